@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""Archivo histórico: comandas cerradas antiguas en comandas_archive.db
+
+La base principal conserva sólo las comandas recientes o abiertas. Las
+completadas o canceladas con más días que la retención configurada se mueven,
+con sus items, a una base separada que se adjunta (ATTACH) sólo cuando una
+consulta necesita ese período. Los resúmenes diarios no se tocan, por lo que
+los reportes normales no necesitan el archivo.
+"""
+import os
+import time
+from datetime import datetime, timedelta
+
+NOMBRE_ARCHIVO = 'comandas_archive.db'
+ALIAS = 'archivo'
+
+# Comandas movidas por transacción; acota cuánto tiempo se bloquea la base
+TAMANO_LOTE = 500
+
+TABLAS_ARCHIVADAS = ('comandas', 'items_comanda')
+
+
+def ruta_archivo(db_path):
+    """Ruta de la base de archivo junto a la base principal"""
+    return os.path.join(os.path.dirname(os.path.abspath(db_path)), NOMBRE_ARCHIVO)
+
+
+def _columnas(conn, tabla, esquema='main'):
+    return [fila[1] for fila in conn.execute(f"PRAGMA {esquema}.table_info({tabla})").fetchall()]
+
+
+def adjuntar(conn, db_path, crear=False):
+    """Adjunta la base de archivo como 'archivo'; devuelve False si no existe y no se pide crearla"""
+    ruta = ruta_archivo(db_path)
+    adjuntas = [fila[1] for fila in conn.execute("PRAGMA database_list").fetchall()]
+    if ALIAS in adjuntas:
+        return True
+    if not crear and not os.path.exists(ruta):
+        return False
+    conn.execute(f"ATTACH DATABASE ? AS {ALIAS}", (ruta,))
+    if crear:
+        _crear_tablas(conn)
+    return True
+
+
+def desadjuntar(conn):
+    """Quita la base de archivo de la conexión si estaba adjunta"""
+    adjuntas = [fila[1] for fila in conn.execute("PRAGMA database_list").fetchall()]
+    if ALIAS in adjuntas:
+        conn.execute(f"DETACH DATABASE {ALIAS}")
+
+
+def _crear_tablas(conn):
+    """Crea en el archivo las tablas con las mismas columnas que en la base principal"""
+    for tabla in TABLAS_ARCHIVADAS:
+        columnas = conn.execute(f"PRAGMA main.table_info({tabla})").fetchall()
+        definiciones = ', '.join(
+            f"{nombre} INTEGER PRIMARY KEY" if nombre == 'id' else f"{nombre} {tipo}"
+            for _, nombre, tipo, _, _, _ in columnas
+        )
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {ALIAS}.{tabla} ({definiciones})")
+        # Columnas agregadas a la base principal después de crear el archivo
+        existentes = _columnas(conn, tabla, ALIAS)
+        for _, nombre, tipo, _, _, _ in columnas:
+            if nombre not in existentes:
+                conn.execute(f"ALTER TABLE {ALIAS}.{tabla} ADD COLUMN {nombre} {tipo}")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {ALIAS}.idx_comandas_fecha ON comandas (fecha)")
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {ALIAS}.idx_items_comanda_comanda ON items_comanda (comanda_id)")
+    conn.commit()
+
+
+def archivar(conn, db_path, dias, tamano_lote=TAMANO_LOTE, pausa=0.05):
+    """Mueve al archivo las comandas cerradas con fecha anterior a hoy menos 'dias'
+
+    Trabaja por lotes, cada uno en su propia transacción BEGIN IMMEDIATE, y hace
+    una pausa entre lotes para que las terminales puedan escribir. Si se
+    interrumpe, lo ya movido queda consistente y la próxima corrida continúa.
+    Devuelve (comandas, items) movidos.
+    """
+    corte = (datetime.now() - timedelta(days=dias)).strftime('%Y-%m-%d')
+    adjuntar(conn, db_path, crear=True)
+    columnas = {tabla: ', '.join(_columnas(conn, tabla)) for tabla in TABLAS_ARCHIVADAS}
+    total_comandas = total_items = 0
+    try:
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DROP TABLE IF EXISTS temp.lote_archivo")
+                conn.execute('''
+                    CREATE TEMP TABLE lote_archivo AS
+                    SELECT id FROM main.comandas
+                    WHERE estado IN ('Completada', 'Cancelada') AND fecha < ?
+                    ORDER BY id
+                    LIMIT ?
+                ''', (corte, tamano_lote))
+                movidas = conn.execute("SELECT COUNT(*) FROM temp.lote_archivo").fetchone()[0]
+                if not movidas:
+                    conn.rollback()
+                    break
+
+                conn.execute(f'''
+                    INSERT OR REPLACE INTO {ALIAS}.comandas ({columnas['comandas']})
+                    SELECT {columnas['comandas']} FROM main.comandas
+                    WHERE id IN (SELECT id FROM temp.lote_archivo)
+                ''')
+                items = conn.execute(f'''
+                    INSERT OR REPLACE INTO {ALIAS}.items_comanda ({columnas['items_comanda']})
+                    SELECT {columnas['items_comanda']} FROM main.items_comanda
+                    WHERE comanda_id IN (SELECT id FROM temp.lote_archivo)
+                ''').rowcount
+                conn.execute("DELETE FROM main.items_comanda WHERE comanda_id IN (SELECT id FROM temp.lote_archivo)")
+                conn.execute("DELETE FROM main.comandas WHERE id IN (SELECT id FROM temp.lote_archivo)")
+                # Los eventos sólo sirven a las pantallas de comandas abiertas
+                conn.execute("DELETE FROM main.eventos WHERE comanda_id IN (SELECT id FROM temp.lote_archivo)")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+            total_comandas += movidas
+            total_items += items
+            if pausa:
+                time.sleep(pausa)
+    finally:
+        conn.execute("DROP TABLE IF EXISTS temp.lote_archivo")
+        desadjuntar(conn)
+    # Los eventos de mesas viejos ya no los pide ningún cliente (reanudan desde otro snapshot)
+    conn.execute("DELETE FROM eventos WHERE comanda_id IS NULL AND fecha < ?", (corte,))
+    conn.commit()
+    return total_comandas, total_items
+
+
+def tablas_historial(conn, db_path, desde):
+    """Nombres (comandas, items) a consultar para un período que empieza en 'desde'
+
+    Si el archivo tiene comandas de ese período lo adjunta y devuelve vistas
+    temporales que unen ambas bases; si no, devuelve las tablas de la base principal.
+    """
+    if not adjuntar(conn, db_path):
+        return 'comandas', 'items_comanda'
+    ultima = conn.execute(f"SELECT MAX(fecha) FROM {ALIAS}.comandas").fetchone()[0]
+    if ultima is None or desde > ultima:
+        desadjuntar(conn)
+        return 'comandas', 'items_comanda'
+
+    for tabla, vista in (('comandas', 'historial_comandas'), ('items_comanda', 'historial_items')):
+        columnas = ', '.join(_columnas(conn, tabla))
+        conn.execute(f'''
+            CREATE TEMP VIEW IF NOT EXISTS {vista} AS
+            SELECT {columnas} FROM main.{tabla}
+            UNION ALL
+            SELECT {columnas} FROM {ALIAS}.{tabla}
+        ''')
+    return 'historial_comandas', 'historial_items'
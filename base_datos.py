@@ -0,0 +1,497 @@
+# -*- coding: utf-8 -*-
+"""Acceso a la base de datos SQLite del sistema de comandas"""
+import sqlite3
+from datetime import datetime
+
+import cuentas
+import ventas_diarias
+from instrumentacion import ConexionInstrumentada
+
+
+def conectar(db_path, timeout=10, instrumentar=True):
+    """Abre una conexión a la base de datos de comandas"""
+    # El timeout permite que varias terminales compartan el mismo archivo
+    # esperando el bloqueo en lugar de fallar inmediatamente
+    if instrumentar:
+        return sqlite3.connect(db_path, timeout=timeout, factory=ConexionInstrumentada)
+    return sqlite3.connect(db_path, timeout=timeout)
+
+
+def _columnas(cursor, tabla):
+    """Nombres de columnas de una tabla"""
+    cursor.execute(f"PRAGMA table_info({tabla})")
+    return [col[1] for col in cursor.fetchall()]
+
+
+# ==================== MIGRACIONES ====================
+# Cada migración se ejecuta una sola vez, en orden, dentro de una transacción.
+# Para cambiar el esquema agregar una función nueva al final de MIGRACIONES;
+# nunca modificar una migración ya publicada.
+
+def _migracion_tablas_base(cursor):
+    """Crea las tablas del sistema y completa columnas de bases de versiones anteriores"""
+    # Tabla de usuarios
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS usuarios (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            usuario TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            nombre_completo TEXT,
+            rol TEXT NOT NULL,
+            activo INTEGER DEFAULT 1,
+            ultimo_acceso TEXT
+        )
+    ''')
+
+    # Actualizar tabla usuarios de versiones anteriores
+    columnas = _columnas(cursor, 'usuarios')
+    if 'nombre_completo' not in columnas:
+        cursor.execute("ALTER TABLE usuarios ADD COLUMN nombre_completo TEXT")
+    if 'activo' not in columnas:
+        cursor.execute("ALTER TABLE usuarios ADD COLUMN activo INTEGER DEFAULT 1")
+    if 'ultimo_acceso' not in columnas:
+        cursor.execute("ALTER TABLE usuarios ADD COLUMN ultimo_acceso TEXT")
+    if 'usuario' not in columnas:
+        # Si no existe 'usuario', crear la columna y copiar de 'nombre'
+        cursor.execute("ALTER TABLE usuarios ADD COLUMN usuario TEXT")
+        cursor.execute("UPDATE usuarios SET usuario = nombre WHERE usuario IS NULL")
+
+    # Asegurar que ambas columnas tengan valores válidos
+    cursor.execute("UPDATE usuarios SET nombre_completo = usuario WHERE nombre_completo IS NULL AND usuario IS NOT NULL")
+    cursor.execute("UPDATE usuarios SET usuario = nombre_completo WHERE usuario IS NULL AND nombre_completo IS NOT NULL")
+
+    # Tabla de productos/platos
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS productos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT NOT NULL,
+            precio REAL NOT NULL,
+            categoria TEXT,
+            disponible INTEGER DEFAULT 1,
+            descripcion TEXT,
+            imagen TEXT
+        )
+    ''')
+
+    # Agregar columna imagen si no existe (para bases de datos existentes)
+    if 'imagen' not in _columnas(cursor, 'productos'):
+        cursor.execute("ALTER TABLE productos ADD COLUMN imagen TEXT")
+
+    # Tabla de mesas
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS mesas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT UNIQUE NOT NULL,
+            capacidad INTEGER DEFAULT 4,
+            estado TEXT DEFAULT 'Disponible',
+            ubicacion TEXT
+        )
+    ''')
+
+    # Actualizar tabla mesas de versiones anteriores
+    columnas = _columnas(cursor, 'mesas')
+    if 'nombre' not in columnas:
+        cursor.execute("ALTER TABLE mesas ADD COLUMN nombre TEXT")
+        # Migrar datos de 'numero' a 'nombre' si es necesario
+        cursor.execute("UPDATE mesas SET nombre = numero WHERE nombre IS NULL")
+    if 'ubicacion' not in columnas:
+        cursor.execute("ALTER TABLE mesas ADD COLUMN ubicacion TEXT DEFAULT 'Sin ubicación'")
+
+    # Tabla de comandas
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS comandas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            numero_comanda TEXT NOT NULL,
+            mesa_id INTEGER,
+            fecha TEXT NOT NULL,
+            usuario TEXT NOT NULL,
+            total REAL NOT NULL,
+            estado TEXT DEFAULT 'Pendiente',
+            observaciones TEXT,
+            FOREIGN KEY (mesa_id) REFERENCES mesas (id)
+        )
+    ''')
+
+    # Tabla de items de comanda
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS items_comanda (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            comanda_id INTEGER NOT NULL,
+            producto_nombre TEXT NOT NULL,
+            cantidad INTEGER NOT NULL,
+            precio_unitario REAL NOT NULL,
+            observaciones TEXT,
+            FOREIGN KEY (comanda_id) REFERENCES comandas (id)
+        )
+    ''')
+
+    # Tabla de configuración del sistema
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS configuracion (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            clave TEXT UNIQUE NOT NULL,
+            valor TEXT NOT NULL,
+            descripcion TEXT,
+            tipo TEXT DEFAULT 'string',
+            fecha_modificacion TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _migracion_normalizar_estados(cursor):
+    """Normaliza los estados de comandas guardados en minúsculas por versiones anteriores"""
+    cursor.execute("UPDATE comandas SET estado = 'Pendiente' WHERE estado = 'pendiente'")
+    cursor.execute("UPDATE comandas SET estado = 'En preparación' WHERE estado = 'en preparacion' OR estado = 'en preparación'")
+    cursor.execute("UPDATE comandas SET estado = 'Completada' WHERE estado = 'completada'")
+    cursor.execute("UPDATE comandas SET estado = 'Cancelada' WHERE estado = 'cancelada'")
+
+
+def _migracion_usuario_admin(cursor):
+    """Crea el usuario admin (o repara su rol) y elimina el duplicado 'Administrador'"""
+    cursor.execute("SELECT * FROM usuarios WHERE usuario = 'admin'")
+    admin_user = cursor.fetchone()
+
+    if not admin_user:
+        # No existe, crear el usuario admin
+        cursor.execute('''
+            INSERT INTO usuarios (usuario, password, nombre_completo, rol, activo)
+            VALUES ('admin', 'admin123', 'Administrador del Sistema', 'Administrador', 1)
+        ''')
+    else:
+        # Existe, asegurar que tenga el rol correcto
+        cursor.execute('''
+            UPDATE usuarios
+            SET rol = 'Administrador', nombre_completo = 'Administrador del Sistema', activo = 1
+            WHERE usuario = 'admin'
+        ''')
+
+    # Limpiar usuarios duplicados o con problemas (ej: 'Administrador' en lugar de 'admin')
+    cursor.execute("DELETE FROM usuarios WHERE usuario = 'Administrador' AND usuario != 'admin'")
+
+
+def _migracion_datos_ejemplo(cursor):
+    """Carga productos y mesas de ejemplo en una base vacía"""
+    cursor.execute("SELECT COUNT(*) FROM productos")
+    if cursor.fetchone()[0] == 0:
+        productos_ejemplo = [
+            ('Hamburguesa Clásica', 2500, 'Hamburguesas', 1, 'Carne, lechuga, tomate, cebolla'),
+            ('Pizza Margarita', 3000, 'Pizzas', 1, 'Salsa de tomate, mozzarella, albahaca'),
+            ('Papas Fritas', 800, 'Guarniciones', 1, 'Papas cortadas en bastones'),
+            ('Coca Cola 500ml', 600, 'Bebidas', 1, 'Bebida gaseosa'),
+            ('Milanesa con Puré', 2800, 'Platos Principales', 1, 'Milanesa de carne con puré de papas'),
+            ('Ensalada César', 1800, 'Ensaladas', 1, 'Lechuga, pollo, crutones, aderezo césar'),
+            ('Café Expreso', 400, 'Cafetería', 1, 'Café expreso tradicional'),
+            ('Agua Mineral', 300, 'Bebidas', 1, 'Agua sin gas 500ml')
+        ]
+        cursor.executemany('''
+            INSERT INTO productos (nombre, precio, categoria, disponible, descripcion)
+            VALUES (?, ?, ?, ?, ?)
+        ''', productos_ejemplo)
+
+    cursor.execute("SELECT COUNT(*) FROM mesas")
+    if cursor.fetchone()[0] == 0:
+        mesas_ejemplo = [
+            ('Mesa 1', 4, 'Disponible', 'Zona Principal'),
+            ('Mesa 2', 4, 'Disponible', 'Zona Principal'),
+            ('Mesa 3', 6, 'Disponible', 'Zona Principal'),
+            ('Mesa 4', 2, 'Disponible', 'Zona Ventana'),
+            ('Mesa 5', 8, 'Disponible', 'Zona VIP'),
+            ('Barra 1', 1, 'Disponible', 'Barra'),
+            ('Barra 2', 1, 'Disponible', 'Barra'),
+            ('Terraza 1', 4, 'Disponible', 'Terraza'),
+            ('Terraza 2', 6, 'Disponible', 'Terraza'),
+            ('Privado 1', 10, 'Disponible', 'Salón Privado')
+        ]
+        cursor.executemany('''
+            INSERT INTO mesas (nombre, capacidad, estado, ubicacion)
+            VALUES (?, ?, ?, ?)
+        ''', mesas_ejemplo)
+
+
+def _migracion_indices_reportes(cursor):
+    """Índices para leer comandas por rango de fechas y sus items"""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_comandas_fecha ON comandas (fecha)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_items_comanda_comanda ON items_comanda (comanda_id)")
+
+
+def _migracion_resumenes_diarios(cursor):
+    """Tablas de resumen diario de ventas, cargadas con el historial existente"""
+    ventas_diarias.crear_tablas(cursor)
+    ventas_diarias.reconstruir(cursor)
+
+
+def _migracion_marcas_exportacion(cursor):
+    """Último id exportado por tabla y formato para las exportaciones incrementales"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS exportaciones_marcas (
+            tabla TEXT NOT NULL,
+            formato TEXT NOT NULL,
+            ultimo_id INTEGER NOT NULL DEFAULT 0,
+            fecha TEXT,
+            PRIMARY KEY (tabla, formato)
+        )
+    ''')
+
+
+def _migracion_eventos(cursor):
+    """Registro de cambios de comandas para pantallas que se actualizan en forma incremental"""
+    # seq crece siempre (AUTOINCREMENT no reutiliza valores aunque se borren filas),
+    # así un lector sólo pide lo posterior a la última seq que vio
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS eventos (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            comanda_id INTEGER NOT NULL,
+            tipo TEXT NOT NULL,
+            estado TEXT,
+            fecha TEXT NOT NULL
+        )
+    ''')
+
+
+def _migracion_estaciones(cursor):
+    """Estación de preparación por producto y por item, con la hora en que quedó listo"""
+    if 'estacion' not in _columnas(cursor, 'productos'):
+        cursor.execute("ALTER TABLE productos ADD COLUMN estacion TEXT")
+    cursor.execute('''
+        UPDATE productos SET estacion = CASE categoria
+            WHEN 'Bebidas' THEN 'Bar'
+            WHEN 'Cafetería' THEN 'Cafetería'
+            WHEN 'Hamburguesas' THEN 'Parrilla'
+            ELSE 'Cocina'
+        END
+        WHERE estacion IS NULL
+    ''')
+
+    columnas_items = _columnas(cursor, 'items_comanda')
+    if 'estacion' not in columnas_items:
+        cursor.execute("ALTER TABLE items_comanda ADD COLUMN estacion TEXT")
+    if 'listo' not in columnas_items:
+        cursor.execute("ALTER TABLE items_comanda ADD COLUMN listo TEXT")
+
+    # Sólo las comandas abiertas entran en las colas; el historial queda sin estación
+    cursor.execute('''
+        UPDATE items_comanda SET estacion = COALESCE(
+            (SELECT p.estacion FROM productos p WHERE p.nombre = items_comanda.producto_nombre LIMIT 1),
+            'Cocina'
+        )
+        WHERE estacion IS NULL AND comanda_id IN (
+            SELECT id FROM comandas WHERE estado IN ('Pendiente', 'En preparación')
+        )
+    ''')
+
+    # Índices parciales: sólo contienen los items en cola y los que ya tienen hora de listo
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_items_pendientes_estacion ON items_comanda (estacion, comanda_id)
+        WHERE listo IS NULL AND estacion IS NOT NULL
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_items_listo ON items_comanda (listo)
+        WHERE listo IS NOT NULL
+    ''')
+
+
+def _migracion_version_catalogo(cursor):
+    """Contador que cambia con cada alta, modificación o baja de productos (ETag del catálogo)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS versiones (
+            clave TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute("INSERT OR IGNORE INTO versiones (clave, version) VALUES ('catalogo', 1)")
+    # Los triggers cubren también los cambios hechos desde otras terminales o a mano
+    for operacion in ('INSERT', 'UPDATE', 'DELETE'):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS productos_version_{operacion.lower()}
+            AFTER {operacion} ON productos
+            BEGIN
+                UPDATE versiones SET version = version + 1 WHERE clave = 'catalogo';
+            END
+        ''')
+
+
+def _migracion_indice_numero_comanda(cursor):
+    """Índice para buscar comandas por número (transiciones desde la interfaz y la API)"""
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_comandas_numero ON comandas (numero_comanda)")
+
+
+def _migracion_eventos_mesas(cursor):
+    """Eventos también para los cambios de mesas (altas, estado, nombre, bajas)"""
+    # comanda_id era NOT NULL: SQLite no permite quitarlo con ALTER, se rehace la tabla
+    cursor.execute('''
+        CREATE TABLE eventos_nueva (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            comanda_id INTEGER,
+            tipo TEXT NOT NULL,
+            estado TEXT,
+            fecha TEXT NOT NULL,
+            mesa_id INTEGER
+        )
+    ''')
+    cursor.execute('''
+        INSERT INTO eventos_nueva (seq, comanda_id, tipo, estado, fecha)
+        SELECT seq, comanda_id, tipo, estado, fecha FROM eventos
+    ''')
+    # Conservar el contador: las pantallas guardan la última seq y no debe repetirse
+    # aunque se hayan borrado los eventos más nuevos al archivar
+    cursor.execute('''
+        UPDATE sqlite_sequence
+        SET seq = (SELECT MAX(seq) FROM sqlite_sequence WHERE name IN ('eventos', 'eventos_nueva'))
+        WHERE name = 'eventos_nueva'
+    ''')
+    cursor.execute('''
+        INSERT INTO sqlite_sequence (name, seq)
+        SELECT 'eventos_nueva', seq FROM sqlite_sequence
+        WHERE name = 'eventos' AND NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'eventos_nueva')
+    ''')
+    cursor.execute("DROP TABLE eventos")
+    cursor.execute("ALTER TABLE eventos_nueva RENAME TO eventos")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_eventos_mesa_fecha ON eventos (fecha) WHERE comanda_id IS NULL")
+
+    # Triggers: cubren también los cambios de estado que la interfaz hace con SQL directo
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS mesas_evento_insert AFTER INSERT ON mesas
+        BEGIN
+            INSERT INTO eventos (tipo, estado, fecha, mesa_id)
+            VALUES ('mesa', NEW.estado, datetime('now', 'localtime'), NEW.id);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS mesas_evento_update AFTER UPDATE ON mesas
+        WHEN OLD.estado IS NOT NEW.estado OR OLD.nombre IS NOT NEW.nombre
+             OR OLD.capacidad IS NOT NEW.capacidad OR OLD.ubicacion IS NOT NEW.ubicacion
+        BEGIN
+            INSERT INTO eventos (tipo, estado, fecha, mesa_id)
+            VALUES ('mesa', NEW.estado, datetime('now', 'localtime'), NEW.id);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS mesas_evento_delete AFTER DELETE ON mesas
+        BEGIN
+            INSERT INTO eventos (tipo, estado, fecha, mesa_id)
+            VALUES ('mesa_borrada', NULL, datetime('now', 'localtime'), OLD.id);
+        END
+    ''')
+
+
+def _migracion_id_cliente(cursor):
+    """Identificador generado por la terminal para reenviar comandas sin duplicarlas"""
+    columnas = _columnas(cursor, 'comandas')
+    if 'id_cliente' not in columnas:
+        cursor.execute("ALTER TABLE comandas ADD COLUMN id_cliente TEXT")
+    if 'fecha_terminal' not in columnas:
+        cursor.execute("ALTER TABLE comandas ADD COLUMN fecha_terminal TEXT")
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_comandas_id_cliente ON comandas (id_cliente)
+        WHERE id_cliente IS NOT NULL
+    ''')
+
+
+def _migracion_borradores(cursor):
+    """Comanda en curso de cada mesa, para recuperarla tras un cierre inesperado"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS borradores (
+            terminal TEXT NOT NULL,
+            mesa_id INTEGER NOT NULL,
+            items TEXT NOT NULL,
+            observaciones TEXT,
+            usuario TEXT,
+            actualizado TEXT NOT NULL,
+            PRIMARY KEY (terminal, mesa_id)
+        )
+    ''')
+
+
+def _migracion_cuentas(cursor):
+    """Cuentas por ocupación de mesa con totales acumulados
+
+    Las mesas ocupadas o con comandas activas reciben una cuenta abierta con
+    sus comandas activas y las no canceladas del día; el historial anterior
+    queda sin cuenta.
+    """
+    cuentas.crear_tablas(cursor)
+    cursor.execute('''
+        INSERT INTO cuentas (mesa_id, abierta)
+        SELECT c.mesa_id, MIN(c.fecha)
+        FROM comandas c JOIN mesas m ON m.id = c.mesa_id
+        WHERE c.estado IN ('Pendiente', 'En preparación')
+           OR (c.estado != 'Cancelada' AND DATE(c.fecha) = DATE('now', 'localtime') AND (
+               LOWER(m.estado) = 'ocupada' OR EXISTS (
+                   SELECT 1 FROM comandas a
+                   WHERE a.mesa_id = m.id AND a.estado IN ('Pendiente', 'En preparación'))))
+        GROUP BY c.mesa_id
+    ''')
+    cursor.execute('''
+        UPDATE comandas SET cuenta_id = (
+            SELECT id FROM cuentas WHERE cuentas.mesa_id = comandas.mesa_id AND cerrada IS NULL
+        )
+        WHERE mesa_id IN (SELECT mesa_id FROM cuentas WHERE cerrada IS NULL)
+          AND (estado IN ('Pendiente', 'En preparación')
+               OR (estado != 'Cancelada' AND DATE(fecha) = DATE('now', 'localtime')))
+    ''')
+    cuentas.reconstruir(cursor)
+
+
+# Registro ordenado: (versión, descripción, función)
+MIGRACIONES = [
+    (1, 'Tablas base y columnas de versiones anteriores', _migracion_tablas_base),
+    (2, 'Normalizar estados de comandas', _migracion_normalizar_estados),
+    (3, 'Usuario administrador por defecto', _migracion_usuario_admin),
+    (4, 'Datos de ejemplo', _migracion_datos_ejemplo),
+    (5, 'Índices para reportes', _migracion_indices_reportes),
+    (6, 'Resúmenes diarios de ventas', _migracion_resumenes_diarios),
+    (7, 'Marcas de exportación incremental', _migracion_marcas_exportacion),
+    (8, 'Registro de eventos de comandas', _migracion_eventos),
+    (9, 'Estaciones de preparación', _migracion_estaciones),
+    (10, 'Versión del catálogo de productos', _migracion_version_catalogo),
+    (11, 'Índice por número de comanda', _migracion_indice_numero_comanda),
+    (12, 'Eventos de mesas', _migracion_eventos_mesas),
+    (13, 'Id de comanda generado por la terminal', _migracion_id_cliente),
+    (14, 'Borradores de comandas en curso', _migracion_borradores),
+    (15, 'Cuentas por ocupación de mesa', _migracion_cuentas),
+]
+
+VERSION_ESQUEMA = MIGRACIONES[-1][0]
+
+
+def version_esquema(conn):
+    """Versión de esquema aplicada a la base (0 si nunca se migró)"""
+    try:
+        return conn.execute("SELECT MAX(version) FROM schema_version").fetchone()[0] or 0
+    except sqlite3.OperationalError:
+        # La tabla aún no existe: base nueva o anterior al control de versiones
+        return 0
+
+
+def init_database(conn):
+    """Aplica las migraciones pendientes; en una base al día es una sola consulta"""
+    if version_esquema(conn) >= VERSION_ESQUEMA:
+        return
+
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            descripcion TEXT,
+            fecha_aplicada TEXT NOT NULL
+        )
+    ''')
+    conn.commit()
+
+    for version, descripcion, migracion in MIGRACIONES:
+        try:
+            # Bloqueo de escritura: si otra terminal migra a la vez, esperar y volver a verificar
+            conn.execute("BEGIN IMMEDIATE")
+            if version_esquema(conn) >= version:
+                conn.rollback()
+                continue
+            migracion(cursor)
+            cursor.execute(
+                "INSERT INTO schema_version (version, descripcion, fecha_aplicada) VALUES (?, ?, ?)",
+                (version, descripcion, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+            )
+            conn.commit()
+            print(f"Migración {version} aplicada: {descripcion}")
+        except Exception:
+            conn.rollback()
+            raise
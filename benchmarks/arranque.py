@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""Benchmark de arranque: tiempo de importación y de primer pintado de la ventana de login
+
+Cada medición corre en un proceso nuevo para reflejar un arranque en frío.
+
+Uso:
+    python benchmarks/arranque.py --salida arranque.json
+    python benchmarks/arranque.py --comparar arranque.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from dependencias import MODULOS_PESADOS  # noqa: E402
+
+# Script que se ejecuta en el proceso hijo: importa la aplicación sin lanzar mainloop
+# y, si hay pantalla, construye la interfaz hasta el primer pintado.
+SCRIPT_MEDICION = r'''
+import importlib.util, json, os, sys, time
+inicio = time.perf_counter()
+raiz, db_dir, medir_pintado, pesados = sys.argv[1], sys.argv[2], sys.argv[3] == '1', sys.argv[4].split(',')
+sys.path.insert(0, raiz)
+spec = importlib.util.spec_from_file_location('sistema_comandas', os.path.join(raiz, 'sistema-comandas.py'))
+modulo = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(modulo)
+importacion_ms = (time.perf_counter() - inicio) * 1000
+resultado = {
+    'importacion_ms': importacion_ms,
+    'pesados_cargados': [m for m in pesados if m in sys.modules],
+    'primer_pintado_ms': None,
+}
+if medir_pintado:
+    try:
+        root = modulo.tk.Tk()
+    except modulo.tk.TclError as e:
+        resultado['sin_pantalla'] = str(e)
+    else:
+        modulo.SistemaComandas.get_app_directory = lambda self: db_dir
+        app = modulo.SistemaComandas(root)
+        root.update()
+        resultado['primer_pintado_ms'] = (time.perf_counter() - inicio) * 1000
+        resultado['pesados_cargados'] = [m for m in pesados if m in sys.modules]
+        if app.monitor_ui:
+            app.monitor_ui.detener()
+        root.destroy()
+print(json.dumps(resultado))
+'''
+
+
+def medir_una_vez(db_dir, medir_pintado):
+    """Lanza un proceso nuevo y devuelve sus mediciones"""
+    salida = subprocess.run(
+        [sys.executable, '-c', SCRIPT_MEDICION, RAIZ, db_dir,
+         '1' if medir_pintado else '0', ','.join(MODULOS_PESADOS)],
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def ejecutar(repeticiones, medir_pintado):
+    """Repite la medición y devuelve medianas"""
+    db_dir = tempfile.mkdtemp(prefix='comandas_arranque_')
+    importaciones = []
+    pintados = []
+    pesados = set()
+    sin_pantalla = None
+    for _ in range(repeticiones):
+        medicion = medir_una_vez(db_dir, medir_pintado)
+        importaciones.append(medicion['importacion_ms'])
+        if medicion['primer_pintado_ms'] is not None:
+            pintados.append(medicion['primer_pintado_ms'])
+        pesados.update(medicion['pesados_cargados'])
+        sin_pantalla = medicion.get('sin_pantalla', sin_pantalla)
+
+    return {
+        'fecha': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'entorno': {'python': platform.python_version(), 'plataforma': platform.platform()},
+        'repeticiones': repeticiones,
+        'importacion_ms': round(statistics.median(importaciones), 2),
+        'primer_pintado_ms': round(statistics.median(pintados), 2) if pintados else None,
+        'pesados_cargados': sorted(pesados),
+        'sin_pantalla': sin_pantalla if not pintados else None,
+    }
+
+
+def comparar(actual, anterior, tolerancia):
+    """Devuelve la lista de regresiones respecto de un resultado previo"""
+    regresiones = []
+    for clave in ('importacion_ms', 'primer_pintado_ms'):
+        previo, nuevo = anterior.get(clave), actual.get(clave)
+        if not previo or nuevo is None:
+            continue
+        cambio = nuevo / previo - 1
+        print(f"  {clave:<18} {previo:9.1f} -> {nuevo:9.1f} ms ({cambio:+.0%})")
+        if cambio > tolerancia:
+            regresiones.append(f"{clave} {cambio:+.0%}")
+    return regresiones
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de arranque del sistema de comandas")
+    parser.add_argument('--repeticiones', type=int, default=5, help="Procesos a lanzar (se informa la mediana)")
+    parser.add_argument('--sin-pintado', action='store_true', help="Medir sólo la importación")
+    parser.add_argument('--salida', help="Archivo JSON donde guardar el resultado")
+    parser.add_argument('--comparar', help="Resultado JSON previo para detectar regresiones")
+    parser.add_argument('--tolerancia', type=float, default=0.25,
+                        help="Empeoramiento relativo permitido al comparar (0.25 = 25%%)")
+    params = parser.parse_args(argv)
+
+    resultado = ejecutar(params.repeticiones, not params.sin_pintado)
+    print(f"Importación: {resultado['importacion_ms']} ms")
+    if resultado['primer_pintado_ms'] is not None:
+        print(f"Primer pintado: {resultado['primer_pintado_ms']} ms")
+    elif resultado['sin_pantalla']:
+        print(f"Primer pintado no medido (sin pantalla: {resultado['sin_pantalla']})")
+
+    if params.salida:
+        with open(params.salida, 'w', encoding='utf-8') as archivo:
+            json.dump(resultado, archivo, indent=2, ensure_ascii=False)
+        print(f"Resultado guardado en {params.salida}")
+
+    regresiones = []
+    if resultado['pesados_cargados']:
+        regresiones.append("módulos pesados cargados al arrancar: " + ", ".join(resultado['pesados_cargados']))
+
+    if params.comparar:
+        with open(params.comparar, encoding='utf-8') as archivo:
+            anterior = json.load(archivo)
+        print(f"Comparación con {params.comparar}:")
+        regresiones.extend(comparar(resultado, anterior, params.tolerancia))
+
+    if regresiones:
+        print("REGRESIÓN: " + "; ".join(regresiones))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
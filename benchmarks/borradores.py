@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""Benchmark de los borradores de la comanda en curso
+
+Simula a un mesero tocando productos en varias mesas a ritmo fijo mientras
+otra conexión toma cada tanto el bloqueo de escritura de la base (otra
+terminal registrando comandas). Mide lo que tarda cada toque en guardar el
+borrador (lo que ve la interfaz), cuenta las escrituras que hizo el hilo de
+fondo y verifica:
+
+- que no haya más de una escritura por intervalo;
+- que tras un cierre inesperado (sin cerrar() ni vaciar) otra instancia
+  recupere todos los borradores salvo, como mucho, el último intervalo;
+- que después de cerrar() la base tenga exactamente lo que había en memoria.
+
+Uso:
+    python benchmarks/borradores.py --toques 2000 --por-segundo 50 --intervalo 500
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import borradores  # noqa: E402
+from motor_comandas import OrderEngine  # noqa: E402
+from hora_pico import sembrar_base, resumir  # noqa: E402
+
+
+def bloquear_periodicamente(db_path, fin, duracion_s, cada_s):
+    """Otra terminal que mantiene el bloqueo de escritura un rato cada tanto"""
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        while not fin.wait(cada_s):
+            conn.execute("BEGIN IMMEDIATE")
+            time.sleep(duracion_s)
+            conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+
+def estado_en_base(db_path, terminal):
+    instancia = borradores.Borradores(db_path, terminal)
+    instancia.cargar()
+    return {mesa_id: instancia.obtener(mesa_id)['items'] for mesa_id in instancia.mesas()}
+
+
+def ejecutar(params):
+    db_path = os.path.join(tempfile.mkdtemp(prefix='comandas_borradores_'), 'comandas.db')
+    sembrar_base(db_path, params.productos, params.mesas, 0, 0, params.semilla)
+    motor = OrderEngine(db_path)
+    productos = motor.listar_productos()
+    mesas = [info['mesa'] for info in motor.listar_mesas()]
+    motor.cerrar()
+
+    rnd = random.Random(params.semilla)
+    terminal = 'benchmark'
+    escritor = borradores.Borradores(db_path, terminal, intervalo_ms=params.intervalo)
+    escrituras = []
+    escribir = escritor._escribir
+
+    def escribir_contando(conn, lote):
+        # Cuenta el comienzo: la espera del bloqueo no es parte del intervalo
+        escrituras.append(time.monotonic())
+        escribir(conn, lote)
+
+    escritor._escribir = escribir_contando
+    escritor.iniciar()
+
+    fin = threading.Event()
+    bloqueo = threading.Thread(
+        target=bloquear_periodicamente, args=(db_path, fin, params.bloqueo_ms / 1000, 1.0), daemon=True
+    )
+    bloqueo.start()
+
+    # Mesas con su comanda en curso; cada toque agrega o quita un item
+    comandas = {}
+    demoras = []
+    pausa = 1 / params.por_segundo
+    for toque in range(params.toques):
+        mesa = rnd.choice(mesas[:params.mesas_activas])
+        items = comandas.setdefault(mesa[0], [])
+        if items and rnd.random() < 0.15:
+            del items[rnd.randrange(len(items))]
+        else:
+            producto = rnd.choice(productos)
+            items.append({'id': producto[0], 'nombre': producto[1], 'precio': producto[2],
+                          'cantidad': 1, 'categoria': producto[3]})
+        inicio = time.perf_counter()
+        escritor.guardar(mesa[0], items, f"toque {toque}", 'benchmark')
+        demoras.append((time.perf_counter() - inicio) * 1000)
+        time.sleep(pausa)
+    fin.set()
+    bloqueo.join()
+
+    errores = []
+    esperadas = {mesa_id: items for mesa_id, items in comandas.items() if items}
+
+    # Cierre inesperado: otra instancia lee la base sin que la primera vacíe lo pendiente
+    time.sleep(params.intervalo / 1000 * 2 + params.bloqueo_ms / 1000)
+    recuperadas = estado_en_base(db_path, terminal)
+    perdidas = sum(1 for mesa_id, items in esperadas.items() if recuperadas.get(mesa_id) != items)
+    if perdidas:
+        errores.append(f"{perdidas} mesas no se recuperaron tras el cierre inesperado")
+
+    if not escritor.cerrar():
+        errores.append("cerrar() no llegó a escribir lo pendiente")
+    if estado_en_base(db_path, terminal) != esperadas:
+        errores.append("la base no coincide con los borradores en memoria después de cerrar()")
+
+    intervalos = [b - a for a, b in zip(escrituras, escrituras[1:])]
+    minimo_ms = min(intervalos) * 1000 if intervalos else None
+    # Margen por la resolución del reloj y del sleep
+    if minimo_ms is not None and minimo_ms < params.intervalo * 0.95:
+        errores.append(f"dos escrituras empezaron con {minimo_ms:.0f} ms de diferencia (< {params.intervalo} ms)")
+
+    return {
+        'toques': params.toques,
+        'escrituras': len(escrituras),
+        'minimo_entre_escrituras_ms': round(minimo_ms, 1) if minimo_ms is not None else None,
+        'operaciones': {'toque': resumir(demoras)},
+        'errores': errores,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de borradores de comandas")
+    parser.add_argument('--toques', type=int, default=1000)
+    parser.add_argument('--por-segundo', type=float, default=50, help="Toques por segundo")
+    parser.add_argument('--intervalo', type=int, default=borradores.INTERVALO_MS,
+                        help="Intervalo mínimo entre escrituras (ms)")
+    parser.add_argument('--bloqueo-ms', type=int, default=300,
+                        help="Duración del bloqueo de escritura de la otra terminal, una vez por segundo")
+    parser.add_argument('--mesas-activas', type=int, default=6)
+    parser.add_argument('--productos', type=int, default=100)
+    parser.add_argument('--mesas', type=int, default=30)
+    parser.add_argument('--semilla', type=int, default=42)
+    params = parser.parse_args(argv)
+
+    resultado = ejecutar(params)
+    toque = resultado['operaciones']['toque']
+    print(f"{resultado['toques']} toques, {resultado['escrituras']} escrituras "
+          f"(mínimo {resultado['minimo_entre_escrituras_ms']} ms entre comienzos)")
+    print(f"  toque    p50 {toque['p50_ms']:.3f} ms / p99 {toque['p99_ms']:.3f} ms / máx {toque['max_ms']:.3f} ms")
+    if resultado['errores']:
+        print("ERROR: " + "; ".join(resultado['errores']))
+        return 1
+    print("OK: borradores recuperados sin esperar a la base")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""Benchmark de búsqueda de productos: tiempo por tecla con menús grandes
+
+Simula a un mozo escribiendo letra por letra y mide cada búsqueda del índice en
+memoria y, si está disponible, del índice FTS5. Una búsqueda debería tardar bastante
+menos que un cuadro de pantalla (16 ms) para que la lista se actualice en cada tecla.
+
+Uso:
+    python benchmarks/busqueda_productos.py --productos 20000 --salida busqueda.json
+    python benchmarks/busqueda_productos.py --productos 20000 --comparar busqueda.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import busqueda  # noqa: E402
+
+PALABRAS = ['hamburguesa', 'pizza', 'milanesa', 'ensalada', 'café', 'limonada', 'cerveza',
+            'papas', 'fritas', 'puré', 'napolitana', 'completa', 'caprese', 'jamón', 'queso',
+            'pollo', 'atún', 'cortado', 'medialuna', 'flan', 'tiramisú', 'provoleta', 'lomo',
+            'espinaca', 'calabaza', 'champiñones', 'ñoquis', 'ravioles', 'sorrentinos', 'salsa']
+CATEGORIAS = ['Hamburguesas', 'Pizzas', 'Platos Principales', 'Ensaladas',
+              'Guarniciones', 'Bebidas', 'Cafetería', 'Postres', 'Otros']
+
+
+def generar_productos(cantidad, semilla):
+    """Filas con la forma de SELECT * FROM productos"""
+    rnd = random.Random(semilla)
+    productos = []
+    for producto_id in range(1, cantidad + 1):
+        nombre = ' '.join(rnd.sample(PALABRAS, rnd.randint(1, 3))).title() + f" {producto_id}"
+        descripcion = ' '.join(rnd.sample(PALABRAS, rnd.randint(2, 6)))
+        productos.append((producto_id, nombre, rnd.randint(500, 20000), rnd.choice(CATEGORIAS),
+                          1, descripcion, None))
+    return productos
+
+
+def medir(indice, consultas):
+    """Tiempo (ms) de cada prefijo de cada consulta, como si se tipeara letra por letra"""
+    tiempos = []
+    for consulta in consultas:
+        for largo in range(1, len(consulta) + 1):
+            inicio = time.perf_counter()
+            indice.buscar(consulta[:largo])
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+    tiempos.sort()
+    return {
+        'busquedas': len(tiempos),
+        'p50_ms': round(statistics.median(tiempos), 3),
+        'p99_ms': round(tiempos[int(len(tiempos) * 0.99) - 1], 3),
+        'max_ms': round(tiempos[-1], 3),
+    }
+
+
+def ejecutar(cantidad, semilla):
+    productos = generar_productos(cantidad, semilla)
+    rnd = random.Random(semilla + 1)
+    consultas = [rnd.choice(PALABRAS) for _ in range(30)] + \
+                [f"{rnd.choice(PALABRAS)[:4]} {rnd.choice(PALABRAS)[:3]}" for _ in range(20)] + \
+                [rnd.choice(PALABRAS)[2:7] for _ in range(10)]
+
+    resultado = {
+        'fecha': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'entorno': {'python': platform.python_version(), 'plataforma': platform.platform()},
+        'productos': cantidad,
+        'indices': {},
+    }
+    clases = [('memoria', busqueda.IndiceProductos)]
+    if busqueda.fts5_disponible():
+        clases.append(('fts5', busqueda.IndiceFTS5))
+    for nombre, clase in clases:
+        inicio = time.perf_counter()
+        indice = clase(productos)
+        construccion = (time.perf_counter() - inicio) * 1000
+        inicio = time.perf_counter()
+        for producto in productos[:100]:
+            indice.actualizar(producto)
+        actualizacion = (time.perf_counter() - inicio) * 1000 / 100
+        resultado['indices'][nombre] = dict(
+            medir(indice, consultas),
+            construccion_ms=round(construccion, 1),
+            actualizacion_ms=round(actualizacion, 3),
+        )
+    return resultado
+
+
+def comparar(actual, anterior, tolerancia):
+    """Devuelve la lista de regresiones respecto de un resultado previo"""
+    regresiones = []
+    for nombre, datos in actual['indices'].items():
+        previos = anterior.get('indices', {}).get(nombre)
+        if not previos:
+            continue
+        for clave in ('p50_ms', 'p99_ms', 'construccion_ms'):
+            previo, nuevo = previos[clave], datos[clave]
+            if not previo:
+                continue
+            cambio = nuevo / previo - 1
+            print(f"  {nombre:<8} {clave:<16} {previo:9.3f} -> {nuevo:9.3f} ({cambio:+.0%})")
+            if cambio > tolerancia:
+                regresiones.append(f"{nombre} {clave} {cambio:+.0%}")
+    return regresiones
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de búsqueda de productos")
+    parser.add_argument('--productos', type=int, default=20000, help="Tamaño del menú simulado")
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--salida', help="Archivo JSON donde guardar el resultado")
+    parser.add_argument('--comparar', help="Resultado JSON previo para detectar regresiones")
+    parser.add_argument('--tolerancia', type=float, default=0.25,
+                        help="Empeoramiento relativo permitido al comparar (0.25 = 25%%)")
+    params = parser.parse_args(argv)
+
+    resultado = ejecutar(params.productos, params.semilla)
+    for nombre, datos in resultado['indices'].items():
+        print(f"{nombre}: construcción {datos['construccion_ms']} ms, actualización {datos['actualizacion_ms']} ms, "
+              f"búsqueda p50 {datos['p50_ms']} ms / p99 {datos['p99_ms']} ms / máx {datos['max_ms']} ms "
+              f"({datos['busquedas']} búsquedas)")
+
+    if params.salida:
+        with open(params.salida, 'w', encoding='utf-8') as archivo:
+            json.dump(resultado, archivo, indent=2, ensure_ascii=False)
+        print(f"Resultado guardado en {params.salida}")
+
+    if params.comparar:
+        with open(params.comparar, encoding='utf-8') as archivo:
+            anterior = json.load(archivo)
+        print(f"Comparación con {params.comparar}:")
+        regresiones = comparar(resultado, anterior, params.tolerancia)
+        if regresiones:
+            print("REGRESIÓN: " + "; ".join(regresiones))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
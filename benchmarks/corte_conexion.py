@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""Simulación de un corte de la base compartida con varias terminales
+
+1. Las terminales toman comandas con la base disponible.
+2. Corte: otra conexión toma un bloqueo EXCLUSIVE durante toda la fase, así la
+   base no responde ni para leer ni para escribir (lo que ve SQLite cuando el
+   recurso de red se cae). Las terminales siguen tomando comandas, que quedan en
+   su diario local; un intento de sincronizar en pleno corte debe fallar sin
+   perder nada.
+3. Vuelve la conexión. Antes de sincronizar se reenvía a mano una comanda de
+   cada diario, como si el commit hubiera llegado y se hubiera cortado la
+   respuesta. Después todas las terminales sincronizan a la vez.
+
+Verifica que cada comanda tomada esté exactamente una vez en la base, que los
+números de comanda no se repitan, que las tomadas sin conexión conserven su
+hora de toma en fecha_terminal y que los diarios queden vacíos. Informa la
+demora de tomar una comanda con y sin conexión y la de sincronizar.
+
+Uso:
+    python benchmarks/corte_conexion.py --terminales 3 --comandas 10
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import diario_local  # noqa: E402
+from motor_comandas import OrderEngine  # noqa: E402
+from hora_pico import sembrar_base, resumir  # noqa: E402
+
+# Espera máxima de bloqueo de las terminales durante la prueba (la de la
+# aplicación es de 10 s; con ella cada comanda del corte tardaría eso)
+ESPERA_BLOQUEO_MS = 200
+
+
+class Terminal(threading.Thread):
+    """Una caja con su conexión a la base y su diario local, en su propio hilo"""
+
+    def __init__(self, nombre, db_path, directorio, semilla, cantidad, fases):
+        super().__init__(daemon=True)
+        self.nombre = nombre
+        self.db_path = db_path
+        self.diario = diario_local.DiarioLocal(os.path.join(directorio, f"diario-{nombre}.jsonl"))
+        self.rnd = random.Random(semilla)
+        self.cantidad = cantidad
+        self.fases = fases
+        self.tomadas = []
+        self.demoras = {'con_conexion': [], 'sin_conexion': [], 'sincronizar': []}
+        self.fallo_en_corte = False
+        self.pendientes_en_corte = 0
+        self.enviadas = []
+        self.error = None
+
+    def tomar(self, fase):
+        for _ in range(self.cantidad):
+            items = []
+            for producto in self.rnd.sample(self.productos, self.rnd.randint(1, 5)):
+                for _ in range(self.rnd.randint(1, 3)):
+                    self.motor.agregar_item(items, producto, True)
+            inicio = time.perf_counter()
+            comanda, registro = diario_local.registrar(
+                self.diario, self.motor, items, self.rnd.choice(self.mesas), self.nombre
+            )
+            self.demoras[fase].append((time.perf_counter() - inicio) * 1000)
+            self.tomadas.append((registro, comanda))
+
+    def run(self):
+        try:
+            self.motor = OrderEngine(self.db_path)
+            self.motor.conn.execute(f"PRAGMA busy_timeout = {ESPERA_BLOQUEO_MS}")
+            self.productos = self.motor.listar_productos()
+            self.mesas = [info['mesa'] for info in self.motor.listar_mesas()]
+
+            # 1. Con conexión
+            self.tomar('con_conexion')
+            self.fases.wait()
+
+            # 2. Corte (el hilo principal tomó el bloqueo)
+            self.fases.wait()
+            self.tomar('sin_conexion')
+            try:
+                diario_local.sincronizar(self.diario, self.motor)
+            except sqlite3.OperationalError:
+                self.fallo_en_corte = True
+            self.pendientes_en_corte = len(self.diario.pendientes())
+            self.fases.wait()
+
+            # 3. Vuelve la conexión: la primera pendiente ya había llegado a la base
+            self.fases.wait()
+            registro = self.diario.pendientes()[0]
+            self.motor.registrar_comanda(
+                registro['items'], registro['mesa'], registro['usuario'], registro['observaciones'],
+                id_cliente=registro['id_cliente'], fecha_terminal=registro['fecha']
+            )
+            inicio = time.perf_counter()
+            self.enviadas, _ = diario_local.sincronizar(self.diario, self.motor)
+            self.demoras['sincronizar'].append((time.perf_counter() - inicio) * 1000)
+        except Exception as e:
+            self.error = e
+            self.fases.abort()
+        finally:
+            if hasattr(self, 'motor'):
+                self.motor.cerrar()
+
+
+def ejecutar(params):
+    directorio = tempfile.mkdtemp(prefix='comandas_corte_')
+    db_path = os.path.join(directorio, 'comandas.db')
+    sembrar_base(db_path, params.productos, params.mesas, 0, 0, params.semilla)
+    fases = threading.Barrier(params.terminales + 1)
+    terminales = [
+        Terminal(f"caja{i + 1}", db_path, directorio, params.semilla + i, params.comandas, fases)
+        for i in range(params.terminales)
+    ]
+    for terminal in terminales:
+        terminal.start()
+
+    try:
+        fases.wait()
+        bloqueo = sqlite3.connect(db_path, isolation_level=None)
+        bloqueo.execute("BEGIN EXCLUSIVE")
+        fases.wait()
+        fases.wait()
+        bloqueo.execute("ROLLBACK")
+        bloqueo.close()
+        fases.wait()
+    except threading.BrokenBarrierError:
+        pass
+    for terminal in terminales:
+        terminal.join()
+
+    # Verificación contra la base
+    errores = [f"{t.nombre}: {t.error}" for t in terminales if t.error]
+    motor = OrderEngine(db_path)
+    filas = motor.cursor.execute(
+        "SELECT id_cliente, numero_comanda, fecha_terminal FROM comandas WHERE id_cliente IS NOT NULL"
+    ).fetchall()
+    motor.cerrar()
+    por_id = {}
+    for id_cliente, numero, fecha_terminal in filas:
+        por_id.setdefault(id_cliente, []).append((numero, fecha_terminal))
+    tomadas = [registro for terminal in terminales for registro, _ in terminal.tomadas]
+    for registro in tomadas:
+        copias = por_id.get(registro['id_cliente'], [])
+        if len(copias) != 1:
+            errores.append(f"comanda {registro['id_cliente']} está {len(copias)} veces en la base")
+        elif copias[0][1] != registro['fecha']:
+            errores.append(f"comanda {registro['id_cliente']} perdió su hora de toma")
+    numeros = [numero for _, numero, _ in filas]
+    if len(numeros) != len(set(numeros)):
+        errores.append("hay números de comanda repetidos")
+    repetidas = sum(1 for t in terminales for _, comanda in t.enviadas if comanda['repetida'])
+    if repetidas != len(terminales):
+        errores.append(f"se esperaban {len(terminales)} reenvíos reconocidos y hubo {repetidas}")
+    for terminal in terminales:
+        if not terminal.fallo_en_corte:
+            errores.append(f"{terminal.nombre}: la sincronización en pleno corte no falló")
+        if terminal.diario.pendientes():
+            errores.append(f"{terminal.nombre} quedó con comandas pendientes")
+
+    return {
+        'terminales': len(terminales),
+        'tomadas': len(tomadas),
+        'en_base': len(filas),
+        'pendientes_en_corte': sum(t.pendientes_en_corte for t in terminales),
+        'reenvios_reconocidos': repetidas,
+        'operaciones': {
+            operacion: resumir([d for t in terminales for d in t.demoras[operacion]])
+            for operacion in ('con_conexion', 'sin_conexion', 'sincronizar')
+        },
+        'errores': errores,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulación de corte de la base compartida")
+    parser.add_argument('--terminales', type=int, default=3)
+    parser.add_argument('--comandas', type=int, default=10, help="Comandas por terminal en cada fase")
+    parser.add_argument('--productos', type=int, default=100)
+    parser.add_argument('--mesas', type=int, default=30)
+    parser.add_argument('--semilla', type=int, default=42)
+    params = parser.parse_args(argv)
+    if params.terminales * params.comandas * 2 > 99:
+        parser.error("La numeración diaria llega a 99 comandas: reducir --terminales o --comandas")
+
+    resultado = ejecutar(params)
+    print(f"{resultado['tomadas']} comandas tomadas en {resultado['terminales']} terminales, "
+          f"{resultado['en_base']} en la base; {resultado['pendientes_en_corte']} en los diarios durante el corte, "
+          f"{resultado['reenvios_reconocidos']} reenvíos reconocidos por id_cliente")
+    for operacion, datos in resultado['operaciones'].items():
+        print(f"  {operacion:<14} p50 {datos['p50_ms']} ms / p95 {datos['p95_ms']} ms ({datos['cantidad']})")
+    if resultado['errores']:
+        print("ERROR: " + "; ".join(resultado['errores']))
+        return 1
+    print("OK: ninguna comanda perdida ni duplicada")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
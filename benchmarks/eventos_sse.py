@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""Benchmark del flujo de eventos: muchas pantallas suscriptas, pocas comandas
+
+Levanta eventos_sse sobre una base sembrada, conecta N suscriptores (la
+mayoría sólo esperan, como una pantalla o un handheld en reposo) y un hilo
+que toma y completa comandas a ritmo de servicio. A mitad de la prueba una
+parte de los suscriptores se desconecta y vuelve con Last-Event-ID.
+
+Informa la demora desde el commit de cada comanda hasta que llega a cada
+suscriptor, los reenvíos y snapshots servidos al reconectar, la memoria y el
+CPU del proceso, y verifica que todos los suscriptores terminen con el mismo
+estado que la base (ninguna comanda perdida al reconectar).
+
+Servidor y clientes corren en el mismo proceso: las demoras incluyen la
+competencia por el GIL con los clientes.
+
+Uso:
+    python benchmarks/eventos_sse.py --suscriptores 500 --comandas 200 --salida eventos.json
+    python benchmarks/eventos_sse.py --suscriptores 500 --comandas 200 --comparar eventos.json
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import eventos_sse  # noqa: E402
+from motor_comandas import OrderEngine  # noqa: E402
+from hora_pico import sembrar_base, resumir  # noqa: E402
+
+CABECERA_AUTH = 'Basic ' + base64.b64encode(b'admin:admin123').decode('ascii')
+
+
+class Suscriptor:
+    """Una pantalla: mantiene el estado de las comandas a partir del flujo"""
+
+    def __init__(self, puerto, creadas):
+        self.puerto = puerto
+        self.creadas = creadas
+        self.ultimo_id = None
+        self.estados = {}
+        self.demoras = []
+        self.snapshots = 0
+        self.cambios = 0
+        self._writer = None
+
+    async def conectar(self):
+        reader, self._writer = await asyncio.open_connection('127.0.0.1', self.puerto)
+        cabeceras = f"GET {eventos_sse.RUTA} HTTP/1.1\r\nHost: localhost\r\nAuthorization: {CABECERA_AUTH}\r\n"
+        if self.ultimo_id is not None:
+            cabeceras += f"Last-Event-ID: {self.ultimo_id}\r\n"
+        self._writer.write((cabeceras + "\r\n").encode('ascii'))
+        linea = await reader.readline()
+        if b' 200 ' not in linea:
+            raise RuntimeError(f"Respuesta inesperada: {linea!r}")
+        await reader.readuntil(b'\r\n\r\n')
+        return reader
+
+    async def escuchar(self, reader):
+        evento, datos = None, None
+        while True:
+            linea = await reader.readline()
+            if not linea:
+                return
+            linea = linea.rstrip(b'\n')
+            if linea.startswith(b'id: '):
+                self.ultimo_id = int(linea[4:])
+            elif linea.startswith(b'event: '):
+                evento = linea[7:].decode()
+            elif linea.startswith(b'data: '):
+                datos = linea[6:]
+            elif not linea and datos is not None:
+                self.aplicar(evento, json.loads(datos))
+                evento, datos = None, None
+
+    def aplicar(self, evento, datos):
+        ahora = time.perf_counter()
+        if evento == 'snapshot':
+            self.snapshots += 1
+        else:
+            self.cambios += 1
+        for comanda in datos['comandas']:
+            nueva = comanda['id'] not in self.estados
+            self.estados[comanda['id']] = comanda.get('estado')
+            creada = self.creadas.get(comanda['id'])
+            if nueva and creada is not None:
+                self.demoras.append((ahora - creada) * 1000)
+
+    def desconectar(self):
+        self._writer.close()
+
+
+def tomar_comandas(db_path, cantidad, por_segundo, semilla, creadas, fin):
+    """Hilo de servicio: registra y completa comandas a ritmo fijo"""
+    rnd = random.Random(semilla)
+    motor = OrderEngine(db_path)
+    productos = [fila[0] for fila in motor.cursor.execute("SELECT id FROM productos").fetchall()]
+    mesas = [fila[0] for fila in motor.cursor.execute("SELECT id FROM mesas").fetchall()]
+    abiertas = []
+    try:
+        for _ in range(cantidad):
+            items = motor.armar_items([(p, rnd.randint(1, 3)) for p in rnd.sample(productos, rnd.randint(1, 5))])
+            comanda = motor.registrar_comanda(items, motor.obtener_mesa(rnd.choice(mesas)), 'benchmark')
+            creadas[comanda['id']] = time.perf_counter()
+            abiertas.append(comanda['numero_comanda'])
+            if len(abiertas) > 10:
+                motor.completar_comanda(abiertas.pop(0))
+            time.sleep(1 / por_segundo)
+        for numero in abiertas:
+            motor.completar_comanda(numero)
+    finally:
+        motor.cerrar()
+        fin.set()
+
+
+async def simular(params, puerto, db_path):
+    creadas = {}
+    suscriptores = [Suscriptor(puerto, creadas) for _ in range(params.suscriptores)]
+    lectores = await asyncio.gather(*(s.conectar() for s in suscriptores))
+    tareas = {s: asyncio.create_task(s.escuchar(r)) for s, r in zip(suscriptores, lectores)}
+
+    fin = threading.Event()
+    hilo = threading.Thread(
+        target=tomar_comandas,
+        args=(db_path, params.comandas, params.por_segundo, params.semilla, creadas, fin),
+        daemon=True,
+    )
+    hilo.start()
+
+    # A mitad de la prueba una parte se va un momento y vuelve con Last-Event-ID
+    await asyncio.sleep(params.comandas / params.por_segundo / 2)
+    reconectados = suscriptores[:int(len(suscriptores) * params.reconectar)]
+    for suscriptor in reconectados:
+        suscriptor.desconectar()
+    await asyncio.gather(*(tareas[s] for s in reconectados))
+    await asyncio.sleep(1)
+    for suscriptor in reconectados:
+        tareas[suscriptor] = asyncio.create_task(suscriptor.escuchar(await suscriptor.conectar()))
+
+    while not fin.is_set():
+        await asyncio.sleep(0.1)
+    await asyncio.sleep(eventos_sse.INTERVALO * 4)
+    for suscriptor in suscriptores:
+        suscriptor.desconectar()
+    await asyncio.gather(*tareas.values(), return_exceptions=True)
+    return suscriptores, creadas, reconectados
+
+
+def ejecutar(params):
+    db_path = os.path.join(tempfile.mkdtemp(prefix='comandas_eventos_'), 'comandas.db')
+    sembrar_base(db_path, params.productos, params.mesas, 0, 0, params.semilla)
+
+    flujo = eventos_sse.iniciar_en_segundo_plano(db_path, puerto=0)
+    cpu_inicio = time.process_time()
+    inicio = time.perf_counter()
+    suscriptores, creadas, reconectados = asyncio.run(simular(params, flujo.puerto, db_path))
+    duracion = time.perf_counter() - inicio
+    cpu = time.process_time() - cpu_inicio
+    flujo.cerrar()
+
+    # Estado final en la base: todas las comandas de la prueba completadas
+    motor = OrderEngine(db_path)
+    finales = dict(motor.cursor.execute(
+        f"SELECT id, estado FROM comandas WHERE id IN ({','.join('?' * len(creadas))})", list(creadas)
+    ).fetchall())
+    motor.cerrar()
+    distintos = sum(
+        1 for suscriptor in suscriptores
+        if any(suscriptor.estados.get(comanda_id) != estado for comanda_id, estado in finales.items())
+    )
+
+    demoras = [demora for suscriptor in suscriptores for demora in suscriptor.demoras]
+    return {
+        'fecha': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'entorno': {'python': platform.python_version(), 'plataforma': platform.platform()},
+        'parametros': {'suscriptores': params.suscriptores, 'comandas': params.comandas,
+                       'por_segundo': params.por_segundo, 'reconectar': params.reconectar},
+        'duracion_s': round(duracion, 2),
+        'cpu_s': round(cpu, 2),
+        'memoria_max_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'reconectados': len(reconectados),
+        'snapshots': sum(suscriptor.snapshots for suscriptor in suscriptores),
+        'mensajes': sum(suscriptor.snapshots + suscriptor.cambios for suscriptor in suscriptores),
+        'suscriptores_con_estado_distinto': distintos,
+        'operaciones': {'entrega': resumir(demoras)},
+    }
+
+
+def comparar(actual, anterior, tolerancia):
+    """Devuelve la lista de regresiones respecto de un resultado previo"""
+    regresiones = []
+    previos = anterior.get('operaciones', {}).get('entrega')
+    datos = actual['operaciones']['entrega']
+    if previos and previos.get('p95_ms') and datos.get('p95_ms'):
+        cambio = datos['p95_ms'] / previos['p95_ms'] - 1
+        print(f"  entrega    p95 {previos['p95_ms']:8.2f} -> {datos['p95_ms']:8.2f} ms ({cambio:+.0%})")
+        if cambio > tolerancia:
+            regresiones.append(f"entrega p95 {cambio:+.0%}")
+    previo, nuevo = anterior.get('cpu_s'), actual['cpu_s']
+    if previo:
+        cambio = nuevo / previo - 1
+        print(f"  cpu {previo:.2f} -> {nuevo:.2f} s ({cambio:+.0%})")
+        if cambio > tolerancia:
+            regresiones.append(f"cpu {cambio:+.0%}")
+    return regresiones
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del flujo de eventos (SSE)")
+    parser.add_argument('--suscriptores', type=int, default=300, help="Pantallas y handhelds conectados")
+    parser.add_argument('--comandas', type=int, default=100, help="Comandas tomadas durante la prueba")
+    parser.add_argument('--por-segundo', type=float, default=20, help="Comandas por segundo")
+    parser.add_argument('--reconectar', type=float, default=0.2,
+                        help="Fracción de suscriptores que se reconecta a mitad de la prueba")
+    parser.add_argument('--productos', type=int, default=200)
+    parser.add_argument('--mesas', type=int, default=40)
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--salida', help="Archivo JSON donde guardar el resultado")
+    parser.add_argument('--comparar', help="Resultado JSON previo para detectar regresiones")
+    parser.add_argument('--tolerancia', type=float, default=0.25,
+                        help="Empeoramiento relativo permitido al comparar (0.25 = 25%%)")
+    params = parser.parse_args(argv)
+
+    resultado = ejecutar(params)
+    entrega = resultado['operaciones']['entrega']
+    print(f"{params.suscriptores} suscriptores, {params.comandas} comandas en {resultado['duracion_s']} s: "
+          f"{resultado['mensajes']} mensajes, CPU {resultado['cpu_s']} s, memoria máx. {resultado['memoria_max_mb']} MB")
+    print(f"  entrega    p50 {entrega['p50_ms']} ms / p95 {entrega['p95_ms']} ms / p99 {entrega['p99_ms']} ms "
+          f"({entrega['cantidad']} entregas)")
+    print(f"  {resultado['reconectados']} reconectados con Last-Event-ID, "
+          f"{resultado['snapshots']} snapshots servidos en total")
+    if resultado['suscriptores_con_estado_distinto']:
+        print(f"ERROR: {resultado['suscriptores_con_estado_distinto']} suscriptores no coinciden con la base")
+
+    if params.salida:
+        with open(params.salida, 'w', encoding='utf-8') as archivo:
+            json.dump(resultado, archivo, indent=2, ensure_ascii=False)
+        print(f"Resultado guardado en {params.salida}")
+
+    if params.comparar:
+        with open(params.comparar, encoding='utf-8') as archivo:
+            anterior = json.load(archivo)
+        print(f"Comparación con {params.comparar}:")
+        regresiones = comparar(resultado, anterior, params.tolerancia)
+        if regresiones:
+            print("REGRESIÓN: " + "; ".join(regresiones))
+            return 1
+    return 0 if not resultado['suscriptores_con_estado_distinto'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
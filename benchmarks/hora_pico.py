@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+"""Benchmark de hora pico: simula varias terminales cargando comandas en simultáneo
+
+Uso:
+    python benchmarks/hora_pico.py --terminales 8 --comandas 2000 --salida resultado.json
+    python benchmarks/hora_pico.py --comparar resultado_anterior.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+# Permitir importar los módulos del sistema desde la carpeta benchmarks
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from motor_comandas import OrderEngine  # noqa: E402
+import instrumentacion  # noqa: E402
+import ventas_diarias  # noqa: E402
+
+CATEGORIAS = ['Hamburguesas', 'Pizzas', 'Platos Principales', 'Ensaladas',
+              'Guarniciones', 'Bebidas', 'Cafetería', 'Postres', 'Otros']
+UBICACIONES = ['Zona Principal', 'Zona Ventana', 'Terraza', 'Barra', 'Salón Privado']
+
+
+def sembrar_base(db_path, productos, mesas, meses, comandas_por_dia, semilla):
+    """Crea la base con el menú, las mesas y el histórico de comandas indicados"""
+    rnd = random.Random(semilla)
+    motor = OrderEngine(db_path)
+    conn = motor.conn
+
+    # Reemplazar los datos de ejemplo por el tamaño de menú y mesas pedido
+    conn.execute("DELETE FROM productos")
+    conn.execute("DELETE FROM mesas")
+    conn.executemany('''
+        INSERT INTO productos (nombre, precio, categoria, disponible, descripcion)
+        VALUES (?, ?, ?, 1, ?)
+    ''', [(f"Producto {i:04d}", rnd.randrange(300, 5000, 50), rnd.choice(CATEGORIAS),
+           f"Descripción del producto {i}") for i in range(productos)])
+    conn.executemany('''
+        INSERT INTO mesas (nombre, capacidad, estado, ubicacion)
+        VALUES (?, ?, 'Disponible', ?)
+    ''', [(f"Mesa {i:03d}", rnd.choice([2, 4, 6, 8]), rnd.choice(UBICACIONES))
+          for i in range(1, mesas + 1)])
+    conn.commit()
+
+    menu = conn.execute("SELECT nombre, precio FROM productos").fetchall()
+    mesa_ids = [fila[0] for fila in conn.execute("SELECT id FROM mesas")]
+
+    # Histórico: comandas cerradas de los días anteriores
+    hoy = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    dias = meses * 30
+    siguiente_id = 1
+    for dia in range(dias, 0, -1):
+        fecha_dia = hoy - timedelta(days=dia)
+        comandas = []
+        items = []
+        for n in range(comandas_por_dia):
+            fecha = fecha_dia + timedelta(hours=rnd.randint(11, 23), minutes=rnd.randint(0, 59))
+            lineas = [(rnd.choice(menu), rnd.randint(1, 3)) for _ in range(rnd.randint(1, 6))]
+            total = sum(precio * cantidad for (_, precio), cantidad in lineas)
+            estado = 'Cancelada' if rnd.random() < 0.05 else 'Completada'
+            comandas.append((siguiente_id, f"CMD-{fecha_dia.strftime('%Y%m%d')}-{(n % 99) + 1:02d}",
+                             rnd.choice(mesa_ids), fecha.strftime('%Y-%m-%d %H:%M:%S'),
+                             f"mesero{rnd.randint(1, 10)}", total, estado, ''))
+            items.extend((siguiente_id, nombre, cantidad, precio)
+                         for (nombre, precio), cantidad in lineas)
+            siguiente_id += 1
+        conn.executemany('''
+            INSERT INTO comandas (id, numero_comanda, mesa_id, fecha, usuario, total, estado, observaciones)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', comandas)
+        conn.executemany('''
+            INSERT INTO items_comanda (comanda_id, producto_nombre, cantidad, precio_unitario)
+            VALUES (?, ?, ?, ?)
+        ''', items)
+    # El histórico se insertó sin pasar por el motor: recalcular los resúmenes diarios
+    ventas_diarias.reconstruir(conn.cursor())
+    conn.commit()
+    motor.cerrar()
+    return siguiente_id - 1
+
+
+class Terminal(threading.Thread):
+    """Terminal simulada con su propia conexión, como un puesto real del salón"""
+
+    def __init__(self, numero, db_path, params, pendientes, lock_pendientes, cupo):
+        super().__init__(name=f"terminal-{numero}")
+        self.db_path = db_path
+        self.params = params
+        self.pendientes = pendientes
+        self.lock_pendientes = lock_pendientes
+        self.cupo = cupo
+        self.rnd = random.Random(params.semilla + numero)
+        self.latencias = {'registrar_comanda': [], 'completar_comanda': [], 'cancelar_comanda': []}
+        self.errores = {}
+
+    def medir(self, operacion, funcion, *args):
+        """Ejecuta la operación registrando su latencia en milisegundos"""
+        inicio = time.perf_counter()
+        try:
+            resultado = funcion(*args)
+        except Exception as e:
+            clave = f"{operacion}: {type(e).__name__}"
+            self.errores[clave] = self.errores.get(clave, 0) + 1
+            return None
+        self.latencias[operacion].append((time.perf_counter() - inicio) * 1000)
+        return resultado
+
+    def tomar_cupo(self):
+        """Reserva una comanda del total a enviar; False cuando ya no quedan"""
+        with self.lock_pendientes:
+            if self.cupo[0] <= 0:
+                return False
+            self.cupo[0] -= 1
+            return True
+
+    def run(self):
+        motor = OrderEngine(self.db_path)
+        productos = motor.listar_productos()
+        mesas = [info['mesa'] for info in motor.listar_mesas()]
+        p = self.params
+
+        while self.tomar_cupo():
+            # Armar la comanda como lo haría un mesero tocando productos
+            mesa = self.rnd.choice(mesas)
+            items = []
+            for _ in range(self.rnd.randint(p.items_min, p.items_max)):
+                motor.agregar_item(items, self.rnd.choice(productos), mesa)
+
+            comanda = self.medir('registrar_comanda', motor.registrar_comanda,
+                                 items, mesa, self.name, '')
+            if comanda:
+                destino = self.rnd.random()
+                if destino < p.completar + p.cancelar:
+                    with self.lock_pendientes:
+                        self.pendientes.append((comanda['numero_comanda'], destino < p.completar))
+
+            # Procesar una comanda abierta (cocina completa, mesero cancela)
+            with self.lock_pendientes:
+                siguiente = self.pendientes.popleft() if self.pendientes else None
+            if siguiente:
+                numero, completar = siguiente
+                if completar:
+                    self.medir('completar_comanda', motor.completar_comanda, numero)
+                else:
+                    self.medir('cancelar_comanda', motor.cancelar_comanda, numero)
+
+        # Vaciar las transiciones que quedaron en cola
+        while True:
+            with self.lock_pendientes:
+                siguiente = self.pendientes.popleft() if self.pendientes else None
+            if not siguiente:
+                break
+            numero, completar = siguiente
+            operacion = 'completar_comanda' if completar else 'cancelar_comanda'
+            self.medir(operacion, getattr(motor, operacion), numero)
+        motor.cerrar()
+
+
+def percentil(valores_ordenados, p):
+    """Percentil por rango más cercano sobre una lista ya ordenada"""
+    if not valores_ordenados:
+        return None
+    indice = max(0, min(len(valores_ordenados) - 1,
+                        int(round(p / 100.0 * len(valores_ordenados) + 0.5)) - 1))
+    return valores_ordenados[indice]
+
+
+def resumir(latencias):
+    """Calcula conteo y percentiles de una lista de latencias"""
+    ordenadas = sorted(latencias)
+    return {
+        'cantidad': len(ordenadas),
+        'p50_ms': percentil(ordenadas, 50),
+        'p95_ms': percentil(ordenadas, 95),
+        'p99_ms': percentil(ordenadas, 99),
+        'max_ms': ordenadas[-1] if ordenadas else None,
+    }
+
+
+def ejecutar(params):
+    """Siembra la base, reproduce el tráfico y devuelve el resultado"""
+    db_path = params.db or os.path.join(tempfile.mkdtemp(prefix='comandas_bench_'), 'comandas.db')
+    if os.path.exists(db_path) and not params.reusar:
+        os.remove(db_path)
+
+    inicio_siembra = time.perf_counter()
+    historicas = 0
+    if not params.reusar:
+        historicas = sembrar_base(db_path, params.productos, params.mesas, params.meses,
+                                  params.comandas_por_dia, params.semilla)
+    duracion_siembra = time.perf_counter() - inicio_siembra
+
+    # Medir sólo las consultas del tráfico simulado, no las de la siembra
+    instrumentacion.estadisticas.reiniciar()
+
+    pendientes = deque()
+    lock = threading.Lock()
+    cupo = [params.comandas]
+    terminales = [Terminal(i, db_path, params, pendientes, lock, cupo)
+                  for i in range(params.terminales)]
+
+    inicio = time.perf_counter()
+    for terminal in terminales:
+        terminal.start()
+    for terminal in terminales:
+        terminal.join()
+    duracion = time.perf_counter() - inicio
+
+    operaciones = {}
+    errores = {}
+    for terminal in terminales:
+        for operacion, valores in terminal.latencias.items():
+            operaciones.setdefault(operacion, []).extend(valores)
+        for clave, cantidad in terminal.errores.items():
+            errores[clave] = errores.get(clave, 0) + cantidad
+
+    enviadas = len(operaciones['registrar_comanda'])
+    return {
+        'fecha': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'entorno': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'plataforma': platform.platform(),
+        },
+        'parametros': {
+            'productos': params.productos,
+            'mesas': params.mesas,
+            'meses_historia': params.meses,
+            'comandas_por_dia': params.comandas_por_dia,
+            'comandas_historicas': historicas,
+            'terminales': params.terminales,
+            'comandas': params.comandas,
+            'items_min': params.items_min,
+            'items_max': params.items_max,
+            'ratio_completar': params.completar,
+            'ratio_cancelar': params.cancelar,
+            'semilla': params.semilla,
+        },
+        'siembra_s': round(duracion_siembra, 3),
+        'duracion_s': round(duracion, 3),
+        'comandas_por_segundo': round(enviadas / duracion, 2) if duracion else None,
+        'operaciones': {operacion: resumir(valores) for operacion, valores in operaciones.items()},
+        'errores': errores,
+        'consultas_top': [
+            {clave: fila[clave] for clave in ('etiqueta', 'llamadas', 'total_ms', 'max_ms', 'sql')}
+            for fila in instrumentacion.estadisticas.resumen()[:10]
+        ],
+    }
+
+
+def comparar(actual, anterior, tolerancia):
+    """Compara p95 y throughput contra un resultado previo; devuelve las regresiones"""
+    regresiones = []
+    for operacion, datos in actual['operaciones'].items():
+        previo = anterior.get('operaciones', {}).get(operacion)
+        if not previo or not previo.get('p95_ms') or datos['p95_ms'] is None:
+            continue
+        cambio = datos['p95_ms'] / previo['p95_ms'] - 1
+        print(f"  {operacion:<20} p95 {previo['p95_ms']:8.2f} -> {datos['p95_ms']:8.2f} ms ({cambio:+.0%})")
+        if cambio > tolerancia:
+            regresiones.append(f"{operacion} p95 {cambio:+.0%}")
+
+    previo_cps = anterior.get('comandas_por_segundo')
+    if previo_cps and actual['comandas_por_segundo']:
+        cambio = actual['comandas_por_segundo'] / previo_cps - 1
+        print(f"  {'comandas/s':<20}     {previo_cps:8.2f} -> {actual['comandas_por_segundo']:8.2f}    ({cambio:+.0%})")
+        if cambio < -tolerancia:
+            regresiones.append(f"comandas/s {cambio:+.0%}")
+    return regresiones
+
+
+def imprimir(resultado):
+    """Muestra el resultado en formato legible"""
+    print(f"Duración: {resultado['duracion_s']} s  |  "
+          f"Comandas por segundo: {resultado['comandas_por_segundo']}")
+    print(f"{'Operación':<20} {'n':>7} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}  (ms)")
+    for operacion, datos in resultado['operaciones'].items():
+        if not datos['cantidad']:
+            continue
+        print(f"{operacion:<20} {datos['cantidad']:>7} {datos['p50_ms']:>9.2f} {datos['p95_ms']:>9.2f} "
+              f"{datos['p99_ms']:>9.2f} {datos['max_ms']:>9.2f}")
+    for clave, cantidad in resultado['errores'].items():
+        print(f"Error {clave}: {cantidad}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de hora pico del sistema de comandas")
+    parser.add_argument('--db', help="Ruta de la base a usar (por defecto una temporal)")
+    parser.add_argument('--reusar', action='store_true', help="No volver a sembrar la base indicada en --db")
+    parser.add_argument('--productos', type=int, default=120, help="Tamaño del menú")
+    parser.add_argument('--mesas', type=int, default=40, help="Cantidad de mesas")
+    parser.add_argument('--meses', type=int, default=3, help="Meses de histórico a sembrar")
+    parser.add_argument('--comandas-por-dia', type=int, default=300, help="Comandas históricas por día")
+    parser.add_argument('--terminales', type=int, default=8, help="Terminales concurrentes")
+    parser.add_argument('--comandas', type=int, default=2000, help="Comandas a enviar durante la simulación")
+    parser.add_argument('--items-min', type=int, default=1, help="Productos mínimos por comanda")
+    parser.add_argument('--items-max', type=int, default=8, help="Productos máximos por comanda")
+    parser.add_argument('--completar', type=float, default=0.85, help="Proporción de comandas que se completan")
+    parser.add_argument('--cancelar', type=float, default=0.05, help="Proporción de comandas que se cancelan")
+    parser.add_argument('--semilla', type=int, default=42, help="Semilla aleatoria")
+    parser.add_argument('--salida', help="Archivo JSON donde guardar el resultado")
+    parser.add_argument('--comparar', help="Resultado JSON previo para detectar regresiones")
+    parser.add_argument('--tolerancia', type=float, default=0.20,
+                        help="Empeoramiento relativo permitido al comparar (0.20 = 20%%)")
+    params = parser.parse_args(argv)
+
+    resultado = ejecutar(params)
+    imprimir(resultado)
+
+    if params.salida:
+        with open(params.salida, 'w', encoding='utf-8') as archivo:
+            json.dump(resultado, archivo, indent=2, ensure_ascii=False)
+        print(f"Resultado guardado en {params.salida}")
+
+    if params.comparar:
+        with open(params.comparar, encoding='utf-8') as archivo:
+            anterior = json.load(archivo)
+        print(f"Comparación con {params.comparar}:")
+        regresiones = comparar(resultado, anterior, params.tolerancia)
+        if regresiones:
+            print("REGRESIÓN: " + ", ".join(regresiones))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""Benchmark del plano de mesas con cientos de mesas en varias zonas
+
+Dibuja el plano completo y después aplica refrescos en los que cambia el
+estado de unas pocas mesas (comandas nuevas, cuentas cobradas, borradores),
+como hace cargar_mesas cada 30 s o después de enviar una comanda. Mide el
+dibujo inicial, cada refresco (hasta que Tk termina de pintar) y la búsqueda
+de la mesa tocada, y verifica que cada refresco reconfigure sólo las mesas
+que cambiaron y que cada punto de una mesa la encuentre.
+
+Necesita pantalla (Tk); sin ella termina sin medir.
+
+Uso:
+    python benchmarks/plano_mesas.py --mesas 320 --zonas 5 --refrescos 200 --cambios 5
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import tkinter as tk
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import plano_mesas  # noqa: E402
+from hora_pico import resumir  # noqa: E402
+
+ESTADOS = ('Disponible', 'Ocupada')
+
+
+def generar_mesas(cantidad, zonas):
+    """Filas (id, nombre, capacidad, estado, ubicacion) como las de la tabla mesas"""
+    nombres = [f"Zona {i + 1}" for i in range(zonas)]
+    return [
+        (mesa_id, f"Mesa {mesa_id}", 4, 'Disponible', nombres[mesa_id % zonas])
+        for mesa_id in range(1, cantidad + 1)
+    ]
+
+
+def info(mesa, activas=0, total=None):
+    """Una entrada como las de OrderEngine.listar_mesas()"""
+    cuenta = None
+    if total is not None:
+        cuenta = {'rondas': 1, 'items': 2, 'total': total, 'activas': activas, 'completadas': 1 - activas}
+    return {'mesa': mesa, 'activas': activas, 'completadas': 0, 'cuenta': cuenta}
+
+
+def ejecutar(params, root):
+    rnd = random.Random(params.semilla)
+    mesas = generar_mesas(params.mesas, params.zonas)
+    infos = [info(mesa) for mesa in mesas]
+    borradores = set()
+
+    root.geometry(f"{params.ancho}x400")
+    plano = plano_mesas.PlanoMesas(root, lambda mesa: None)
+    plano.pack(fill='both', expand=True)
+    root.update()
+
+    inicio = time.perf_counter()
+    plano.actualizar(infos, borradores)
+    root.update()
+    dibujo_ms = (time.perf_counter() - inicio) * 1000
+
+    errores = []
+    refrescos = []
+    for _ in range(params.refrescos):
+        esperados = set()
+        for indice in rnd.sample(range(len(infos)), params.cambios):
+            mesa = infos[indice]['mesa']
+            estilo_anterior = plano.estilos[mesa[0]]
+            mesa = mesa[:3] + (rnd.choice(ESTADOS),) + mesa[4:]
+            activas = rnd.randint(0, 2)
+            infos[indice] = info(mesa, activas, rnd.choice([None, 1500.0]))
+            if rnd.random() < 0.2:
+                borradores ^= {mesa[0]}
+            color, texto, _ = plano_mesas.estilo_mesa(infos[indice], mesa[0] in borradores)
+            if (color, texto) != estilo_anterior:
+                esperados.add(mesa[0])
+        inicio = time.perf_counter()
+        cambios = plano.actualizar(infos, borradores)
+        root.update_idletasks()
+        refrescos.append((time.perf_counter() - inicio) * 1000)
+        if cambios != len(esperados):
+            errores.append(f"un refresco reconfiguró {cambios} mesas y cambiaron {len(esperados)}")
+
+    busquedas = []
+    for mesa_id, (x, y) in plano.disposicion['posiciones'].items():
+        for dx, dy in ((1, 1), (plano_mesas.ANCHO_MESA - 1, plano_mesas.ALTO_MESA - 1)):
+            inicio = time.perf_counter()
+            encontrada = plano_mesas.mesa_en(plano.disposicion, x + dx, y + dy)
+            busquedas.append((time.perf_counter() - inicio) * 1000)
+            if encontrada != mesa_id:
+                errores.append(f"el punto ({x + dx}, {y + dy}) debía ser la mesa {mesa_id} y fue {encontrada}")
+
+    return {
+        'mesas': params.mesas,
+        'zonas': params.zonas,
+        'columnas': plano.disposicion['columnas'],
+        'items_canvas': len(plano.canvas.find_all()),
+        'dibujo_ms': round(dibujo_ms, 1),
+        'operaciones': {'refresco': resumir(refrescos), 'toque': resumir(busquedas)},
+        'errores': errores[:10],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del plano de mesas")
+    parser.add_argument('--mesas', type=int, default=320)
+    parser.add_argument('--zonas', type=int, default=5)
+    parser.add_argument('--refrescos', type=int, default=200)
+    parser.add_argument('--cambios', type=int, default=5, help="Mesas que cambian de estado en cada refresco")
+    parser.add_argument('--ancho', type=int, default=1200, help="Ancho de la ventana en píxeles")
+    parser.add_argument('--semilla', type=int, default=42)
+    params = parser.parse_args(argv)
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        print(f"Plano no medido (sin pantalla: {e})")
+        return 0
+    try:
+        resultado = ejecutar(params, root)
+    finally:
+        root.destroy()
+
+    print(f"{resultado['mesas']} mesas en {resultado['zonas']} zonas, {resultado['columnas']} por fila, "
+          f"{resultado['items_canvas']} items en el Canvas")
+    print(f"  dibujo inicial {resultado['dibujo_ms']} ms")
+    for operacion, datos in resultado['operaciones'].items():
+        print(f"  {operacion:<8} p50 {datos['p50_ms']:.3f} ms / p99 {datos['p99_ms']:.3f} ms / "
+              f"máx {datos['max_ms']:.3f} ms ({datos['cantidad']})")
+    if resultado['errores']:
+        print("ERROR: " + "; ".join(resultado['errores']))
+        return 1
+    print("OK: los refrescos sólo reconfiguran las mesas que cambiaron")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""Benchmark de la API HTTP: handhelds tomando comandas contra localhost
+
+Levanta servidor_api en un puerto libre sobre una base sembrada y simula N
+clientes, cada uno con una sola conexión keep-alive: consulta el catálogo con
+If-None-Match (debería recibir 304 salvo la primera vez), lista las mesas, envía
+una comanda y la completa. Informa latencias por operación, peticiones por
+segundo, respuestas 503 (o conexiones rechazadas) y conexiones TCP abiertas (una por cliente si el
+keep-alive funciona).
+
+Uso:
+    python benchmarks/servidor_api.py --clientes 16 --rondas 200 --salida api.json
+    python benchmarks/servidor_api.py --clientes 16 --rondas 200 --comparar api.json
+"""
+import argparse
+import base64
+import http.client
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import servidor_api  # noqa: E402
+from hora_pico import sembrar_base, resumir  # noqa: E402
+
+CABECERA_AUTH = 'Basic ' + base64.b64encode(b'admin:admin123').decode('ascii')
+
+
+class Cliente(threading.Thread):
+    """Un handheld: una conexión reutilizada para todas sus peticiones"""
+
+    def __init__(self, puerto, rondas, semilla):
+        super().__init__(daemon=True)
+        self.puerto = puerto
+        self.rondas = rondas
+        self.rnd = random.Random(semilla)
+        self.tiempos = {}
+        self.estados = {}
+        self.conexiones = 0
+        self.error = None
+
+    def pedir(self, operacion, metodo, ruta, cuerpo=None, cabeceras=None):
+        encabezados = {'Authorization': CABECERA_AUTH}
+        encabezados.update(cabeceras or {})
+        datos = None
+        if cuerpo is not None:
+            datos = json.dumps(cuerpo)
+            encabezados['Content-Type'] = 'application/json'
+        socket_previo = self.conexion.sock
+        inicio = time.perf_counter()
+        try:
+            self.conexion.request(metodo, ruta, datos, encabezados)
+            respuesta = self.conexion.getresponse()
+            contenido = respuesta.read()
+            estado = respuesta.status
+        except (ConnectionError, http.client.RemoteDisconnected):
+            # El servidor saturado cierra sin leer la petición: equivale a un 503
+            self.conexion.close()
+            respuesta, contenido, estado = None, b'', 'rechazada'
+        self.tiempos.setdefault(operacion, []).append((time.perf_counter() - inicio) * 1000)
+        if self.conexion.sock is not socket_previo and self.conexion.sock is not None:
+            self.conexiones += 1
+        self.estados[estado] = self.estados.get(estado, 0) + 1
+        return respuesta, contenido
+
+    def run(self):
+        try:
+            self.conexion = http.client.HTTPConnection('127.0.0.1', self.puerto, timeout=30)
+            etag = None
+            productos = mesas = None
+            for _ in range(self.rondas):
+                respuesta, contenido = self.pedir(
+                    'catalogo', 'GET', '/api/catalogo', cabeceras={'If-None-Match': etag} if etag else None
+                )
+                if respuesta and respuesta.status == 200:
+                    etag = respuesta.getheader('ETag')
+                    productos = [p['id'] for p in json.loads(contenido)['productos']]
+                respuesta, contenido = self.pedir('mesas', 'GET', '/api/mesas')
+                if respuesta and respuesta.status == 200:
+                    mesas = [m['id'] for m in json.loads(contenido)['mesas']]
+                if not productos or not mesas:
+                    # 503: servidor saturado, reintentar como lo haría un handheld
+                    time.sleep(0.05)
+                    continue
+
+                items = [{'producto_id': p, 'cantidad': self.rnd.randint(1, 3)}
+                         for p in self.rnd.sample(productos, self.rnd.randint(1, 6))]
+                respuesta, contenido = self.pedir(
+                    'crear', 'POST', '/api/comandas', {'mesa_id': self.rnd.choice(mesas), 'items': items}
+                )
+                if respuesta and respuesta.status == 201:
+                    numero = json.loads(contenido)['numero_comanda']
+                    self.pedir('completar', 'POST', f'/api/comandas/{numero}/completar', {})
+        except Exception as e:
+            self.error = e
+        finally:
+            self.conexion.close()
+
+
+def ejecutar(params):
+    db_path = os.path.join(tempfile.mkdtemp(prefix='comandas_api_'), 'comandas.db')
+    sembrar_base(db_path, params.productos, params.mesas, 0, 0, params.semilla)
+
+    servidor = servidor_api.crear_servidor(db_path, puerto=0, hilos=params.hilos, cola=params.cola)
+    servidor_api.iniciar_en_segundo_plano(servidor)
+    puerto = servidor.server_address[1]
+
+    clientes = [Cliente(puerto, params.rondas, params.semilla + i) for i in range(params.clientes)]
+    inicio = time.perf_counter()
+    for cliente in clientes:
+        cliente.start()
+    for cliente in clientes:
+        cliente.join()
+    duracion = time.perf_counter() - inicio
+    servidor.shutdown()
+    servidor.server_close()
+
+    errores = [str(cliente.error) for cliente in clientes if cliente.error]
+    tiempos, estados = {}, {}
+    for cliente in clientes:
+        for operacion, lista in cliente.tiempos.items():
+            tiempos.setdefault(operacion, []).extend(lista)
+        for estado, cantidad in cliente.estados.items():
+            estados[str(estado)] = estados.get(str(estado), 0) + cantidad
+    peticiones = sum(len(lista) for lista in tiempos.values())
+    return {
+        'fecha': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'entorno': {'python': platform.python_version(), 'plataforma': platform.platform()},
+        'parametros': {'clientes': params.clientes, 'rondas': params.rondas, 'hilos': params.hilos,
+                       'productos': params.productos, 'mesas': params.mesas},
+        'duracion_s': round(duracion, 2),
+        'peticiones_por_s': round(peticiones / duracion, 1),
+        'conexiones': sum(cliente.conexiones for cliente in clientes),
+        'estados': estados,
+        'errores': errores,
+        'operaciones': {operacion: resumir(lista) for operacion, lista in tiempos.items()},
+    }
+
+
+def comparar(actual, anterior, tolerancia):
+    """Devuelve la lista de regresiones respecto de un resultado previo"""
+    regresiones = []
+    for operacion, datos in actual['operaciones'].items():
+        previos = anterior.get('operaciones', {}).get(operacion)
+        if not previos or not previos.get('p95_ms'):
+            continue
+        cambio = datos['p95_ms'] / previos['p95_ms'] - 1
+        print(f"  {operacion:<10} p95 {previos['p95_ms']:8.2f} -> {datos['p95_ms']:8.2f} ms ({cambio:+.0%})")
+        if cambio > tolerancia:
+            regresiones.append(f"{operacion} p95 {cambio:+.0%}")
+    previo, nuevo = anterior.get('peticiones_por_s'), actual['peticiones_por_s']
+    if previo:
+        cambio = nuevo / previo - 1
+        print(f"  peticiones/s {previo:.1f} -> {nuevo:.1f} ({cambio:+.0%})")
+        if cambio < -tolerancia:
+            regresiones.append(f"peticiones/s {cambio:+.0%}")
+    return regresiones
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de la API HTTP de comandas")
+    parser.add_argument('--clientes', type=int, default=16, help="Handhelds simulados")
+    parser.add_argument('--rondas', type=int, default=100, help="Comandas por cliente")
+    parser.add_argument('--hilos', type=int, default=servidor_api.HILOS)
+    parser.add_argument('--cola', type=int, default=servidor_api.COLA)
+    parser.add_argument('--productos', type=int, default=200)
+    parser.add_argument('--mesas', type=int, default=40)
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--salida', help="Archivo JSON donde guardar el resultado")
+    parser.add_argument('--comparar', help="Resultado JSON previo para detectar regresiones")
+    parser.add_argument('--tolerancia', type=float, default=0.25,
+                        help="Empeoramiento relativo permitido al comparar (0.25 = 25%%)")
+    params = parser.parse_args(argv)
+
+    resultado = ejecutar(params)
+    print(f"{resultado['peticiones_por_s']} peticiones/s en {resultado['duracion_s']} s, "
+          f"{resultado['conexiones']} conexiones TCP, respuestas {resultado['estados']}")
+    for operacion, datos in resultado['operaciones'].items():
+        print(f"  {operacion:<10} p50 {datos['p50_ms']} ms / p95 {datos['p95_ms']} ms / "
+              f"p99 {datos['p99_ms']} ms ({datos['cantidad']} peticiones)")
+    if resultado['errores']:
+        print("Errores de clientes: " + "; ".join(resultado['errores']))
+
+    if params.salida:
+        with open(params.salida, 'w', encoding='utf-8') as archivo:
+            json.dump(resultado, archivo, indent=2, ensure_ascii=False)
+        print(f"Resultado guardado en {params.salida}")
+
+    if params.comparar:
+        with open(params.comparar, encoding='utf-8') as archivo:
+            anterior = json.load(archivo)
+        print(f"Comparación con {params.comparar}:")
+        regresiones = comparar(resultado, anterior, params.tolerancia)
+        if regresiones:
+            print("REGRESIÓN: " + "; ".join(regresiones))
+            return 1
+    return 0 if not resultado['errores'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
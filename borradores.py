@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""Borradores de la comanda en curso, uno por mesa y por terminal
+
+Mientras se toma una comanda los items y las observaciones se guardan en la
+tabla borradores para no perderlos si la aplicación se cierra o se cambia de
+usuario. La interfaz sólo actualiza una copia en memoria (un dict, sin tocar
+la base); un hilo de fondo con su propia conexión escribe lo pendiente de
+todas las mesas en una sola transacción, como mucho una vez cada
+`intervalo_ms`. Así tocar un producto nunca espera a la base, aunque esté en
+una carpeta de red o bloqueada por otra terminal.
+
+Si la escritura falla (base sin conexión) lo pendiente se conserva y se
+reintenta en la próxima vuelta; la copia en memoria sigue siendo la vigente.
+Las comandas sin mesa usan la clave SIN_MESA.
+"""
+import json
+import socket
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import base_datos
+
+INTERVALO_MS = 500
+
+# Pausa antes de reintentar cuando la base no responde
+REINTENTO_SEGUNDOS = 5
+
+# mesa_id de los borradores de comandas sin mesa (los ids de mesas empiezan en 1)
+SIN_MESA = 0
+
+# Campos de cada item que se guardan (los de OrderEngine.agregar_item)
+CAMPOS_ITEM = ('id', 'nombre', 'precio', 'cantidad', 'categoria')
+
+
+def clave_mesa(mesa):
+    """mesa_id del borrador para una fila de mesa (SIN_MESA si no hay mesa)"""
+    return mesa[0] if mesa else SIN_MESA
+
+
+class Borradores:
+    """Borradores de esta terminal con escritura diferida en un hilo de fondo"""
+
+    def __init__(self, db_path, terminal=None, intervalo_ms=INTERVALO_MS):
+        self.db_path = db_path
+        self.terminal = terminal or socket.gethostname()
+        self.intervalo = intervalo_ms / 1000
+        self._borradores = {}
+        self._pendientes = {}
+        self._lock = threading.Lock()
+        self._hay_pendientes = threading.Event()
+        self._escrito = threading.Condition(self._lock)
+        self._cerrar = False
+        self._escribiendo = False
+        self._hilo = None
+
+    def cargar(self):
+        """Lee los borradores guardados de esta terminal (al iniciar)"""
+        conn = base_datos.conectar(self.db_path, instrumentar=False)
+        try:
+            filas = conn.execute(
+                "SELECT mesa_id, items, observaciones, usuario, actualizado FROM borradores WHERE terminal = ?",
+                (self.terminal,)
+            ).fetchall()
+        finally:
+            conn.close()
+        with self._lock:
+            for mesa_id, items, observaciones, usuario, actualizado in filas:
+                self._borradores[mesa_id] = {
+                    'items': json.loads(items),
+                    'observaciones': observaciones or '',
+                    'usuario': usuario,
+                    'actualizado': actualizado,
+                }
+        return len(filas)
+
+    def iniciar(self):
+        """Arranca el hilo de escritura"""
+        self._hilo = threading.Thread(target=self._escribir_periodicamente, name='borradores', daemon=True)
+        self._hilo.start()
+
+    # ==================== USO DESDE LA INTERFAZ ====================
+
+    def guardar(self, mesa_id, items, observaciones='', usuario=None):
+        """Actualiza el borrador de la mesa; vacío lo descarta. No accede a la base"""
+        if items or observaciones:
+            borrador = {
+                'items': [{campo: item.get(campo) for campo in CAMPOS_ITEM} for item in items],
+                'observaciones': observaciones,
+                'usuario': usuario,
+                'actualizado': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            }
+        else:
+            borrador = None
+        with self._lock:
+            if borrador is None:
+                if self._borradores.pop(mesa_id, None) is None and mesa_id not in self._pendientes:
+                    return
+            else:
+                self._borradores[mesa_id] = borrador
+            self._pendientes[mesa_id] = borrador
+        self._hay_pendientes.set()
+
+    def descartar(self, mesa_id):
+        self.guardar(mesa_id, [])
+
+    def obtener(self, mesa_id):
+        """Borrador de la mesa (copia de los items) o None"""
+        with self._lock:
+            borrador = self._borradores.get(mesa_id)
+            if borrador is None:
+                return None
+            return dict(borrador, items=[dict(item) for item in borrador['items']])
+
+    def mesas(self):
+        """Ids de las mesas con borrador, para marcarlas en la interfaz"""
+        with self._lock:
+            return set(self._borradores)
+
+    def mas_reciente(self):
+        """mesa_id del último borrador modificado, o None si no hay"""
+        with self._lock:
+            if not self._borradores:
+                return None
+            return max(self._borradores, key=lambda mesa_id: self._borradores[mesa_id]['actualizado'])
+
+    def vaciar(self, timeout=2.0):
+        """Espera a que lo pendiente quede escrito (al salir); devuelve False si no se pudo"""
+        limite = time.monotonic() + timeout
+        self._hay_pendientes.set()
+        with self._lock:
+            while self._pendientes or self._escribiendo:
+                restante = limite - time.monotonic()
+                if restante <= 0 or not (self._hilo and self._hilo.is_alive()):
+                    return False
+                self._escrito.wait(restante)
+        return True
+
+    def cerrar(self, timeout=2.0):
+        escrito = self.vaciar(timeout)
+        self._cerrar = True
+        self._hay_pendientes.set()
+        return escrito
+
+    # ==================== HILO DE ESCRITURA ====================
+
+    def _escribir_periodicamente(self):
+        conn = None
+        ultima = 0.0
+        while not self._cerrar:
+            self._hay_pendientes.wait()
+            if self._cerrar:
+                break
+            # Como mucho una escritura por intervalo: los toques de ese lapso se juntan
+            espera = ultima + self.intervalo - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+            with self._lock:
+                self._hay_pendientes.clear()
+                lote, self._pendientes = self._pendientes, {}
+                self._escribiendo = bool(lote)
+            if not lote:
+                continue
+            ultima = time.monotonic()
+            try:
+                if conn is None:
+                    conn = base_datos.conectar(self.db_path, instrumentar=False)
+                self._escribir(conn, lote)
+            except sqlite3.Error as e:
+                print(f"No se pudieron guardar los borradores, se reintenta: {e}")
+                ultima += REINTENTO_SEGUNDOS - self.intervalo
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except sqlite3.Error:
+                        pass
+                    conn = None
+                with self._lock:
+                    # Lo modificado mientras tanto es más nuevo que el lote
+                    for mesa_id, borrador in lote.items():
+                        self._pendientes.setdefault(mesa_id, borrador)
+                    self._hay_pendientes.set()
+            finally:
+                with self._lock:
+                    self._escribiendo = False
+                    self._escrito.notify_all()
+        if conn is not None:
+            conn.close()
+
+    def _escribir(self, conn, lote):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for mesa_id, borrador in lote.items():
+                if borrador is None:
+                    conn.execute("DELETE FROM borradores WHERE terminal = ? AND mesa_id = ?", (self.terminal, mesa_id))
+                    continue
+                conn.execute('''
+                    INSERT OR REPLACE INTO borradores (terminal, mesa_id, items, observaciones, usuario, actualizado)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (self.terminal, mesa_id, json.dumps(borrador['items'], ensure_ascii=False),
+                      borrador['observaciones'], borrador['usuario'], borrador['actualizado']))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
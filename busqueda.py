@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""Búsqueda de productos mientras se escribe
+
+IndiceProductos mantiene en memoria índices sobre nombre y descripción ya
+normalizados (minúsculas y sin acentos): los prefijos de cada palabra, que
+resuelven el caso común de escribir el comienzo de una palabra (los del nombre
+aparte, para mostrarlos primero), y los trigramas del texto, que encuentran
+fragmentos del medio ("burg" en "hamburguesa"). Se actualiza producto por
+producto cuando el menú cambia.
+
+IndiceFTS5 ofrece la misma interfaz sobre una tabla FTS5 de SQLite en memoria
+para catálogos muy grandes: se construye más rápido y ocupa menos memoria, pero
+sólo busca por comienzo de palabra.
+"""
+import heapq
+import re
+import sqlite3
+import unicodedata
+
+# Resultados mostrados como máximo; dibujar cientos de botones por tecla es lo lento
+LIMITE_RESULTADOS = 40
+
+# Prefijos indexados por palabra; los más largos se verifican sobre el texto
+LARGO_MAXIMO_PREFIJO = 8
+
+# Columnas de la fila de productos (SELECT * FROM productos)
+_ID, _NOMBRE, _CATEGORIA, _DISPONIBLE, _DESCRIPCION = 0, 1, 3, 4, 5
+
+
+def normalizar(texto):
+    """Minúsculas, sin acentos ni signos: 'Café con Leche!' -> 'cafe con leche'"""
+    if not texto:
+        return ''
+    descompuesto = unicodedata.normalize('NFKD', texto.lower())
+    sin_acentos = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(re.sub(r'[^\w\s]', ' ', sin_acentos).split())
+
+
+def _prefijos(texto):
+    """Comienzos de cada palabra, hasta LARGO_MAXIMO_PREFIJO letras"""
+    return {
+        palabra[:largo]
+        for palabra in texto.split()
+        for largo in range(1, min(len(palabra), LARGO_MAXIMO_PREFIJO) + 1)
+    }
+
+
+def _trigramas(texto):
+    """Trigramas de cada palabra con un espacio de relleno al principio"""
+    resultado = set()
+    for palabra in texto.split():
+        palabra = ' ' + palabra
+        for i in range(len(palabra) - 2):
+            resultado.add(palabra[i:i + 3])
+    return resultado
+
+
+class IndiceProductos:
+    """Índice en memoria de prefijos y trigramas sobre los productos disponibles"""
+
+    def __init__(self, productos=()):
+        self.productos = {}
+        self._nombres = {}
+        self._textos = {}
+        self._claves = {}
+        self._prefijos = {}
+        self._prefijos_nombre = {}
+        self._trigramas = {}
+        # Posición de cada id en orden alfabético; se recalcula en la primera búsqueda tras un cambio
+        self._posicion = None
+        self.reconstruir(productos)
+
+    def reconstruir(self, productos):
+        """Vuelve a indexar todos los productos"""
+        self.productos.clear()
+        self._nombres.clear()
+        self._textos.clear()
+        self._claves.clear()
+        self._prefijos.clear()
+        self._prefijos_nombre.clear()
+        self._trigramas.clear()
+        self._posicion = None
+        for producto in productos:
+            self.actualizar(producto)
+
+    def actualizar(self, producto):
+        """Indexa un producto nuevo o modificado; los no disponibles se quitan"""
+        producto_id = producto[_ID]
+        self.quitar(producto_id)
+        if not producto[_DISPONIBLE]:
+            return
+
+        nombre = normalizar(producto[_NOMBRE])
+        texto = f"{nombre} {normalizar(producto[_DESCRIPCION])}".strip()
+        prefijos = _prefijos(texto)
+        prefijos_nombre = _prefijos(nombre)
+        trigramas = _trigramas(texto)
+        for indice, claves in ((self._prefijos, prefijos), (self._prefijos_nombre, prefijos_nombre),
+                               (self._trigramas, trigramas)):
+            for clave in claves:
+                indice.setdefault(clave, set()).add(producto_id)
+
+        self.productos[producto_id] = producto
+        self._nombres[producto_id] = nombre
+        self._textos[producto_id] = texto
+        self._claves[producto_id] = (prefijos, prefijos_nombre, trigramas)
+        self._posicion = None
+
+    def quitar(self, producto_id):
+        """Saca un producto del índice (si estaba)"""
+        claves = self._claves.pop(producto_id, None)
+        if claves is None:
+            return
+        for indice, usadas in zip((self._prefijos, self._prefijos_nombre, self._trigramas), claves):
+            for clave in usadas:
+                ids = indice.get(clave)
+                if ids is not None:
+                    ids.discard(producto_id)
+                    if not ids:
+                        del indice[clave]
+        del self.productos[producto_id]
+        del self._nombres[producto_id]
+        del self._textos[producto_id]
+        self._posicion = None
+
+    def _por_prefijo(self, indice, textos, termino):
+        """Ids con una palabra que empieza con el término"""
+        ids = indice.get(termino[:LARGO_MAXIMO_PREFIJO], set())
+        if len(termino) > LARGO_MAXIMO_PREFIJO:
+            ids = {i for i in ids if (' ' + termino) in (' ' + textos[i])}
+        return ids
+
+    def _candidatos(self, termino):
+        """Ids cuyo texto contiene el término al comienzo de una palabra o, si no, en el medio"""
+        ids = self._por_prefijo(self._prefijos, self._textos, termino)
+        if ids or len(termino) < 3:
+            return ids
+
+        # Fragmento del medio de una palabra: intersección de trigramas y verificación
+        conjuntos = sorted(
+            (self._trigramas.get(termino[i:i + 3], set()) for i in range(len(termino) - 2)),
+            key=len
+        )
+        ids = set(conjuntos[0]).intersection(*conjuntos[1:])
+        return {i for i in ids if termino in self._textos[i]}
+
+    def buscar(self, texto, categoria=None, limite=LIMITE_RESULTADOS):
+        """Productos que contienen todos los términos, primero los que coinciden en el nombre"""
+        terminos = normalizar(texto).split()
+        if not terminos:
+            return []
+
+        ids = None
+        # Empezar por el término más largo, que suele ser el más selectivo
+        for termino in sorted(terminos, key=len, reverse=True):
+            encontrados = self._candidatos(termino)
+            ids = encontrados if ids is None else ids & encontrados
+            if not ids:
+                return []
+
+        if categoria:
+            ids = {i for i in ids if self.productos[i][_CATEGORIA] == categoria}
+
+        # Primero los que tienen todos los términos al comienzo de palabras del
+        # nombre, después el resto; cada grupo en orden alfabético. Todo con
+        # operaciones de conjuntos y una clave precalculada: con miles de
+        # coincidencias por letra, evaluar cada una en Python no entra en un cuadro.
+        en_nombre = set(ids)
+        for termino in terminos:
+            en_nombre &= self._por_prefijo(self._prefijos_nombre, self._nombres, termino)
+            if not en_nombre:
+                break
+
+        if self._posicion is None:
+            ordenados = sorted(self._nombres, key=self._nombres.__getitem__)
+            self._posicion = {producto_id: posicion for posicion, producto_id in enumerate(ordenados)}
+        posicion = self._posicion.__getitem__
+
+        resultado = heapq.nsmallest(limite, en_nombre, key=posicion)
+        if len(resultado) < limite:
+            resultado += heapq.nsmallest(limite - len(resultado), ids - en_nombre, key=posicion)
+        return [self.productos[i] for i in resultado]
+
+
+class IndiceFTS5:
+    """Misma interfaz que IndiceProductos sobre una tabla FTS5 en memoria"""
+
+    def __init__(self, productos=()):
+        self.productos = {}
+        self.conn = sqlite3.connect(':memory:')
+        self.conn.execute('''
+            CREATE VIRTUAL TABLE productos_fts USING fts5(
+                nombre, descripcion,
+                tokenize = "unicode61 remove_diacritics 2",
+                prefix = '2 3'
+            )
+        ''')
+        self.reconstruir(productos)
+
+    def reconstruir(self, productos):
+        """Vuelve a indexar todos los productos"""
+        self.productos.clear()
+        self.conn.execute("DELETE FROM productos_fts")
+        disponibles = [producto for producto in productos if producto[_DISPONIBLE]]
+        self.conn.executemany(
+            "INSERT INTO productos_fts (rowid, nombre, descripcion) VALUES (?, ?, ?)",
+            [(p[_ID], normalizar(p[_NOMBRE]), normalizar(p[_DESCRIPCION])) for p in disponibles]
+        )
+        self.productos.update((p[_ID], p) for p in disponibles)
+
+    def actualizar(self, producto):
+        """Indexa un producto nuevo o modificado; los no disponibles se quitan"""
+        self.quitar(producto[_ID])
+        if not producto[_DISPONIBLE]:
+            return
+        self.conn.execute(
+            "INSERT INTO productos_fts (rowid, nombre, descripcion) VALUES (?, ?, ?)",
+            (producto[_ID], normalizar(producto[_NOMBRE]), normalizar(producto[_DESCRIPCION]))
+        )
+        self.productos[producto[_ID]] = producto
+
+    def quitar(self, producto_id):
+        """Saca un producto del índice (si estaba)"""
+        if self.productos.pop(producto_id, None) is not None:
+            self.conn.execute("DELETE FROM productos_fts WHERE rowid = ?", (producto_id,))
+
+    def buscar(self, texto, categoria=None, limite=LIMITE_RESULTADOS):
+        """Productos con palabras que empiezan con cada término, ordenados por relevancia"""
+        terminos = normalizar(texto).split()
+        if not terminos:
+            return []
+        # normalizar deja sólo letras y números: no hay comillas que escapar
+        consulta = ' '.join(f'"{termino}"*' for termino in terminos)
+        filas = self.conn.execute(
+            "SELECT rowid FROM productos_fts WHERE productos_fts MATCH ? ORDER BY bm25(productos_fts, 10.0, 1.0)",
+            (consulta,)
+        )
+        resultado = []
+        for (producto_id,) in filas:
+            producto = self.productos[producto_id]
+            if categoria and producto[_CATEGORIA] != categoria:
+                continue
+            resultado.append(producto)
+            if len(resultado) >= limite:
+                break
+        return resultado
+
+
+def fts5_disponible():
+    """Indica si el SQLite de esta instalación fue compilado con FTS5"""
+    conn = sqlite3.connect(':memory:')
+    try:
+        conn.execute("CREATE VIRTUAL TABLE prueba USING fts5(texto)")
+        return True
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        conn.close()
+
+
+def crear_indice(productos, usar_fts5=False):
+    """Crea el índice de productos; FTS5 sólo si se pide y está disponible"""
+    if usar_fts5:
+        if fts5_disponible():
+            return IndiceFTS5(productos)
+        print("FTS5 no está disponible en este SQLite; se usa el índice en memoria")
+    return IndiceProductos(productos)
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""Comandos de mantenimiento del sistema de comandas
+
+Uso:
+    python comandas_cli.py reconstruir-resumenes
+    python comandas_cli.py reconstruir-resumenes --desde 2025-01-01 --hasta 2025-01-31
+    python comandas_cli.py exportar --formato ndjson --destino exportaciones/
+    python comandas_cli.py archivar --dias 180
+    python comandas_cli.py respaldar --destino respaldos/
+    python comandas_cli.py estaciones --minutos 60
+    python comandas_cli.py servidor --host 0.0.0.0 --puerto 8080
+    python comandas_cli.py eventos --host 0.0.0.0 --puerto 8081
+"""
+import argparse
+import os
+import sys
+import time
+
+import archivo
+import base_datos
+import eventos_sse
+import exportacion
+import respaldo
+import servidor_api
+import ventas_diarias
+from motor_comandas import OrderEngine
+
+DB_POR_DEFECTO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'comandas.db')
+
+
+def abrir_base(db_path):
+    """Abre la base aplicando las migraciones pendientes"""
+    if not os.path.exists(db_path):
+        raise SystemExit(f"No existe la base de datos {db_path}")
+    conn = base_datos.conectar(db_path)
+    base_datos.init_database(conn)
+    return conn
+
+
+def cmd_reconstruir_resumenes(params):
+    """Recalcula las tablas ventas_diarias_* desde comandas e items"""
+    conn = abrir_base(params.db)
+    inicio = time.perf_counter()
+    try:
+        # Los días ya archivados también se recalculan
+        comandas, items = archivo.tablas_historial(conn, params.db, params.desde or '')
+        conn.execute("BEGIN IMMEDIATE")
+        filas = ventas_diarias.reconstruir(conn.cursor(), params.desde, params.hasta, comandas, items)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    for tabla, cantidad in filas.items():
+        print(f"{tabla}: {cantidad} filas")
+    print(f"Resúmenes reconstruidos en {time.perf_counter() - inicio:.2f} s")
+    return 0
+
+
+def cmd_exportar(params):
+    """Exporta las filas nuevas de comandas e items desde la última corrida"""
+    conn = abrir_base(params.db)
+    tablas = list(exportacion.COLUMNAS_INCREMENTAL) if params.tabla == 'todas' else [params.tabla]
+    try:
+        if params.reiniciar:
+            for tabla in tablas:
+                exportacion.guardar_marca(conn, tabla, params.formato, 0)
+        for tabla in tablas:
+            inicio = time.perf_counter()
+            ruta, filas = exportacion.exportar_incremental(
+                conn, tabla, params.formato, params.destino, params.lote
+            )
+            if ruta:
+                print(f"{tabla}: {filas} filas nuevas -> {ruta} ({time.perf_counter() - inicio:.2f} s)")
+            else:
+                print(f"{tabla}: sin filas nuevas")
+    finally:
+        conn.close()
+    return 0
+
+
+def cmd_archivar(params):
+    """Mueve las comandas cerradas antiguas a la base de archivo"""
+    conn = abrir_base(params.db)
+    try:
+        dias = params.dias
+        if dias is None:
+            fila = conn.execute(
+                "SELECT valor FROM configuracion WHERE clave = 'dias_retencion_comandas'"
+            ).fetchone()
+            dias = int(fila[0]) if fila else 0
+        if dias <= 0:
+            print("La retención está desactivada (dias_retencion_comandas = 0); indique --dias")
+            return 1
+        inicio = time.perf_counter()
+        comandas, items = archivo.archivar(conn, params.db, dias, params.lote)
+    finally:
+        conn.close()
+
+    print(f"{comandas} comandas y {items} items con más de {dias} días movidos a "
+          f"{archivo.ruta_archivo(params.db)} en {time.perf_counter() - inicio:.2f} s")
+    return 0
+
+
+def cmd_respaldar(params):
+    """Copia la base en caliente, la verifica y rota los respaldos viejos"""
+    destino = params.destino or os.path.join(os.path.dirname(os.path.abspath(params.db)), respaldo.DIRECTORIO)
+    respaldo.configurar_log(os.path.join(os.path.dirname(os.path.abspath(params.db)), 'logs', 'respaldos.log'))
+    resultado = respaldo.respaldar(params.db, destino, params.paginas, params.pausa, params.conservar)
+    print(f"Respaldo {resultado['ruta']}: {resultado['bytes']} bytes en {resultado['pasos']} pasos, "
+          f"{resultado['duracion_s']:.2f} s, bloqueo máximo {resultado['bloqueo_max_ms']:.1f} ms")
+    if resultado['rotados']:
+        print(f"{resultado['rotados']} respaldos viejos borrados")
+    return 0
+
+
+def cmd_estaciones(params):
+    """Muestra la cola y lo despachado por cada estación de preparación"""
+    if not os.path.exists(params.db):
+        raise SystemExit(f"No existe la base de datos {params.db}")
+    motor = OrderEngine(params.db)
+    try:
+        estado = motor.estado_estaciones(params.minutos)
+    finally:
+        motor.cerrar()
+
+    print(f"{'Estación':<12} {'Comandas':>8} {'Items':>6} {'Más antigua':>20} "
+          f"{'Listos ' + str(params.minutos) + ' min':>14} {'Promedio':>9}")
+    for estacion, datos in estado.items():
+        promedio = f"{datos['minutos_promedio']:.1f} min" if datos['minutos_promedio'] is not None else '-'
+        print(f"{estacion:<12} {datos['comandas']:>8} {datos['items']:>6} {datos['mas_antigua'] or '-':>20} "
+              f"{datos['listos']:>14} {promedio:>9}")
+    return 0
+
+
+def cmd_servidor(params):
+    """Atiende la API HTTP/JSON hasta Ctrl+C"""
+    abrir_base(params.db).close()
+    servidor = servidor_api.crear_servidor(params.db, params.host, params.puerto, params.hilos, params.cola)
+    print(f"API de comandas en http://{params.host}:{servidor.server_address[1]}/api/ "
+          f"({params.hilos} hilos, Ctrl+C para detener)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+    return 0
+
+
+def cmd_eventos(params):
+    """Atiende el flujo de eventos (SSE) hasta Ctrl+C"""
+    abrir_base(params.db).close()
+
+    def al_iniciar(flujo):
+        print(f"Flujo de eventos en http://{params.host}:{flujo.puerto}{eventos_sse.RUTA} (Ctrl+C para detener)")
+
+    eventos_sse.servir(params.db, params.host, params.puerto, al_iniciar)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mantenimiento del sistema de comandas")
+    parser.add_argument('--db', default=DB_POR_DEFECTO, help="Archivo de base de datos (por defecto comandas.db)")
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+
+    resumenes = subcomandos.add_parser('reconstruir-resumenes',
+                                       help="Recalcular los resúmenes diarios de ventas")
+    resumenes.add_argument('--desde', help="Primer día a recalcular (AAAA-MM-DD)")
+    resumenes.add_argument('--hasta', help="Último día a recalcular (AAAA-MM-DD)")
+    resumenes.set_defaults(funcion=cmd_reconstruir_resumenes)
+
+    exportar = subcomandos.add_parser('exportar',
+                                      help="Exportar comandas e items nuevos a CSV o NDJSON")
+    exportar.add_argument('--tabla', choices=list(exportacion.COLUMNAS_INCREMENTAL) + ['todas'], default='todas')
+    exportar.add_argument('--formato', choices=exportacion.FORMATOS, default='csv')
+    exportar.add_argument('--destino', default='exportaciones', help="Directorio de salida")
+    exportar.add_argument('--lote', type=int, default=exportacion.TAMANO_LOTE, help="Filas por fetchmany")
+    exportar.add_argument('--reiniciar', action='store_true', help="Exportar todo desde el principio")
+    exportar.set_defaults(funcion=cmd_exportar)
+
+    archivar = subcomandos.add_parser('archivar',
+                                      help="Mover comandas cerradas antiguas a comandas_archive.db")
+    archivar.add_argument('--dias', type=int,
+                          help="Antigüedad mínima en días (por defecto la retención configurada)")
+    archivar.add_argument('--lote', type=int, default=archivo.TAMANO_LOTE, help="Comandas por transacción")
+    archivar.set_defaults(funcion=cmd_archivar)
+
+    respaldar = subcomandos.add_parser('respaldar',
+                                       help="Respaldar la base sin detener el sistema")
+    respaldar.add_argument('--destino', help="Directorio de respaldos (por defecto respaldos/ junto a la base)")
+    respaldar.add_argument('--paginas', type=int, default=respaldo.PAGINAS_POR_PASO, help="Páginas copiadas por paso")
+    respaldar.add_argument('--pausa', type=float, default=respaldo.PAUSA, help="Segundos entre pasos")
+    respaldar.add_argument('--conservar', type=int, default=respaldo.CONSERVAR, help="Respaldos que se conservan")
+    respaldar.set_defaults(funcion=cmd_respaldar)
+
+    estaciones = subcomandos.add_parser('estaciones',
+                                        help="Cola y rendimiento de cada estación de preparación")
+    estaciones.add_argument('--minutos', type=int, default=60, help="Ventana para contar los items listos")
+    estaciones.set_defaults(funcion=cmd_estaciones)
+
+    servidor = subcomandos.add_parser('servidor',
+                                      help="API HTTP/JSON para terminales remotas")
+    servidor.add_argument('--host', default='127.0.0.1', help="Dirección donde escuchar (0.0.0.0 = toda la red)")
+    servidor.add_argument('--puerto', type=int, default=servidor_api.PUERTO)
+    servidor.add_argument('--hilos', type=int, default=servidor_api.HILOS, help="Conexiones atendidas a la vez")
+    servidor.add_argument('--cola', type=int, default=servidor_api.COLA,
+                          help="Conexiones en espera antes de responder 503")
+    servidor.set_defaults(funcion=cmd_servidor)
+
+    eventos = subcomandos.add_parser('eventos',
+                                     help="Flujo de cambios de comandas y mesas (Server-Sent Events)")
+    eventos.add_argument('--host', default='127.0.0.1', help="Dirección donde escuchar (0.0.0.0 = toda la red)")
+    eventos.add_argument('--puerto', type=int, default=eventos_sse.PUERTO)
+    eventos.set_defaults(funcion=cmd_eventos)
+
+    params = parser.parse_args(argv)
+    return params.funcion(params)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
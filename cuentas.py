@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""Cuentas de mesa: las rondas de una misma ocupación agrupadas
+
+Cada comanda con mesa pertenece a la cuenta abierta de esa mesa (se abre con
+la primera ronda). La cuenta acumula rondas no canceladas, unidades, importe
+y cuántas rondas están activas o completadas; el motor la actualiza en la
+misma transacción que registra, completa o cancela una comanda, igual que los
+resúmenes de ventas_diarias. Así el estado de una mesa y el total a cobrar son
+una lectura de una fila, sin recorrer sus comandas.
+
+La cuenta se cierra al cobrarla o al liberar la mesa a mano; la liberación
+automática cuando la cocina completa todo no la cierra (la mesa sigue
+consumiendo). Si la cuenta quedó abierta sin que nadie la cobre ni libere la
+mesa, la próxima ronda abre una cuenta nueva sólo cuando la anterior está
+abandonada: sin rondas en cocina, la mesa libre y ninguna ronda en las últimas
+horas_inactividad horas. Una mesa que sigue pidiendo nunca parte su cuenta,
+aunque pase la medianoche. reconstruir() recalcula los acumulados desde las
+comandas.
+"""
+from datetime import datetime, timedelta
+
+ESTADOS_ACTIVOS = ('Pendiente', 'En preparación')
+
+# Horas sin rondas para dar por abandonada la cuenta de una mesa libre
+HORAS_INACTIVIDAD = 4
+
+FORMATO_FECHA = '%Y-%m-%d %H:%M:%S'
+
+
+def crear_tablas(cursor):
+    """Crea la tabla de cuentas y la columna comandas.cuenta_id"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cuentas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            mesa_id INTEGER NOT NULL,
+            abierta TEXT NOT NULL,
+            cerrada TEXT,
+            rondas INTEGER NOT NULL DEFAULT 0,
+            items INTEGER NOT NULL DEFAULT 0,
+            total REAL NOT NULL DEFAULT 0,
+            activas INTEGER NOT NULL DEFAULT 0,
+            completadas INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    # Una sola cuenta abierta por mesa; es además el índice del estado de mesas
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_cuentas_abierta ON cuentas (mesa_id)
+        WHERE cerrada IS NULL
+    ''')
+    cursor.execute("PRAGMA table_info(comandas)")
+    if 'cuenta_id' not in [col[1] for col in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE comandas ADD COLUMN cuenta_id INTEGER REFERENCES cuentas(id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_comandas_cuenta ON comandas (cuenta_id)")
+
+
+def abrir(cursor, mesa_id, fecha, horas_inactividad=HORAS_INACTIVIDAD):
+    """Id de la cuenta abierta de la mesa, abriéndola si no hay o si la anterior quedó abandonada
+
+    Se llama antes de marcar la mesa ocupada, así el estado leído es el que
+    tenía cuando llegó la ronda.
+    """
+    cursor.execute('''
+        SELECT c.id, c.activas, m.estado,
+               COALESCE((SELECT MAX(fecha) FROM comandas WHERE cuenta_id = c.id), c.abierta)
+        FROM cuentas c JOIN mesas m ON m.id = c.mesa_id
+        WHERE c.mesa_id = ? AND c.cerrada IS NULL
+    ''', (mesa_id,))
+    fila = cursor.fetchone()
+    if fila:
+        cuenta_id, activas, estado, ultima_ronda = fila
+        inactiva = datetime.strptime(fecha, FORMATO_FECHA) - datetime.strptime(ultima_ronda, FORMATO_FECHA)
+        abandonada = (
+            activas == 0
+            and (estado or '').lower() in ('libre', 'disponible')
+            and inactiva >= timedelta(hours=horas_inactividad)
+        )
+        if not abandonada:
+            return cuenta_id
+        # Queda cerrada con sus rondas: se puede consultar con rondas_de_cuenta
+        cursor.execute("UPDATE cuentas SET cerrada = ? WHERE id = ?", (fecha, cuenta_id))
+    cursor.execute("INSERT INTO cuentas (mesa_id, abierta) VALUES (?, ?)", (mesa_id, fecha))
+    return cursor.lastrowid
+
+
+def cerrar(cursor, mesa_id, fecha):
+    """Cierra la cuenta abierta de la mesa; devuelve su id o None si no había"""
+    cursor.execute("SELECT id FROM cuentas WHERE mesa_id = ? AND cerrada IS NULL", (mesa_id,))
+    fila = cursor.fetchone()
+    if not fila:
+        return None
+    cursor.execute("UPDATE cuentas SET cerrada = ? WHERE id = ?", (fecha, fila[0]))
+    return fila[0]
+
+
+def _signos(estado_anterior, estado_nuevo):
+    """Variación de (ronda vigente, activa, completada) al pasar de un estado a otro"""
+    def vigente(estado):
+        return 1 if estado is not None and estado != 'Cancelada' else 0
+
+    def activa(estado):
+        return 1 if estado in ESTADOS_ACTIVOS else 0
+
+    def completada(estado):
+        return 1 if estado == 'Completada' else 0
+
+    return (vigente(estado_nuevo) - vigente(estado_anterior),
+            activa(estado_nuevo) - activa(estado_anterior),
+            completada(estado_nuevo) - completada(estado_anterior))
+
+
+def aplicar_transicion(cursor, comanda_id, estado_anterior, estado_nuevo):
+    """Suma o resta la comanda en su cuenta según el cambio de estado
+
+    Debe ejecutarse dentro de la transacción que modifica la comanda, después
+    de guardar sus items. Las comandas sin mesa no tienen cuenta.
+    """
+    vigente, activa, completada = _signos(estado_anterior, estado_nuevo)
+    if not vigente and not activa and not completada:
+        return
+    cursor.execute('''
+        UPDATE cuentas SET
+            rondas = rondas + :vigente,
+            items = items + :vigente * (SELECT COALESCE(SUM(cantidad), 0) FROM items_comanda WHERE comanda_id = :comanda),
+            total = total + :vigente * (SELECT total FROM comandas WHERE id = :comanda),
+            activas = activas + :activa,
+            completadas = completadas + :completada
+        WHERE id = (SELECT cuenta_id FROM comandas WHERE id = :comanda)
+    ''', {'vigente': vigente, 'activa': activa, 'completada': completada, 'comanda': comanda_id})
+
+
+def reconstruir(cursor, solo_abiertas=False):
+    """Recalcula los acumulados de las cuentas desde sus comandas; devuelve cuántas actualizó"""
+    marcadores = ','.join('?' * len(ESTADOS_ACTIVOS))
+    cursor.execute(f'''
+        UPDATE cuentas SET
+            rondas = (SELECT COUNT(*) FROM comandas c
+                      WHERE c.cuenta_id = cuentas.id AND c.estado != 'Cancelada'),
+            items = (SELECT COALESCE(SUM(i.cantidad), 0) FROM comandas c
+                     JOIN items_comanda i ON i.comanda_id = c.id
+                     WHERE c.cuenta_id = cuentas.id AND c.estado != 'Cancelada'),
+            total = (SELECT COALESCE(SUM(c.total), 0) FROM comandas c
+                     WHERE c.cuenta_id = cuentas.id AND c.estado != 'Cancelada'),
+            activas = (SELECT COUNT(*) FROM comandas c
+                       WHERE c.cuenta_id = cuentas.id AND c.estado IN ({marcadores})),
+            completadas = (SELECT COUNT(*) FROM comandas c
+                           WHERE c.cuenta_id = cuentas.id AND c.estado = 'Completada')
+        {'WHERE cerrada IS NULL' if solo_abiertas else ''}
+    ''', ESTADOS_ACTIVOS)
+    return cursor.rowcount
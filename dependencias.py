@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""Carga diferida de dependencias pesadas
+
+pandas, fpdf, Pillow y openpyxl tardan en importarse (sobre todo en el
+ejecutable de PyInstaller), así que se importan recién la primera vez que
+una funcionalidad las necesita. Python cachea el módulo en sys.modules,
+por lo que las llamadas siguientes no tienen costo.
+"""
+
+# Módulos que no deben cargarse durante el arranque (verificado por benchmarks/arranque.py)
+MODULOS_PESADOS = ('pandas', 'fpdf', 'PIL', 'openpyxl')
+
+
+def cargar_pandas():
+    """Devuelve el módulo pandas"""
+    import pandas
+    return pandas
+
+
+def cargar_fpdf():
+    """Devuelve la clase FPDF"""
+    from fpdf import FPDF
+    return FPDF
+
+
+def cargar_pil_image():
+    """Devuelve el módulo PIL.Image"""
+    from PIL import Image
+    return Image
+
+
+def cargar_openpyxl():
+    """Devuelve el módulo openpyxl"""
+    import openpyxl
+    return openpyxl
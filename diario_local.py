@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""Diario local de comandas: tomar pedidos aunque la base compartida no responda
+
+Cada terminal anota cada comanda en un archivo JSONL en su propio disco (no en
+la carpeta compartida) antes de enviarla a la base. Si la base no responde
+(recurso de red caído, archivo bloqueado) la comanda queda pendiente en el
+diario y se envía al volver la conexión.
+
+Cada comanda lleva un id_cliente (UUID) generado en la terminal: la base lo
+guarda con índice único, así reenviar una comanda que sí había llegado (se
+cortó la conexión después del commit) no la duplica.
+
+Las comandas pendientes se envían en el orden en que se tomaron y reciben el
+número de ticket de la secuencia central en el momento de llegar; mientras
+haya pendientes, las nuevas se encolan detrás para no adelantarse. La hora en
+que se tomó queda en comandas.fecha_terminal.
+
+El archivo sólo crece con líneas completas ('comanda', 'enviada',
+'descartada'); una línea cortada por un corte de luz se ignora. Cuando no
+queda nada pendiente se vacía.
+"""
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+
+from motor_comandas import ComandaError
+
+# Segundos entre reintentos de envío; no es una configuración de la base porque
+# se usa justamente cuando la base no responde
+REINTENTO_SEGUNDOS = 15
+
+# Espera de bloqueo de la conexión de la interfaz mientras no hay conexión:
+# con la normal (10 s) cada lectura de configuración trabaría la pantalla
+ESPERA_SIN_CONEXION_MS = 300
+
+
+def ruta_por_defecto(db_path):
+    """Diario en el perfil local del usuario, uno por base y por terminal"""
+    base = os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), '.local', 'share')
+    clave = hashlib.sha1(os.path.abspath(db_path).encode('utf-8')).hexdigest()[:8]
+    return os.path.join(base, 'ProyectoComandas', f"diario-{socket.gethostname()}-{clave}.jsonl")
+
+
+def sin_conexion(error):
+    """Indica si el error es de acceso a la base (reintentar) y no de los datos"""
+    return isinstance(error, sqlite3.OperationalError)
+
+
+class DiarioLocal:
+    """Archivo de comandas tomadas en esta terminal pendientes de llegar a la base"""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        # La interfaz anota y el hilo de sincronización confirma
+        self._lock = threading.Lock()
+
+    def _agregar(self, registro):
+        linea = json.dumps(registro, ensure_ascii=False, separators=(',', ':')) + '\n'
+        with self._lock, open(self.ruta, 'a', encoding='utf-8') as archivo:
+            archivo.write(linea)
+            archivo.flush()
+            # La comanda tiene que sobrevivir a un corte de luz de la terminal
+            os.fsync(archivo.fileno())
+
+    def _leer(self):
+        if not os.path.exists(self.ruta):
+            return []
+        registros = []
+        with open(self.ruta, encoding='utf-8') as archivo:
+            for linea in archivo:
+                try:
+                    registros.append(json.loads(linea))
+                except ValueError:
+                    # Última línea a medio escribir
+                    continue
+        return registros
+
+    def anotar(self, items, mesa, usuario, observaciones=""):
+        """Guarda la comanda en el diario y devuelve el registro (con su id_cliente)"""
+        registro = {
+            'tipo': 'comanda',
+            'id_cliente': str(uuid.uuid4()),
+            'fecha': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'items': [
+                {'id': item['id'], 'nombre': item['nombre'], 'precio': item['precio'], 'cantidad': item['cantidad']}
+                for item in items
+            ],
+            'mesa': list(mesa[:2]) if mesa else None,
+            'usuario': usuario,
+            'observaciones': observaciones,
+        }
+        self._agregar(registro)
+        return registro
+
+    def confirmar(self, id_cliente, numero_comanda):
+        self._agregar({'tipo': 'enviada', 'id_cliente': id_cliente, 'numero_comanda': numero_comanda})
+
+    def descartar(self, id_cliente, motivo):
+        self._agregar({'tipo': 'descartada', 'id_cliente': id_cliente, 'motivo': motivo})
+
+    def pendientes(self):
+        """Comandas anotadas que todavía no llegaron a la base, en el orden en que se tomaron"""
+        registros = self._leer()
+        cerradas = {r['id_cliente'] for r in registros if r.get('tipo') in ('enviada', 'descartada')}
+        return [r for r in registros if r.get('tipo') == 'comanda' and r['id_cliente'] not in cerradas]
+
+    def compactar(self):
+        """Deja en el archivo sólo las comandas pendientes (lo vacía si no hay)"""
+        with self._lock:
+            registros = self._leer()
+            cerradas = {r['id_cliente'] for r in registros if r.get('tipo') in ('enviada', 'descartada')}
+            pendientes = [r for r in registros if r.get('tipo') == 'comanda' and r['id_cliente'] not in cerradas]
+            if len(pendientes) == len(registros):
+                return
+            temporal = self.ruta + '.tmp'
+            with open(temporal, 'w', encoding='utf-8') as archivo:
+                for registro in pendientes:
+                    archivo.write(json.dumps(registro, ensure_ascii=False, separators=(',', ':')) + '\n')
+                archivo.flush()
+                os.fsync(archivo.fileno())
+            os.replace(temporal, self.ruta)
+
+
+def _enviar(diario, motor, registro):
+    """Registra en la base una comanda del diario; devuelve el resultado de registrar_comanda"""
+    try:
+        comanda = motor.registrar_comanda(
+            registro['items'], registro['mesa'], registro['usuario'], registro['observaciones'],
+            id_cliente=registro['id_cliente'], fecha_terminal=registro['fecha']
+        )
+    except ComandaError as e:
+        # La base la rechaza (p. ej. cambió la configuración de mesas): no se reintenta
+        diario.descartar(registro['id_cliente'], str(e))
+        raise
+    diario.confirmar(registro['id_cliente'], comanda['numero_comanda'])
+    return comanda
+
+
+def registrar(diario, motor, items, mesa, usuario, observaciones=""):
+    """Anota la comanda y la envía a la base si hay conexión y nada pendiente antes que ella
+
+    Devuelve (comanda, registro): comanda es el resultado de registrar_comanda
+    o None si quedó pendiente en el diario. Los errores de validación
+    (ComandaError) se lanzan antes de anotar nada.
+    """
+    mesa = motor.validar_comanda(items, mesa)
+    registro = diario.anotar(items, mesa, usuario, observaciones)
+    if len(diario.pendientes()) > 1:
+        return None, registro
+    try:
+        comanda = _enviar(diario, motor, registro)
+    except sqlite3.Error as e:
+        if not sin_conexion(e):
+            raise
+        return None, registro
+    diario.compactar()
+    return comanda, registro
+
+
+def sincronizar(diario, motor):
+    """Envía las comandas pendientes en orden
+
+    Devuelve (enviadas, descartadas): listas de (registro, comanda) y de
+    (registro, motivo). Si la base vuelve a fallar se detiene y lanza el error;
+    lo ya enviado queda confirmado en el diario.
+    """
+    enviadas, descartadas = [], []
+    for registro in diario.pendientes():
+        try:
+            enviadas.append((registro, _enviar(diario, motor, registro)))
+        except ComandaError as e:
+            descartadas.append((registro, str(e)))
+    diario.compactar()
+    return enviadas, descartadas
@@ -0,0 +1,369 @@
+# -*- coding: utf-8 -*-
+"""Flujo de cambios de comandas y mesas para terminales remotas (Server-Sent Events)
+
+En lugar de que cada handheld o pantalla pida el estado completo cada pocos
+segundos, se suscribe a GET /api/eventos y recibe:
+
+    event: snapshot   comandas abiertas y todas las mesas (al conectarse)
+    event: cambios    sólo las comandas y mesas que cambiaron, con su estado
+                      completo (se pueden aplicar más de una vez sin problema)
+
+Cada mensaje lleva 'id:' con la seq de la tabla eventos. Al reconectarse el
+cliente manda Last-Event-ID (EventSource lo hace solo) o ?desde=N y recibe
+sólo los lotes posteriores, guardados en memoria; si pasó demasiado tiempo
+recibe un snapshot nuevo.
+
+Todo corre en un único bucle asyncio: un solo lector consulta la tabla eventos
+cada INTERVALO segundos (en un hilo aparte con su propio OrderEngine, para no
+bloquear el bucle), arma y serializa cada lote una vez y lo encola para todos
+los suscriptores. Un suscriptor inactivo es sólo una conexión abierta esperando
+en su cola, así cientos de pantallas no agregan consultas a la base. A un
+cliente que no lee se le corta la conexión cuando su cola se llena; al volver
+continúa desde su último id.
+
+Autenticación: HTTP Basic con los usuarios del sistema, igual que servidor_api.
+
+Uso:
+    python comandas_cli.py eventos --host 0.0.0.0 --puerto 8081
+
+    curl -N -u admin:admin123 http://localhost:8081/api/eventos
+    curl -N -u admin:admin123 -H 'Last-Event-ID: 120' http://localhost:8081/api/eventos
+"""
+import asyncio
+import json
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+from motor_comandas import OrderEngine
+from servidor_api import ErrorAPI, comanda_json, credenciales_basic
+
+PUERTO = 8081
+RUTA = '/api/eventos'
+
+# Segundos entre lecturas de la tabla eventos (demora máxima de un cambio)
+INTERVALO = 0.5
+
+# Segundos sin cambios tras los que se envía un comentario para mantener viva
+# la conexión en proxies y routers, y detectar clientes que se fueron
+LATIDO = 15
+
+# Lotes que se pueden reenviar a un cliente que reconecta
+LOTES_EN_MEMORIA = 1000
+
+# Mensajes pendientes por cliente antes de cortarle la conexión
+PENDIENTES_POR_CLIENTE = 256
+
+# Milisegundos que EventSource espera antes de reconectarse
+REINTENTO_MS = 2000
+
+MAXIMO_CABECERAS = 16 * 1024
+
+_CABECERAS_FLUJO = (
+    b'HTTP/1.1 200 OK\r\n'
+    b'Content-Type: text/event-stream; charset=utf-8\r\n'
+    b'Cache-Control: no-cache\r\n'
+    b'Connection: close\r\n'
+    b'X-Accel-Buffering: no\r\n\r\n'
+    b'retry: ' + str(REINTENTO_MS).encode('ascii') + b'\n\n'
+)
+
+# Marca en la cola de un suscriptor: terminar la conexión
+_FIN = (None, None)
+
+
+def _json(datos):
+    return json.dumps(datos, ensure_ascii=False, separators=(',', ':'))
+
+
+def _mensaje(seq, evento, datos):
+    """Mensaje SSE ya codificado; el JSON compacto ocupa una sola línea data:"""
+    return f"id: {seq}\nevent: {evento}\ndata: {_json(datos)}\n\n".encode('utf-8')
+
+
+def mesa_json(fila):
+    mesa_id, nombre, capacidad, estado, ubicacion = fila
+    return {'id': mesa_id, 'nombre': nombre, 'capacidad': capacidad, 'estado': estado, 'ubicacion': ubicacion}
+
+
+def _respuesta_error(estado, mensaje):
+    cuerpo = _json({'error': mensaje}).encode('utf-8')
+    cabeceras = [
+        f"HTTP/1.1 {estado} {HTTPStatus(estado).phrase}",
+        "Content-Type: application/json; charset=utf-8",
+        f"Content-Length: {len(cuerpo)}",
+        "Connection: close",
+    ]
+    if estado == 401:
+        cabeceras.append('WWW-Authenticate: Basic realm="comandas"')
+    return ('\r\n'.join(cabeceras) + '\r\n\r\n').encode('ascii') + cuerpo
+
+
+class FlujoEventos:
+    """Servidor SSE: un lector de la base y muchas conexiones suscriptas"""
+
+    def __init__(self, db_path, intervalo=INTERVALO):
+        self.db_path = db_path
+        self.intervalo = intervalo
+        # Un solo hilo para la base: el OrderEngine se crea y usa siempre en él
+        self._lector = ThreadPoolExecutor(max_workers=1, thread_name_prefix='eventos-db')
+        self._motor = None
+        self.seq = 0
+        # Lotes (seq, mensaje) que cubren las seq de _seq_base (excluida) a seq
+        self._lotes = deque(maxlen=LOTES_EN_MEMORIA)
+        self._seq_base = 0
+        self._suscriptores = set()
+        self._snapshot = (None, None)
+        self._servidor = None
+        self._loop = None
+        self._tarea = None
+
+    # ---------- Lecturas (hilo de la base) ----------
+
+    def _obtener_motor(self):
+        if self._motor is None:
+            self._motor = OrderEngine(self.db_path)
+        return self._motor
+
+    def _leer_ultimo(self):
+        return self._obtener_motor().ultimo_evento()
+
+    def _leer_cambios(self, seq):
+        """(seq, mensaje, quedan_mas) con los cambios posteriores a seq, o None si no hay"""
+        motor = self._obtener_motor()
+        eventos = motor.eventos_desde(seq)
+        if not eventos:
+            return None
+        ids_comandas = {evento[1] for evento in eventos if evento[1] is not None}
+        ids_mesas = {evento[4] for evento in eventos if evento[1] is None}
+        # Se lee el estado actual, no el de cada evento: puede adelantarse a
+        # eventos del próximo lote, que al llegar repiten el mismo estado
+        comandas = [comanda_json(comanda) for comanda in motor.obtener_comandas(ids_comandas)]
+        mesas = [mesa_json(fila) for fila in motor.estado_mesas(ids_mesas)]
+        # Comandas archivadas y mesas borradas
+        comandas += [{'id': i, 'borrada': True} for i in ids_comandas - {c['id'] for c in comandas}]
+        mesas += [{'id': i, 'borrada': True} for i in ids_mesas - {m['id'] for m in mesas}]
+        ultimo = eventos[-1][0]
+        datos = {'seq': ultimo, 'comandas': comandas, 'mesas': mesas}
+        return ultimo, _mensaje(ultimo, 'cambios', datos), len(eventos) >= 500
+
+    def _leer_snapshot(self):
+        motor = self._obtener_motor()
+        # La seq se lee antes que el estado: lo que cambie en el medio vuelve a llegar como cambio
+        seq = motor.ultimo_evento()
+        datos = {
+            'seq': seq,
+            'comandas': [comanda_json(comanda) for comanda in motor.comandas_abiertas()],
+            'mesas': [mesa_json(fila) for fila in motor.estado_mesas()],
+        }
+        return seq, _mensaje(seq, 'snapshot', datos)
+
+    def _leer_usuario(self, usuario, password):
+        return self._obtener_motor().autenticar_usuario(usuario, password)
+
+    def _cerrar_motor(self):
+        if self._motor is not None:
+            self._motor.cerrar()
+            self._motor = None
+
+    async def _en_base(self, funcion, *argumentos):
+        return await asyncio.get_running_loop().run_in_executor(self._lector, funcion, *argumentos)
+
+    # ---------- Difusión ----------
+
+    async def _sondear(self):
+        """Lee la tabla eventos y reparte cada lote nuevo entre los suscriptores"""
+        while True:
+            quedan_mas = False
+            try:
+                lote = await self._en_base(self._leer_cambios, self.seq)
+            except Exception as e:
+                print(f"Error al leer eventos: {e}")
+                lote = None
+            if lote:
+                seq, mensaje, quedan_mas = lote
+                if len(self._lotes) == self._lotes.maxlen:
+                    self._seq_base = self._lotes[0][0]
+                self._lotes.append((seq, mensaje))
+                self.seq = seq
+                self._difundir(seq, mensaje)
+            if not quedan_mas:
+                await asyncio.sleep(self.intervalo)
+
+    def _difundir(self, seq, mensaje):
+        for cola in list(self._suscriptores):
+            try:
+                cola.put_nowait((seq, mensaje))
+            except asyncio.QueueFull:
+                # Cliente que no lee: se lo desconecta y al volver reanuda desde su último id
+                self._terminar(cola)
+
+    def _terminar(self, cola):
+        self._suscriptores.discard(cola)
+        while not cola.empty():
+            cola.get_nowait()
+        cola.put_nowait(_FIN)
+
+    async def _snapshot_actual(self):
+        """Snapshot serializado; se reutiliza mientras no haya cambios (reconexiones en masa)"""
+        seq, mensaje = self._snapshot
+        if seq is None or seq != self.seq:
+            seq, mensaje = await self._en_base(self._leer_snapshot)
+            self._snapshot = (seq, mensaje)
+        return seq, mensaje
+
+    # ---------- Conexiones ----------
+
+    async def _atender(self, reader, writer):
+        cola = None
+        try:
+            try:
+                cabeceras = await self._leer_peticion(reader)
+                desde = await self._validar(cabeceras)
+            except ErrorAPI as e:
+                writer.write(_respuesta_error(e.estado, str(e)))
+                await writer.drain()
+                return
+
+            # Registrar la cola antes de cualquier espera: ningún lote se pierde
+            cola = asyncio.Queue(PENDIENTES_POR_CLIENTE)
+            reenvio = None
+            if desde is not None and self._seq_base <= desde <= self.seq:
+                reenvio = [(seq, mensaje) for seq, mensaje in self._lotes if seq > desde]
+            self._suscriptores.add(cola)
+
+            writer.write(_CABECERAS_FLUJO)
+            if reenvio is None:
+                enviado, mensaje = await self._snapshot_actual()
+                writer.write(mensaje)
+            else:
+                enviado = desde
+                for seq, mensaje in reenvio:
+                    writer.write(mensaje)
+                    enviado = seq
+            await writer.drain()
+
+            while True:
+                try:
+                    seq, mensaje = await asyncio.wait_for(cola.get(), LATIDO)
+                except asyncio.TimeoutError:
+                    writer.write(b': latido\n\n')
+                    await writer.drain()
+                    continue
+                if mensaje is None:
+                    break
+                # Lotes que ya venían incluidos en el snapshot o en el reenvío
+                if seq <= enviado:
+                    continue
+                writer.write(mensaje)
+                await writer.drain()
+                enviado = seq
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        except Exception as e:
+            print(f"Error en el flujo de eventos: {e}")
+        finally:
+            if cola is not None:
+                self._suscriptores.discard(cola)
+            writer.close()
+
+    async def _leer_peticion(self, reader):
+        try:
+            datos = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), LATIDO)
+        except asyncio.LimitOverrunError:
+            raise ErrorAPI(431, "Cabeceras demasiado grandes")
+        linea, *lineas = datos.decode('latin-1').split('\r\n')
+        partes = linea.split(' ')
+        if len(partes) != 3:
+            raise ErrorAPI(400, "Petición mal formada")
+        cabeceras = {'metodo': partes[0], 'objetivo': partes[1]}
+        for linea in lineas:
+            nombre, separador, valor = linea.partition(':')
+            if separador:
+                cabeceras[nombre.strip().lower()] = valor.strip()
+        return cabeceras
+
+    async def _validar(self, cabeceras):
+        """Devuelve la seq desde la que reanudar (None = snapshot) o lanza ErrorAPI"""
+        url = urlsplit(cabeceras['objetivo'])
+        if url.path.rstrip('/') != RUTA:
+            raise ErrorAPI(404, f"No existe {url.path}")
+        if cabeceras['metodo'] != 'GET':
+            raise ErrorAPI(405, "Método no permitido; usar GET")
+        usuario, password = credenciales_basic(cabeceras.get('authorization', ''))
+        if await self._en_base(self._leer_usuario, usuario, password) is None:
+            raise ErrorAPI(401, "Usuario o contraseña incorrectos")
+        desde = cabeceras.get('last-event-id') or parse_qs(url.query).get('desde', [None])[0]
+        try:
+            return int(desde) if desde is not None else None
+        except ValueError:
+            return None
+
+    # ---------- Ciclo de vida ----------
+
+    @property
+    def puerto(self):
+        return self._servidor.sockets[0].getsockname()[1]
+
+    @property
+    def suscriptores(self):
+        return len(self._suscriptores)
+
+    async def ejecutar(self, host='127.0.0.1', puerto=PUERTO, al_iniciar=None):
+        """Atiende hasta que se cancela la tarea (Ctrl+C o cerrar())"""
+        self._loop = asyncio.get_running_loop()
+        self._tarea = asyncio.current_task()
+        self.seq = self._seq_base = await self._en_base(self._leer_ultimo)
+        self._servidor = await asyncio.start_server(
+            self._atender, host, puerto, limit=MAXIMO_CABECERAS, backlog=512
+        )
+        sondeo = asyncio.create_task(self._sondear())
+        if al_iniciar:
+            al_iniciar()
+        try:
+            await self._servidor.serve_forever()
+        finally:
+            sondeo.cancel()
+            self._servidor.close()
+            for cola in list(self._suscriptores):
+                self._terminar(cola)
+            await self._en_base(self._cerrar_motor)
+            self._lector.shutdown(wait=False)
+
+    def cerrar(self):
+        """Detiene el servidor desde otro hilo"""
+        if self._loop is not None and self._tarea is not None:
+            self._loop.call_soon_threadsafe(self._tarea.cancel)
+
+
+def servir(db_path, host='127.0.0.1', puerto=PUERTO, al_iniciar=None):
+    """Atiende en el hilo actual hasta Ctrl+C"""
+    flujo = FlujoEventos(db_path)
+    try:
+        asyncio.run(flujo.ejecutar(host, puerto, al_iniciar and (lambda: al_iniciar(flujo))))
+    except KeyboardInterrupt:
+        pass
+
+
+def iniciar_en_segundo_plano(db_path, host='127.0.0.1', puerto=PUERTO):
+    """Atiende en un hilo daemon con su propio bucle; devuelve el FlujoEventos ya escuchando"""
+    flujo = FlujoEventos(db_path)
+    listo = threading.Event()
+    errores = []
+
+    def correr():
+        try:
+            asyncio.run(flujo.ejecutar(host, puerto, listo.set))
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            errores.append(e)
+            listo.set()
+
+    threading.Thread(target=correr, name='flujo-eventos', daemon=True).start()
+    listo.wait()
+    if errores:
+        raise errores[0]
+    return flujo
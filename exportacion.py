@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""Exportación del historial de comandas sin cargarlo completo en memoria"""
+import csv
+import json
+import os
+from datetime import datetime
+
+import archivo
+import base_datos
+from dependencias import cargar_openpyxl
+
+# Filas leídas de la base por lote
+TAMANO_LOTE = 5000
+
+COLUMNAS_DETALLE = (
+    'Comanda', 'Fecha', 'Mesa', 'Mozo', 'Estado',
+    'Producto', 'Cantidad', 'Precio Unitario', 'Subtotal', 'Observaciones'
+)
+
+CONSULTA_DETALLE = '''
+    SELECT c.numero_comanda,
+           c.fecha,
+           COALESCE(m.nombre, 'Sin mesa'),
+           c.usuario,
+           c.estado,
+           i.producto_nombre,
+           i.cantidad,
+           i.precio_unitario,
+           i.cantidad * i.precio_unitario,
+           c.observaciones
+    FROM {comandas} c
+    JOIN {items} i ON i.comanda_id = c.id
+    LEFT JOIN mesas m ON m.id = c.mesa_id
+    WHERE c.fecha >= ? AND c.fecha < DATE(?, '+1 day')
+    ORDER BY c.fecha, c.id, i.id
+'''
+
+CONSULTA_CANTIDAD = '''
+    SELECT COUNT(*)
+    FROM {comandas} c
+    JOIN {items} i ON i.comanda_id = c.id
+    WHERE c.fecha >= ? AND c.fecha < DATE(?, '+1 day')
+'''
+
+COLUMNAS_RESUMEN = ('Día', 'Comandas', 'Unidades', 'Importe')
+
+CONSULTA_RESUMEN = '''
+    SELECT dia, SUM(comandas), SUM(cantidad), SUM(importe)
+    FROM ventas_diarias_usuario
+    WHERE dia >= ? AND dia <= ?
+    GROUP BY dia
+    ORDER BY dia
+'''
+
+
+def iterar_filas(cursor, tamano_lote=TAMANO_LOTE):
+    """Recorre el resultado de un cursor por lotes de fetchmany"""
+    while True:
+        lote = cursor.fetchmany(tamano_lote)
+        if not lote:
+            return
+        yield from lote
+
+
+def exportar_excel(db_path, ruta, desde, hasta, progreso=None, tamano_lote=TAMANO_LOTE):
+    """Exporta comandas con sus items entre dos fechas (inclusive) a un archivo XLSX
+
+    Usa una hoja de sólo escritura de openpyxl, que vuelca cada fila al disco al
+    agregarla, y lee la base por lotes: la memoria no crece con la cantidad de filas.
+    progreso(escritas, total) se llama después de cada lote.
+    Devuelve la cantidad de filas de detalle exportadas.
+    """
+    openpyxl = cargar_openpyxl()
+    conn = base_datos.conectar(db_path)
+    try:
+        # Incluye comandas archivadas si el período llega a ellas
+        comandas, items = archivo.tablas_historial(conn, db_path, desde)
+        total = conn.execute(CONSULTA_CANTIDAD.format(comandas=comandas, items=items), (desde, hasta)).fetchone()[0]
+
+        libro = openpyxl.Workbook(write_only=True)
+
+        hoja_resumen = libro.create_sheet('Resumen diario')
+        hoja_resumen.append(COLUMNAS_RESUMEN)
+        for fila in conn.execute(CONSULTA_RESUMEN, (desde, hasta)):
+            hoja_resumen.append(fila)
+
+        hoja_detalle = libro.create_sheet('Detalle')
+        hoja_detalle.append(COLUMNAS_DETALLE)
+        cursor = conn.execute(CONSULTA_DETALLE.format(comandas=comandas, items=items), (desde, hasta))
+        escritas = 0
+        for fila in iterar_filas(cursor, tamano_lote):
+            hoja_detalle.append(fila)
+            escritas += 1
+            if progreso and escritas % tamano_lote == 0:
+                progreso(escritas, total)
+        if progreso:
+            progreso(escritas, total)
+
+        libro.save(ruta)
+        return escritas
+    finally:
+        conn.close()
+
+
+# ==================== EXPORTACIÓN INCREMENTAL ====================
+
+# Tablas exportables y las columnas que se vuelcan de cada una
+COLUMNAS_INCREMENTAL = {
+    'comandas': ('id', 'numero_comanda', 'mesa_id', 'fecha', 'usuario', 'total', 'estado', 'observaciones'),
+    'items_comanda': ('id', 'comanda_id', 'producto_nombre', 'cantidad', 'precio_unitario', 'observaciones'),
+}
+
+FORMATOS = ('csv', 'ndjson')
+
+
+def leer_marca(conn, tabla, formato):
+    """Último id exportado de la tabla en ese formato (0 si nunca se exportó)"""
+    fila = conn.execute(
+        "SELECT ultimo_id FROM exportaciones_marcas WHERE tabla = ? AND formato = ?",
+        (tabla, formato)
+    ).fetchone()
+    return fila[0] if fila else 0
+
+
+def guardar_marca(conn, tabla, formato, ultimo_id):
+    """Persiste hasta qué id se exportó la tabla"""
+    conn.execute('''
+        INSERT INTO exportaciones_marcas (tabla, formato, ultimo_id, fecha)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (tabla, formato) DO UPDATE SET ultimo_id = excluded.ultimo_id, fecha = excluded.fecha
+    ''', (tabla, formato, ultimo_id, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+    conn.commit()
+
+
+def filas_nuevas(conn, tabla, desde_id, tamano_lote=TAMANO_LOTE):
+    """Genera las filas de la tabla con id mayor a desde_id, en orden, por lotes"""
+    columnas = COLUMNAS_INCREMENTAL[tabla]
+    cursor = conn.execute(
+        f"SELECT {', '.join(columnas)} FROM {tabla} WHERE id > ? ORDER BY id",
+        (desde_id,)
+    )
+    yield from iterar_filas(cursor, tamano_lote)
+
+
+def _escribir_csv(archivo, columnas, filas):
+    escritor = csv.writer(archivo)
+    escritor.writerow(columnas)
+    for fila in filas:
+        escritor.writerow(fila)
+        yield fila
+
+
+def _escribir_ndjson(archivo, columnas, filas):
+    for fila in filas:
+        archivo.write(json.dumps(dict(zip(columnas, fila)), ensure_ascii=False))
+        archivo.write('\n')
+        yield fila
+
+
+def exportar_incremental(conn, tabla, formato, directorio, tamano_lote=TAMANO_LOTE):
+    """Vuelca a un archivo las filas nuevas desde la última exportación y avanza la marca
+
+    El archivo se escribe con un nombre temporal y se renombra al terminar; la marca
+    se actualiza recién entonces, así una corrida interrumpida se repite completa.
+    Devuelve (ruta, filas) o (None, 0) si no había filas nuevas.
+    """
+    if tabla not in COLUMNAS_INCREMENTAL:
+        raise ValueError(f"Tabla no exportable: {tabla}")
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no soportado: {formato}")
+
+    desde_id = leer_marca(conn, tabla, formato)
+    columnas = COLUMNAS_INCREMENTAL[tabla]
+    escribir = _escribir_csv if formato == 'csv' else _escribir_ndjson
+
+    os.makedirs(directorio, exist_ok=True)
+    nombre = f"{tabla}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_desde_{desde_id + 1}.{formato}"
+    ruta = os.path.join(directorio, nombre)
+    temporal = ruta + '.parcial'
+
+    filas = 0
+    ultimo_id = desde_id
+    try:
+        with open(temporal, 'w', encoding='utf-8', newline='') as archivo:
+            for fila in escribir(archivo, columnas, filas_nuevas(conn, tabla, desde_id, tamano_lote)):
+                filas += 1
+                ultimo_id = fila[0]
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+    if not filas:
+        os.remove(temporal)
+        return None, 0
+
+    os.replace(temporal, ruta)
+    guardar_marca(conn, tabla, formato, ultimo_id)
+    return ruta, filas
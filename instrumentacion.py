@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""Medición de consultas SQL: tiempos por sentencia, histograma y registro de consultas lentas"""
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+
+# Límites superiores (ms) de los intervalos del histograma
+LIMITES_HISTOGRAMA = (1, 5, 10, 50, 100, 500, 1000, float('inf'))
+
+_ARCHIVO_PROPIO = os.path.normcase(os.path.abspath(__file__))
+
+
+def _normalizar_sql(sql):
+    """Colapsa espacios para agrupar la misma sentencia escrita en varias líneas"""
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+def _etiqueta_llamador():
+    """Devuelve 'archivo:función:línea' del primer marco fuera de este módulo"""
+    marco = sys._getframe(2)
+    while marco and os.path.normcase(os.path.abspath(marco.f_code.co_filename)) == _ARCHIVO_PROPIO:
+        marco = marco.f_back
+    if not marco:
+        return 'desconocido'
+    return f"{os.path.basename(marco.f_code.co_filename)}:{marco.f_code.co_name}:{marco.f_lineno}"
+
+
+class EstadisticasConsultas:
+    """Acumula tiempos por sentencia y sitio de llamada; seguro entre hilos"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._datos = {}
+        self.umbral_lento_ms = 200
+        self.logger_lentas = logging.getLogger('comandas.consultas_lentas')
+        self.logger_lentas.propagate = False
+        self._ruta_log = None
+
+    def configurar(self, umbral_lento_ms=None, ruta_log=None, max_bytes=1024 * 1024, copias=5):
+        """Ajusta el umbral de consulta lenta y el archivo rotativo donde se registran"""
+        if umbral_lento_ms is not None:
+            self.umbral_lento_ms = umbral_lento_ms
+        if ruta_log and ruta_log != self._ruta_log:
+            try:
+                os.makedirs(os.path.dirname(ruta_log), exist_ok=True)
+                handler = RotatingFileHandler(ruta_log, maxBytes=max_bytes,
+                                              backupCount=copias, encoding='utf-8')
+                handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+                for anterior in list(self.logger_lentas.handlers):
+                    self.logger_lentas.removeHandler(anterior)
+                    anterior.close()
+                self.logger_lentas.addHandler(handler)
+                self.logger_lentas.setLevel(logging.INFO)
+                self._ruta_log = ruta_log
+            except OSError as e:
+                print(f"No se pudo abrir el registro de consultas lentas: {e}")
+
+    def _entrada(self, sql, etiqueta):
+        """Obtiene (creando si hace falta) el acumulador de la sentencia; requiere el lock"""
+        clave = (sql, etiqueta)
+        entrada = self._datos.get(clave)
+        if entrada is None:
+            entrada = {
+                'llamadas': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'filas': 0,
+                'histograma': [0] * len(LIMITES_HISTOGRAMA),
+            }
+            self._datos[clave] = entrada
+        return entrada
+
+    def registrar(self, sql, etiqueta, duracion_ms, filas):
+        """Registra una ejecución; devuelve la clave para sumar luego las filas leídas"""
+        sql = _normalizar_sql(sql)
+        with self._lock:
+            entrada = self._entrada(sql, etiqueta)
+            entrada['llamadas'] += 1
+            entrada['total_ms'] += duracion_ms
+            entrada['filas'] += max(filas, 0)
+            if duracion_ms > entrada['max_ms']:
+                entrada['max_ms'] = duracion_ms
+            for i, limite in enumerate(LIMITES_HISTOGRAMA):
+                if duracion_ms <= limite:
+                    entrada['histograma'][i] += 1
+                    break
+        if duracion_ms >= self.umbral_lento_ms:
+            self.logger_lentas.info("%.1f ms [%s] %s", duracion_ms, etiqueta, sql)
+        return (sql, etiqueta)
+
+    def agregar_lectura(self, clave, duracion_ms, filas):
+        """Suma al registro de una sentencia el tiempo y las filas de sus fetch"""
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return
+            entrada['total_ms'] += duracion_ms
+            entrada['filas'] += filas
+
+    def resumen(self):
+        """Lista de sentencias ordenada por tiempo total acumulado"""
+        with self._lock:
+            filas = [
+                {
+                    'sql': sql,
+                    'etiqueta': etiqueta,
+                    'llamadas': datos['llamadas'],
+                    'total_ms': round(datos['total_ms'], 3),
+                    'promedio_ms': round(datos['total_ms'] / datos['llamadas'], 3) if datos['llamadas'] else 0,
+                    'max_ms': round(datos['max_ms'], 3),
+                    'filas': datos['filas'],
+                    'histograma': dict(zip(
+                        [f"<={limite}ms" if limite != float('inf') else ">1000ms" for limite in LIMITES_HISTOGRAMA],
+                        datos['histograma']
+                    )),
+                }
+                for (sql, etiqueta), datos in self._datos.items()
+            ]
+        filas.sort(key=lambda fila: fila['total_ms'], reverse=True)
+        return filas
+
+    def volcar(self, ruta):
+        """Guarda el resumen en un archivo JSON"""
+        with open(ruta, 'w', encoding='utf-8') as archivo:
+            json.dump({
+                'fecha': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'umbral_lento_ms': self.umbral_lento_ms,
+                'consultas': self.resumen(),
+            }, archivo, indent=2, ensure_ascii=False)
+        return ruta
+
+    def reiniciar(self):
+        """Descarta todo lo acumulado"""
+        with self._lock:
+            self._datos.clear()
+
+
+# Instancia compartida por todas las conexiones del proceso
+estadisticas = EstadisticasConsultas()
+
+
+class CursorInstrumentado(sqlite3.Cursor):
+    """Cursor que mide cada execute y las lecturas posteriores"""
+
+    _clave_actual = None
+
+    def execute(self, sql, parameters=()):
+        etiqueta = _etiqueta_llamador()
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._clave_actual = estadisticas.registrar(
+                sql, etiqueta, (time.perf_counter() - inicio) * 1000, self.rowcount)
+
+    def executemany(self, sql, seq_of_parameters):
+        etiqueta = _etiqueta_llamador()
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._clave_actual = estadisticas.registrar(
+                sql, etiqueta, (time.perf_counter() - inicio) * 1000, self.rowcount)
+
+    def _medir_lectura(self, lectura, *args):
+        inicio = time.perf_counter()
+        resultado = lectura(*args)
+        if self._clave_actual:
+            if isinstance(resultado, list):
+                filas = len(resultado)
+            else:
+                filas = 0 if resultado is None else 1
+            estadisticas.agregar_lectura(self._clave_actual, (time.perf_counter() - inicio) * 1000, filas)
+        return resultado
+
+    def fetchone(self):
+        return self._medir_lectura(super().fetchone)
+
+    def fetchmany(self, size=None):
+        if size is None:
+            return self._medir_lectura(super().fetchmany)
+        return self._medir_lectura(super().fetchmany, size)
+
+    def fetchall(self):
+        return self._medir_lectura(super().fetchall)
+
+    def __next__(self):
+        return self._medir_lectura(super().__next__)
+
+
+class ConexionInstrumentada(sqlite3.Connection):
+    """Conexión cuyos cursores (incluidos los de conn.execute) quedan instrumentados"""
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or CursorInstrumentado)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""Ranking de productos más pedidos para la barra de acceso rápido
+
+El ranking se calcula fuera del hilo de la interfaz con una sola consulta
+agrupada por día, hora y producto sobre las últimas semanas. Cada día pesa
+menos cuanto más viejo es (vida media configurable), así un plato nuevo o de
+temporada sube rápido y uno que dejó de pedirse baja solo. Opcionalmente se
+arma además un ranking por hora del día (la hora y sus vecinas), para que al
+mediodía aparezcan los platos y a la tarde la cafetería.
+"""
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+
+import base_datos
+
+# Días de historial considerados y días en que una venta pierde la mitad de su peso
+DIAS_HISTORIAL = 28
+VIDA_MEDIA_DIAS = 7
+
+# Productos en la barra
+LIMITE = 12
+
+CONSULTA_VENTAS = '''
+    SELECT DATE(c.fecha) AS dia,
+           CAST(SUBSTR(c.fecha, 12, 2) AS INTEGER) AS hora,
+           i.producto_nombre,
+           SUM(i.cantidad)
+    FROM comandas c
+    JOIN items_comanda i ON i.comanda_id = c.id
+    WHERE c.fecha >= ? AND c.estado != 'Cancelada'
+    GROUP BY 1, 2, 3
+'''
+
+
+def _mejores(puntajes, limite):
+    """Nombres con mayor puntaje, desempatando por nombre"""
+    return [nombre for nombre, _ in sorted(puntajes.items(), key=lambda par: (-par[1], par[0]))[:limite]]
+
+
+class RankingMasVendidos:
+    """Ranking precalculado en memoria; refrescar() lo recalcula desde la base
+
+    refrescar() está pensado para correr en un hilo de fondo con su propia
+    conexión; el resultado se reemplaza de una sola vez, por lo que productos()
+    puede leerse desde la interfaz en cualquier momento.
+    """
+
+    def __init__(self, db_path, dias=DIAS_HISTORIAL, vida_media_dias=VIDA_MEDIA_DIAS,
+                 limite=LIMITE, por_hora=True):
+        self.db_path = db_path
+        self.dias = dias
+        self.vida_media_dias = vida_media_dias
+        self.limite = limite
+        self.por_hora = por_hora
+        self.actualizado = None
+        self.duracion_ms = None
+        # (productos por nombre, ranking general, ranking por hora)
+        self._datos = ({}, [], {})
+        self._hilo = None
+
+    def refrescar(self):
+        """Recalcula el ranking desde la base (bloqueante)"""
+        inicio = time.perf_counter()
+        hoy = datetime.now().date()
+        desde = (hoy - timedelta(days=self.dias)).strftime('%Y-%m-%d')
+        decaimiento = math.log(2) / self.vida_media_dias
+
+        conn = base_datos.conectar(self.db_path)
+        try:
+            ventas = conn.execute(CONSULTA_VENTAS, (desde,)).fetchall()
+            disponibles = {
+                producto[1]: producto
+                for producto in conn.execute("SELECT * FROM productos WHERE disponible = 1").fetchall()
+            }
+        finally:
+            conn.close()
+
+        general = {}
+        por_hora_producto = {}
+        for dia, hora, nombre, cantidad in ventas:
+            if nombre not in disponibles:
+                continue
+            edad = (hoy - datetime.strptime(dia, '%Y-%m-%d').date()).days
+            puntaje = cantidad * math.exp(-decaimiento * edad)
+            general[nombre] = general.get(nombre, 0.0) + puntaje
+            if self.por_hora:
+                por_hora_producto.setdefault(hora, {})
+                por_hora_producto[hora][nombre] = por_hora_producto[hora].get(nombre, 0.0) + puntaje
+
+        ranking_por_hora = {}
+        for hora in range(24):
+            # La hora y sus vecinas suavizan los cambios de turno
+            puntajes = {}
+            for vecina in ((hora - 1) % 24, hora, (hora + 1) % 24):
+                for nombre, puntaje in por_hora_producto.get(vecina, {}).items():
+                    puntajes[nombre] = puntajes.get(nombre, 0.0) + puntaje
+            if puntajes:
+                ranking_por_hora[hora] = _mejores(puntajes, self.limite)
+
+        self._datos = (disponibles, _mejores(general, self.limite), ranking_por_hora)
+        self.actualizado = datetime.now()
+        self.duracion_ms = (time.perf_counter() - inicio) * 1000
+
+    def refrescar_en_segundo_plano(self):
+        """Inicia refrescar() en un hilo si no hay otro en curso; devuelve el hilo"""
+        if self._hilo is None or not self._hilo.is_alive():
+            self._hilo = threading.Thread(target=self._refrescar_seguro, name='mas-vendidos', daemon=True)
+            self._hilo.start()
+        return self._hilo
+
+    def _refrescar_seguro(self):
+        try:
+            self.refrescar()
+        except Exception as e:
+            print(f"Error al calcular los productos más pedidos: {e}")
+
+    def en_curso(self):
+        """Indica si hay un refresco corriendo"""
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def productos(self, hora=None):
+        """Filas de productos del ranking, de la hora indicada si hay datos, si no el general
+
+        Si el ranking de la hora tiene pocos productos se completa con el general.
+        """
+        disponibles, general, ranking_por_hora = self._datos
+        nombres = list(ranking_por_hora.get(hora, [])) if hora is not None else []
+        for nombre in general:
+            if len(nombres) >= self.limite:
+                break
+            if nombre not in nombres:
+                nombres.append(nombre)
+        return [disponibles[nombre] for nombre in nombres if nombre in disponibles]
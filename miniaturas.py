@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""Miniaturas de las imágenes de productos
+
+Cada imagen se decodifica y achica una sola vez, en un hilo de fondo, y se
+guarda como PNG en una caché en disco cuyo nombre depende de la ruta, la fecha
+de modificación y el tamaño de la miniatura: si la imagen cambia se genera
+otra. En la interfaz se mantiene una cantidad fija de PhotoImage en un LRU
+compartido entre redibujos; mientras una miniatura no está lista se muestra un
+marcador gris. Tk lee PNG directamente, así que Pillow sólo se usa en los hilos.
+"""
+import hashlib
+import os
+import queue
+import tkinter as tk
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from dependencias import cargar_pil_image
+
+DIRECTORIO_CACHE = 'miniaturas'
+
+# Tamaño máximo de la miniatura (ancho, alto) en píxeles
+TAMANO = (120, 80)
+
+# PhotoImage conservadas en memoria; con 120x80 son unos 40 KB cada una
+CAPACIDAD = 64
+
+# Archivos de la caché en disco que se conservan al podarla
+MAXIMO_ARCHIVOS = 2000
+
+HILOS = 2
+
+
+def clave_imagen(ruta_imagen, tamano=TAMANO):
+    """Clave de caché: ruta absoluta, fecha de modificación y tamaño; None si no existe"""
+    try:
+        estado = os.stat(ruta_imagen)
+    except OSError:
+        return None
+    return (os.path.abspath(ruta_imagen), estado.st_mtime_ns, estado.st_size, tamano)
+
+
+def ruta_miniatura(directorio_cache, clave):
+    """Archivo PNG de la caché para una clave"""
+    resumen = hashlib.sha1(repr(clave).encode('utf-8')).hexdigest()
+    return os.path.join(directorio_cache, f"{resumen}.png")
+
+
+def generar_miniatura(ruta_imagen, directorio_cache, clave):
+    """Devuelve la ruta de la miniatura, generándola si no está en la caché"""
+    destino = ruta_miniatura(directorio_cache, clave)
+    if os.path.exists(destino):
+        # La fecha de modificación marca el último uso para podar_cache
+        os.utime(destino)
+        return destino
+
+    Image = cargar_pil_image()
+    tamano = clave[3]
+    with Image.open(ruta_imagen) as imagen:
+        # En JPEG draft decodifica directamente a una escala menor
+        imagen.draft('RGB', tamano)
+        imagen = imagen.convert('RGBA')
+        imagen.thumbnail(tamano, Image.LANCZOS)
+        os.makedirs(directorio_cache, exist_ok=True)
+        temporal = f"{destino}.{os.getpid()}.parcial"
+        imagen.save(temporal, 'PNG')
+    os.replace(temporal, destino)
+    return destino
+
+
+def podar_cache(directorio_cache, maximo=MAXIMO_ARCHIVOS):
+    """Borra las miniaturas usadas hace más tiempo si la caché superó el máximo"""
+    try:
+        archivos = [os.path.join(directorio_cache, nombre) for nombre in os.listdir(directorio_cache)]
+    except OSError:
+        return 0
+    if len(archivos) <= maximo:
+        return 0
+    archivos.sort(key=os.path.getmtime, reverse=True)
+    borrados = 0
+    for ruta in archivos[maximo:]:
+        try:
+            os.remove(ruta)
+            borrados += 1
+        except OSError:
+            pass
+    return borrados
+
+
+class CacheMiniaturas:
+    """LRU de PhotoImage con decodificación en hilos de fondo
+
+    Debe usarse desde el hilo de Tk. obtener() devuelve la imagen si ya está en
+    memoria o un marcador, y llama a al_cargar(foto) cuando la miniatura esté lista.
+    La memoria queda acotada por CAPACIDAD más las imágenes que estén a la vista
+    (cada etiqueta guarda una referencia a la suya mientras existe).
+    """
+
+    def __init__(self, root, directorio_cache, tamano=TAMANO, capacidad=CAPACIDAD, hilos=HILOS):
+        self.root = root
+        self.directorio_cache = directorio_cache
+        self.tamano = tamano
+        self.capacidad = capacidad
+        self._fotos = OrderedDict()
+        self._pendientes = {}
+        self._terminadas = queue.Queue()
+        self._sondeo = None
+        self._ejecutor = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='miniaturas')
+        self.marcador = tk.PhotoImage(master=root, width=tamano[0], height=tamano[1])
+        self.marcador.put('#566573', to=(0, 0, tamano[0], tamano[1]))
+        self._ejecutor.submit(podar_cache, directorio_cache)
+
+    def obtener(self, ruta_imagen, al_cargar):
+        """PhotoImage de la miniatura, o el marcador mientras se genera (None si no hay imagen)"""
+        clave = clave_imagen(ruta_imagen, self.tamano)
+        if clave is None:
+            return None
+        foto = self._fotos.get(clave)
+        if foto is not None:
+            self._fotos.move_to_end(clave)
+            return foto
+
+        if clave in self._pendientes:
+            self._pendientes[clave].append(al_cargar)
+        else:
+            self._pendientes[clave] = [al_cargar]
+            self._ejecutor.submit(self._generar, ruta_imagen, clave)
+            if self._sondeo is None:
+                self._sondeo = self.root.after(50, self._recibir)
+        return self.marcador
+
+    def _generar(self, ruta_imagen, clave):
+        """Corre en un hilo del ejecutor: deja (clave, ruta PNG o None) en la cola"""
+        try:
+            self._terminadas.put((clave, generar_miniatura(ruta_imagen, self.directorio_cache, clave)))
+        except Exception as e:
+            print(f"No se pudo generar la miniatura de {ruta_imagen}: {e}")
+            self._terminadas.put((clave, None))
+
+    def _recibir(self):
+        """Crea en el hilo de Tk las PhotoImage de las miniaturas terminadas"""
+        self._sondeo = None
+        while True:
+            try:
+                clave, ruta_png = self._terminadas.get_nowait()
+            except queue.Empty:
+                break
+            callbacks = self._pendientes.pop(clave, [])
+            if ruta_png is None:
+                continue
+            try:
+                foto = tk.PhotoImage(master=self.root, file=ruta_png)
+            except tk.TclError as e:
+                print(f"No se pudo cargar la miniatura {ruta_png}: {e}")
+                continue
+            self._fotos[clave] = foto
+            while len(self._fotos) > self.capacidad:
+                self._fotos.popitem(last=False)
+            for al_cargar in callbacks:
+                al_cargar(foto)
+        if self._pendientes:
+            self._sondeo = self.root.after(50, self._recibir)
+
+    def cerrar(self):
+        """Detiene los hilos sin esperar las miniaturas pendientes"""
+        if self._sondeo is not None:
+            self.root.after_cancel(self._sondeo)
+            self._sondeo = None
+        self._ejecutor.shutdown(wait=False, cancel_futures=True)
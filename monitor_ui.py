@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""Monitor de bloqueos del bucle de eventos de Tk ("la pantalla se congela")"""
+import logging
+import os
+import sys
+import threading
+import time
+from logging.handlers import RotatingFileHandler
+
+_DIRECTORIO_APP = os.path.normcase(os.path.dirname(os.path.abspath(__file__)))
+_ARCHIVO_PROPIO = os.path.normcase(os.path.abspath(__file__))
+
+# Clases cuyos métodos Tk llama como manejadores de eventos y de root.after
+CLASES_MANEJADORAS = ('SistemaComandas', 'PantallaCocina')
+
+
+def _es_codigo_app(codigo):
+    """Indica si el código pertenece a la aplicación (y no a tkinter o la librería estándar)"""
+    ruta = os.path.normcase(os.path.abspath(codigo.co_filename))
+    return os.path.dirname(ruta) == _DIRECTORIO_APP and ruta != _ARCHIVO_PROPIO
+
+
+def _nombre_funcion(codigo):
+    """Nombre calificado de la función cuando el intérprete lo soporta"""
+    return getattr(codigo, 'co_qualname', codigo.co_name)
+
+
+def _manejador(cadena):
+    """Manejador al que se atribuye un bloqueo, a partir de la cadena de funciones de la aplicación
+
+    El <module> de sistema-comandas.py (donde corre root.mainloop) está en todas
+    las muestras y no cuenta. Se toma el primer método de una de las
+    CLASES_MANEJADORAS; si no hay (intérprete sin co_qualname), la primera
+    función que no sea una lambda o un closure de binding.
+    """
+    funciones = [funcion for _, funcion, _ in cadena if funcion != '<module>']
+    for funcion in funciones:
+        clase, _, metodo = funcion.partition('.')
+        if clase in CLASES_MANEJADORAS and metodo and '.' not in metodo:
+            return metodo
+    for funcion in funciones:
+        if '<lambda>' not in funcion and '<locals>' not in funcion:
+            return funcion.rsplit('.', 1)[-1]
+    return funciones[0] if funciones else 'fuera de la aplicación'
+
+
+class MonitorLatenciaUI:
+    """Mide el retraso de latidos periódicos de root.after y muestrea el hilo principal cuando se bloquea"""
+
+    def __init__(self, root, intervalo_ms=50, umbral_ms=250, ruta_log=None):
+        self.root = root
+        self.intervalo_ms = intervalo_ms
+        self.umbral_ms = umbral_ms
+        self.hilo_principal = threading.get_ident()
+        self.bloqueos = {}
+        self._lock = threading.Lock()
+        self._ultimo_latido = None
+        self._muestra = None
+        self._activo = False
+        self._id_after = None
+
+        self.logger = logging.getLogger('comandas.monitor_ui')
+        self.logger.propagate = False
+        if ruta_log and not self.logger.handlers:
+            try:
+                os.makedirs(os.path.dirname(ruta_log), exist_ok=True)
+                handler = RotatingFileHandler(ruta_log, maxBytes=512 * 1024, backupCount=3, encoding='utf-8')
+                handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+                self.logger.addHandler(handler)
+                self.logger.setLevel(logging.INFO)
+            except OSError as e:
+                print(f"No se pudo abrir el registro de bloqueos de UI: {e}")
+
+    def iniciar(self):
+        """Comienza a medir cuando arranque el bucle de eventos"""
+        if self._activo:
+            return
+        self._activo = True
+        # El primer latido llega recién con mainloop, así la construcción inicial no cuenta como bloqueo
+        self._id_after = self.root.after(0, self._primer_latido)
+
+    def detener(self):
+        """Detiene los latidos y el hilo vigilante"""
+        self._activo = False
+        if self._id_after:
+            try:
+                self.root.after_cancel(self._id_after)
+            except Exception:
+                pass
+            self._id_after = None
+
+    def _primer_latido(self):
+        self._ultimo_latido = time.perf_counter()
+        threading.Thread(target=self._vigilar, name='monitor-ui', daemon=True).start()
+        self._id_after = self.root.after(self.intervalo_ms, self._latido)
+
+    def _latido(self):
+        """Se ejecuta en el hilo de Tk; calcula cuánto se atrasó respecto de lo programado"""
+        if not self._activo:
+            return
+        ahora = time.perf_counter()
+        retraso_ms = (ahora - self._ultimo_latido) * 1000 - self.intervalo_ms
+        with self._lock:
+            muestra = self._muestra
+            self._muestra = None
+            self._ultimo_latido = ahora
+        if muestra is not None and retraso_ms >= self.umbral_ms:
+            self._registrar_bloqueo(muestra, retraso_ms)
+        self._id_after = self.root.after(self.intervalo_ms, self._latido)
+
+    def _vigilar(self):
+        """Hilo secundario: si el latido no llega a tiempo, toma una muestra de la pila del hilo principal"""
+        espera = max(self.intervalo_ms, self.umbral_ms) / 1000.0 / 2
+        while self._activo:
+            time.sleep(espera)
+            with self._lock:
+                if self._muestra is not None or self._ultimo_latido is None:
+                    continue
+                atraso_ms = (time.perf_counter() - self._ultimo_latido) * 1000 - self.intervalo_ms
+                if atraso_ms < self.umbral_ms:
+                    continue
+            marco = sys._current_frames().get(self.hilo_principal)
+            if marco is None:
+                continue
+            muestra = self._cadena_app(marco)
+            with self._lock:
+                self._muestra = muestra
+
+    def _cadena_app(self, marco):
+        """Funciones de la aplicación en la pila, desde el manejador externo hacia adentro"""
+        cadena = []
+        while marco is not None:
+            codigo = marco.f_code
+            if _es_codigo_app(codigo):
+                cadena.append((os.path.basename(codigo.co_filename), _nombre_funcion(codigo), marco.f_lineno))
+            marco = marco.f_back
+        cadena.reverse()
+        return cadena
+
+    def _registrar_bloqueo(self, cadena, duracion_ms):
+        """Acumula el bloqueo bajo el manejador que lo originó y lo escribe en el registro"""
+        manejador = _manejador(cadena)
+
+        with self._lock:
+            datos = self.bloqueos.setdefault(manejador, {'cantidad': 0, 'total_ms': 0.0, 'peor_ms': 0.0})
+            datos['cantidad'] += 1
+            datos['total_ms'] += duracion_ms
+            datos['peor_ms'] = max(datos['peor_ms'], duracion_ms)
+
+        detalle = ' > '.join(f"{funcion} ({archivo}:{linea})" for archivo, funcion, linea in cadena)
+        self.logger.info("Bloqueo de %.0f ms en %s: %s", duracion_ms, manejador, detalle or 'sin código de la aplicación')
+
+    def resumen(self):
+        """Bloqueos por manejador ordenados por el peor caso"""
+        with self._lock:
+            filas = [dict(manejador=manejador, **datos) for manejador, datos in self.bloqueos.items()]
+        filas.sort(key=lambda fila: fila['peor_ms'], reverse=True)
+        return filas
@@ -0,0 +1,894 @@
+# -*- coding: utf-8 -*-
+"""Motor de comandas: lógica de negocio sin dependencias de interfaz gráfica"""
+import os
+import sqlite3
+from datetime import datetime, timedelta
+
+import base_datos
+import busqueda
+import cuentas
+import instrumentacion
+import ventas_diarias
+
+class ConfigManager:
+    """Gestor de configuraciones del sistema"""
+    
+    def __init__(self, cursor, conn):
+        self.cursor = cursor
+        self.conn = conn
+        self.configuraciones_por_defecto = {
+            'usar_mesas': {'valor': 'true', 'descripcion': 'Habilitar funcionalidad de mesas', 'tipo': 'boolean'},
+            'usar_categorias': {'valor': 'true', 'descripcion': 'Habilitar categorías de productos', 'tipo': 'boolean'},
+            'usar_observaciones': {'valor': 'true', 'descripcion': 'Permitir observaciones en comandas', 'tipo': 'boolean'},
+            'generar_tickets': {'valor': 'true', 'descripcion': 'Generar tickets PDF automáticamente', 'tipo': 'boolean'},
+            'nombre_negocio': {'valor': 'Restaurante', 'descripcion': 'Nombre del negocio', 'tipo': 'string'},
+            'moneda': {'valor': '$', 'descripcion': 'Símbolo de moneda', 'tipo': 'string'},
+            'actualizacion_automatica': {'valor': 'true', 'descripcion': 'Actualización automática de mesas', 'tipo': 'boolean'},
+            'mostrar_precios_menu': {'valor': 'true', 'descripcion': 'Mostrar precios en el menú de productos', 'tipo': 'boolean'},
+            'permitir_comandas_sin_mesa': {'valor': 'false', 'descripcion': 'Permitir comandas sin asignar mesa', 'tipo': 'boolean'},
+            'mostrar_control_comandas': {'valor': 'true', 'descripcion': 'Mostrar pestaña de control de comandas y estados', 'tipo': 'boolean'},
+            'usar_sistema_usuarios': {'valor': 'true', 'descripcion': 'Habilitar sistema de usuarios y login', 'tipo': 'boolean'},
+            'usuario_predeterminado': {'valor': 'admin', 'descripcion': 'Usuario predeterminado cuando el login está desactivado', 'tipo': 'string'},
+            'cambio_rapido_usuario': {'valor': 'true', 'descripcion': 'Conservar la interfaz cargada al cambiar de usuario', 'tipo': 'boolean'},
+            'umbral_consulta_lenta_ms': {'valor': '200', 'descripcion': 'Registrar consultas SQL más lentas que (ms)', 'tipo': 'integer'},
+            'monitor_bloqueos_ui': {'valor': 'true', 'descripcion': 'Registrar bloqueos de la pantalla', 'tipo': 'boolean'},
+            'umbral_bloqueo_ui_ms': {'valor': '250', 'descripcion': 'Considerar bloqueo una pausa mayor a (ms)', 'tipo': 'integer'},
+            'liberar_pestanas_inactivas': {'valor': 'false', 'descripcion': 'Liberar memoria de pestañas de administración sin uso', 'tipo': 'boolean'},
+            'minutos_liberar_pestanas': {'valor': '10', 'descripcion': 'Minutos sin uso antes de liberar una pestaña', 'tipo': 'integer'},
+            'dias_retencion_comandas': {'valor': '0', 'descripcion': 'Archivar comandas cerradas con más días que (0 = nunca)', 'tipo': 'integer'},
+            'respaldo_automatico': {'valor': 'true', 'descripcion': 'Respaldar la base de datos automáticamente', 'tipo': 'boolean'},
+            'horas_entre_respaldos': {'valor': '24', 'descripcion': 'Horas entre respaldos automáticos', 'tipo': 'integer'},
+            'respaldos_a_conservar': {'valor': '7', 'descripcion': 'Cantidad de respaldos que se conservan', 'tipo': 'integer'},
+            'busqueda_fts5': {'valor': 'false', 'descripcion': 'Buscar productos con SQLite FTS5 (menús muy grandes)', 'tipo': 'boolean'},
+            'mostrar_mas_vendidos': {'valor': 'true', 'descripcion': 'Mostrar barra de productos más pedidos', 'tipo': 'boolean'},
+            'mas_vendidos_por_hora': {'valor': 'true', 'descripcion': 'Más pedidos según la hora del día', 'tipo': 'boolean'},
+            'minutos_actualizar_mas_vendidos': {'valor': '15', 'descripcion': 'Minutos entre actualizaciones de los más pedidos', 'tipo': 'integer'},
+            'mostrar_imagenes_productos': {'valor': 'true', 'descripcion': 'Mostrar imágenes en los botones de productos', 'tipo': 'boolean'},
+            'minutos_alerta_cocina': {'valor': '10', 'descripcion': 'Minutos de espera para marcar una comanda en alerta en cocina', 'tipo': 'integer'},
+            'minutos_demora_cocina': {'valor': '20', 'descripcion': 'Minutos de espera para marcar una comanda demorada en cocina', 'tipo': 'integer'},
+            'tickets_por_estacion': {'valor': 'false', 'descripcion': 'Generar además un ticket por estación de preparación', 'tipo': 'boolean'},
+            'servidor_api': {'valor': 'false', 'descripcion': 'Atender la API HTTP para handhelds desde esta terminal', 'tipo': 'boolean'},
+            'puerto_servidor_api': {'valor': '8080', 'descripcion': 'Puerto de la API HTTP para handhelds', 'tipo': 'integer'},
+            'puerto_eventos_api': {'valor': '8081', 'descripcion': 'Puerto del flujo de eventos (SSE) para handhelds y pantallas', 'tipo': 'integer'},
+            'milisegundos_guardar_borrador': {'valor': '500', 'descripcion': 'Intervalo mínimo entre guardados del borrador de la comanda (ms)', 'tipo': 'integer'},
+            'horas_cuenta_inactiva': {'valor': '4', 'descripcion': 'Horas sin rondas para que una mesa libre empiece una cuenta nueva', 'tipo': 'integer'}
+        }
+        self.inicializar_configuraciones()
+    
+    def inicializar_configuraciones(self):
+        """Inicializa las configuraciones por defecto si no existen"""
+        # Una sola lectura de las claves existentes en lugar de una consulta por clave
+        self.cursor.execute("SELECT clave FROM configuracion")
+        existentes = {fila[0] for fila in self.cursor.fetchall()}
+        faltantes = [
+            (clave, config['valor'], config['descripcion'], config['tipo'])
+            for clave, config in self.configuraciones_por_defecto.items()
+            if clave not in existentes
+        ]
+        if faltantes:
+            # No existen, crear con valor por defecto
+            self.cursor.executemany('''
+                INSERT INTO configuracion (clave, valor, descripcion, tipo)
+                VALUES (?, ?, ?, ?)
+            ''', faltantes)
+            self.conn.commit()
+    
+    def get(self, clave, valor_por_defecto=None):
+        """Obtiene el valor de una configuración"""
+        try:
+            self.cursor.execute("SELECT valor, tipo FROM configuracion WHERE clave = ?", (clave,))
+            resultado = self.cursor.fetchone()
+            
+            if resultado:
+                valor, tipo = resultado
+                # Convertir según el tipo
+                if tipo == 'boolean':
+                    return valor.lower() in ('true', '1', 'si', 'yes', 'on')
+                elif tipo == 'integer':
+                    return int(valor)
+                elif tipo == 'float':
+                    return float(valor)
+                else:
+                    return valor
+            else:
+                return valor_por_defecto
+        except Exception as e:
+            print(f"Error al obtener configuración {clave}: {e}")
+            return valor_por_defecto
+    
+    def set(self, clave, valor, descripcion=None):
+        """Establece el valor de una configuración"""
+        try:
+            # Convertir valor a string para almacenamiento
+            valor_str = str(valor).lower() if isinstance(valor, bool) else str(valor)
+            
+            # Verificar si existe la configuración
+            self.cursor.execute("SELECT id FROM configuracion WHERE clave = ?", (clave,))
+            if self.cursor.fetchone():
+                # Actualizar
+                self.cursor.execute('''
+                    UPDATE configuracion 
+                    SET valor = ?, fecha_modificacion = CURRENT_TIMESTAMP
+                    WHERE clave = ?
+                ''', (valor_str, clave))
+            else:
+                # Crear nueva
+                tipo = 'boolean' if isinstance(valor, bool) else 'string'
+                self.cursor.execute('''
+                    INSERT INTO configuracion (clave, valor, descripcion, tipo)
+                    VALUES (?, ?, ?, ?)
+                ''', (clave, valor_str, descripcion or f'Configuración {clave}', tipo))
+            
+            self.conn.commit()
+            return True
+        except Exception as e:
+            print(f"Error al establecer configuración {clave}: {e}")
+            return False
+    
+    def get_all(self):
+        """Obtiene todas las configuraciones"""
+        try:
+            self.cursor.execute('''
+                SELECT clave, valor, descripcion, tipo 
+                FROM configuracion 
+                ORDER BY clave
+            ''')
+            configuraciones = {}
+            for clave, valor, descripcion, tipo in self.cursor.fetchall():
+                configuraciones[clave] = {
+                    'valor': self.get(clave),  # Usar get() para conversión de tipo
+                    'valor_raw': valor,
+                    'descripcion': descripcion,
+                    'tipo': tipo
+                }
+            return configuraciones
+        except Exception as e:
+            print(f"Error al obtener todas las configuraciones: {e}")
+            return {}
+
+class ComandaError(Exception):
+    """Error de negocio que debe informarse al usuario"""
+    
+    def __init__(self, mensaje, titulo="Error"):
+        super().__init__(mensaje)
+        self.titulo = titulo
+
+
+class OrderEngine:
+    """Opera comandas, mesas y numeración directamente sobre la base de datos"""
+    
+    ESTADOS_ACTIVOS = ('Pendiente', 'En preparación')
+    
+    # Estaciones de preparación; los productos sin estación van a la primera
+    ESTACIONES = ('Cocina', 'Parrilla', 'Bar', 'Cafetería')
+    
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = base_datos.conectar(db_path)
+        self.cursor = self.conn.cursor()
+        base_datos.init_database(self.conn)
+        self.config = ConfigManager(self.cursor, self.conn)
+        
+        # Índice de búsqueda de productos, creado en la primera búsqueda
+        self._indice_productos = None
+        
+        # Registro rotativo de consultas lentas junto a la base de datos
+        instrumentacion.estadisticas.configurar(
+            umbral_lento_ms=self.config.get('umbral_consulta_lenta_ms', 200),
+            ruta_log=os.path.join(os.path.dirname(os.path.abspath(db_path)), 'logs', 'consultas_lentas.log')
+        )
+    
+    def cerrar(self):
+        """Cierra la conexión a la base de datos"""
+        self.conn.close()
+    
+    def reconectar(self):
+        """Abre una conexión nueva (después de un corte del recurso compartido)"""
+        try:
+            self.conn.close()
+        except sqlite3.Error:
+            pass
+        self.conn = base_datos.conectar(self.db_path)
+        self.cursor = self.conn.cursor()
+        self.config.conn = self.conn
+        self.config.cursor = self.cursor
+    
+    def _iniciar_escritura(self):
+        """Toma el bloqueo de escritura para que la numeración sea consistente entre terminales"""
+        if not self.conn.in_transaction:
+            self.conn.execute("BEGIN IMMEDIATE")
+    
+    # ==================== COMANDA EN CURSO ====================
+    
+    def requiere_mesa(self):
+        """Indica si la configuración exige seleccionar mesa antes de cargar productos"""
+        return (self.config.get('usar_mesas', True) and
+                not self.config.get('permitir_comandas_sin_mesa', False))
+    
+    def agregar_item(self, items, producto, mesa=None):
+        """Agrega un producto (fila de productos) a la lista de items en curso"""
+        if self.requiere_mesa() and not mesa:
+            raise ComandaError("Primero selecciona una mesa", "Mesa")
+        
+        # Verificar si ya está en la comanda
+        for item in items:
+            if item['id'] == producto[0]:
+                item['cantidad'] += 1
+                return item
+        
+        # Agregar nuevo item
+        item = {
+            'id': producto[0],
+            'nombre': producto[1],
+            'precio': producto[2],
+            'cantidad': 1,
+            'categoria': producto[3]
+        }
+        items.append(item)
+        return item
+    
+    def quitar_item(self, items, indice):
+        """Quita una unidad del item indicado, eliminándolo si era la última"""
+        item = items[indice]
+        if item['cantidad'] > 1:
+            item['cantidad'] -= 1
+        else:
+            del items[indice]
+    
+    def calcular_total(self, items):
+        """Calcula el total de una lista de items"""
+        return sum(item['precio'] * item['cantidad'] for item in items)
+    
+    def obtener_siguiente_numero_ticket(self):
+        """Obtiene el siguiente número de ticket secuencial (01-99)"""
+        try:
+            # Buscar el último número de ticket usado hoy
+            self.cursor.execute('''
+                SELECT MAX(CAST(SUBSTR(numero_comanda, -2) AS INTEGER)) as ultimo_numero
+                FROM comandas 
+                WHERE numero_comanda LIKE '%-%__'
+                AND DATE(fecha) = DATE('now')
+            ''')
+            resultado = self.cursor.fetchone()
+            ultimo_numero = resultado[0] if resultado and resultado[0] else 0
+            
+            # Incrementar y resetear a 01 si llega a 100
+            siguiente_numero = (ultimo_numero + 1) % 100
+            if siguiente_numero == 0:
+                siguiente_numero = 1
+                
+            return f"{siguiente_numero:02d}"  # Formato 01, 02, ..., 99
+        except Exception as e:
+            print(f"Error al obtener número de ticket: {e}")
+            # Fallback: usar timestamp
+            return datetime.now().strftime("%S")
+    
+    def validar_comanda(self, items, mesa):
+        """Verifica que la comanda se pueda enviar; devuelve la mesa a usar (None sin mesas)"""
+        if not items:
+            raise ComandaError("La comanda está vacía", "Comanda Vacía")
+        
+        # Validación de mesa según configuración
+        usar_mesas = self.config.get('usar_mesas', True)
+        if usar_mesas and not mesa and not self.config.get('permitir_comandas_sin_mesa', False):
+            raise ComandaError("Selecciona una mesa", "Mesa")
+        elif not usar_mesas:
+            # En modo sin mesas, no requerimos mesa
+            mesa = None
+        return mesa
+    
+    def registrar_comanda(self, items, mesa, usuario, observaciones="", id_cliente=None, fecha_terminal=None):
+        """Guarda la comanda con sus items y marca la mesa como ocupada
+
+        id_cliente es el identificador que generó la terminal (diario local):
+        si ya hay una comanda con ese id no se vuelve a guardar y se devuelve
+        esa, con 'repetida' en True. fecha_terminal es la hora en que se tomó.
+        """
+        mesa = self.validar_comanda(items, mesa)
+        total = self.calcular_total(items)
+        mesa_id = mesa[0] if mesa else None
+        
+        try:
+            self._iniciar_escritura()
+            
+            if id_cliente:
+                existente = self._comanda_por_id_cliente(id_cliente)
+                if existente:
+                    self.conn.rollback()
+                    return existente
+            
+            # Generar número de comanda con número secuencial
+            fecha_actual = datetime.now()
+            numero_ticket = self.obtener_siguiente_numero_ticket()
+            numero_comanda = f"CMD-{fecha_actual.strftime('%Y%m%d')}-{numero_ticket}"
+            fecha = fecha_actual.strftime('%Y-%m-%d %H:%M:%S')
+            
+            # Cada ronda se suma a la cuenta abierta de la mesa
+            cuenta_id = cuentas.abrir(
+                self.cursor, mesa_id, fecha, self.config.get('horas_cuenta_inactiva', cuentas.HORAS_INACTIVIDAD)
+            ) if mesa_id else None
+            
+            # Guardar comanda
+            self.cursor.execute('''
+                INSERT INTO comandas (numero_comanda, mesa_id, fecha, usuario, total, estado, observaciones,
+                                      id_cliente, fecha_terminal, cuenta_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (numero_comanda, mesa_id, fecha, usuario, total, 'Pendiente', observaciones,
+                  id_cliente, fecha_terminal, cuenta_id))
+            
+            comanda_id = self.cursor.lastrowid
+            
+            # Guardar items de la comanda; cada uno entra en la cola de la estación de su producto
+            self.cursor.executemany('''
+                INSERT INTO items_comanda (comanda_id, producto_nombre, cantidad, precio_unitario, estacion)
+                VALUES (?, ?, ?, ?, COALESCE((SELECT estacion FROM productos WHERE id = ?), ?))
+            ''', [
+                (comanda_id, item['nombre'], item['cantidad'], item['precio'], item['id'], self.ESTACIONES[0])
+                for item in items
+            ])
+            
+            # Marcar mesa como ocupada
+            if mesa_id:
+                self.cursor.execute('''
+                    UPDATE mesas SET estado = 'ocupada' WHERE id = ?
+                ''', (mesa_id,))
+            
+            ventas_diarias.aplicar_transicion(self.cursor, comanda_id, None, 'Pendiente')
+            cuentas.aplicar_transicion(self.cursor, comanda_id, None, 'Pendiente')
+            self._registrar_evento(comanda_id, 'creada', 'Pendiente')
+            
+            self.conn.commit()
+        except sqlite3.IntegrityError:
+            self.conn.rollback()
+            # Otra terminal guardó el mismo id_cliente entre la consulta y el INSERT
+            existente = self._comanda_por_id_cliente(id_cliente) if id_cliente else None
+            if not existente:
+                raise
+            return existente
+        except Exception:
+            self.conn.rollback()
+            raise
+        
+        return {
+            'id': comanda_id,
+            'numero_comanda': numero_comanda,
+            'total': total,
+            'mesa_id': mesa_id,
+            'mesa_nombre': mesa[1] if mesa else None,
+            'observaciones': observaciones,
+            'cuenta_id': cuenta_id,
+            'repetida': False
+        }
+    
+    def _comanda_por_id_cliente(self, id_cliente):
+        """Comanda ya registrada con ese id de terminal, en el formato de registrar_comanda, o None"""
+        self.cursor.execute('''
+            SELECT c.id, c.numero_comanda, c.total, c.mesa_id, m.nombre, c.observaciones, c.cuenta_id
+            FROM comandas c LEFT JOIN mesas m ON m.id = c.mesa_id
+            WHERE c.id_cliente = ?
+        ''', (id_cliente,))
+        fila = self.cursor.fetchone()
+        if not fila:
+            return None
+        return {
+            'id': fila[0],
+            'numero_comanda': fila[1],
+            'total': fila[2],
+            'mesa_id': fila[3],
+            'mesa_nombre': fila[4],
+            'observaciones': fila[5] or '',
+            'cuenta_id': fila[6],
+            'repetida': True
+        }
+    
+    # ==================== TRANSICIONES DE ESTADO ====================
+    
+    def _registrar_evento(self, comanda_id, tipo, estado):
+        """Anota el cambio en eventos dentro de la transacción en curso; no hace commit"""
+        self.cursor.execute(
+            "INSERT INTO eventos (comanda_id, tipo, estado, fecha) VALUES (?, ?, ?, ?)",
+            (comanda_id, tipo, estado, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        )
+    
+    def _buscar_comanda(self, numero_comanda):
+        """Devuelve (id, mesa_id, estado) de la comanda o lanza ComandaError"""
+        # La numeración vuelve a 01 después de 99: ante números repetidos se toma la
+        # comanda abierta más reciente
+        self.cursor.execute(f'''
+            SELECT id, mesa_id, estado FROM comandas WHERE numero_comanda = ?
+            ORDER BY estado IN ({','.join('?' * len(self.ESTADOS_ACTIVOS))}) DESC, id DESC
+            LIMIT 1
+        ''', (numero_comanda,) + self.ESTADOS_ACTIVOS)
+        resultado = self.cursor.fetchone()
+        if not resultado:
+            raise ComandaError("No se pudo encontrar la comanda")
+        return resultado
+    
+    def _cambiar_estado(self, numero_comanda, estado_nuevo):
+        """Cambia el estado de la comanda y ajusta los resúmenes diarios; no hace commit
+
+        Sólo una comanda activa puede completarse o cancelarse. El estado se lee
+        dentro de la transacción de escritura, así otra terminal no puede
+        cerrarla entre la verificación y el cambio.
+        """
+        comanda_id, mesa_id, estado_anterior = self._buscar_comanda(numero_comanda)
+        if estado_anterior not in self.ESTADOS_ACTIVOS:
+            raise ComandaError(f"La comanda {numero_comanda} ya está {estado_anterior.lower()}", "Comanda Cerrada")
+        self.cursor.execute("UPDATE comandas SET estado = ? WHERE id = ?", (estado_nuevo, comanda_id))
+        ventas_diarias.aplicar_transicion(self.cursor, comanda_id, estado_anterior, estado_nuevo)
+        cuentas.aplicar_transicion(self.cursor, comanda_id, estado_anterior, estado_nuevo)
+        if estado_nuevo not in self.ESTADOS_ACTIVOS:
+            # Una comanda cerrada sale de todas las colas de estación
+            self.cursor.execute(
+                "UPDATE items_comanda SET listo = ? WHERE comanda_id = ? AND listo IS NULL",
+                (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), comanda_id)
+            )
+        self._registrar_evento(comanda_id, 'estado', estado_nuevo)
+        return comanda_id, mesa_id
+    
+    def completar_comanda(self, numero_comanda):
+        """Marca la comanda como completada y libera la mesa si ya no tiene comandas activas"""
+        try:
+            self._iniciar_escritura()
+            comanda_id, mesa_id = self._cambiar_estado(numero_comanda, 'Completada')
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        
+        mesa_liberada = self.liberar_mesa_si_completada(mesa_id) if mesa_id else False
+        return {'comanda_id': comanda_id, 'mesa_id': mesa_id, 'mesa_liberada': mesa_liberada}
+    
+    def cancelar_comanda(self, numero_comanda):
+        """Cancela la comanda y libera su mesa si no le quedan otras rondas activas"""
+        try:
+            self._iniciar_escritura()
+            comanda_id, mesa_id = self._cambiar_estado(numero_comanda, 'Cancelada')
+            
+            # Mismo criterio que liberar_mesa_si_completada: la cuenta ya descontó esta ronda
+            mesa_liberada = False
+            if mesa_id:
+                cuenta = self.cuenta_abierta(mesa_id)
+                if not cuenta or cuenta['activas'] == 0:
+                    self.cursor.execute("UPDATE mesas SET estado = 'Disponible' WHERE id = ?", (mesa_id,))
+                    mesa_liberada = True
+            
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return {'comanda_id': comanda_id, 'mesa_id': mesa_id, 'mesa_liberada': mesa_liberada}
+    
+    def liberar_mesa_de_comanda(self, numero_comanda):
+        """Marca como disponible la mesa asociada a la comanda y cierra su cuenta"""
+        try:
+            self._iniciar_escritura()
+            # Mismo criterio que el resto de las transiciones ante números repetidos
+            _, mesa_id, _ = self._buscar_comanda(numero_comanda)
+            if not mesa_id:
+                raise ComandaError("No se pudo encontrar la mesa asociada")
+            self.cursor.execute("UPDATE mesas SET estado = 'Disponible' WHERE id = ?", (mesa_id,))
+            # Liberarla a mano es que la mesa se fue: las próximas rondas son otra cuenta
+            cuentas.cerrar(self.cursor, mesa_id, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return mesa_id
+    
+    def liberar_mesa_si_completada(self, mesa_id):
+        """Liberar mesa automáticamente si todas las comandas están completadas"""
+        try:
+            cuenta = self.cuenta_abierta(mesa_id)
+            comandas_activas = cuenta['activas'] if cuenta else 0
+            
+            if comandas_activas == 0:
+                # No hay comandas activas, podemos liberar la mesa
+                self.cursor.execute("""
+                    UPDATE mesas SET estado = 'Disponible' WHERE id = ?
+                """, (mesa_id,))
+                self.conn.commit()
+                return True
+            return False
+        except Exception as e:
+            print(f"Error al verificar estado de mesa: {e}")
+            return False
+    
+    # ==================== CUENTAS ====================
+    
+    def cuenta_abierta(self, mesa_id):
+        """Cuenta abierta de la mesa con sus acumulados, o None"""
+        self.cursor.execute('''
+            SELECT id, mesa_id, abierta, rondas, items, total, activas, completadas
+            FROM cuentas WHERE mesa_id = ? AND cerrada IS NULL
+        ''', (mesa_id,))
+        fila = self.cursor.fetchone()
+        return self._cuenta_dict(fila) if fila else None
+    
+    def _cuenta_dict(self, fila):
+        return {
+            'id': fila[0],
+            'mesa_id': fila[1],
+            'abierta': fila[2],
+            'rondas': fila[3],
+            'items': fila[4],
+            'total': fila[5],
+            'activas': fila[6],
+            'completadas': fila[7],
+        }
+    
+    def rondas_de_cuenta(self, cuenta_id):
+        """Comandas de la cuenta en orden: (numero_comanda, fecha, usuario, estado, total)"""
+        self.cursor.execute('''
+            SELECT numero_comanda, fecha, usuario, estado, total
+            FROM comandas WHERE cuenta_id = ? ORDER BY id
+        ''', (cuenta_id,))
+        return self.cursor.fetchall()
+    
+    def cerrar_cuenta(self, mesa_id, forzar=False):
+        """Cierra la cuenta abierta de la mesa (cobrada) y la deja disponible
+
+        Devuelve la cuenta con sus totales finales. Sin forzar, no cierra una
+        cuenta con rondas todavía en cocina.
+        """
+        try:
+            self._iniciar_escritura()
+            cuenta = self.cuenta_abierta(mesa_id)
+            if not cuenta:
+                raise ComandaError("La mesa no tiene una cuenta abierta", "Cuenta")
+            if cuenta['activas'] and not forzar:
+                raise ComandaError(
+                    f"La mesa tiene {cuenta['activas']} comandas sin completar", "Cuenta"
+                )
+            cuentas.cerrar(self.cursor, mesa_id, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+            self.cursor.execute("UPDATE mesas SET estado = 'Disponible' WHERE id = ?", (mesa_id,))
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return cuenta
+    
+    # ==================== CONSULTAS ====================
+    
+    def listar_mesas(self):
+        """Devuelve las mesas con su cuenta abierta y las rondas activas y completadas de ella"""
+        # Una sola consulta: los acumulados están en la cuenta abierta de cada mesa
+        consulta = '''
+            SELECT m.*, c.id, c.mesa_id, c.abierta, c.rondas, c.items, c.total, c.activas, c.completadas
+            FROM mesas m
+            LEFT JOIN cuentas c ON c.mesa_id = m.id AND c.cerrada IS NULL
+            ORDER BY m.{}
+        '''
+        # Intentar con nueva estructura primero
+        try:
+            self.cursor.execute(consulta.format('nombre'))
+        except Exception:
+            # Fallback a estructura antigua
+            self.cursor.execute(consulta.format('numero'))
+        columnas_mesa = len(self.cursor.description) - 8
+        
+        resultado = []
+        for fila in self.cursor.fetchall():
+            cuenta = self._cuenta_dict(fila[columnas_mesa:]) if fila[columnas_mesa] is not None else None
+            resultado.append({
+                'mesa': fila[:columnas_mesa],
+                'activas': cuenta['activas'] if cuenta else 0,
+                'completadas': cuenta['completadas'] if cuenta else 0,
+                'cuenta': cuenta
+            })
+        return resultado
+    
+    def listar_categorias(self):
+        """Devuelve las categorías con productos disponibles"""
+        self.cursor.execute('SELECT DISTINCT categoria FROM productos WHERE disponible = 1 ORDER BY categoria')
+        return [fila[0] for fila in self.cursor.fetchall()]
+    
+    def listar_productos(self, categoria=None):
+        """Devuelve los productos disponibles, opcionalmente filtrados por categoría"""
+        if categoria:
+            self.cursor.execute('''
+                SELECT * FROM productos 
+                WHERE disponible = 1 AND categoria = ?
+                ORDER BY nombre
+            ''', (categoria,))
+        else:
+            self.cursor.execute('''
+                SELECT * FROM productos 
+                WHERE disponible = 1
+                ORDER BY categoria, nombre
+            ''')
+        return self.cursor.fetchall()
+    
+    def buscar_productos(self, texto, categoria=None):
+        """Productos disponibles que coinciden con el texto, sin distinguir acentos"""
+        if self._indice_productos is None:
+            self._indice_productos = busqueda.crear_indice(
+                self.listar_productos(), self.config.get('busqueda_fts5', False)
+            )
+        return self._indice_productos.buscar(texto, categoria)
+    
+    def producto_modificado(self, producto_id):
+        """Actualiza el índice de búsqueda después de crear, editar o eliminar un producto"""
+        if self._indice_productos is None:
+            return
+        self.cursor.execute("SELECT * FROM productos WHERE id = ?", (producto_id,))
+        producto = self.cursor.fetchone()
+        if producto:
+            self._indice_productos.actualizar(producto)
+        else:
+            self._indice_productos.quitar(producto_id)
+    
+    def listar_comandas_estado(self):
+        """Devuelve las comandas no canceladas con datos de su mesa para el control de estados"""
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT 
+                c.numero_comanda,
+                COALESCE(m.nombre, 'Sin mesa') as mesa_nombre,
+                COALESCE(m.estado, 'N/A') as mesa_estado,
+                c.estado as comanda_estado,
+                c.fecha,
+                c.usuario,
+                c.total,
+                COUNT(ic.id) as total_items,
+                c.id as comanda_id,
+                m.id as mesa_id
+            FROM comandas c
+            LEFT JOIN mesas m ON c.mesa_id = m.id
+            LEFT JOIN items_comanda ic ON c.id = ic.comanda_id
+            WHERE c.estado IN ('Pendiente', 'En preparación', 'Completada')
+            GROUP BY c.id
+            ORDER BY c.fecha DESC
+        """)
+        return cursor.fetchall()
+    
+    def estadisticas_resumen(self):
+        """Devuelve conteos de mesas por estado, comandas de hoy por estado y pendientes totales"""
+        cursor = self.conn.cursor()
+        
+        # Estadísticas de mesas
+        cursor.execute("SELECT estado, COUNT(*) FROM mesas GROUP BY estado")
+        stats_mesas = dict(cursor.fetchall())
+        
+        # Estadísticas de comandas hoy
+        cursor.execute("""
+            SELECT estado, COUNT(*) 
+            FROM comandas 
+            WHERE DATE(fecha) = DATE('now') 
+            GROUP BY estado
+        """)
+        stats_comandas_hoy = dict(cursor.fetchall())
+        
+        # Comandas pendientes total
+        cursor.execute("""
+            SELECT COUNT(*) FROM comandas 
+            WHERE estado IN ('Pendiente', 'En preparación')
+        """)
+        comandas_pendientes = cursor.fetchone()[0]
+        
+        return stats_mesas, stats_comandas_hoy, comandas_pendientes
+    
+    def obtener_items_comanda(self, comanda_id):
+        """Devuelve los items de una comanda en orden de carga"""
+        self.cursor.execute('''
+            SELECT producto_nombre, cantidad, precio_unitario, observaciones
+            FROM items_comanda WHERE comanda_id = ?
+            ORDER BY id
+        ''', (comanda_id,))
+        return self.cursor.fetchall()
+    
+    # ==================== EVENTOS (PANTALLAS INCREMENTALES) ====================
+    
+    def ultimo_evento(self):
+        """Última seq de eventos (0 si no hay); un lector nuevo empieza desde aquí"""
+        self.cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM eventos")
+        return self.cursor.fetchone()[0]
+    
+    def eventos_desde(self, seq, limite=500):
+        """Eventos posteriores a seq en orden: filas (seq, comanda_id, tipo, estado, mesa_id)
+
+        Los eventos de mesas (tipo 'mesa' o 'mesa_borrada') tienen comanda_id None.
+        """
+        self.cursor.execute('''
+            SELECT seq, comanda_id, tipo, estado, mesa_id FROM eventos
+            WHERE seq > ? ORDER BY seq LIMIT ?
+        ''', (seq, limite))
+        return self.cursor.fetchall()
+    
+    def estado_mesas(self, ids=None):
+        """Filas (id, nombre, capacidad, estado, ubicacion) de todas las mesas o de los ids indicados"""
+        if ids is None:
+            self.cursor.execute("SELECT id, nombre, capacidad, estado, ubicacion FROM mesas ORDER BY nombre")
+            return self.cursor.fetchall()
+        filas = []
+        ids = list(ids)
+        for inicio in range(0, len(ids), 500):
+            bloque = ids[inicio:inicio + 500]
+            self.cursor.execute(
+                f"SELECT id, nombre, capacidad, estado, ubicacion FROM mesas WHERE id IN ({','.join('?' * len(bloque))})",
+                bloque
+            )
+            filas.extend(self.cursor.fetchall())
+        return filas
+    
+    def _comandas_con_items(self, condicion, parametros):
+        """Comandas que cumplen la condición con sus items, en dos consultas
+
+        Cada item es (nombre, cantidad, observaciones, estación, listo).
+        """
+        self.cursor.execute(f'''
+            SELECT c.id, c.numero_comanda, c.fecha, c.usuario, c.estado, c.observaciones,
+                   m.nombre
+            FROM comandas c
+            LEFT JOIN mesas m ON m.id = c.mesa_id
+            WHERE {condicion}
+            ORDER BY c.fecha, c.id
+        ''', parametros)
+        comandas = [
+            {
+                'id': fila[0], 'numero_comanda': fila[1], 'fecha': fila[2], 'usuario': fila[3],
+                'estado': fila[4], 'observaciones': fila[5] or '', 'mesa': fila[6], 'items': [],
+            }
+            for fila in self.cursor.fetchall()
+        ]
+        por_id = {comanda['id']: comanda for comanda in comandas}
+        ids = list(por_id)
+        # De a 500 ids para no pasar el límite de parámetros de SQLite
+        for inicio in range(0, len(ids), 500):
+            bloque = ids[inicio:inicio + 500]
+            self.cursor.execute(f'''
+                SELECT comanda_id, producto_nombre, cantidad, observaciones, estacion, listo
+                FROM items_comanda
+                WHERE comanda_id IN ({','.join('?' * len(bloque))})
+                ORDER BY id
+            ''', bloque)
+            for comanda_id, nombre, cantidad, observaciones, estacion, listo in self.cursor.fetchall():
+                por_id[comanda_id]['items'].append((nombre, cantidad, observaciones or '', estacion, listo))
+        return comandas
+    
+    def comandas_abiertas(self):
+        """Comandas pendientes o en preparación con sus items, de la más vieja a la más nueva"""
+        return self._comandas_con_items(
+            f"c.estado IN ({','.join('?' * len(self.ESTADOS_ACTIVOS))})", self.ESTADOS_ACTIVOS
+        )
+    
+    def obtener_comandas(self, ids):
+        """Comandas (con sus items) de los ids indicados, en cualquier estado"""
+        comandas = []
+        ids = list(ids)
+        for inicio in range(0, len(ids), 500):
+            bloque = ids[inicio:inicio + 500]
+            comandas.extend(self._comandas_con_items(f"c.id IN ({','.join('?' * len(bloque))})", bloque))
+        return comandas
+    
+    # ==================== ESTACIONES DE PREPARACIÓN ====================
+    
+    def marcar_estacion_lista(self, numero_comanda, estacion):
+        """Marca listos los items de una estación; devuelve los items que siguen en otras estaciones"""
+        if estacion not in self.ESTACIONES:
+            raise ComandaError(f"No existe la estación {estacion}", "Estación")
+        try:
+            self._iniciar_escritura()
+            comanda_id, _, estado = self._buscar_comanda(numero_comanda)
+            if estado not in self.ESTADOS_ACTIVOS:
+                raise ComandaError(f"La comanda {numero_comanda} ya está {estado.lower()}", "Comanda Cerrada")
+            self.cursor.execute(
+                "UPDATE items_comanda SET listo = ? WHERE comanda_id = ? AND estacion = ? AND listo IS NULL",
+                (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), comanda_id, estacion)
+            )
+            self._registrar_evento(comanda_id, 'estacion', estacion)
+            self.cursor.execute(
+                "SELECT COUNT(*) FROM items_comanda WHERE comanda_id = ? AND listo IS NULL AND estacion IS NOT NULL",
+                (comanda_id,)
+            )
+            pendientes = self.cursor.fetchone()[0]
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return pendientes
+    
+    def items_por_estacion(self, comanda_id):
+        """Items de la comanda agrupados por estación, en el orden de ESTACIONES"""
+        self.cursor.execute('''
+            SELECT estacion, producto_nombre, cantidad, observaciones
+            FROM items_comanda WHERE comanda_id = ?
+            ORDER BY id
+        ''', (comanda_id,))
+        grupos = {}
+        for estacion, nombre, cantidad, observaciones in self.cursor.fetchall():
+            grupos.setdefault(estacion or self.ESTACIONES[0], []).append((nombre, cantidad, observaciones or ''))
+        orden = {estacion: i for i, estacion in enumerate(self.ESTACIONES)}
+        return dict(sorted(grupos.items(), key=lambda par: (orden.get(par[0], len(orden)), par[0])))
+    
+    def estado_estaciones(self, minutos=60):
+        """Cola y rendimiento por estación
+
+        Para cada estación: comandas e items en cola, fecha de la comanda más
+        vieja en cola, items listos en los últimos 'minutos' y minutos promedio
+        desde que se tomó la comanda hasta que la estación los marcó listos.
+        """
+        estado = {
+            estacion: {'comandas': 0, 'items': 0, 'mas_antigua': None, 'listos': 0, 'minutos_promedio': None}
+            for estacion in self.ESTACIONES
+        }
+        vacio = {'comandas': 0, 'items': 0, 'mas_antigua': None, 'listos': 0, 'minutos_promedio': None}
+        
+        # Cola: índice parcial idx_items_pendientes_estacion
+        self.cursor.execute('''
+            SELECT i.estacion, COUNT(DISTINCT i.comanda_id), SUM(i.cantidad), MIN(c.fecha)
+            FROM items_comanda i
+            JOIN comandas c ON c.id = i.comanda_id
+            WHERE i.listo IS NULL AND i.estacion IS NOT NULL
+            GROUP BY i.estacion
+        ''')
+        for estacion, comandas, items, mas_antigua in self.cursor.fetchall():
+            fila = estado.setdefault(estacion, dict(vacio))
+            fila.update(comandas=comandas, items=items, mas_antigua=mas_antigua)
+        
+        # Rendimiento: índice parcial idx_items_listo
+        desde = (datetime.now() - timedelta(minutes=minutos)).strftime('%Y-%m-%d %H:%M:%S')
+        self.cursor.execute('''
+            SELECT i.estacion, SUM(i.cantidad),
+                   AVG((julianday(i.listo) - julianday(c.fecha)) * 1440)
+            FROM items_comanda i
+            JOIN comandas c ON c.id = i.comanda_id
+            WHERE i.listo >= ? AND i.estacion IS NOT NULL AND c.estado != 'Cancelada'
+            GROUP BY i.estacion
+        ''', (desde,))
+        for estacion, listos, minutos_promedio in self.cursor.fetchall():
+            fila = estado.setdefault(estacion, dict(vacio))
+            fila.update(listos=listos, minutos_promedio=minutos_promedio)
+        return estado
+    
+    # ==================== API REMOTA ====================
+    
+    def autenticar_usuario(self, usuario, password):
+        """Datos del usuario activo con esas credenciales (mismo criterio que el login) o None"""
+        self.cursor.execute(
+            "SELECT id, usuario, nombre_completo, rol FROM usuarios WHERE usuario = ? AND password = ? AND activo = 1",
+            (usuario, password)
+        )
+        fila = self.cursor.fetchone()
+        if not fila:
+            return None
+        return {'id': fila[0], 'usuario': fila[1], 'nombre': fila[2] or fila[1], 'rol': fila[3] or 'Mesero'}
+    
+    def version_catalogo(self):
+        """Número que cambia cada vez que se modifica la tabla productos"""
+        self.cursor.execute("SELECT version FROM versiones WHERE clave = 'catalogo'")
+        fila = self.cursor.fetchone()
+        return fila[0] if fila else 0
+    
+    def obtener_mesa(self, mesa_id):
+        """Fila de la mesa o ComandaError si no existe"""
+        self.cursor.execute("SELECT * FROM mesas WHERE id = ?", (mesa_id,))
+        mesa = self.cursor.fetchone()
+        if not mesa:
+            raise ComandaError(f"No existe la mesa {mesa_id}", "Mesa")
+        return mesa
+    
+    def armar_items(self, pedidos):
+        """Items de comanda a partir de pares (producto_id, cantidad), con precio de la base"""
+        items = []
+        por_id = {}
+        for producto_id, cantidad in pedidos:
+            if cantidad <= 0:
+                raise ComandaError("La cantidad debe ser mayor que cero", "Cantidad")
+            if producto_id in por_id:
+                por_id[producto_id]['cantidad'] += cantidad
+                continue
+            self.cursor.execute("SELECT * FROM productos WHERE id = ? AND disponible = 1", (producto_id,))
+            producto = self.cursor.fetchone()
+            if not producto:
+                raise ComandaError(f"El producto {producto_id} no existe o no está disponible", "Producto")
+            item = {
+                'id': producto[0],
+                'nombre': producto[1],
+                'precio': producto[2],
+                'cantidad': cantidad,
+                'categoria': producto[3]
+            }
+            por_id[producto_id] = item
+            items.append(item)
+        return items
@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+"""Pantalla de cocina (KDS): comandas abiertas como tarjetas con su tiempo de espera
+
+Al abrir se carga una foto de las comandas abiertas y desde ahí sólo se leen
+los eventos nuevos (tabla eventos, por seq) y las comandas que cambiaron; nunca
+se vuelve a consultar todo. Las tarjetas se dibujan en un único Canvas en lugar
+de un widget por renglón, y el reloj de cada tarjeta actualiza sólo su texto,
+así la pantalla sigue fluida con cientos de comandas abiertas.
+
+Tocar "LISTO" en una tarjeta completa la comanda con la misma transición que el
+botón Completar del control de comandas. Con una estación (Bar, Parrilla, ...)
+la pantalla muestra sólo los items pendientes de esa estación y LISTO los marca
+listos sin cerrar la comanda; la pantalla general los sigue mostrando tachados
+hasta que se completa.
+"""
+import tkinter as tk
+from tkinter import ttk, messagebox
+from datetime import datetime
+
+from motor_comandas import ComandaError
+
+ANCHO_TARJETA = 240
+MARGEN = 10
+
+# Colores del encabezado según los minutos de espera
+COLOR_A_TIEMPO = '#27AE60'
+COLOR_ALERTA = '#F39C12'
+COLOR_DEMORA = '#C0392B'
+
+COLOR_FONDO = '#1C2833'
+COLOR_TARJETA = '#FDFEFE'
+
+# Segundos entre actualizaciones de los contadores de estaciones sin eventos nuevos
+SEGUNDOS_CONTADORES = 30
+
+
+class PantallaCocina:
+    """Vista de cocina sobre una ventana Tk o Toplevel"""
+
+    def __init__(self, ventana, motor, pantalla_completa=False, intervalo_ms=1000, estacion=None):
+        self.ventana = ventana
+        self.motor = motor
+        self.estacion = estacion
+        self.intervalo_ms = intervalo_ms
+        self.minutos_alerta = motor.config.get('minutos_alerta_cocina', 10)
+        self.minutos_demora = motor.config.get('minutos_demora_cocina', 20)
+
+        # comanda_id -> datos de la tarjeta dibujada
+        self.tarjetas = {}
+        self.columnas = 0
+        self._sondeo = None
+        self._reloj = None
+        self._segundos_contadores = 0
+
+        self.crear_interfaz()
+        if pantalla_completa:
+            self.ventana.attributes('-fullscreen', True)
+
+        # La seq se lee antes de la foto: un cambio entre ambas se vuelve a aplicar, sin efecto
+        self.ultimo_seq = motor.ultimo_evento()
+        for comanda in motor.comandas_abiertas():
+            self.aplicar_comanda(comanda)
+        self.reubicar()
+        self.actualizar_contadores()
+        self.actualizar_tiempos()
+        self._sondeo = self.ventana.after(self.intervalo_ms, self.sondear)
+
+    # ==================== INTERFAZ ====================
+
+    def crear_interfaz(self):
+        nombre = self.estacion or "Cocina"
+        self.ventana.title(f"{nombre} - Comandas Abiertas")
+        self.ventana.configure(bg=COLOR_FONDO)
+
+        barra = tk.Frame(self.ventana, bg='#2C3E50', height=50)
+        barra.pack(fill='x')
+        barra.pack_propagate(False)
+
+        tk.Label(
+            barra,
+            text=f"🍳 {nombre}",
+            font=('Arial', 16, 'bold'),
+            bg='#2C3E50',
+            fg='white'
+        ).pack(side='left', padx=15)
+
+        self.label_resumen = tk.Label(
+            barra,
+            text="",
+            font=('Arial', 12),
+            bg='#2C3E50',
+            fg='white'
+        )
+        self.label_resumen.pack(side='left', padx=20)
+
+        self.label_estaciones = tk.Label(
+            barra,
+            text="",
+            font=('Arial', 11),
+            bg='#2C3E50',
+            fg='#D5D8DC'
+        )
+        self.label_estaciones.pack(side='left', padx=20)
+
+        tk.Button(
+            barra,
+            text="✖ Cerrar",
+            font=('Arial', 10),
+            bg='#34495E',
+            fg='white',
+            command=self.cerrar,
+            relief='flat',
+            cursor='hand2'
+        ).pack(side='right', padx=8, pady=8)
+
+        tk.Button(
+            barra,
+            text="⛶ Pantalla completa",
+            font=('Arial', 10),
+            bg='#34495E',
+            fg='white',
+            command=self.alternar_pantalla_completa,
+            relief='flat',
+            cursor='hand2'
+        ).pack(side='right', padx=8, pady=8)
+
+        contenedor = tk.Frame(self.ventana, bg=COLOR_FONDO)
+        contenedor.pack(fill='both', expand=True)
+
+        self.canvas = tk.Canvas(contenedor, bg=COLOR_FONDO, highlightthickness=0)
+        scrollbar = ttk.Scrollbar(contenedor, orient='vertical', command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side='right', fill='y')
+        self.canvas.pack(side='left', fill='both', expand=True)
+
+        self.canvas.bind('<Configure>', lambda e: self.reubicar())
+        self.canvas.bind('<MouseWheel>', lambda e: self.canvas.yview_scroll(-1 if e.delta > 0 else 1, 'units'))
+        self.canvas.bind('<Button-4>', lambda e: self.canvas.yview_scroll(-1, 'units'))
+        self.canvas.bind('<Button-5>', lambda e: self.canvas.yview_scroll(1, 'units'))
+        self.ventana.bind('<F11>', lambda e: self.alternar_pantalla_completa())
+        self.ventana.bind('<Escape>', lambda e: self.ventana.attributes('-fullscreen', False))
+        self.ventana.protocol('WM_DELETE_WINDOW', self.cerrar)
+
+    def alternar_pantalla_completa(self):
+        self.ventana.attributes('-fullscreen', not int(self.ventana.attributes('-fullscreen')))
+
+    def cerrar(self):
+        """Detiene los temporizadores y cierra la ventana"""
+        for tarea in (self._sondeo, self._reloj):
+            if tarea:
+                self.ventana.after_cancel(tarea)
+        self._sondeo = self._reloj = None
+        self.ventana.destroy()
+
+    # ==================== TARJETAS ====================
+
+    def aplicar_comanda(self, comanda):
+        """Dibuja la tarjeta si la comanda está abierta y tiene algo que mostrar; si no, la quita"""
+        if comanda['estado'] not in self.motor.ESTADOS_ACTIVOS:
+            self.quitar_tarjeta(comanda['id'])
+            return
+        if self.estacion:
+            items = [item for item in comanda['items'] if item[3] == self.estacion and item[4] is None]
+            if not items:
+                self.quitar_tarjeta(comanda['id'])
+                return
+            comanda = dict(comanda, items=items)
+        self.dibujar_tarjeta(comanda)
+
+    def dibujar_tarjeta(self, comanda):
+        """Dibuja (o redibuja) la tarjeta de una comanda en el origen; reubicar() la posiciona"""
+        self.quitar_tarjeta(comanda['id'])
+        etiqueta = f"c{comanda['id']}"
+        etiquetas = ('tarjeta', etiqueta)
+        ancho = ANCHO_TARJETA
+        canvas = self.canvas
+
+        encabezado = canvas.create_rectangle(0, 0, ancho, 48, fill=COLOR_A_TIEMPO, outline='', tags=etiquetas)
+        numero = comanda['numero_comanda'].rsplit('-', 1)[-1]
+        canvas.create_text(8, 6, anchor='nw', text=f"#{numero}", font=('Arial', 15, 'bold'),
+                           fill='white', tags=etiquetas)
+        canvas.create_text(8, 29, anchor='nw', text=comanda['mesa'] or 'Sin mesa', font=('Arial', 10),
+                           fill='white', tags=etiquetas)
+        reloj = canvas.create_text(ancho - 8, 6, anchor='ne', text='', font=('Arial', 15, 'bold'),
+                                   fill='white', tags=etiquetas)
+        canvas.create_text(ancho - 8, 29, anchor='ne', text=comanda['usuario'] or '', font=('Arial', 9),
+                           fill='white', tags=etiquetas)
+
+        y = 56
+        for nombre, cantidad, observaciones, _, listo in comanda['items']:
+            # En la pantalla general lo que una estación ya terminó se muestra tachado
+            texto = canvas.create_text(10, y, anchor='nw', width=ancho - 20, text=f"{cantidad} × {nombre}",
+                                       font=('Arial', 12, 'overstrike' if listo else 'bold'),
+                                       fill='#AAB7B8' if listo else '#1C2833', tags=etiquetas)
+            y = canvas.bbox(texto)[3] + 2
+            if observaciones:
+                texto = canvas.create_text(24, y, anchor='nw', width=ancho - 34, text=observaciones,
+                                           font=('Arial', 10, 'italic'), fill='#7F8C8D', tags=etiquetas)
+                y = canvas.bbox(texto)[3] + 2
+        if comanda['observaciones']:
+            texto = canvas.create_text(10, y + 4, anchor='nw', width=ancho - 20,
+                                       text=f"📝 {comanda['observaciones']}",
+                                       font=('Arial', 10, 'italic'), fill='#B03A2E', tags=etiquetas)
+            y = canvas.bbox(texto)[3] + 2
+
+        y += 8
+        etiqueta_listo = f"listo{comanda['id']}"
+        canvas.create_rectangle(0, y, ancho, y + 40, fill='#2E86C1', outline='',
+                                tags=etiquetas + (etiqueta_listo,))
+        canvas.create_text(ancho / 2, y + 20, text="✔ LISTO", font=('Arial', 13, 'bold'), fill='white',
+                           tags=etiquetas + (etiqueta_listo,))
+        alto = y + 40
+
+        fondo = canvas.create_rectangle(0, 48, ancho, alto, fill=COLOR_TARJETA, outline='', tags=etiquetas)
+        canvas.tag_lower(fondo, encabezado)
+        canvas.tag_bind(etiqueta_listo, '<Button-1>', lambda e, c=comanda: self.marcar_lista(c))
+
+        self.tarjetas[comanda['id']] = {
+            'comanda': comanda,
+            'inicio': datetime.strptime(comanda['fecha'], '%Y-%m-%d %H:%M:%S'),
+            'etiqueta': etiqueta,
+            'encabezado': encabezado,
+            'reloj': reloj,
+            'alto': alto,
+            'x': 0,
+            'y': 0,
+            'texto_reloj': None,
+            'color': COLOR_A_TIEMPO,
+        }
+        self.actualizar_reloj(self.tarjetas[comanda['id']], datetime.now())
+
+    def quitar_tarjeta(self, comanda_id):
+        """Borra la tarjeta de la comanda si está dibujada; devuelve True si existía"""
+        tarjeta = self.tarjetas.pop(comanda_id, None)
+        if tarjeta is None:
+            return False
+        self.canvas.delete(tarjeta['etiqueta'])
+        return True
+
+    def reubicar(self):
+        """Acomoda las tarjetas por antigüedad en la columna más corta (sólo mueve las que cambian)"""
+        ancho_canvas = max(self.canvas.winfo_width(), ANCHO_TARJETA + 2 * MARGEN)
+        columnas = max(1, (ancho_canvas - MARGEN) // (ANCHO_TARJETA + MARGEN))
+        alturas = [MARGEN] * columnas
+        ordenadas = sorted(self.tarjetas.items(), key=lambda par: (par[1]['inicio'], par[0]))
+        for _, tarjeta in ordenadas:
+            columna = alturas.index(min(alturas))
+            x = MARGEN + columna * (ANCHO_TARJETA + MARGEN)
+            y = alturas[columna]
+            if (x, y) != (tarjeta['x'], tarjeta['y']):
+                self.canvas.move(tarjeta['etiqueta'], x - tarjeta['x'], y - tarjeta['y'])
+                tarjeta['x'], tarjeta['y'] = x, y
+            alturas[columna] = y + tarjeta['alto'] + MARGEN
+        self.canvas.configure(scrollregion=(0, 0, ancho_canvas, max(alturas)))
+        self.columnas = columnas
+        self.actualizar_resumen()
+
+    # ==================== TIEMPOS ====================
+
+    def actualizar_reloj(self, tarjeta, ahora):
+        """Actualiza el tiempo y el color de una tarjeta sólo si cambiaron"""
+        segundos = max(0, int((ahora - tarjeta['inicio']).total_seconds()))
+        minutos = segundos // 60
+        texto = f"{minutos}:{segundos % 60:02d}" if minutos < 60 else f"{minutos // 60}h{minutos % 60:02d}"
+        if texto != tarjeta['texto_reloj']:
+            self.canvas.itemconfigure(tarjeta['reloj'], text=texto)
+            tarjeta['texto_reloj'] = texto
+        if minutos >= self.minutos_demora:
+            color = COLOR_DEMORA
+        elif minutos >= self.minutos_alerta:
+            color = COLOR_ALERTA
+        else:
+            color = COLOR_A_TIEMPO
+        if color != tarjeta['color']:
+            self.canvas.itemconfigure(tarjeta['encabezado'], fill=color)
+            tarjeta['color'] = color
+
+    def actualizar_tiempos(self):
+        """Avanza los relojes una vez por segundo"""
+        self._reloj = None
+        if not self.canvas.winfo_exists():
+            return
+        ahora = datetime.now()
+        for tarjeta in self.tarjetas.values():
+            self.actualizar_reloj(tarjeta, ahora)
+        self.actualizar_resumen()
+        self._segundos_contadores += 1
+        if self._segundos_contadores >= SEGUNDOS_CONTADORES:
+            self.actualizar_contadores()
+        self._reloj = self.ventana.after(1000, self.actualizar_tiempos)
+
+    def actualizar_resumen(self):
+        if not self.tarjetas:
+            self.label_resumen.config(text="Sin comandas pendientes")
+            return
+        inicio = min(tarjeta['inicio'] for tarjeta in self.tarjetas.values())
+        minutos = int((datetime.now() - inicio).total_seconds() // 60)
+        self.label_resumen.config(text=f"Abiertas: {len(self.tarjetas)}   ·   Más antigua: {minutos} min")
+
+    def actualizar_contadores(self):
+        """Cola de cada estación o, con una estación, su cola y lo despachado en la última hora"""
+        self._segundos_contadores = 0
+        try:
+            estaciones = self.motor.estado_estaciones()
+        except Exception as e:
+            print(f"Error al leer el estado de las estaciones: {e}")
+            return
+        if self.estacion:
+            datos = estaciones.get(self.estacion, {})
+            texto = f"En cola: {datos.get('items', 0)} items   ·   Listos última hora: {datos.get('listos', 0)}"
+            if datos.get('minutos_promedio') is not None:
+                texto += f"   ·   Promedio: {datos['minutos_promedio']:.0f} min"
+        else:
+            texto = "   ".join(f"{nombre}: {datos['items']}" for nombre, datos in estaciones.items())
+        self.label_estaciones.config(text=texto)
+
+    # ==================== EVENTOS ====================
+
+    def sondear(self):
+        """Aplica los eventos nuevos: sólo se leen las comandas que cambiaron"""
+        self._sondeo = None
+        if not self.canvas.winfo_exists():
+            return
+        eventos = []
+        try:
+            eventos = self.motor.eventos_desde(self.ultimo_seq)
+            if eventos:
+                self.ultimo_seq = eventos[-1][0]
+                # Los eventos de mesas no tienen comanda
+                ids = {evento[1] for evento in eventos if evento[1] is not None}
+                if ids:
+                    self.aplicar_cambios(ids)
+        except Exception as e:
+            print(f"Error al actualizar la pantalla de cocina: {e}")
+        # Si vino un lote completo quedan más eventos: seguir enseguida
+        demora = 1 if len(eventos) >= 500 else self.intervalo_ms
+        self._sondeo = self.ventana.after(demora, self.sondear)
+
+    def aplicar_cambios(self, ids):
+        """Redibuja las comandas abiertas que cambiaron y quita las cerradas"""
+        encontradas = set()
+        for comanda in self.motor.obtener_comandas(ids):
+            encontradas.add(comanda['id'])
+            self.aplicar_comanda(comanda)
+        # Comandas borradas o archivadas
+        for comanda_id in ids - encontradas:
+            self.quitar_tarjeta(comanda_id)
+        self.reubicar()
+        self.actualizar_contadores()
+
+    def marcar_lista(self, comanda):
+        """Completa la comanda, o con una estación marca listos sus items, y quita la tarjeta"""
+        try:
+            if self.estacion:
+                self.motor.marcar_estacion_lista(comanda['numero_comanda'], self.estacion)
+            else:
+                self.motor.completar_comanda(comanda['numero_comanda'])
+        except ComandaError as e:
+            messagebox.showwarning(e.titulo, str(e), parent=self.ventana)
+            return
+        except Exception as e:
+            messagebox.showerror("Error", f"No se pudo completar la comanda: {e}", parent=self.ventana)
+            return
+        if self.quitar_tarjeta(comanda['id']):
+            self.reubicar()
@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""Plano de mesas: todas las mesas dibujadas en un único Canvas, por ubicación
+
+Cada mesa es un rectángulo con su nombre, agrupadas por zona (ubicacion) en
+filas que llenan el ancho disponible. En lugar de un botón por mesa hay un
+solo binding de clic en el Canvas: la mesa tocada se calcula con la
+disposición (zona por búsqueda binaria, fila y columna por división), sin
+recorrer los items.
+
+Al refrescar sólo se reconfiguran (itemconfigure) las mesas cuyo color o
+texto cambió; el plano se redibuja entero únicamente si cambian las mesas de
+cada zona (alta, baja, cambio de ubicación u orden) o las columnas que entran.
+Así sigue fluido con cientos de mesas en varias zonas.
+"""
+import bisect
+import tkinter as tk
+from tkinter import ttk
+
+ANCHO_MESA = 82
+ALTO_MESA = 30
+SEPARACION = 4
+MARGEN = 6
+ALTO_TITULO = 20
+
+# Alto máximo visible del plano en la pestaña de comandas; el resto se desplaza
+ALTO_MAXIMO = 230
+
+SIN_UBICACION = 'Sin ubicación'
+
+COLOR_FONDO = '#E9ECEF'
+COLOR_TITULO = '#2C3E50'
+COLOR_SELECCION = '#212F3D'
+
+# Colores de las mesas según su estado y su cuenta
+COLOR_CUENTA = '#17A2B8'
+COLOR_PENDIENTES = '#FFC107'
+COLOR_LIBRE = '#28A745'
+COLOR_OCUPADA = '#DC3545'
+COLOR_OTRO = '#6C757D'
+
+
+def ubicacion(mesa):
+    """Zona de la mesa (las tablas de versiones anteriores no tienen ubicacion)"""
+    valor = mesa[4] if len(mesa) > 4 else None
+    return (valor or '').strip() or SIN_UBICACION
+
+
+def estilo_mesa(info_mesa, con_borrador=False):
+    """(color, texto, descripción) de una mesa de listar_mesas()"""
+    mesa = info_mesa['mesa']
+    estado = (mesa[3] or '').lower() if len(mesa) > 3 else 'libre'
+    comandas_activas = info_mesa['activas']
+    cuenta = info_mesa['cuenta']
+
+    if cuenta and comandas_activas == 0 and cuenta['rondas'] > 0:
+        color = COLOR_CUENTA  # Todo servido, cuenta abierta (lista para cobrar)
+        descripcion = "Cuenta abierta, sin comandas en cocina"
+    elif estado in ['libre', 'disponible']:
+        if comandas_activas > 0:
+            color = COLOR_PENDIENTES  # Mesa libre pero con comandas pendientes
+            descripcion = f"Mesa disponible · Comandas pendientes: {comandas_activas}"
+        else:
+            color = COLOR_LIBRE
+            descripcion = "Mesa disponible"
+    elif estado == 'ocupada':
+        color = COLOR_OCUPADA
+        descripcion = f"Mesa ocupada · Comandas activas: {comandas_activas}"
+    else:
+        color = COLOR_OTRO
+        descripcion = f"Estado: {estado}"
+    if cuenta:
+        descripcion += f" · Cuenta: ${cuenta['total']} ({cuenta['rondas']} rondas, {cuenta['items']} items)"
+
+    texto = f"{mesa[1]}"
+    if con_borrador:
+        # Comanda empezada en esta terminal y no enviada
+        texto += " 📝"
+        descripcion += " · Comanda en curso sin enviar"
+    return color, texto, descripcion
+
+
+def agrupar(mesas):
+    """[(zona, [mesa_id, ...])] en orden alfabético de zona, 'Sin ubicación' al final
+
+    Dentro de cada zona se respeta el orden recibido (el de listar_mesas).
+    """
+    zonas = {}
+    for mesa in mesas:
+        zonas.setdefault(ubicacion(mesa), []).append(mesa[0])
+    return sorted(zonas.items(), key=lambda par: (par[0] == SIN_UBICACION, par[0].lower()))
+
+
+def calcular_disposicion(zonas, ancho):
+    """Posición de cada zona y de cada mesa para un Canvas de `ancho` píxeles
+
+    Devuelve un dict con:
+    - 'columnas': mesas por fila;
+    - 'zonas': lista de (nombre, y_titulo, y_inicio, ids) en orden vertical;
+    - 'inicios': los y_inicio de las zonas (para la búsqueda binaria);
+    - 'posiciones': mesa_id -> (x, y) de la esquina superior izquierda;
+    - 'alto': alto total del contenido.
+    """
+    paso_x = ANCHO_MESA + SEPARACION
+    paso_y = ALTO_MESA + SEPARACION
+    columnas = max(1, (ancho - 2 * MARGEN + SEPARACION) // paso_x)
+    disposicion = {'columnas': columnas, 'zonas': [], 'inicios': [], 'posiciones': {}}
+    y = MARGEN
+    for nombre, ids in zonas:
+        y_titulo = y
+        y_inicio = y + ALTO_TITULO
+        for indice, mesa_id in enumerate(ids):
+            fila, columna = divmod(indice, columnas)
+            disposicion['posiciones'][mesa_id] = (MARGEN + columna * paso_x, y_inicio + fila * paso_y)
+        filas = (len(ids) + columnas - 1) // columnas
+        disposicion['zonas'].append((nombre, y_titulo, y_inicio, ids))
+        disposicion['inicios'].append(y_inicio)
+        y = y_inicio + filas * paso_y + MARGEN
+    disposicion['alto'] = y
+    return disposicion
+
+
+def mesa_en(disposicion, x, y):
+    """mesa_id en el punto (x, y) del Canvas, o None si cae en un título o un hueco"""
+    indice_zona = bisect.bisect_right(disposicion['inicios'], y) - 1
+    if indice_zona < 0:
+        return None
+    _, _, y_inicio, ids = disposicion['zonas'][indice_zona]
+    columna, dx = divmod(x - MARGEN, ANCHO_MESA + SEPARACION)
+    fila, dy = divmod(y - y_inicio, ALTO_MESA + SEPARACION)
+    if columna < 0 or columna >= disposicion['columnas'] or dx > ANCHO_MESA or dy > ALTO_MESA:
+        return None
+    indice = int(fila) * disposicion['columnas'] + int(columna)
+    return ids[indice] if indice < len(ids) else None
+
+
+class PlanoMesas:
+    """Plano de mesas en un Canvas; al tocar una mesa llama a al_seleccionar(fila de la mesa)"""
+
+    def __init__(self, padre, al_seleccionar, alto_maximo=ALTO_MAXIMO):
+        self.al_seleccionar = al_seleccionar
+        self.alto_maximo = alto_maximo
+
+        # mesa_id -> fila de la mesa, items del Canvas y lo que muestran
+        self.mesas = {}
+        self.items = {}
+        self.estilos = {}
+        self.descripciones = {}
+        self.zonas = []
+        self.disposicion = None
+        self.seleccionada = None
+        self._sobre = None
+        self._reubicar = None
+
+        self.frame = tk.Frame(padre, bg=COLOR_FONDO)
+        self.label_detalle = tk.Label(
+            self.frame,
+            text="",
+            font=('Arial', 9),
+            bg=COLOR_FONDO,
+            fg='#495057',
+            anchor='w'
+        )
+        self.label_detalle.pack(side='bottom', fill='x')
+
+        self.canvas = tk.Canvas(self.frame, bg=COLOR_FONDO, highlightthickness=0, height=ALTO_MESA + ALTO_TITULO)
+        scrollbar = ttk.Scrollbar(self.frame, orient='vertical', command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side='right', fill='y')
+        self.canvas.pack(side='left', fill='both', expand=True)
+
+        self.canvas.bind('<Button-1>', self.tocar)
+        self.canvas.bind('<Motion>', self.mover)
+        self.canvas.bind('<Leave>', lambda e: self.mostrar_detalle(None))
+        self.canvas.bind('<Configure>', lambda e: self.programar_reubicar())
+        self.canvas.bind('<MouseWheel>', lambda e: self.canvas.yview_scroll(-1 if e.delta > 0 else 1, 'units'))
+        self.canvas.bind('<Button-4>', lambda e: self.canvas.yview_scroll(-1, 'units'))
+        self.canvas.bind('<Button-5>', lambda e: self.canvas.yview_scroll(1, 'units'))
+
+    def pack(self, **opciones):
+        self.frame.pack(**opciones)
+
+    # ==================== DATOS ====================
+
+    def actualizar(self, infos_mesas, mesas_con_borrador=(), seleccionada=None):
+        """Aplica el estado de listar_mesas(); devuelve cuántas mesas se reconfiguraron
+
+        Si las mesas son las mismas sólo cambia el color o el texto de las que
+        lo necesitan; si no, redibuja el plano.
+        """
+        self.mesas = {info['mesa'][0]: info['mesa'] for info in infos_mesas}
+        estilos = {}
+        for info in infos_mesas:
+            mesa_id = info['mesa'][0]
+            color, texto, descripcion = estilo_mesa(info, mesa_id in mesas_con_borrador)
+            estilos[mesa_id] = (color, texto)
+            self.descripciones[mesa_id] = descripcion
+
+        zonas = agrupar(self.mesas.values())
+        if zonas != self.zonas:
+            self.zonas = zonas
+            self.estilos = estilos
+            self.seleccionada = seleccionada
+            self.dibujar()
+            return len(estilos)
+
+        cambios = 0
+        for mesa_id, estilo in estilos.items():
+            if estilo != self.estilos[mesa_id]:
+                rectangulo, texto = self.items[mesa_id]
+                self.canvas.itemconfigure(rectangulo, fill=estilo[0])
+                self.canvas.itemconfigure(texto, text=estilo[1])
+                self.estilos[mesa_id] = estilo
+                cambios += 1
+        self.marcar_seleccionada(seleccionada)
+        if self._sobre is not None:
+            self.mostrar_detalle(self._sobre)
+        return cambios
+
+    # ==================== DIBUJO ====================
+
+    def ancho_disponible(self):
+        return max(self.canvas.winfo_width(), ANCHO_MESA + 2 * MARGEN)
+
+    def dibujar(self):
+        """Dibuja todo el plano con la disposición para el ancho actual"""
+        canvas = self.canvas
+        canvas.delete('all')
+        self.items = {}
+        self.disposicion = calcular_disposicion(self.zonas, self.ancho_disponible())
+        for nombre, y_titulo, _, _ in self.disposicion['zonas']:
+            canvas.create_text(MARGEN, y_titulo + ALTO_TITULO // 2, anchor='w', text=nombre,
+                               font=('Arial', 9, 'bold'), fill=COLOR_TITULO)
+        for mesa_id, (x, y) in self.disposicion['posiciones'].items():
+            color, texto = self.estilos[mesa_id]
+            seleccionada = mesa_id == self.seleccionada
+            rectangulo = canvas.create_rectangle(
+                x, y, x + ANCHO_MESA, y + ALTO_MESA, fill=color,
+                outline=COLOR_SELECCION if seleccionada else '', width=3 if seleccionada else 1
+            )
+            etiqueta = canvas.create_text(x + ANCHO_MESA / 2, y + ALTO_MESA / 2, text=texto,
+                                          font=('Arial', 9, 'bold'), fill='white', width=ANCHO_MESA - 4)
+            self.items[mesa_id] = (rectangulo, etiqueta)
+        canvas.configure(scrollregion=(0, 0, self.ancho_disponible(), self.disposicion['alto']))
+        canvas.configure(height=min(self.disposicion['alto'], self.alto_maximo))
+
+    def programar_reubicar(self):
+        """Agrupa los eventos de redimensionado: se redibuja una vez al terminar"""
+        if self._reubicar:
+            self.canvas.after_cancel(self._reubicar)
+        self._reubicar = self.canvas.after(100, self.reubicar)
+
+    def reubicar(self):
+        """Redibuja sólo si cambió la cantidad de mesas que entran por fila"""
+        self._reubicar = None
+        if self.disposicion is None:
+            return
+        disposicion = calcular_disposicion(self.zonas, self.ancho_disponible())
+        if disposicion['columnas'] != self.disposicion['columnas']:
+            self.dibujar()
+
+    def marcar_seleccionada(self, mesa_id):
+        """Resalta la mesa elegida; sólo se tocan la anterior y la nueva"""
+        if mesa_id == self.seleccionada:
+            return
+        if self.seleccionada in self.items:
+            self.canvas.itemconfigure(self.items[self.seleccionada][0], outline='', width=1)
+        if mesa_id in self.items:
+            self.canvas.itemconfigure(self.items[mesa_id][0], outline=COLOR_SELECCION, width=3)
+        self.seleccionada = mesa_id
+
+    # ==================== EVENTOS ====================
+
+    def mesa_en_evento(self, evento):
+        if self.disposicion is None:
+            return None
+        return mesa_en(self.disposicion, self.canvas.canvasx(evento.x), self.canvas.canvasy(evento.y))
+
+    def tocar(self, evento):
+        mesa_id = self.mesa_en_evento(evento)
+        if mesa_id is not None:
+            self.al_seleccionar(self.mesas[mesa_id])
+
+    def mover(self, evento):
+        mesa_id = self.mesa_en_evento(evento)
+        if mesa_id != self._sobre:
+            self.mostrar_detalle(mesa_id)
+
+    def mostrar_detalle(self, mesa_id):
+        """Estado de la mesa bajo el puntero en la línea inferior (en lugar de un tooltip)"""
+        self._sobre = mesa_id
+        if mesa_id is None or mesa_id not in self.mesas:
+            self.label_detalle.config(text="")
+            return
+        self.label_detalle.config(text=f"{self.mesas[mesa_id][1]}: {self.descripciones[mesa_id]}")
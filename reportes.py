@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""Reportes de ventas: lectura de resúmenes diarios o de items por bloques, agregados con pandas"""
+import archivo
+import base_datos
+from dependencias import cargar_pandas
+
+# Filas de items leídas por bloque; acota la memoria con años de historial
+TAMANO_BLOQUE = 100000
+
+# Una sola lectura de items con los datos de su comanda. Mesa y categoría no se
+# juntan aquí: se resuelven después sobre los totales agregados, que tienen
+# decenas de filas en lugar de millones.
+CONSULTA_ITEMS = '''
+    SELECT c.id AS comanda_id,
+           c.fecha,
+           c.usuario,
+           c.mesa_id,
+           i.producto_nombre AS producto,
+           i.cantidad,
+           i.precio_unitario
+    FROM {comandas} c
+    JOIN {items} i ON i.comanda_id = c.id
+    WHERE c.fecha >= ? AND c.fecha < DATE(?, '+1 day')
+      AND c.estado != 'Cancelada'
+'''
+
+# Dimensiones leídas directamente: nombre -> (columna de agrupación, tabla de resumen)
+DIMENSIONES = {
+    'producto': ('producto', 'ventas_diarias_producto'),
+    'hora': ('hora', 'ventas_diarias_hora'),
+    'usuario': ('usuario', 'ventas_diarias_usuario'),
+    'mesa': ('mesa_id', 'ventas_diarias_mesa'),
+}
+
+# Dimensiones en las que cada comanda pertenece a un único valor
+DIMENSIONES_POR_COMANDA = ('hora', 'usuario', 'mesa')
+
+
+def _preparar_bloque(bloque):
+    """Agrega importe y hora a un bloque leído de la base"""
+    bloque['importe'] = bloque['cantidad'] * bloque['precio_unitario']
+    # fecha tiene formato 'YYYY-MM-DD HH:MM:SS'
+    bloque['hora'] = bloque['fecha'].str.slice(11, 13).astype('int64')
+    # Comandas sin mesa quedan agrupadas bajo el id 0
+    bloque['mesa_id'] = bloque['mesa_id'].fillna(0).astype('int64')
+    return bloque
+
+
+def _leer_nombres(conn):
+    """Nombres de mesas por id y categoría de cada producto"""
+    nombres_mesas = dict(conn.execute("SELECT id, nombre FROM mesas").fetchall())
+    categorias = dict(conn.execute(
+        "SELECT nombre, MIN(categoria) FROM productos GROUP BY nombre"
+    ).fetchall())
+    return nombres_mesas, categorias
+
+
+def _reporte_desde_resumenes(pd, conn, desde, hasta):
+    """Suma las tablas ventas_diarias_* del período: una fila por día y clave en lugar de cada item"""
+    reporte = {}
+    for dimension, (columna, tabla) in DIMENSIONES.items():
+        reporte[dimension] = pd.read_sql_query(f'''
+            SELECT {columna}, SUM(cantidad) AS cantidad, SUM(importe) AS importe, SUM(comandas) AS comandas
+            FROM {tabla}
+            WHERE dia >= ? AND dia <= ?
+            GROUP BY {columna}
+        ''', conn, params=(desde, hasta), index_col=columna)
+
+    por_usuario = reporte['usuario']
+    comandas = int(por_usuario['comandas'].sum())
+    unidades = int(por_usuario['cantidad'].sum())
+    total = float(por_usuario['importe'].sum())
+
+    # En producto 'comandas' cuenta las que contienen el producto y no suma al total; no se informa
+    reporte['producto'] = reporte['producto'][['cantidad', 'importe']]
+    return reporte, comandas, unidades, total
+
+
+def _reporte_desde_items(pd, conn, desde, hasta, tamano_bloque, progreso, tablas):
+    """Lee items_comanda por bloques y reduce cada bloque con groupby antes de leer el siguiente"""
+    parciales = {dimension: [] for dimension in DIMENSIONES}
+    comandas = []
+    filas = 0
+    consulta = CONSULTA_ITEMS.format(comandas=tablas[0], items=tablas[1])
+
+    for bloque in pd.read_sql_query(consulta, conn, params=(desde, hasta), chunksize=tamano_bloque):
+        bloque = _preparar_bloque(bloque)
+        filas += len(bloque)
+        for dimension, (columna, _) in DIMENSIONES.items():
+            parciales[dimension].append(
+                bloque.groupby(columna, sort=False)[['cantidad', 'importe']].sum()
+            )
+        # Una fila por comanda; una comanda partida entre dos bloques se une al final
+        comandas.append(
+            bloque.groupby('comanda_id', sort=False).agg(
+                importe=('importe', 'sum'),
+                cantidad=('cantidad', 'sum'),
+                hora=('hora', 'first'),
+                usuario=('usuario', 'first'),
+                mesa_id=('mesa_id', 'first'),
+            )
+        )
+        if progreso:
+            progreso(filas)
+
+    reporte = {}
+    for dimension, (columna, _) in DIMENSIONES.items():
+        if parciales[dimension]:
+            tabla = pd.concat(parciales[dimension]).groupby(level=0).sum()
+        else:
+            tabla = pd.DataFrame({'cantidad': [], 'importe': []})
+        tabla.index.name = columna
+        reporte[dimension] = tabla
+
+    if comandas:
+        por_comanda = pd.concat(comandas).groupby(level=0).agg(
+            importe=('importe', 'sum'),
+            cantidad=('cantidad', 'sum'),
+            hora=('hora', 'first'),
+            usuario=('usuario', 'first'),
+            mesa_id=('mesa_id', 'first'),
+        )
+    else:
+        por_comanda = pd.DataFrame({'importe': [], 'cantidad': [], 'hora': [], 'usuario': [], 'mesa_id': []})
+
+    for dimension in DIMENSIONES_POR_COMANDA:
+        tabla = reporte[dimension]
+        tabla['comandas'] = por_comanda.groupby(DIMENSIONES[dimension][0]).size()
+        tabla['comandas'] = tabla['comandas'].fillna(0).astype('int64')
+
+    total = float(por_comanda['importe'].sum())
+    unidades = int(por_comanda['cantidad'].sum())
+    return reporte, len(por_comanda), unidades, total
+
+
+def generar_reporte(db_path, desde, hasta, tamano_bloque=TAMANO_BLOQUE, progreso=None, usar_resumenes=True):
+    """Calcula ventas por producto, categoría, hora, mozo y mesa entre dos fechas (inclusive)
+
+    desde/hasta son fechas 'YYYY-MM-DD'. Las comandas canceladas no se cuentan.
+    Por defecto suma los resúmenes diarios (ventas_diarias); con usar_resumenes=False
+    recorre items_comanda por bloques y progreso(filas_leidas) se llama tras cada bloque.
+
+    Devuelve un dict con un DataFrame por dimensión (columnas cantidad, importe y,
+    donde aplica, comandas) y 'totales' con los totales del período.
+    """
+    pd = cargar_pandas()
+    conn = base_datos.conectar(db_path)
+    try:
+        if usar_resumenes:
+            reporte, comandas, unidades, total = _reporte_desde_resumenes(pd, conn, desde, hasta)
+        else:
+            # Incluye comandas archivadas si el período llega a ellas
+            tablas = archivo.tablas_historial(conn, db_path, desde)
+            reporte, comandas, unidades, total = _reporte_desde_items(
+                pd, conn, desde, hasta, tamano_bloque, progreso, tablas)
+        nombres_mesas, categorias = _leer_nombres(conn)
+    finally:
+        conn.close()
+
+    # Categoría a partir de los totales por producto (pocas filas)
+    por_producto = reporte['producto']
+    reporte['categoria'] = por_producto.groupby(
+        por_producto.index.map(lambda nombre: categorias.get(nombre) or 'Sin categoría')
+    )[['cantidad', 'importe']].sum()
+    reporte['categoria'].index.name = 'categoria'
+
+    reporte['mesa'].index = reporte['mesa'].index.map(
+        lambda mesa_id: nombres_mesas.get(mesa_id, 'Sin mesa' if mesa_id == 0 else f'Mesa #{mesa_id}')
+    )
+    reporte['mesa'].index.name = 'mesa'
+
+    reporte['hora'] = reporte['hora'].sort_index()
+    for dimension in ('producto', 'categoria', 'usuario', 'mesa'):
+        reporte[dimension] = reporte[dimension].sort_values('importe', ascending=False)
+
+    reporte['totales'] = {
+        'desde': desde,
+        'hasta': hasta,
+        'comandas': comandas,
+        'unidades': unidades,
+        'total': total,
+        'ticket_promedio': total / comandas if comandas else 0.0,
+    }
+    return reporte
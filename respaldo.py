@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""Respaldo en caliente de comandas.db con la API de backup de SQLite
+
+La copia se hace por pasos de pocas páginas con una pausa entre ellos: cada paso
+toma el bloqueo de lectura sólo mientras copia esas páginas, así las terminales
+pueden seguir registrando comandas durante el respaldo. La copia se verifica con
+PRAGMA integrity_check antes de conservarla y se guardan sólo las últimas N.
+
+SQLite reinicia desde el principio una copia por pasos cada vez que otra
+conexión escribe en la base; con mucho movimiento podría no terminar nunca.
+Después de MAX_REINICIOS reinicios o de TIEMPO_MAXIMO segundos se abandona la
+copia por pasos y se hace en un solo paso, que retiene el bloqueo de lectura
+durante toda la copia pero termina siempre.
+"""
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+DIRECTORIO = 'respaldos'
+PREFIJO = 'comandas_'
+
+# Páginas copiadas por paso y pausa entre pasos (segundos)
+PAGINAS_POR_PASO = 256
+PAUSA = 0.02
+
+# Límite de la copia por pasos antes de pasar a un solo paso
+MAX_REINICIOS = 3
+TIEMPO_MAXIMO = 120
+
+# Respaldos que se conservan al rotar
+CONSERVAR = 7
+
+logger = logging.getLogger('comandas.respaldos')
+logger.propagate = False
+
+
+def configurar_log(ruta_log, max_bytes=1024 * 1024, copias=3):
+    """Registra cada respaldo en un archivo rotativo (una sola vez por proceso)"""
+    if logger.handlers:
+        return
+    try:
+        os.makedirs(os.path.dirname(ruta_log), exist_ok=True)
+        handler = RotatingFileHandler(ruta_log, maxBytes=max_bytes, backupCount=copias, encoding='utf-8')
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+    except OSError as e:
+        print(f"No se pudo abrir el registro de respaldos: {e}")
+
+
+def listar_respaldos(directorio):
+    """Rutas de los respaldos existentes, del más nuevo al más viejo"""
+    if not os.path.isdir(directorio):
+        return []
+    nombres = [
+        nombre for nombre in os.listdir(directorio)
+        if nombre.startswith(PREFIJO) and nombre.endswith('.db')
+    ]
+    # El nombre lleva la fecha AAAAMMDD_HHMMSS: el orden alfabético es cronológico
+    return [os.path.join(directorio, nombre) for nombre in sorted(nombres, reverse=True)]
+
+
+def ultimo_respaldo(directorio):
+    """Fecha del respaldo más reciente o None"""
+    respaldos = listar_respaldos(directorio)
+    if not respaldos:
+        return None
+    return datetime.fromtimestamp(os.path.getmtime(respaldos[0]))
+
+
+def rotar(directorio, conservar=CONSERVAR):
+    """Borra los respaldos más viejos dejando los 'conservar' más recientes"""
+    borrados = []
+    for ruta in listar_respaldos(directorio)[conservar:]:
+        try:
+            os.remove(ruta)
+            borrados.append(ruta)
+        except OSError as e:
+            print(f"No se pudo borrar el respaldo {ruta}: {e}")
+    return borrados
+
+
+def verificar(ruta):
+    """Ejecuta PRAGMA integrity_check sobre una copia; devuelve el primer error o None"""
+    conn = sqlite3.connect(ruta)
+    try:
+        resultado = conn.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        conn.close()
+    return None if resultado == 'ok' else resultado
+
+
+class _CopiaPorPasosAbandonada(Exception):
+    """La copia por pasos se reinició o tardó demasiado"""
+
+
+def limpiar_parciales(directorio):
+    """Borra las copias a medias de un respaldo interrumpido (y su journal)"""
+    borrados = []
+    for nombre in os.listdir(directorio):
+        if nombre.startswith(PREFIJO) and (nombre.endswith('.parcial') or nombre.endswith('.parcial-journal')):
+            ruta = os.path.join(directorio, nombre)
+            try:
+                os.remove(ruta)
+                borrados.append(ruta)
+            except OSError as e:
+                print(f"No se pudo borrar la copia parcial {ruta}: {e}")
+    return borrados
+
+
+def _borrar_temporal(temporal):
+    for ruta in (temporal, temporal + '-journal'):
+        if os.path.exists(ruta):
+            os.remove(ruta)
+
+
+def respaldar(db_path, directorio, paginas=PAGINAS_POR_PASO, pausa=PAUSA, conservar=CONSERVAR,
+              max_reinicios=MAX_REINICIOS, tiempo_maximo=TIEMPO_MAXIMO):
+    """Copia db_path a directorio/comandas_AAAAMMDD_HHMMSS.db sin bloquear la base
+
+    Devuelve un dict con ruta, tamaño, pasos, duración total y el mayor tiempo
+    que un paso retuvo el bloqueo. Si la verificación falla la copia se descarta
+    y se lanza sqlite3.DatabaseError.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    for ruta_parcial in limpiar_parciales(directorio):
+        logger.warning("Copia parcial de un respaldo interrumpido borrada: %s", os.path.basename(ruta_parcial))
+    ruta = os.path.join(directorio, f"{PREFIJO}{datetime.now().strftime('%Y%m%d_%H%M%S')}.db")
+    temporal = ruta + '.parcial'
+
+    # backup() llama a progreso al terminar cada paso, ya sin el bloqueo de
+    # lectura; la pausa se hace ahí porque su parámetro sleep sólo se aplica
+    # cuando la base está ocupada. Lo que va de una llamada a la siguiente
+    # (sin la pausa) es lo que el paso retuvo el bloqueo.
+    medicion = {'pasos': 0, 'max_paso': 0.0, 'total_pasos': 0.0, 'desde': None, 'restantes': None, 'reinicios': 0}
+
+    def progreso(estado, restantes, total):
+        duracion = time.perf_counter() - medicion['desde']
+        medicion['pasos'] += 1
+        medicion['total_pasos'] += duracion
+        medicion['max_paso'] = max(medicion['max_paso'], duracion)
+        # Si quedan más páginas que en el paso anterior, SQLite empezó de nuevo
+        if medicion['restantes'] is not None and restantes > medicion['restantes']:
+            medicion['reinicios'] += 1
+        medicion['restantes'] = restantes
+        if restantes and (medicion['reinicios'] > max_reinicios or time.perf_counter() - inicio > tiempo_maximo):
+            raise _CopiaPorPasosAbandonada()
+        if restantes and pausa:
+            time.sleep(pausa)
+        medicion['desde'] = time.perf_counter()
+
+    inicio = time.perf_counter()
+    un_paso = False
+    origen = sqlite3.connect(db_path, timeout=10)
+    try:
+        destino = sqlite3.connect(temporal)
+        try:
+            medicion['desde'] = time.perf_counter()
+            origen.backup(destino, pages=paginas, progress=progreso, sleep=pausa)
+        except _CopiaPorPasosAbandonada:
+            logger.warning(
+                "Copia por pasos abandonada tras %d reinicios y %.1f s por escrituras en la base; se copia en un solo paso",
+                medicion['reinicios'], time.perf_counter() - inicio
+            )
+            destino.close()
+            _borrar_temporal(temporal)
+            un_paso = True
+            destino = sqlite3.connect(temporal)
+            medicion['desde'] = time.perf_counter()
+            origen.backup(destino, pages=-1, progress=progreso)
+        finally:
+            destino.close()
+    except BaseException as e:
+        _borrar_temporal(temporal)
+        logger.error("Respaldo fallido, copia parcial borrada: %s", e)
+        raise
+    finally:
+        origen.close()
+    copia = time.perf_counter() - inicio
+
+    error = verificar(temporal)
+    if error:
+        os.remove(temporal)
+        logger.error("Respaldo descartado, la copia no pasó integrity_check: %s", error)
+        raise sqlite3.DatabaseError(f"La copia no pasó la verificación de integridad: {error}")
+    os.replace(temporal, ruta)
+    borrados = rotar(directorio, conservar)
+
+    resultado = {
+        'ruta': ruta,
+        'bytes': os.path.getsize(ruta),
+        'pasos': medicion['pasos'],
+        'reinicios': medicion['reinicios'],
+        'un_paso': un_paso,
+        'duracion_s': time.perf_counter() - inicio,
+        'copia_s': copia,
+        'bloqueo_max_ms': medicion['max_paso'] * 1000,
+        'bloqueo_total_ms': medicion['total_pasos'] * 1000,
+        'rotados': len(borrados),
+    }
+    logger.info(
+        "Respaldo %s: %d bytes en %d pasos (%d reinicios%s), %.2f s (copia %.2f s), "
+        "bloqueo máx. %.1f ms, total %.1f ms, %d rotados",
+        os.path.basename(ruta), resultado['bytes'], resultado['pasos'], resultado['reinicios'],
+        ', terminado en un solo paso' if un_paso else '', resultado['duracion_s'],
+        resultado['copia_s'], resultado['bloqueo_max_ms'], resultado['bloqueo_total_ms'], resultado['rotados']
+    )
+    return resultado
@@ -0,0 +1,431 @@
+# -*- coding: utf-8 -*-
+"""API HTTP/JSON para terminales sin Tkinter (handhelds, tablets)
+
+Expone catálogo, mesas, alta de comandas y transiciones de estado sobre el
+mismo OrderEngine que usa la interfaz, así las reglas (mesa obligatoria,
+numeración, resúmenes diarios, eventos) son las mismas.
+
+El servidor usa sólo la biblioteca estándar. Las conexiones se atienden en un
+pool fijo de hilos, cada uno con su propio OrderEngine (las conexiones SQLite
+no se comparten entre hilos); si el pool y la cola de espera están llenos se
+responde 503 enseguida en lugar de acumular hilos. Las respuestas son HTTP/1.1
+con Content-Length, por lo que el cliente puede reutilizar la conexión; una
+conexión inactiva se cierra a los pocos segundos para liberar su hilo, y si hay
+conexiones esperando un hilo la respuesta lleva Connection: close para cederlo.
+
+El catálogo lleva ETag (la versión de la tabla productos): con If-None-Match
+el servidor responde 304 consultando un solo número, y el cuerpo serializado se
+guarda en memoria hasta que la versión cambia.
+
+Autenticación: HTTP Basic con los usuarios del sistema. Las credenciales viajan
+sin cifrar; exponer el servidor sólo en la red local del negocio.
+
+Uso:
+    python comandas_cli.py servidor --host 0.0.0.0 --puerto 8080
+
+    curl -u admin:admin123 http://localhost:8080/api/catalogo
+    curl -u admin:admin123 -d '{"mesa_id": 1, "items": [{"producto_id": 3, "cantidad": 2}]}' \\
+         http://localhost:8080/api/comandas
+"""
+import base64
+import binascii
+import json
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import unquote
+
+from motor_comandas import OrderEngine, ComandaError
+
+PUERTO = 8080
+
+# Hilos que atienden conexiones y conexiones que pueden esperar un hilo libre
+HILOS = 8
+COLA = 32
+
+# Segundos que una conexión keep-alive puede quedar inactiva ocupando un hilo
+INACTIVIDAD = 5
+
+# Tamaño máximo del cuerpo de una petición
+MAXIMO_CUERPO = 64 * 1024
+
+_CUERPO_OCUPADO = '{"error":"Servidor ocupado, reintentar"}'.encode('utf-8')
+RESPUESTA_OCUPADO = (
+    b'HTTP/1.1 503 Service Unavailable\r\n'
+    b'Content-Type: application/json; charset=utf-8\r\n'
+    b'Retry-After: 1\r\n'
+    b'Connection: close\r\n'
+    b'Content-Length: ' + str(len(_CUERPO_OCUPADO)).encode('ascii') + b'\r\n\r\n'
+    + _CUERPO_OCUPADO
+)
+
+
+class ErrorAPI(Exception):
+    """Error con código HTTP que se devuelve al cliente como {"error": ...}"""
+
+    def __init__(self, estado, mensaje):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+def _json(datos):
+    return json.dumps(datos, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _etag_catalogo(version):
+    return f'"catalogo-{version}"'
+
+
+def credenciales_basic(cabecera):
+    """(usuario, contraseña) de una cabecera Authorization: Basic, o ErrorAPI 401"""
+    if not cabecera.startswith('Basic '):
+        raise ErrorAPI(401, "Se requiere usuario y contraseña")
+    try:
+        usuario, _, password = base64.b64decode(cabecera[6:]).decode('utf-8').partition(':')
+    except (binascii.Error, UnicodeDecodeError):
+        raise ErrorAPI(401, "Credenciales mal formadas")
+    return usuario, password
+
+
+def _buscar_comanda(motor, numero):
+    """(id, estado) de la comanda, con el mismo criterio que el motor ante números repetidos, o 404"""
+    try:
+        comanda_id, _, estado = motor._buscar_comanda(numero)
+    except ComandaError:
+        raise ErrorAPI(404, f"No existe la comanda {numero}")
+    return comanda_id, estado
+
+
+# ==================== RUTAS ====================
+
+def _catalogo(servidor, motor, usuario, parametros, cuerpo):
+    version = motor.version_catalogo()
+    return 200, servidor.catalogo_serializado(motor, version), {'ETag': _etag_catalogo(version)}
+
+
+def _mesas(servidor, motor, usuario, parametros, cuerpo):
+    mesas = [
+        {
+            'id': fila['mesa'][0],
+            'nombre': fila['mesa'][1],
+            'capacidad': fila['mesa'][2],
+            'estado': fila['mesa'][3],
+            'ubicacion': fila['mesa'][4],
+            'comandas_activas': fila['activas'],
+            'cuenta': {
+                'id': fila['cuenta']['id'],
+                'abierta': fila['cuenta']['abierta'],
+                'rondas': fila['cuenta']['rondas'],
+                'items': fila['cuenta']['items'],
+                'total': fila['cuenta']['total'],
+            } if fila['cuenta'] else None,
+        }
+        for fila in motor.listar_mesas()
+    ]
+    return 200, {'mesas': mesas}, {}
+
+
+def _comandas_abiertas(servidor, motor, usuario, parametros, cuerpo):
+    return 200, {'comandas': [comanda_json(c) for c in motor.comandas_abiertas()]}, {}
+
+
+def _comanda(servidor, motor, usuario, parametros, cuerpo):
+    comanda_id = _buscar_comanda(motor, parametros['numero'])[0]
+    return 200, comanda_json(motor.obtener_comandas([comanda_id])[0]), {}
+
+
+def _crear_comanda(servidor, motor, usuario, parametros, cuerpo):
+    try:
+        pedidos = [(int(item['producto_id']), int(item.get('cantidad', 1))) for item in cuerpo['items']]
+        mesa_id = int(cuerpo['mesa_id']) if cuerpo.get('mesa_id') is not None else None
+        observaciones = str(cuerpo.get('observaciones', ''))
+        id_cliente = str(cuerpo['id_cliente']) if cuerpo.get('id_cliente') else None
+    except (KeyError, TypeError, ValueError, AttributeError):
+        raise ErrorAPI(400, 'Se esperaba {"mesa_id": N, "items": [{"producto_id": N, "cantidad": N}]}')
+    mesa = motor.obtener_mesa(mesa_id) if mesa_id is not None else None
+    items = motor.armar_items(pedidos)
+    # Con id_cliente el handheld puede reintentar tras un timeout sin duplicar la comanda
+    comanda = motor.registrar_comanda(items, mesa, usuario['nombre'], observaciones, id_cliente=id_cliente)
+    return 200 if comanda['repetida'] else 201, {
+        'id': comanda['id'],
+        'numero_comanda': comanda['numero_comanda'],
+        'total': comanda['total'],
+    }, {'Location': f"/api/comandas/{comanda['numero_comanda']}"}
+
+
+def _completar(servidor, motor, usuario, parametros, cuerpo):
+    _buscar_comanda(motor, parametros['numero'])
+    # Una comanda ya completada o cancelada la rechaza el motor (409)
+    return 200, motor.completar_comanda(parametros['numero']), {}
+
+
+def _cancelar(servidor, motor, usuario, parametros, cuerpo):
+    _buscar_comanda(motor, parametros['numero'])
+    return 200, motor.cancelar_comanda(parametros['numero']), {}
+
+
+def _estacion_lista(servidor, motor, usuario, parametros, cuerpo):
+    _buscar_comanda(motor, parametros['numero'])
+    if parametros['estacion'] not in motor.ESTACIONES:
+        raise ErrorAPI(404, f"No existe la estación {parametros['estacion']}")
+    pendientes = motor.marcar_estacion_lista(parametros['numero'], parametros['estacion'])
+    return 200, {'pendientes_otras_estaciones': pendientes}, {}
+
+
+def _cuenta_abierta(motor, mesa_id):
+    try:
+        cuenta = motor.cuenta_abierta(int(mesa_id))
+    except ValueError:
+        raise ErrorAPI(404, f"No existe la mesa {mesa_id}")
+    if not cuenta:
+        raise ErrorAPI(404, f"La mesa {mesa_id} no tiene una cuenta abierta")
+    return cuenta
+
+
+def _cuenta(servidor, motor, usuario, parametros, cuerpo):
+    cuenta = _cuenta_abierta(motor, parametros['mesa'])
+    rondas = [
+        {'numero_comanda': numero, 'fecha': fecha, 'usuario': mozo, 'estado': estado, 'total': total}
+        for numero, fecha, mozo, estado, total in motor.rondas_de_cuenta(cuenta['id'])
+    ]
+    return 200, dict(cuenta, detalle_rondas=rondas), {}
+
+
+def _cerrar_cuenta(servidor, motor, usuario, parametros, cuerpo):
+    mesa_id = _cuenta_abierta(motor, parametros['mesa'])['mesa_id']
+    return 200, motor.cerrar_cuenta(mesa_id, forzar=bool(cuerpo.get('forzar'))), {}
+
+
+def _estaciones(servidor, motor, usuario, parametros, cuerpo):
+    return 200, {'estaciones': motor.estado_estaciones()}, {}
+
+
+def comanda_json(comanda):
+    """Comanda de OrderEngine con los items como objetos (también la usa el flujo de eventos)"""
+    return dict(comanda, items=[
+        {'nombre': nombre, 'cantidad': cantidad, 'observaciones': observaciones, 'estacion': estacion, 'listo': listo}
+        for nombre, cantidad, observaciones, estacion, listo in comanda['items']
+    ])
+
+
+_SEGMENTO = r'(?P<{}>[^/]+)'
+RUTAS = [
+    ('GET', r'/api/catalogo', _catalogo),
+    ('GET', r'/api/mesas', _mesas),
+    ('GET', r'/api/mesas/' + _SEGMENTO.format('mesa') + r'/cuenta', _cuenta),
+    ('POST', r'/api/mesas/' + _SEGMENTO.format('mesa') + r'/cuenta/cerrar', _cerrar_cuenta),
+    ('GET', r'/api/comandas', _comandas_abiertas),
+    ('POST', r'/api/comandas', _crear_comanda),
+    ('GET', r'/api/comandas/' + _SEGMENTO.format('numero'), _comanda),
+    ('POST', r'/api/comandas/' + _SEGMENTO.format('numero') + r'/completar', _completar),
+    ('POST', r'/api/comandas/' + _SEGMENTO.format('numero') + r'/cancelar', _cancelar),
+    ('POST', r'/api/comandas/' + _SEGMENTO.format('numero') + r'/estaciones/' + _SEGMENTO.format('estacion')
+     + r'/listo', _estacion_lista),
+    ('GET', r'/api/estaciones', _estaciones),
+]
+RUTAS = [(metodo, re.compile(patron + r'/?$'), funcion) for metodo, patron, funcion in RUTAS]
+
+
+# ==================== HTTP ====================
+
+class ManejadorAPI(BaseHTTPRequestHandler):
+    """Atiende las peticiones de una conexión (varias si el cliente usa keep-alive)"""
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'ComandasAPI/1.0'
+    timeout = INACTIVIDAD
+    # Cabeceras y cuerpo salen en dos envíos: con Nagle el segundo espera el ACK
+    # retardado del cliente (~40 ms por respuesta en conexiones keep-alive)
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self._atender('GET')
+
+    def do_POST(self):
+        self._atender('POST')
+
+    def _atender(self, metodo):
+        ruta = self.path.split('?', 1)[0]
+        try:
+            # El cuerpo se lee siempre primero: si quedara en el socket arruinaría la próxima petición
+            cuerpo = self._leer_cuerpo() if metodo == 'POST' else None
+            funcion, parametros = self._buscar_ruta(metodo, ruta)
+            motor = self.server.motor()
+            usuario = self._autenticar(motor)
+            if funcion is _catalogo:
+                # Con If-None-Match vigente se responde sin leer los productos
+                etag = _etag_catalogo(motor.version_catalogo())
+                if self._etag_vigente(etag):
+                    self._responder(304, None, {'ETag': etag})
+                    return
+            estado, datos, cabeceras = funcion(self.server, motor, usuario, parametros, cuerpo)
+            self._responder(estado, datos, cabeceras)
+        except ErrorAPI as e:
+            cabeceras = {'WWW-Authenticate': 'Basic realm="comandas"'} if e.estado == 401 else {}
+            self._responder(e.estado, {'error': str(e)}, cabeceras)
+        except ComandaError as e:
+            # Reglas del negocio (mesa obligatoria, comanda ya cerrada, producto no disponible...)
+            self._responder(409, {'error': str(e), 'titulo': e.titulo})
+        except Exception as e:
+            print(f"Error en la API ({metodo} {ruta}): {e}")
+            self._responder(500, {'error': 'Error interno del servidor'})
+
+    def _buscar_ruta(self, metodo, ruta):
+        metodos = []
+        for metodo_ruta, patron, funcion in RUTAS:
+            coincidencia = patron.match(ruta)
+            if coincidencia:
+                if metodo_ruta == metodo:
+                    return funcion, {nombre: unquote(valor) for nombre, valor in coincidencia.groupdict().items()}
+                metodos.append(metodo_ruta)
+        if metodos:
+            raise ErrorAPI(405, f"Método no permitido; usar {', '.join(metodos)}")
+        raise ErrorAPI(404, f"No existe {ruta}")
+
+    def _leer_cuerpo(self):
+        try:
+            largo = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            raise ErrorAPI(400, "Content-Length inválido")
+        if largo > MAXIMO_CUERPO:
+            # El resto del cuerpo no se lee: la conexión no puede reutilizarse
+            self.close_connection = True
+            raise ErrorAPI(413, "Cuerpo demasiado grande")
+        datos = self.rfile.read(largo) if largo else b'{}'
+        try:
+            cuerpo = json.loads(datos.decode('utf-8'))
+        except (UnicodeDecodeError, ValueError):
+            raise ErrorAPI(400, "El cuerpo debe ser JSON")
+        if not isinstance(cuerpo, dict):
+            raise ErrorAPI(400, "El cuerpo debe ser un objeto JSON")
+        return cuerpo
+
+    def _autenticar(self, motor):
+        usuario, password = credenciales_basic(self.headers.get('Authorization', ''))
+        datos = motor.autenticar_usuario(usuario, password)
+        if datos is None:
+            raise ErrorAPI(401, "Usuario o contraseña incorrectos")
+        return datos
+
+    def _etag_vigente(self, etag):
+        etiquetas = self.headers.get('If-None-Match')
+        if not etiquetas:
+            return False
+        return etiquetas.strip() == '*' or etag in [etiqueta.strip() for etiqueta in etiquetas.split(',')]
+
+    def _responder(self, estado, datos, cabeceras=None):
+        cuerpo = b'' if datos is None else (datos if isinstance(datos, bytes) else _json(datos))
+        self.send_response(estado)
+        if datos is not None:
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.send_header('Cache-Control', 'no-cache')
+        if self.server.hay_espera():
+            # Keep-alive sólo mientras sobran hilos: si no, esta conexión retiene uno
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        for nombre, valor in (cabeceras or {}).items():
+            self.send_header(nombre, valor)
+        self.end_headers()
+        if cuerpo:
+            self.wfile.write(cuerpo)
+
+    def log_message(self, formato, *argumentos):
+        # Una línea por petición en consola sería demasiado en servicio
+        pass
+
+
+class ServidorAPI(HTTPServer):
+    """HTTPServer con un pool fijo de hilos y un OrderEngine por hilo"""
+
+    # Backlog del listen(): con el de socketserver (5) una ráfaga de handhelds pierde
+    # SYN y espera 1 s a retransmitir en lugar de recibir el 503 en el acto
+    request_queue_size = 128
+
+    def __init__(self, direccion, db_path, hilos=HILOS, cola=COLA):
+        self.db_path = db_path
+        self._ejecutor = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='api')
+        # Conexiones en curso más en espera; con el cupo lleno se rechaza en el acto
+        self._cupos = threading.BoundedSemaphore(hilos + cola)
+        self._lock_espera = threading.Lock()
+        self._en_espera = 0
+        self._locales = threading.local()
+        self._lock_catalogo = threading.Lock()
+        self._catalogo = (None, None)
+        super().__init__(direccion, ManejadorAPI)
+
+    def motor(self):
+        """OrderEngine del hilo actual (se crea en la primera petición que atiende)"""
+        motor = getattr(self._locales, 'motor', None)
+        if motor is None:
+            motor = OrderEngine(self.db_path)
+            self._locales.motor = motor
+        return motor
+
+    def catalogo_serializado(self, motor, version):
+        """Cuerpo JSON del catálogo de esa versión, armado una sola vez por versión"""
+        with self._lock_catalogo:
+            version_guardada, cuerpo = self._catalogo
+            if version_guardada == version:
+                return cuerpo
+        productos = [
+            {
+                'id': producto[0],
+                'nombre': producto[1],
+                'precio': producto[2],
+                'categoria': producto[3],
+                'descripcion': producto[5] or '',
+                'estacion': producto[7],
+            }
+            for producto in motor.listar_productos()
+        ]
+        cuerpo = _json({'version': version, 'categorias': motor.listar_categorias(), 'productos': productos})
+        with self._lock_catalogo:
+            # La versión se leyó antes que los productos: nunca queda un cuerpo más viejo que su ETag
+            if self._catalogo[0] is None or self._catalogo[0] < version:
+                self._catalogo = (version, cuerpo)
+        return cuerpo
+
+    def process_request(self, request, client_address):
+        if not self._cupos.acquire(blocking=False):
+            try:
+                request.sendall(RESPUESTA_OCUPADO)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        with self._lock_espera:
+            self._en_espera += 1
+        self._ejecutor.submit(self._atender, request, client_address)
+
+    def hay_espera(self):
+        """Indica si hay conexiones aceptadas esperando un hilo libre"""
+        return self._en_espera > 0
+
+    def _atender(self, request, client_address):
+        with self._lock_espera:
+            self._en_espera -= 1
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._cupos.release()
+
+    def server_close(self):
+        super().server_close()
+        self._ejecutor.shutdown(wait=False, cancel_futures=True)
+
+
+def crear_servidor(db_path, host='127.0.0.1', puerto=PUERTO, hilos=HILOS, cola=COLA):
+    """Crea el servidor (todavía sin atender); puerto 0 elige uno libre"""
+    return ServidorAPI((host, puerto), db_path, hilos, cola)
+
+
+def iniciar_en_segundo_plano(servidor):
+    """Atiende peticiones en un hilo daemon; devuelve el hilo"""
+    hilo = threading.Thread(target=servidor.serve_forever, name='servidor-api', daemon=True)
+    hilo.start()
+    return hilo
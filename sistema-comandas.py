@@ -2,121 +2,29 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import sqlite3
-from datetime import datetime
-import pandas as pd
-from fpdf import FPDF
+from datetime import datetime, timedelta
 import os
 import sys
 import logging
-from PIL import Image, ImageTk
+import threading
 
-class ConfigManager:
-    """Gestor de configuraciones del sistema"""
-    
-    def __init__(self, cursor, conn):
-        self.cursor = cursor
-        self.conn = conn
-        self.configuraciones_por_defecto = {
-            'usar_mesas': {'valor': 'true', 'descripcion': 'Habilitar funcionalidad de mesas', 'tipo': 'boolean'},
-            'usar_categorias': {'valor': 'true', 'descripcion': 'Habilitar categorías de productos', 'tipo': 'boolean'},
-            'usar_observaciones': {'valor': 'true', 'descripcion': 'Permitir observaciones en comandas', 'tipo': 'boolean'},
-            'generar_tickets': {'valor': 'true', 'descripcion': 'Generar tickets PDF automáticamente', 'tipo': 'boolean'},
-            'nombre_negocio': {'valor': 'Restaurante', 'descripcion': 'Nombre del negocio', 'tipo': 'string'},
-            'moneda': {'valor': '$', 'descripcion': 'Símbolo de moneda', 'tipo': 'string'},
-            'actualizacion_automatica': {'valor': 'true', 'descripcion': 'Actualización automática de mesas', 'tipo': 'boolean'},
-            'mostrar_precios_menu': {'valor': 'true', 'descripcion': 'Mostrar precios en el menú de productos', 'tipo': 'boolean'},
-            'permitir_comandas_sin_mesa': {'valor': 'false', 'descripcion': 'Permitir comandas sin asignar mesa', 'tipo': 'boolean'},
-            'mostrar_control_comandas': {'valor': 'true', 'descripcion': 'Mostrar pestaña de control de comandas y estados', 'tipo': 'boolean'},
-            'usar_sistema_usuarios': {'valor': 'true', 'descripcion': 'Habilitar sistema de usuarios y login', 'tipo': 'boolean'},
-            'usuario_predeterminado': {'valor': 'admin', 'descripcion': 'Usuario predeterminado cuando el login está desactivado', 'tipo': 'string'}
-        }
-        self.inicializar_configuraciones()
-    
-    def inicializar_configuraciones(self):
-        """Inicializa las configuraciones por defecto si no existen"""
-        for clave, config in self.configuraciones_por_defecto.items():
-            # Verificar si la configuración ya existe
-            self.cursor.execute("SELECT valor FROM configuracion WHERE clave = ?", (clave,))
-            if not self.cursor.fetchone():
-                # No existe, crear con valor por defecto
-                self.cursor.execute('''
-                    INSERT INTO configuracion (clave, valor, descripcion, tipo)
-                    VALUES (?, ?, ?, ?)
-                ''', (clave, config['valor'], config['descripcion'], config['tipo']))
-        self.conn.commit()
-    
-    def get(self, clave, valor_por_defecto=None):
-        """Obtiene el valor de una configuración"""
-        try:
-            self.cursor.execute("SELECT valor, tipo FROM configuracion WHERE clave = ?", (clave,))
-            resultado = self.cursor.fetchone()
-            
-            if resultado:
-                valor, tipo = resultado
-                # Convertir según el tipo
-                if tipo == 'boolean':
-                    return valor.lower() in ('true', '1', 'si', 'yes', 'on')
-                elif tipo == 'integer':
-                    return int(valor)
-                elif tipo == 'float':
-                    return float(valor)
-                else:
-                    return valor
-            else:
-                return valor_por_defecto
-        except Exception as e:
-            print(f"Error al obtener configuración {clave}: {e}")
-            return valor_por_defecto
-    
-    def set(self, clave, valor, descripcion=None):
-        """Establece el valor de una configuración"""
-        try:
-            # Convertir valor a string para almacenamiento
-            valor_str = str(valor).lower() if isinstance(valor, bool) else str(valor)
-            
-            # Verificar si existe la configuración
-            self.cursor.execute("SELECT id FROM configuracion WHERE clave = ?", (clave,))
-            if self.cursor.fetchone():
-                # Actualizar
-                self.cursor.execute('''
-                    UPDATE configuracion 
-                    SET valor = ?, fecha_modificacion = CURRENT_TIMESTAMP
-                    WHERE clave = ?
-                ''', (valor_str, clave))
-            else:
-                # Crear nueva
-                tipo = 'boolean' if isinstance(valor, bool) else 'string'
-                self.cursor.execute('''
-                    INSERT INTO configuracion (clave, valor, descripcion, tipo)
-                    VALUES (?, ?, ?, ?)
-                ''', (clave, valor_str, descripcion or f'Configuración {clave}', tipo))
-            
-            self.conn.commit()
-            return True
-        except Exception as e:
-            print(f"Error al establecer configuración {clave}: {e}")
-            return False
-    
-    def get_all(self):
-        """Obtiene todas las configuraciones"""
-        try:
-            self.cursor.execute('''
-                SELECT clave, valor, descripcion, tipo 
-                FROM configuracion 
-                ORDER BY clave
-            ''')
-            configuraciones = {}
-            for clave, valor, descripcion, tipo in self.cursor.fetchall():
-                configuraciones[clave] = {
-                    'valor': self.get(clave),  # Usar get() para conversión de tipo
-                    'valor_raw': valor,
-                    'descripcion': descripcion,
-                    'tipo': tipo
-                }
-            return configuraciones
-        except Exception as e:
-            print(f"Error al obtener todas las configuraciones: {e}")
-            return {}
+from dependencias import cargar_fpdf
+from motor_comandas import OrderEngine, ComandaError
+import archivo
+import base_datos
+import instrumentacion
+import reportes
+import exportacion
+import respaldo
+from mas_vendidos import RankingMasVendidos
+import miniaturas
+from monitor_ui import MonitorLatenciaUI
+from pantalla_cocina import PantallaCocina
+from plano_mesas import PlanoMesas
+import servidor_api
+import eventos_sse
+import diario_local
+import borradores
 
 class SistemaComandas:
     def __init__(self, root):
@@ -155,8 +63,48 @@ class SistemaComandas:
         # Inicializar base de datos
         self.init_database()
         
-        # Inicializar gestor de configuraciones
-        self.config = ConfigManager(self.cursor, self.conn)
+        # Gestor de configuraciones (compartido con el motor)
+        self.config = self.motor.config
+        
+        # Monitor de bloqueos del bucle de eventos (diagnóstico de "pantalla congelada")
+        self.monitor_ui = None
+        if self.config.get('monitor_bloqueos_ui', True):
+            self.monitor_ui = MonitorLatenciaUI(
+                self.root,
+                umbral_ms=self.config.get('umbral_bloqueo_ui_ms', 250),
+                ruta_log=os.path.join(self.get_app_directory(), 'logs', 'bloqueos_ui.log')
+            )
+            self.monitor_ui.iniciar()
+        
+        # Mover comandas cerradas antiguas al archivo sin demorar el inicio
+        self.archivar_en_segundo_plano()
+        
+        # Respaldo automático periódico
+        self.respaldo_en_curso = False
+        self.programar_respaldo()
+        
+        # Pantalla de cocina abierta desde el encabezado (una sola a la vez)
+        self.pantalla_cocina = None
+        
+        # API HTTP y flujo de eventos para handhelds (opcional)
+        self.servidor_api = None
+        self.flujo_eventos = None
+        self.iniciar_servidor_api()
+        
+        # Diario local: comandas tomadas sin conexión con la base, pendientes de envío
+        self.diario = diario_local.DiarioLocal(diario_local.ruta_por_defecto(self.motor.db_path))
+        self.sin_conexion = False
+        self.sincronizacion_en_curso = False
+        self.label_conexion = None
+        self.programar_sincronizacion()
+        
+        # Borradores de la comanda en curso por mesa: se escriben en segundo plano
+        self.borradores = borradores.Borradores(
+            self.motor.db_path,
+            intervalo_ms=self.config.get('milisegundos_guardar_borrador', borradores.INTERVALO_MS)
+        )
+        self.borradores.cargar()
+        self.borradores.iniciar()
         
         # Comanda actual
         self.comanda_actual = []
@@ -242,211 +190,193 @@ class SistemaComandas:
             return os.path.dirname(os.path.abspath(__file__))
         
     def init_database(self):
-        """Inicializa la base de datos y crea las tablas"""
+        """Inicializa la base de datos y el motor de comandas"""
         # Crear la base de datos en el directorio de la aplicación
         app_dir = self.get_app_directory()
         db_path = os.path.join(app_dir, 'comandas.db')
         
-        self.conn = sqlite3.connect(db_path)
-        self.cursor = self.conn.cursor()
+        self.motor = OrderEngine(db_path)
+        self.conn = self.motor.conn
+        self.cursor = self.motor.cursor
         
         print(f"Base de datos ubicada en: {db_path}")
-        
-        # Tabla de usuarios
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS usuarios (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                usuario TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL,
-                nombre_completo TEXT,
-                rol TEXT NOT NULL,
-                activo INTEGER DEFAULT 1,
-                ultimo_acceso TEXT
-            )
-        ''')
-        
-        # Actualizar tabla usuarios si es necesaria (migración)
+    
+    def iniciar_servidor_api(self):
+        """Levanta la API HTTP en la red local si está habilitada en la configuración"""
+        if not self.config.get('servidor_api', False):
+            return
+        puerto = self.config.get('puerto_servidor_api', servidor_api.PUERTO)
         try:
-            # Verificar si existe la columna 'nombre_completo'
-            self.cursor.execute("PRAGMA table_info(usuarios)")
-            columnas = [col[1] for col in self.cursor.fetchall()]
-            
-            if 'nombre_completo' not in columnas:
-                self.cursor.execute("ALTER TABLE usuarios ADD COLUMN nombre_completo TEXT")
-            if 'activo' not in columnas:
-                self.cursor.execute("ALTER TABLE usuarios ADD COLUMN activo INTEGER DEFAULT 1")
-            if 'ultimo_acceso' not in columnas:
-                self.cursor.execute("ALTER TABLE usuarios ADD COLUMN ultimo_acceso TEXT")
-            if 'usuario' not in columnas:
-                # Si no existe 'usuario', crear la columna y copiar de 'nombre'
-                self.cursor.execute("ALTER TABLE usuarios ADD COLUMN usuario TEXT")
-                self.cursor.execute("UPDATE usuarios SET usuario = nombre WHERE usuario IS NULL")
-            
-            # Asegurar que ambas columnas tengan valores válidos
-            self.cursor.execute("UPDATE usuarios SET nombre_completo = usuario WHERE nombre_completo IS NULL AND usuario IS NOT NULL")
-            self.cursor.execute("UPDATE usuarios SET usuario = nombre_completo WHERE usuario IS NULL AND nombre_completo IS NOT NULL")
-            
-        except Exception as e:
-            print(f"Error en migración de usuarios: {e}")
-            pass
-        
-        # Tabla de productos/platos
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS productos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nombre TEXT NOT NULL,
-                precio REAL NOT NULL,
-                categoria TEXT,
-                disponible INTEGER DEFAULT 1,
-                descripcion TEXT,
-                imagen TEXT
-            )
-        ''')
+            self.servidor_api = servidor_api.crear_servidor(self.motor.db_path, '0.0.0.0', puerto)
+        except OSError as e:
+            print(f"No se pudo iniciar la API en el puerto {puerto}: {e}")
+            return
+        servidor_api.iniciar_en_segundo_plano(self.servidor_api)
+        print(f"API para handhelds escuchando en el puerto {puerto}")
         
-        # Agregar columna imagen si no existe (para bases de datos existentes)
+        puerto_eventos = self.config.get('puerto_eventos_api', eventos_sse.PUERTO)
         try:
-            self.cursor.execute("ALTER TABLE productos ADD COLUMN imagen TEXT")
-            self.conn.commit()
-        except sqlite3.OperationalError:
-            # La columna ya existe
-            pass
+            self.flujo_eventos = eventos_sse.iniciar_en_segundo_plano(self.motor.db_path, '0.0.0.0', puerto_eventos)
+        except OSError as e:
+            print(f"No se pudo iniciar el flujo de eventos en el puerto {puerto_eventos}: {e}")
+    
+    def programar_sincronizacion(self):
+        """Reintenta enviar las comandas del diario local mientras queden pendientes"""
+        if not self.sincronizacion_en_curso and self.diario.pendientes():
+            self.sincronizar_en_segundo_plano()
+        self.root.after(diario_local.REINTENTO_SEGUNDOS * 1000, self.programar_sincronizacion)
+    
+    def sincronizar_en_segundo_plano(self):
+        """Envía las comandas pendientes en un hilo con una conexión nueva"""
+        self.sincronizacion_en_curso = True
+        db_path = self.motor.db_path
+        resultado = {}
         
-        # Tabla de mesas
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS mesas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nombre TEXT UNIQUE NOT NULL,
-                capacidad INTEGER DEFAULT 4,
-                estado TEXT DEFAULT 'Disponible',
-                ubicacion TEXT
-            )
-        ''')
+        def enviar():
+            try:
+                # Conexión propia: la de la interfaz pudo quedar inválida durante el corte
+                motor = OrderEngine(db_path)
+                try:
+                    resultado['enviadas'], resultado['descartadas'] = diario_local.sincronizar(self.diario, motor)
+                finally:
+                    motor.cerrar()
+            except Exception as e:
+                resultado['error'] = e
         
-        # Actualizar tabla mesas si es necesaria (migración)
-        try:
-            # Verificar si existe la columna 'nombre'
-            self.cursor.execute("PRAGMA table_info(mesas)")
-            columnas = [col[1] for col in self.cursor.fetchall()]
-            
-            if 'nombre' not in columnas:
-                self.cursor.execute("ALTER TABLE mesas ADD COLUMN nombre TEXT")
-                # Migrar datos de 'numero' a 'nombre' si es necesario
-                self.cursor.execute("UPDATE mesas SET nombre = numero WHERE nombre IS NULL")
-            if 'ubicacion' not in columnas:
-                self.cursor.execute("ALTER TABLE mesas ADD COLUMN ubicacion TEXT DEFAULT 'Sin ubicación'")
-        except:
-            pass
+        hilo = threading.Thread(target=enviar, name='sincronizacion-diario', daemon=True)
+        hilo.start()
+        self.root.after(200, lambda: self.esperar_sincronizacion(hilo, resultado))
+    
+    def esperar_sincronizacion(self, hilo, resultado):
+        """Consulta el hilo de sincronización desde el hilo de Tk"""
+        if hilo.is_alive():
+            self.root.after(200, lambda: self.esperar_sincronizacion(hilo, resultado))
+            return
+        self.sincronizacion_en_curso = False
         
-        # Tabla de comandas
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS comandas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                numero_comanda TEXT NOT NULL,
-                mesa_id INTEGER,
-                fecha TEXT NOT NULL,
-                usuario TEXT NOT NULL,
-                total REAL NOT NULL,
-                estado TEXT DEFAULT 'Pendiente',
-                observaciones TEXT,
-                FOREIGN KEY (mesa_id) REFERENCES mesas (id)
-            )
-        ''')
-        
-        # Tabla de items de comanda
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS items_comanda (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                comanda_id INTEGER NOT NULL,
-                producto_nombre TEXT NOT NULL,
-                cantidad INTEGER NOT NULL,
-                precio_unitario REAL NOT NULL,
-                observaciones TEXT,
-                FOREIGN KEY (comanda_id) REFERENCES comandas (id)
-            )
-        ''')
-        
-        # Tabla de configuración del sistema
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS configuracion (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                clave TEXT UNIQUE NOT NULL,
-                valor TEXT NOT NULL,
-                descripcion TEXT,
-                tipo TEXT DEFAULT 'string',
-                fecha_modificacion TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        if 'error' in resultado:
+            print(f"La base sigue sin responder, las comandas quedan en el diario local: {resultado['error']}")
+            self.marcar_sin_conexion()
+            self.actualizar_estado_conexion()
+            return
         
-        # Migración: normalizar estados de comandas existentes
+        if self.sin_conexion:
+            self.sin_conexion = False
+            self.motor.reconectar()
+            self.conn = self.motor.conn
+            self.cursor = self.motor.cursor
+        
+        if resultado['enviadas']:
+            self.emitir_comandas_enviadas(resultado['enviadas'])
+        if resultado['descartadas']:
+            messagebox.showwarning("Comandas descartadas", "Estas comandas del diario local no se pudieron enviar:\n\n" + "\n".join(
+                f"{registro['fecha']} - {registro['mesa'][1] if registro['mesa'] else 'Sin mesa'}: {motivo}"
+                for registro, motivo in resultado['descartadas']
+            ))
+        self.actualizar_estado_conexion(len(resultado['enviadas']))
+        if resultado['enviadas']:
+            self.cargar_mesas()
+    
+    def emitir_comandas_enviadas(self, enviadas):
+        """Tickets de las comandas del diario que llegaron a la base y aviso con sus números
+
+        Las repetidas (ya estaban en la base antes del corte) tuvieron su ticket
+        al registrarse y no se vuelven a imprimir.
+        """
+        generar_tickets = self.config.get('generar_tickets', True)
+        por_estacion = self.config.get('tickets_por_estacion', False)
+        lineas = []
+        for registro, comanda in enviadas:
+            if comanda['repetida']:
+                continue
+            mesa_nombre = registro['mesa'][1] if registro['mesa'] else 'Sin Mesa'
+            print(f"Comanda tomada a las {registro['fecha']} enviada como {comanda['numero_comanda']}")
+            if generar_tickets:
+                self.generar_ticket_comanda(
+                    comanda['id'], comanda['numero_comanda'], comanda['total'], registro['observaciones'],
+                    mesa_nombre=mesa_nombre, usuario_nombre=registro['usuario']
+                )
+                if por_estacion:
+                    self.generar_tickets_estacion(
+                        comanda['id'], comanda['numero_comanda'], registro['observaciones'], mesa_nombre=mesa_nombre
+                    )
+            lineas.append(f"{comanda['numero_comanda']} - {mesa_nombre} (tomada {registro['fecha'][11:16]})")
+        if not lineas:
+            return
+        mensaje = "Volvió la conexión. Estas comandas tomadas sin conexión ya están en la base:\n\n" + "\n".join(lineas)
+        if generar_tickets:
+            mensaje += "\n\n📄 Sus tickets se guardaron en la carpeta 'tickets'"
+        messagebox.showinfo("Comandas enviadas", mensaje)
+    
+    def marcar_sin_conexion(self):
+        """Acorta la espera de bloqueo hasta que vuelva la conexión (reconectar la restablece)"""
+        self.sin_conexion = True
         try:
-            self.cursor.execute("UPDATE comandas SET estado = 'Pendiente' WHERE estado = 'pendiente'")
-            self.cursor.execute("UPDATE comandas SET estado = 'En preparación' WHERE estado = 'en preparacion' OR estado = 'en preparación'")
-            self.cursor.execute("UPDATE comandas SET estado = 'Completada' WHERE estado = 'completada'")
-            self.cursor.execute("UPDATE comandas SET estado = 'Cancelada' WHERE estado = 'cancelada'")
-            self.conn.commit()
-        except Exception as e:
-            print(f"Error en migración de estados de comandas: {e}")
+            self.motor.conn.execute(f"PRAGMA busy_timeout = {diario_local.ESPERA_SIN_CONEXION_MS}")
+        except sqlite3.Error:
+            pass
+    
+    def actualizar_estado_conexion(self, enviadas=0):
+        """Muestra en el encabezado las comandas en espera o las recién enviadas"""
+        if not self.label_conexion or not self.label_conexion.winfo_exists():
+            return
+        pendientes = len(self.diario.pendientes())
+        if pendientes:
+            self.label_conexion.config(text=f"⚠ Sin conexión: {pendientes} comandas en espera", bg='#E67E22')
+        elif enviadas:
+            self.label_conexion.config(text=f"✅ {enviadas} comandas en espera enviadas", bg='#27AE60')
+            self.root.after(10000, lambda: self.actualizar_estado_conexion())
+        else:
+            self.label_conexion.config(text="", bg='#2C3E50')
+    
+    def archivar_en_segundo_plano(self):
+        """Ejecuta la retención de comandas en un hilo con su propia conexión"""
+        dias = self.config.get('dias_retencion_comandas', 0)
+        if dias <= 0:
+            return
+        db_path = self.motor.db_path
         
-        # Insertar usuario admin por defecto si no existe
-        self.cursor.execute("SELECT * FROM usuarios WHERE usuario = 'admin'")
-        admin_user = self.cursor.fetchone()
+        def archivar():
+            conn = base_datos.conectar(db_path)
+            try:
+                comandas, items = archivo.archivar(conn, db_path, dias)
+                if comandas:
+                    print(f"Archivadas {comandas} comandas ({items} items) con más de {dias} días")
+            except Exception as e:
+                print(f"Error al archivar comandas: {e}")
+            finally:
+                conn.close()
         
-        if not admin_user:
-            # No existe, crear el usuario admin
-            self.cursor.execute('''
-                INSERT INTO usuarios (usuario, password, nombre_completo, rol, activo) 
-                VALUES ('admin', 'admin123', 'Administrador del Sistema', 'Administrador', 1)
-            ''')
-        else:
-            # Existe, asegurar que tenga el rol correcto
-            self.cursor.execute('''
-                UPDATE usuarios 
-                SET rol = 'Administrador', nombre_completo = 'Administrador del Sistema', activo = 1
-                WHERE usuario = 'admin'
-            ''')
-        
-        # Limpiar usuarios duplicados o con problemas (ej: 'Administrador' en lugar de 'admin')
-        self.cursor.execute("DELETE FROM usuarios WHERE usuario = 'Administrador' AND usuario != 'admin'")
-        
-        # Insertar productos de ejemplo si no existen
-        self.cursor.execute("SELECT COUNT(*) FROM productos")
-        if self.cursor.fetchone()[0] == 0:
-            productos_ejemplo = [
-                ('Hamburguesa Clásica', 2500, 'Hamburguesas', 1, 'Carne, lechuga, tomate, cebolla'),
-                ('Pizza Margarita', 3000, 'Pizzas', 1, 'Salsa de tomate, mozzarella, albahaca'),
-                ('Papas Fritas', 800, 'Guarniciones', 1, 'Papas cortadas en bastones'),
-                ('Coca Cola 500ml', 600, 'Bebidas', 1, 'Bebida gaseosa'),
-                ('Milanesa con Puré', 2800, 'Platos Principales', 1, 'Milanesa de carne con puré de papas'),
-                ('Ensalada César', 1800, 'Ensaladas', 1, 'Lechuga, pollo, crutones, aderezo césar'),
-                ('Café Expreso', 400, 'Cafetería', 1, 'Café expreso tradicional'),
-                ('Agua Mineral', 300, 'Bebidas', 1, 'Agua sin gas 500ml')
-            ]
-            self.cursor.executemany('''
-                INSERT INTO productos (nombre, precio, categoria, disponible, descripcion)
-                VALUES (?, ?, ?, ?, ?)
-            ''', productos_ejemplo)
-        
-        # Insertar mesas de ejemplo si no existen
-        self.cursor.execute("SELECT COUNT(*) FROM mesas")
-        if self.cursor.fetchone()[0] == 0:
-            mesas_ejemplo = [
-                ('Mesa 1', 4, 'Disponible', 'Zona Principal'),
-                ('Mesa 2', 4, 'Disponible', 'Zona Principal'),
-                ('Mesa 3', 6, 'Disponible', 'Zona Principal'),
-                ('Mesa 4', 2, 'Disponible', 'Zona Ventana'),
-                ('Mesa 5', 8, 'Disponible', 'Zona VIP'),
-                ('Barra 1', 1, 'Disponible', 'Barra'),
-                ('Barra 2', 1, 'Disponible', 'Barra'),
-                ('Terraza 1', 4, 'Disponible', 'Terraza'),
-                ('Terraza 2', 6, 'Disponible', 'Terraza'),
-                ('Privado 1', 10, 'Disponible', 'Salón Privado')
-            ]
-            self.cursor.executemany('''
-                INSERT INTO mesas (nombre, capacidad, estado, ubicacion)
-                VALUES (?, ?, ?, ?)
-            ''', mesas_ejemplo)
+        threading.Thread(target=archivar, name='archivo-comandas', daemon=True).start()
+    
+    def programar_respaldo(self):
+        """Inicia un respaldo si pasó el intervalo configurado y vuelve a revisar en una hora"""
+        if self.config.get('respaldo_automatico', True) and not self.respaldo_en_curso:
+            directorio = os.path.join(self.get_app_directory(), respaldo.DIRECTORIO)
+            ultimo = respaldo.ultimo_respaldo(directorio)
+            horas = self.config.get('horas_entre_respaldos', 24)
+            if ultimo is None or datetime.now() - ultimo >= timedelta(hours=horas):
+                self.respaldar_en_segundo_plano(directorio)
+        self.root.after(60 * 60 * 1000, self.programar_respaldo)
+    
+    def respaldar_en_segundo_plano(self, directorio):
+        """Respalda la base en un hilo; los pasos cortos no frenan el registro de comandas"""
+        db_path = self.motor.db_path
+        conservar = self.config.get('respaldos_a_conservar', respaldo.CONSERVAR)
+        respaldo.configurar_log(os.path.join(self.get_app_directory(), 'logs', 'respaldos.log'))
+        self.respaldo_en_curso = True
+        
+        def respaldar():
+            try:
+                resultado = respaldo.respaldar(db_path, directorio, conservar=conservar)
+                print(f"Respaldo creado: {resultado['ruta']} ({resultado['duracion_s']:.2f} s, "
+                      f"bloqueo máximo {resultado['bloqueo_max_ms']:.1f} ms)")
+            except Exception as e:
+                print(f"Error al respaldar la base de datos: {e}")
+            finally:
+                self.respaldo_en_curso = False
         
-        self.conn.commit()
+        threading.Thread(target=respaldar, name='respaldo-base', daemon=True).start()
     
     def mostrar_login(self):
         """Muestra la ventana de login"""
@@ -542,7 +472,10 @@ class SistemaComandas:
             
             self.usuario_actual_completo = self.usuario_actual  # Para compatibilidad
             self.login_frame.destroy()
-            self.mostrar_interfaz_principal()
+            if self.interfaz_en_memoria():
+                self.restaurar_interfaz_principal()
+            else:
+                self.mostrar_interfaz_principal()
         else:
             messagebox.showerror("Error", "Usuario o contraseña incorrectos")
     
@@ -552,6 +485,7 @@ class SistemaComandas:
         header = tk.Frame(self.root, bg='#2C3E50', height=50)  # Azul oscuro elegante
         header.pack(fill='x')
         header.pack_propagate(False)
+        self.header = header
         
         tk.Label(
             header,
@@ -561,13 +495,26 @@ class SistemaComandas:
             fg='white'
         ).pack(side='left', padx=15, pady=10)
         
-        tk.Label(
+        self.label_usuario = tk.Label(
             header,
             text=f"👤 {self.usuario_actual['nombre']}",
             font=('Arial', 10),
             bg='#2C3E50',
             fg='white'
-        ).pack(side='right', padx=8)
+        )
+        self.label_usuario.pack(side='right', padx=8)
+        
+        # Comandas guardadas en el diario local mientras la base no responde
+        self.label_conexion = tk.Label(
+            header,
+            text="",
+            font=('Arial', 10, 'bold'),
+            bg='#2C3E50',
+            fg='white',
+            padx=8
+        )
+        self.label_conexion.pack(side='right', padx=8)
+        self.actualizar_estado_conexion()
         
         tk.Button(
             header,
@@ -581,6 +528,32 @@ class SistemaComandas:
             padx=10
         ).pack(side='right', padx=8, pady=8)
         
+        # Cambio de usuario sin cerrar la aplicación (solo con sistema de login)
+        if self.config.get('usar_sistema_usuarios', True):
+            tk.Button(
+                header,
+                text="🔄 Cambiar Usuario",
+                font=('Arial', 9),
+                bg="#34495E",
+                fg='white',
+                command=self.cambiar_usuario,
+                cursor='hand2',
+                relief='flat',
+                padx=10
+            ).pack(side='right', padx=8, pady=8)
+        
+        tk.Button(
+            header,
+            text="🍳 Cocina",
+            font=('Arial', 9),
+            bg="#34495E",
+            fg='white',
+            command=self.abrir_pantalla_cocina,
+            cursor='hand2',
+            relief='flat',
+            padx=10
+        ).pack(side='right', padx=8, pady=8)
+        
         # Notebook (pestañas)
         self.notebook = ttk.Notebook(self.root)
         self.notebook.pack(fill='both', expand=True, padx=5, pady=5)
@@ -588,7 +561,12 @@ class SistemaComandas:
         # Binding para recalcular layout cuando cambie el tamaño de la ventana
         self.root.bind('<Configure>', self.on_window_resize)
         self._resize_timer = None
-        
+
+        # Pestañas que se construyen al primer uso: nombre del frame -> estado
+        self.pestañas_diferidas = {}
+        # Trabajos en segundo plano en curso ('reporte', 'exportacion'); su pestaña no se libera mientras corren
+        self.trabajos_en_curso = set()
+
         # Crear pestañas según el rol
         self.crear_pestaña_comandas()
         
@@ -597,19 +575,109 @@ class SistemaComandas:
             self.crear_pestaña_estado_comandas()  # Nueva pestaña para todos los usuarios
         
         # Verificar rol de manera segura
-        rol_usuario = self.usuario_actual.get('rol', '').lower() if self.usuario_actual and self.usuario_actual.get('rol') else ''
-        if rol_usuario in ['admin', 'administrador']:
-            self.crear_pestaña_productos()
+        # Con cambio rápido de usuario las pestañas de administración se agregan siempre
+        # (vacías) y se ocultan o muestran según el rol de quien inicie sesión
+        self.pestañas_admin = []
+        if self.es_administrador() or self.config.get('cambio_rapido_usuario', True):
+            # Las pestañas de administración se construyen recién al seleccionarlas
+            # Cada una declara los atributos que guarda en self (se sueltan al liberarla)
+            self.pestañas_admin.append(self.agregar_pestaña_diferida(
+                '🍽️ Productos', self.crear_pestaña_productos,
+                atributos=('tabla_productos', 'prod_nombre', 'prod_precio', 'prod_categoria', 'prod_estacion',
+                           'prod_descripcion', 'prod_imagen', 'disponible_var')
+            ))
             # Solo mostrar pestaña de mesas si está habilitada
             if self.config.get('usar_mesas', True):
-                self.crear_pestaña_mesas()
-            self.crear_pestaña_reportes()
-            self.crear_pestaña_usuarios()
-            self.crear_pestaña_configuracion()
-        
+                self.pestañas_admin.append(self.agregar_pestaña_diferida(
+                    '🪑 Mesas', self.crear_pestaña_mesas, atributos=('tree_mesas',)
+                ))
+            self.pestañas_admin.append(self.agregar_pestaña_diferida(
+                '📊 Reportes', self.crear_pestaña_reportes,
+                atributos=('entry_reporte_desde', 'entry_reporte_hasta', 'btn_generar_reporte', 'btn_exportar_excel',
+                           'progreso_exportacion', 'label_estado_reporte', 'label_totales_reporte', 'tablas_reporte'),
+                trabajos=('reporte', 'exportacion')
+            ))
+            self.pestañas_admin.append(self.agregar_pestaña_diferida(
+                '👥 Usuarios', self.crear_pestaña_usuarios, atributos=('tree_usuarios',)
+            ))
+            self.pestañas_admin.append(self.agregar_pestaña_diferida(
+                '⚙️ Configuración', self.crear_pestaña_configuracion,
+                atributos=('frame_config_scroll', 'controles_config')
+            ))
+            self.aplicar_permisos_pestañas()
+        self.notebook.bind('<<NotebookTabChanged>>', self.on_pestaña_cambiada)
+
         # Inicializar actualización automática de mesas
         self.root.after(30000, self.actualizar_mesas_automatico)
     
+    def agregar_pestaña_diferida(self, texto, constructor, atributos=(), trabajos=()):
+        """Agrega una pestaña vacía cuyo contenido se construye al seleccionarla por primera vez
+
+        atributos son los nombres que el constructor guarda en self y trabajos los
+        trabajos en segundo plano que usan sus widgets (ver trabajos_en_curso).
+        """
+        frame = tk.Frame(self.notebook, bg='#F8F9FA')
+        self.notebook.add(frame, text=texto)
+        self.pestañas_diferidas[str(frame)] = {
+            'frame': frame,
+            'constructor': constructor,
+            'construida': False,
+            'id_liberar': None,
+            'atributos': atributos,
+            'trabajos': trabajos
+        }
+        return frame
+
+    def on_pestaña_cambiada(self, event=None):
+        """Construye la pestaña seleccionada si hace falta y programa liberar las inactivas"""
+        seleccionada = self.notebook.select()
+        liberar = self.config.get('liberar_pestanas_inactivas', False)
+        minutos = self.config.get('minutos_liberar_pestanas', 10)
+
+        for nombre, pestaña in self.pestañas_diferidas.items():
+            if nombre == seleccionada:
+                if pestaña['id_liberar']:
+                    self.root.after_cancel(pestaña['id_liberar'])
+                    pestaña['id_liberar'] = None
+                if not pestaña['construida']:
+                    pestaña['construida'] = True
+                    try:
+                        pestaña['constructor'](pestaña['frame'])
+                    except Exception as e:
+                        pestaña['construida'] = False
+                        messagebox.showerror("Error", f"Error al cargar la pestaña: {str(e)}")
+            elif liberar and pestaña['construida'] and not pestaña['id_liberar']:
+                pestaña['id_liberar'] = self.root.after(
+                    int(minutos * 60000), lambda n=nombre: self.liberar_pestaña(n)
+                )
+
+    def liberar_pestaña(self, nombre):
+        """Destruye el contenido de una pestaña sin uso; se reconstruye al volver a seleccionarla"""
+        pestaña = self.pestañas_diferidas.get(nombre)
+        if not pestaña:
+            return
+        pestaña['id_liberar'] = None
+        if self.notebook.select() == nombre or not pestaña['frame'].winfo_exists():
+            return
+        if self.trabajos_en_curso.intersection(pestaña['trabajos']):
+            # Un trabajo todavía va a mostrar su resultado en la pestaña: se reintenta más tarde
+            minutos = self.config.get('minutos_liberar_pestanas', 10)
+            pestaña['id_liberar'] = self.root.after(int(minutos * 60000), lambda: self.liberar_pestaña(nombre))
+            return
+        for widget in pestaña['frame'].winfo_children():
+            widget.destroy()
+        # Sin referencias a widgets destruidos: las actualizaciones las ven en None y no hacen nada
+        for atributo in pestaña['atributos']:
+            setattr(self, atributo, None)
+        pestaña['construida'] = False
+
+    def widget_activo(self, nombre):
+        """El widget del atributo si su pestaña está construida, o None (nunca construida o liberada)"""
+        widget = getattr(self, nombre, None)
+        if widget is None or not widget.winfo_exists():
+            return None
+        return widget
+
     def crear_pestaña_comandas(self):
         """Crea la pestaña principal de comandas (diseño táctil)"""
         frame_comandas = tk.Frame(self.notebook, bg='#ECF0F1')  # Fondo gris claro
@@ -620,9 +688,9 @@ class SistemaComandas:
         
         # Frame superior - Selección de mesa (solo si usar_mesas está habilitado)
         if usar_mesas:
-            frame_mesa = tk.Frame(frame_comandas, bg='#D5DBDB', relief='raised', bd=1, height=80)  # Gris más oscuro
+            # Sin alto fijo: crece con el plano de mesas hasta su alto máximo
+            frame_mesa = tk.Frame(frame_comandas, bg='#D5DBDB', relief='raised', bd=1)  # Gris más oscuro
             frame_mesa.pack(fill='x', padx=5, pady=3)
-            frame_mesa.pack_propagate(False)
             
             tk.Label(
                 frame_mesa,
@@ -632,9 +700,9 @@ class SistemaComandas:
                 fg='#2C3E50'
             ).pack(side='left', padx=10, pady=5)
             
-            # Botones de mesas (más compactos)
-            self.frame_mesas = tk.Frame(frame_mesa, bg='#E9ECEF')
-            self.frame_mesas.pack(side='left', fill='x', expand=True, padx=5, pady=5)
+            # Plano de mesas por ubicación (un solo Canvas)
+            self.plano_mesas = PlanoMesas(frame_mesa, self.seleccionar_mesa)
+            self.plano_mesas.pack(side='left', fill='x', expand=True, padx=5, pady=5)
             
             self.label_mesa_actual = tk.Label(
                 frame_mesa,
@@ -695,14 +763,58 @@ class SistemaComandas:
             canvas_categorias.pack(side="top", fill="x")
             scrollbar_cat_h.pack(side="top", fill="x")
         
-        # Productos (grid más compacto)
+        # Productos (grid más compacto) con búsqueda mientras se escribe
+        frame_titulo_productos = tk.Frame(frame_izq, bg='#ECF0F1')
+        frame_titulo_productos.pack(fill='x', pady=(10, 5))
+        
         tk.Label(
-            frame_izq,
+            frame_titulo_productos,
             text="🍽️ Productos",
             font=('Arial', 12, 'bold'),
             bg='#ECF0F1',
             fg='#2C3E50'
-        ).pack(pady=(10, 5))
+        ).pack(side='left', padx=(5, 15))
+        
+        tk.Label(
+            frame_titulo_productos,
+            text="🔍",
+            font=('Arial', 12),
+            bg='#ECF0F1'
+        ).pack(side='left')
+        
+        self.busqueda_var = tk.StringVar()
+        self.entry_busqueda = tk.Entry(
+            frame_titulo_productos,
+            textvariable=self.busqueda_var,
+            font=('Arial', 12),
+            relief='solid',
+            bd=1
+        )
+        self.entry_busqueda.pack(side='left', fill='x', expand=True, padx=5, ipady=3)
+        self.entry_busqueda.bind('<Escape>', lambda e: self.limpiar_busqueda())
+        self.busqueda_var.trace_add('write', lambda *args: self.programar_busqueda())
+        self.busqueda_pendiente = None
+        
+        tk.Button(
+            frame_titulo_productos,
+            text="✖",
+            font=('Arial', 10, 'bold'),
+            bg='#95A5A6',
+            fg='white',
+            command=self.limpiar_busqueda,
+            relief='flat',
+            cursor='hand2'
+        ).pack(side='left', padx=(0, 5))
+        
+        # Barra de acceso rápido a los más pedidos (se llena al terminar el primer cálculo)
+        if self.config.get('mostrar_mas_vendidos', True):
+            self.frame_mas_vendidos = tk.Frame(frame_izq, bg='#ECF0F1')
+            self.frame_mas_vendidos.pack(fill='x', pady=(0, 5))
+            self.ranking_mas_vendidos = RankingMasVendidos(
+                self.motor.db_path,
+                por_hora=self.config.get('mas_vendidos_por_hora', True)
+            )
+            self.programar_mas_vendidos()
         
         # Frame con scroll para productos (altura fija)
         canvas_productos = tk.Canvas(frame_izq, bg='#ECF0F1', height=450)  # Gris muy claro
@@ -823,6 +935,7 @@ class SistemaComandas:
             
             # Agregar placeholder text
             self.configurar_placeholder_observaciones()
+            self.text_observaciones.bind("<KeyRelease>", lambda event: self.guardar_borrador())
         else:
             # Crear widget dummy para evitar errores
             self.text_observaciones = tk.Text(frame_der, height=0)
@@ -856,96 +969,23 @@ class SistemaComandas:
         if usar_categorias:
             self.cargar_categorias()
         self.cargar_productos()
+        self.restaurar_borrador()
     
     def cargar_mesas(self):
-        """Carga los botones de mesas"""
+        """Actualiza el plano de mesas (sólo recolorea las que cambiaron)"""
         # Verificar si las mesas están habilitadas
         if not self.config.get('usar_mesas', True):
             return
             
-        # Verificar si el frame de mesas existe
-        if not hasattr(self, 'frame_mesas'):
+        # Verificar si el plano de mesas existe
+        if not hasattr(self, 'plano_mesas'):
             return
-            
-        # Limpiar frame
-        for widget in self.frame_mesas.winfo_children():
-            widget.destroy()
         
-        # Intentar con nueva estructura primero
-        try:
-            self.cursor.execute('SELECT * FROM mesas ORDER BY nombre')
-            mesas = self.cursor.fetchall()
-            columna_nombre = 1  # columna 'nombre'
-            columna_estado = 3  # columna 'estado'
-        except:
-            # Fallback a estructura antigua
-            self.cursor.execute('SELECT * FROM mesas ORDER BY numero')
-            mesas = self.cursor.fetchall()
-            columna_nombre = 1  # columna 'numero'
-            columna_estado = 3  # columna 'estado'
-        
-        for i, mesa in enumerate(mesas):
-            estado = mesa[columna_estado].lower()
-            mesa_id = mesa[0]
-            
-            # Verificar si hay comandas pendientes o en preparación para esta mesa
-            self.cursor.execute("""
-                SELECT COUNT(*) FROM comandas 
-                WHERE mesa_id = ? AND estado IN ('Pendiente', 'En preparación')
-            """, (mesa_id,))
-            comandas_activas = self.cursor.fetchone()[0]
-            
-            # Determinar color según estado de mesa y comandas
-            if estado in ['libre', 'disponible']:
-                if comandas_activas > 0:
-                    color_bg = '#FFC107'  # Amarillo: mesa libre pero con comandas pendientes
-                    tooltip = f"Mesa disponible\nComandas pendientes: {comandas_activas}"
-                else:
-                    color_bg = '#28A745'  # Verde: mesa totalmente libre
-                    tooltip = "Mesa disponible"
-            elif estado.lower() == 'ocupada':
-                # Verificar si hay comandas completadas
-                self.cursor.execute("""
-                    SELECT COUNT(*) FROM comandas 
-                    WHERE mesa_id = ? AND estado = 'Completada'
-                """, (mesa_id,))
-                comandas_completadas = self.cursor.fetchone()[0]
-                
-                if comandas_completadas > 0 and comandas_activas == 0:
-                    color_bg = '#17A2B8'  # Azul: mesa ocupada pero sin comandas activas (lista para liberar)
-                    tooltip = f"Mesa ocupada\nComandas completadas: {comandas_completadas}\n¡Lista para liberar!"
-                else:
-                    color_bg = '#DC3545'  # Rojo: mesa ocupada con comandas activas
-                    tooltip = f"Mesa ocupada\nComandas activas: {comandas_activas}"
-            else:
-                color_bg = '#6C757D'  # Gris: otros estados
-                tooltip = f"Estado: {estado}"
-            
-            color_text = 'white'
-            
-            btn = tk.Button(
-                self.frame_mesas,
-                text=f"{mesa[columna_nombre]}",
-                font=('Arial', 9, 'bold'),
-                bg=color_bg,
-                fg=color_text,
-                command=lambda m=mesa: self.seleccionar_mesa(m),
-                width=8,
-                height=1,
-                cursor='hand2'
-            )
-            btn.grid(row=i//8, column=i%8, padx=1, pady=1)
-            
-            # Agregar tooltip (simulado con bind de eventos)
-            def create_tooltip(widget, text):
-                def on_enter(event):
-                    widget.config(relief='raised')
-                def on_leave(event):
-                    widget.config(relief='flat')
-                widget.bind('<Enter>', on_enter)
-                widget.bind('<Leave>', on_leave)
-            
-            create_tooltip(btn, tooltip)
+        self.plano_mesas.actualizar(
+            self.motor.listar_mesas(),
+            self.borradores.mesas(),
+            self.mesa_actual[0] if self.mesa_actual else None
+        )
     
     def seleccionar_mesa(self, mesa):
         """Selecciona una mesa para la comanda"""
@@ -961,8 +1001,20 @@ class SistemaComandas:
             if not messagebox.askyesno("Mesa Ocupada", f"La {nombre_mesa} está ocupada. ¿Desea continuar?"):
                 return
         
+        anterior = borradores.clave_mesa(self.mesa_actual)
+        if mesa[0] != anterior:
+            borrador = self.borradores.obtener(mesa[0])
+            if anterior == borradores.SIN_MESA and self.comanda_actual and borrador is None:
+                # Lo tomado antes de elegir la mesa pasa a esa mesa
+                self.borradores.descartar(anterior)
+            else:
+                # Cada mesa conserva su comanda en curso
+                self.mostrar_borrador(borrador)
+        
         self.mesa_actual = mesa
+        self.guardar_borrador()
         self.label_mesa_actual.config(text=f"{mesa[1]}")
+        self.plano_mesas.marcar_seleccionada(mesa[0])
         # Mensaje de confirmación más discreto - sin ventana emergente
         print(f"Mesa seleccionada: {mesa[1]}")
     
@@ -992,8 +1044,7 @@ class SistemaComandas:
         ).pack(side='left', padx=2, pady=5)
         
         # Obtener categorías únicas
-        self.cursor.execute('SELECT DISTINCT categoria FROM productos WHERE disponible = 1 ORDER BY categoria')
-        categorias = self.cursor.fetchall()
+        categorias = self.motor.listar_categorias()
         
         # Colores más suaves y elegantes
         colores_categoria = {
@@ -1008,8 +1059,7 @@ class SistemaComandas:
             'Otros': '#95A5A6'         # Gris
         }
         
-        for categoria in categorias:
-            cat_nombre = categoria[0]
+        for cat_nombre in categorias:
             color = colores_categoria.get(cat_nombre, '#95A5A6')
             
             # Nombre más corto para categorías
@@ -1029,32 +1079,104 @@ class SistemaComandas:
                 bd=0
             ).pack(side='left', padx=2, pady=5)
     
+    def programar_mas_vendidos(self):
+        """Recalcula los más pedidos ahora y cada tantos minutos"""
+        if getattr(self, 'after_mas_vendidos', None):
+            self.root.after_cancel(self.after_mas_vendidos)
+        self.actualizar_mas_vendidos()
+        minutos = max(1, self.config.get('minutos_actualizar_mas_vendidos', 15))
+        self.after_mas_vendidos = self.root.after(minutos * 60 * 1000, self.programar_mas_vendidos)
+    
+    def actualizar_mas_vendidos(self):
+        """Recalcula el ranking en segundo plano y lo muestra al terminar"""
+        if not hasattr(self, 'ranking_mas_vendidos'):
+            return
+        self.ranking_mas_vendidos.refrescar_en_segundo_plano()
+        self.root.after(200, self.esperar_mas_vendidos)
+    
+    def esperar_mas_vendidos(self):
+        """Revisa sin bloquear si terminó el cálculo del ranking"""
+        if self.ranking_mas_vendidos.en_curso():
+            self.root.after(200, self.esperar_mas_vendidos)
+            return
+        self.mostrar_mas_vendidos()
+    
+    def mostrar_mas_vendidos(self):
+        """Dibuja la barra con los productos más pedidos (de la hora actual si está configurado)"""
+        if not hasattr(self, 'frame_mas_vendidos') or not self.frame_mas_vendidos.winfo_exists():
+            return
+        for widget in self.frame_mas_vendidos.winfo_children():
+            widget.destroy()
+        
+        hora = datetime.now().hour if self.ranking_mas_vendidos.por_hora else None
+        productos = self.ranking_mas_vendidos.productos(hora)
+        if not productos:
+            return
+        
+        tk.Label(
+            self.frame_mas_vendidos,
+            text="⭐ Más pedidos",
+            font=('Arial', 10, 'bold'),
+            bg='#ECF0F1',
+            fg='#2C3E50'
+        ).grid(row=0, column=0, rowspan=2, padx=(5, 8), sticky='w')
+        
+        columnas = 6
+        for i, producto in enumerate(productos):
+            nombre_corto = producto[1][:18] + "…" if len(producto[1]) > 18 else producto[1]
+            tk.Button(
+                self.frame_mas_vendidos,
+                text=nombre_corto,
+                font=('Arial', 9, 'bold'),
+                bg='#F39C12',
+                fg='white',
+                command=lambda p=producto: self.agregar_a_comanda(p),
+                relief='flat',
+                cursor='hand2'
+            ).grid(row=i // columnas, column=1 + i % columnas, padx=1, pady=1, sticky='ew')
+        for col in range(1, columnas + 1):
+            self.frame_mas_vendidos.columnconfigure(col, weight=1, uniform='mas_vendidos')
+    
     def filtrar_productos(self, categoria):
         """Filtra productos por categoría"""
         self.categoria_actual = categoria
-        self.cargar_productos()
+        if hasattr(self, 'busqueda_var') and self.busqueda_var.get().strip():
+            self.buscar_productos()
+        else:
+            self.cargar_productos()
+    
+    def programar_busqueda(self):
+        """Agrupa las teclas seguidas en una sola búsqueda cuando la interfaz queda libre"""
+        if self.busqueda_pendiente:
+            self.root.after_cancel(self.busqueda_pendiente)
+        self.busqueda_pendiente = self.root.after_idle(self.buscar_productos)
+    
+    def buscar_productos(self):
+        """Muestra los productos que coinciden con el texto de búsqueda"""
+        self.busqueda_pendiente = None
+        texto = self.busqueda_var.get().strip()
+        if not texto:
+            self.cargar_productos()
+            return
+        self.cargar_productos(self.motor.buscar_productos(texto, getattr(self, 'categoria_actual', None)))
     
-    def cargar_productos(self):
-        """Carga los productos como botones grandes (diseño táctil)"""
+    def limpiar_busqueda(self):
+        """Borra el texto de búsqueda y vuelve a mostrar todos los productos"""
+        self.busqueda_var.set('')
+        self.entry_busqueda.focus_set()
+    
+    def cargar_productos(self, productos=None):
+        """Carga los productos como botones grandes (diseño táctil)
+        
+        Sin 'productos' muestra los disponibles de la categoría actual.
+        """
         # Limpiar frame
         for widget in self.frame_productos_scroll.winfo_children():
             widget.destroy()
         
         # Consulta según filtro
-        if hasattr(self, 'categoria_actual') and self.categoria_actual:
-            self.cursor.execute('''
-                SELECT * FROM productos 
-                WHERE disponible = 1 AND categoria = ?
-                ORDER BY nombre
-            ''', (self.categoria_actual,))
-        else:
-            self.cursor.execute('''
-                SELECT * FROM productos 
-                WHERE disponible = 1
-                ORDER BY categoria, nombre
-            ''')
-        
-        productos = self.cursor.fetchall()
+        if productos is None:
+            productos = self.motor.listar_productos(getattr(self, 'categoria_actual', None))
         
         if not productos:
             # Si no hay productos, mostrar mensaje
@@ -1094,6 +1216,8 @@ class SistemaComandas:
             # Fallback en caso de error
             columnas = 4
         
+        mostrar_imagenes = self.config.get('mostrar_imagenes_productos', True)
+        
         # Configurar el grid para que se expanda uniformemente
         for col in range(columnas):
             self.frame_productos_scroll.columnconfigure(col, weight=1, uniform="col")
@@ -1138,6 +1262,20 @@ class SistemaComandas:
             
             configurar_click_frame(frame_producto)
             
+            # Imagen (miniatura cacheada; un marcador mientras se genera)
+            label_imagen = None
+            if mostrar_imagenes and producto[6]:
+                label_imagen = tk.Label(frame_producto, bg='#2C3E50', cursor='hand2')
+                foto = self.obtener_cache_miniaturas().obtener(
+                    self.ruta_imagen_producto(producto[6]),
+                    lambda foto, label=label_imagen: self.mostrar_miniatura(label, foto)
+                )
+                if foto is not None:
+                    self.mostrar_miniatura(label_imagen, foto)
+                    label_imagen.pack(pady=(6, 0))
+                else:
+                    label_imagen = None
+            
             # Contenido del frame-botón (formato original con texto)
             # Nombre del producto
             nombre_corto = producto[1][:25] + "..." if len(producto[1]) > 25 else producto[1]
@@ -1201,6 +1339,8 @@ class SistemaComandas:
                 widget.bind("<Button-1>", on_click)
             
             configurar_click_label(label_nombre)
+            if label_imagen is not None:
+                configurar_click_label(label_imagen)
             if mostrar_precios:
                 configurar_click_label(label_precio)
             if producto[5]:
@@ -1210,6 +1350,27 @@ class SistemaComandas:
         # Forzar actualización del layout
         self.frame_productos_scroll.update_idletasks()
     
+    def obtener_cache_miniaturas(self):
+        """Caché de miniaturas compartida por todos los redibujos (se crea al primer uso)"""
+        if getattr(self, 'cache_miniaturas', None) is None:
+            self.cache_miniaturas = miniaturas.CacheMiniaturas(
+                self.root, os.path.join(self.get_app_directory(), miniaturas.DIRECTORIO_CACHE)
+            )
+        return self.cache_miniaturas
+    
+    def ruta_imagen_producto(self, imagen):
+        """Ruta de la imagen de un producto; las relativas se toman desde la carpeta del programa"""
+        if os.path.isabs(imagen):
+            return imagen
+        return os.path.join(self.get_app_directory(), imagen)
+    
+    def mostrar_miniatura(self, label, foto):
+        """Pone la miniatura en la etiqueta si todavía existe"""
+        if label.winfo_exists():
+            label.config(image=foto)
+            # Tk borra la imagen si Python deja de referenciarla (p. ej. al salir del LRU)
+            label.imagen = foto
+    
     def configurar_placeholder_observaciones(self):
         """Configura el placeholder para el campo de observaciones"""
         placeholder_text = "Escribe observaciones especiales aquí (opcional)..."
@@ -1263,28 +1424,13 @@ class SistemaComandas:
     
     def agregar_a_comanda(self, producto):
         """Agrega un producto a la comanda actual"""
-        # Solo verificar mesa si las mesas están habilitadas y no se permiten comandas sin mesa
-        if self.config.get('usar_mesas', True) and not self.config.get('permitir_comandas_sin_mesa', False):
-            if not self.mesa_actual:
-                messagebox.showwarning("Mesa", "Primero selecciona una mesa")
-                return
-        
-        # Verificar si ya está en la comanda
-        for item in self.comanda_actual:
-            if item['id'] == producto[0]:
-                item['cantidad'] += 1
-                self.actualizar_comanda_display()
-                return
-        
-        # Agregar nuevo item
-        self.comanda_actual.append({
-            'id': producto[0],
-            'nombre': producto[1],
-            'precio': producto[2],
-            'cantidad': 1,
-            'categoria': producto[3]
-        })
+        try:
+            self.motor.agregar_item(self.comanda_actual, producto, self.mesa_actual)
+        except ComandaError as e:
+            messagebox.showwarning(e.titulo, str(e))
+            return
         self.actualizar_comanda_display()
+        self.guardar_borrador()
     
     def actualizar_comanda_display(self):
         """Actualiza la visualización de la comanda"""
@@ -1306,85 +1452,108 @@ class SistemaComandas:
             messagebox.showwarning("Selección", "Selecciona un item para quitar")
             return
         
-        index = seleccion[0]
-        item = self.comanda_actual[index]
-        
-        if item['cantidad'] > 1:
-            item['cantidad'] -= 1
-        else:
-            del self.comanda_actual[index]
-        
+        self.motor.quitar_item(self.comanda_actual, seleccion[0])
         self.actualizar_comanda_display()
+        self.guardar_borrador()
     
     def limpiar_comanda(self):
         """Limpia toda la comanda"""
         if self.comanda_actual and messagebox.askyesno("Confirmar", "¿Limpiar toda la comanda?"):
             self.comanda_actual = []
             self.actualizar_comanda_display()
+            self.guardar_borrador()
+    
+    def observaciones_actuales(self):
+        """Texto de observaciones sin el placeholder"""
+        observaciones = self.text_observaciones.get("1.0", tk.END).strip()
+        if observaciones == "Escribe observaciones especiales aquí (opcional)...":
+            return ""
+        return observaciones
+    
+    def guardar_borrador(self):
+        """Actualiza el borrador de la mesa actual (sólo en memoria; se escribe en segundo plano)"""
+        if not hasattr(self, 'text_observaciones'):
+            return
+        usuario = self.usuario_actual['nombre'] if self.usuario_actual else None
+        self.borradores.guardar(
+            borradores.clave_mesa(self.mesa_actual), self.comanda_actual, self.observaciones_actuales(), usuario
+        )
+    
+    def mostrar_borrador(self, borrador):
+        """Carga en pantalla los items y observaciones de un borrador (None: comanda vacía)"""
+        self.comanda_actual = borrador['items'] if borrador else []
+        self.actualizar_comanda_display()
+        self.text_observaciones.delete("1.0", tk.END)
+        if borrador and borrador['observaciones']:
+            self.text_observaciones.insert("1.0", borrador['observaciones'])
+            self.text_observaciones.config(fg='#2C3E50')
+        else:
+            self.text_observaciones.insert("1.0", "Escribe observaciones especiales aquí (opcional)...")
+            self.text_observaciones.config(fg='#7F8C8D')
+    
+    def restaurar_borrador(self):
+        """Vuelve a la última comanda en curso de esta terminal (tras reiniciar o cambiar de usuario)"""
+        mesa_id = self.borradores.mas_reciente()
+        if mesa_id is None:
+            return
+        mesa = None
+        if mesa_id != borradores.SIN_MESA:
+            if not self.config.get('usar_mesas', True):
+                return
+            try:
+                mesa = self.motor.obtener_mesa(mesa_id)
+            except ComandaError:
+                # La mesa se borró: el borrador ya no se puede retomar
+                self.borradores.descartar(mesa_id)
+                return
+        borrador = self.borradores.obtener(mesa_id)
+        self.mesa_actual = mesa
+        if mesa and hasattr(self, 'label_mesa_actual'):
+            self.label_mesa_actual.config(text=f"{mesa[1]}")
+            self.plano_mesas.marcar_seleccionada(mesa[0])
+        self.mostrar_borrador(borrador)
+        print(f"Comanda en curso recuperada: {mesa[1] if mesa else 'Sin mesa'} ({len(borrador['items'])} items)")
     
     def finalizar_comanda(self):
         """Finaliza y guarda la comanda"""
-        if not self.comanda_actual:
-            messagebox.showwarning("Comanda Vacía", "La comanda está vacía")
-            return
-        
-        # Verificar configuración de mesas
         usar_mesas = self.config.get('usar_mesas', True)
-        permitir_sin_mesa = self.config.get('permitir_comandas_sin_mesa', False)
-        
-        # Validación de mesa según configuración
-        if usar_mesas and not self.mesa_actual and not permitir_sin_mesa:
-            messagebox.showwarning("Mesa", "Selecciona una mesa")
-            return
-        elif not usar_mesas:
-            # En modo sin mesas, no requerimos mesa
-            self.mesa_actual = None
-        
-        # Calcular total
-        total = sum(item['precio'] * item['cantidad'] for item in self.comanda_actual)
-        
-        # Generar número de comanda con número secuencial
-        fecha_actual = datetime.now()
-        numero_ticket = self.obtener_siguiente_numero_ticket()
-        numero_comanda = f"CMD-{fecha_actual.strftime('%Y%m%d')}-{numero_ticket}"
         
         # Obtener observaciones
-        observaciones = self.text_observaciones.get("1.0", tk.END).strip()
-        placeholder_text = "Escribe observaciones especiales aquí (opcional)..."
-        if observaciones == placeholder_text:
-            observaciones = ""  # Vacío si es solo el placeholder
+        observaciones = self.observaciones_actuales()
+        clave_borrador = borradores.clave_mesa(self.mesa_actual)
         
-        # Determinar mesa_id según configuración
-        mesa_id = self.mesa_actual[0] if self.mesa_actual else None
-        
-        # Guardar comanda
-        self.cursor.execute('''
-            INSERT INTO comandas (numero_comanda, mesa_id, fecha, usuario, total, estado, observaciones)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (numero_comanda, mesa_id, fecha_actual.strftime('%Y-%m-%d %H:%M:%S'), 
-              self.usuario_actual['nombre'], total, 'Pendiente', observaciones))
+        try:
+            # Se anota primero en el diario local: si la base no responde la comanda no se pierde
+            comanda, registro = diario_local.registrar(
+                self.diario, self.motor, self.comanda_actual, self.mesa_actual,
+                self.usuario_actual['nombre'], observaciones
+            )
+        except ComandaError as e:
+            messagebox.showwarning(e.titulo, str(e))
+            return
         
-        comanda_id = self.cursor.lastrowid
+        # La comanda ya está en la base o en el diario local
+        self.borradores.descartar(clave_borrador)
         
-        # Guardar items de la comanda
-        for item in self.comanda_actual:
-            self.cursor.execute('''
-                INSERT INTO items_comanda (comanda_id, producto_nombre, cantidad, precio_unitario)
-                VALUES (?, ?, ?, ?)
-            ''', (comanda_id, item['nombre'], item['cantidad'], item['precio']))
+        if comanda is None:
+            self.comanda_guardada_sin_conexion(registro)
+            return
         
-        # Marcar mesa como ocupada (solo si se usan mesas)
-        if usar_mesas and self.mesa_actual:
-            self.cursor.execute('''
-                UPDATE mesas SET estado = 'ocupada' WHERE id = ?
-            ''', (self.mesa_actual[0],))
+        if not usar_mesas:
+            # En modo sin mesas, no requerimos mesa
+            self.mesa_actual = None
         
-        self.conn.commit()
+        comanda_id = comanda['id']
+        numero_comanda = comanda['numero_comanda']
+        total = comanda['total']
         
         # Generar ticket (según configuración)
         generar_tickets = self.config.get('generar_tickets', True)
+        estaciones_ticket = []
         if generar_tickets and messagebox.askyesno("Ticket", "¿Deseas generar el ticket de comanda?"):
             self.generar_ticket_comanda(comanda_id, numero_comanda, total, observaciones)
+            if self.config.get('tickets_por_estacion', False):
+                estaciones_ticket = self.generar_tickets_estacion(comanda_id, numero_comanda, observaciones)
         
         # Limpiar comanda
         self.comanda_actual = []
@@ -1405,15 +1574,46 @@ class SistemaComandas:
         self.mesa_actual = None
         if hasattr(self, 'label_mesa_actual'):
             self.label_mesa_actual.config(text="No seleccionada")
+            self.plano_mesas.marcar_seleccionada(None)
         
         # Mensaje de éxito adaptado
         mensaje_exito = f"✅ Comanda {numero_comanda} enviada exitosamente!\n\n💰 Total: ${total}\n"
         if usar_mesas:
             mensaje_exito += f"🪑 Mesa: {mesa_nombre}\n"
+            cuenta = self.motor.cuenta_abierta(comanda['mesa_id']) if comanda['mesa_id'] else None
+            if cuenta and cuenta['rondas'] > 1:
+                mensaje_exito += f"🧾 Cuenta de la mesa: ${cuenta['total']} ({cuenta['rondas']} rondas)\n"
+        if estaciones_ticket:
+            mensaje_exito += f"🧾 Tickets por estación: {', '.join(estaciones_ticket)}\n"
         mensaje_exito += f"\n📄 Los tickets se guardan en la carpeta 'tickets'"
         
         messagebox.showinfo("Éxito", mensaje_exito)
     
+    def comanda_guardada_sin_conexion(self, registro):
+        """Limpia la comanda que quedó en el diario local (sin ticket: el número se asigna al enviarla)"""
+        self.marcar_sin_conexion()
+        self.comanda_actual = []
+        self.actualizar_comanda_display()
+        self.text_observaciones.delete("1.0", tk.END)
+        self.text_observaciones.insert("1.0", "Escribe observaciones especiales aquí (opcional)...")
+        self.text_observaciones.config(fg='#7F8C8D')
+        
+        # Sin cargar_mesas: consultaría la base que no responde
+        self.mesa_actual = None
+        if hasattr(self, 'label_mesa_actual'):
+            self.label_mesa_actual.config(text="No seleccionada")
+            self.plano_mesas.marcar_seleccionada(None)
+        self.actualizar_estado_conexion()
+        
+        mesa_nombre = registro['mesa'][1] if registro['mesa'] else 'Sin mesa'
+        messagebox.showwarning(
+            "Sin conexión",
+            f"⚠ No se pudo acceder a la base de datos.\n\n"
+            f"La comanda de {mesa_nombre} quedó guardada en esta terminal y se enviará "
+            f"automáticamente cuando vuelva la conexión.\n\n"
+            f"El número de comanda y el ticket se generan al enviarla."
+        )
+    
     def crear_pestaña_estado_comandas(self):
         """Crea la pestaña para gestionar el estado de comandas y mesas"""
         frame_estado = tk.Frame(self.notebook, bg='#F8F9FA')
@@ -1499,6 +1699,21 @@ class SistemaComandas:
         )
         btn_liberar.pack(side='left', padx=(0, 10))
         
+        # Botón Cerrar Cuenta (cobrar todas las rondas de la mesa)
+        btn_cuenta = tk.Button(
+            action_frame,
+            text="💵 Cerrar Cuenta",
+            font=('Arial', 12, 'bold'),
+            bg='#6F42C1',
+            fg='white',
+            command=self.cerrar_cuenta_seleccionada,
+            relief='flat',
+            padx=20,
+            pady=10,
+            cursor='hand2'
+        )
+        btn_cuenta.pack(side='left', padx=(0, 10))
+        
         # Botón Cancelar Comanda
         btn_cancelar = tk.Button(
             action_frame,
@@ -1558,30 +1773,10 @@ class SistemaComandas:
         self.actualizar_estado_comandas()
         self.actualizar_estadisticas_resumen()
     
-    def actualizar_estadisticas_resumen(self):
-        """Actualiza las estadísticas mostradas en el resumen"""
-        try:
-            cursor = self.conn.cursor()
-            
-            # Estadísticas de mesas
-            cursor.execute("SELECT estado, COUNT(*) FROM mesas GROUP BY estado")
-            stats_mesas = dict(cursor.fetchall())
-            
-            # Estadísticas de comandas hoy
-            cursor.execute("""
-                SELECT estado, COUNT(*) 
-                FROM comandas 
-                WHERE DATE(fecha) = DATE('now') 
-                GROUP BY estado
-            """)
-            stats_comandas_hoy = dict(cursor.fetchall())
-            
-            # Comandas pendientes total
-            cursor.execute("""
-                SELECT COUNT(*) FROM comandas 
-                WHERE estado IN ('Pendiente', 'En preparación')
-            """)
-            comandas_pendientes = cursor.fetchone()[0]
+    def actualizar_estadisticas_resumen(self):
+        """Actualiza las estadísticas mostradas en el resumen"""
+        try:
+            stats_mesas, stats_comandas_hoy, comandas_pendientes = self.motor.estadisticas_resumen()
             
             # Crear texto del resumen
             mesas_libres = stats_mesas.get('Disponible', 0) + stats_mesas.get('Libre', 0)
@@ -1610,27 +1805,8 @@ class SistemaComandas:
             self.tree_comandas.delete(item)
         
         # Cargar comandas desde la base de datos con información de las mesas
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT 
-                c.numero_comanda,
-                COALESCE(m.nombre, 'Sin mesa') as mesa_nombre,
-                COALESCE(m.estado, 'N/A') as mesa_estado,
-                c.estado as comanda_estado,
-                c.fecha,
-                c.usuario,
-                c.total,
-                COUNT(ic.id) as total_items,
-                c.id as comanda_id,
-                m.id as mesa_id
-            FROM comandas c
-            LEFT JOIN mesas m ON c.mesa_id = m.id
-            LEFT JOIN items_comanda ic ON c.id = ic.comanda_id
-            WHERE c.estado IN ('Pendiente', 'En preparación', 'Completada')
-            GROUP BY c.id
-            ORDER BY c.fecha DESC
-        """)
-        comandas = cursor.fetchall()
+        comandas = self.motor.listar_comandas_estado()
+        self.mesa_por_fila = {}
         
         # Agregar comandas al Treeview
         for comanda in comandas:
@@ -1648,6 +1824,7 @@ class SistemaComandas:
                 numero, mesa or 'Sin mesa', estado_mesa or 'N/A', estado_comanda, 
                 fecha_formateada, mesero, f'${total}', items
             ))
+            self.mesa_por_fila[item_id] = mesa_id
         
         # Actualizar estadísticas si existe el widget
         if hasattr(self, 'label_stats'):
@@ -1674,36 +1851,21 @@ class SistemaComandas:
         if messagebox.askyesno("Completar Comanda", 
                               f"¿Estás seguro de que deseas marcar la comanda {numero_comanda} como completada?"):
             try:
-                # Buscar el ID real de la comanda y mesa
-                cursor = self.conn.cursor()
-                cursor.execute("""
-                    SELECT c.id, c.mesa_id 
-                    FROM comandas c 
-                    WHERE c.numero_comanda = ?
-                """, (numero_comanda,))
-                resultado = cursor.fetchone()
+                resultado = self.motor.completar_comanda(numero_comanda)
+                mesa_id = resultado['mesa_id']
                 
-                if resultado:
-                    comanda_id, mesa_id = resultado
-                    # Actualizar estado de la comanda
-                    cursor.execute("UPDATE comandas SET estado = 'Completada' WHERE id = ?", (comanda_id,))
-                    self.conn.commit()
-                    
-                    # Verificar si se puede liberar automáticamente la mesa
-                    mesa_liberada = self.liberar_mesa_si_completada(mesa_id) if mesa_id else False
-                    
-                    mensaje = f"Comanda {numero_comanda} marcada como completada"
-                    if mesa_liberada:
-                        mensaje += f"\n¡Mesa {mesa_nombre} liberada automáticamente!"
-                    elif mesa_id:
-                        mensaje += f"\nMesa {mesa_nombre} aún tiene comandas pendientes"
-                    
-                    messagebox.showinfo("Éxito", mensaje)
-                    self.actualizar_estado_comandas()
-                    self.cargar_mesas()  # Actualizar colores de mesas
-                else:
-                    messagebox.showerror("Error", "No se pudo encontrar la comanda")
-                    
+                mensaje = f"Comanda {numero_comanda} marcada como completada"
+                if resultado['mesa_liberada']:
+                    mensaje += f"\n¡Mesa {mesa_nombre} liberada automáticamente!"
+                elif mesa_id:
+                    mensaje += f"\nMesa {mesa_nombre} aún tiene comandas pendientes"
+                
+                messagebox.showinfo("Éxito", mensaje)
+                self.actualizar_estado_comandas()
+                self.cargar_mesas()  # Actualizar colores de mesas
+                
+            except ComandaError as e:
+                messagebox.showerror(e.titulo, str(e))
             except Exception as e:
                 messagebox.showerror("Error", f"Error al completar comanda: {str(e)}")
     
@@ -1735,26 +1897,56 @@ class SistemaComandas:
         if messagebox.askyesno("Liberar Mesa", 
                               f"¿Estás seguro de que deseas liberar la mesa {mesa_nombre}?"):
             try:
-                # Buscar el ID de la mesa
-                cursor = self.conn.cursor()
-                cursor.execute("SELECT mesa_id FROM comandas WHERE numero_comanda = ?", (numero_comanda,))
-                resultado = cursor.fetchone()
+                self.motor.liberar_mesa_de_comanda(numero_comanda)
                 
-                if resultado and resultado[0]:
-                    mesa_id = resultado[0]
-                    # Actualizar estado de la mesa
-                    cursor.execute("UPDATE mesas SET estado = 'Disponible' WHERE id = ?", (mesa_id,))
-                    self.conn.commit()
-                    
-                    messagebox.showinfo("Éxito", f"Mesa {mesa_nombre} liberada correctamente")
-                    self.actualizar_estado_comandas()
-                    self.cargar_mesas()  # Actualizar colores de mesas
-                else:
-                    messagebox.showerror("Error", "No se pudo encontrar la mesa asociada")
-                    
+                messagebox.showinfo("Éxito", f"Mesa {mesa_nombre} liberada correctamente")
+                self.actualizar_estado_comandas()
+                self.cargar_mesas()  # Actualizar colores de mesas
+                
+            except ComandaError as e:
+                messagebox.showerror(e.titulo, str(e))
             except Exception as e:
                 messagebox.showerror("Error", f"Error al liberar mesa: {str(e)}")
     
+    def cerrar_cuenta_seleccionada(self):
+        """Muestra la cuenta de la mesa de la comanda seleccionada y la cierra"""
+        seleccion = self.tree_comandas.selection()
+        if not seleccion:
+            messagebox.showwarning("Advertencia", "Selecciona una comanda de la mesa a cobrar")
+            return
+        
+        mesa_id = self.mesa_por_fila.get(seleccion[0])
+        mesa_nombre = self.tree_comandas.item(seleccion[0])['values'][1]
+        cuenta = self.motor.cuenta_abierta(mesa_id) if mesa_id else None
+        if not cuenta:
+            messagebox.showinfo("Información", f"{mesa_nombre} no tiene una cuenta abierta")
+            return
+        
+        lineas = [
+            f"{numero}  {fecha[11:16]}  {estado}  ${total}"
+            for numero, fecha, usuario, estado, total in self.motor.rondas_de_cuenta(cuenta['id'])
+            if estado != 'Cancelada'
+        ]
+        resumen = (
+            f"Cuenta de {mesa_nombre} (abierta {cuenta['abierta'][11:16]})\n\n" + "\n".join(lineas) +
+            f"\n\n{cuenta['rondas']} rondas, {cuenta['items']} items\n💰 Total: ${cuenta['total']}"
+        )
+        forzar = False
+        if cuenta['activas']:
+            resumen += f"\n\n⚠ Hay {cuenta['activas']} comandas sin completar."
+            forzar = True
+        if not messagebox.askyesno("Cerrar Cuenta", resumen + "\n\n¿Cerrar la cuenta y liberar la mesa?"):
+            return
+        
+        try:
+            self.motor.cerrar_cuenta(mesa_id, forzar=forzar)
+        except ComandaError as e:
+            messagebox.showerror(e.titulo, str(e))
+            return
+        messagebox.showinfo("Éxito", f"Cuenta de {mesa_nombre} cerrada: ${cuenta['total']}")
+        self.actualizar_estado_comandas()
+        self.cargar_mesas()
+    
     def cancelar_comanda_seleccionada(self):
         """Cancela la comanda seleccionada"""
         seleccion = self.tree_comandas.selection()
@@ -1779,59 +1971,32 @@ class SistemaComandas:
         
         if messagebox.askyesno("Cancelar Comanda", 
                               f"¿Estás seguro de que deseas cancelar la comanda {numero_comanda}?\n"
-                              f"Esta acción también liberará la mesa {mesa_nombre}."):
+                              f"Si la mesa {mesa_nombre} no tiene otras comandas activas, quedará libre."):
             try:
-                # Buscar los IDs de la comanda y mesa
-                cursor = self.conn.cursor()
-                cursor.execute("SELECT id, mesa_id FROM comandas WHERE numero_comanda = ?", (numero_comanda,))
-                resultado = cursor.fetchone()
+                resultado = self.motor.cancelar_comanda(numero_comanda)
                 
-                if resultado:
-                    comanda_id, mesa_id = resultado
-                    
-                    # Actualizar estado de la comanda
-                    cursor.execute("UPDATE comandas SET estado = 'Cancelada' WHERE id = ?", (comanda_id,))
-                    
-                    # Liberar la mesa si tiene una asignada
-                    if mesa_id:
-                        cursor.execute("UPDATE mesas SET estado = 'Disponible' WHERE id = ?", (mesa_id,))
-                    
-                    self.conn.commit()
-                    
-                    messagebox.showinfo("Éxito", f"Comanda {numero_comanda} cancelada y mesa {mesa_nombre} liberada")
-                    self.actualizar_estado_comandas()
-                    self.cargar_mesas()  # Actualizar colores de mesas
-                else:
-                    messagebox.showerror("Error", "No se pudo encontrar la comanda")
-                    
+                mensaje = f"Comanda {numero_comanda} cancelada"
+                if resultado['mesa_liberada']:
+                    mensaje += f" y mesa {mesa_nombre} liberada"
+                elif resultado['mesa_id']:
+                    mensaje += f"\nMesa {mesa_nombre} aún tiene comandas pendientes"
+                messagebox.showinfo("Éxito", mensaje)
+                self.actualizar_estado_comandas()
+                self.cargar_mesas()  # Actualizar colores de mesas
+                
+            except ComandaError as e:
+                messagebox.showerror(e.titulo, str(e))
             except Exception as e:
                 messagebox.showerror("Error", f"Error al cancelar comanda: {str(e)}")
     
     def liberar_mesa_si_completada(self, mesa_id):
         """Liberar mesa automáticamente si todas las comandas están completadas"""
-        try:
-            self.cursor.execute("""
-                SELECT COUNT(*) FROM comandas 
-                WHERE mesa_id = ? AND estado IN ('Pendiente', 'En preparación')
-            """, (mesa_id,))
-            comandas_activas = self.cursor.fetchone()[0]
-            
-            if comandas_activas == 0:
-                # No hay comandas activas, podemos liberar la mesa
-                self.cursor.execute("""
-                    UPDATE mesas SET estado = 'Disponible' WHERE id = ?
-                """, (mesa_id,))
-                self.conn.commit()
-                return True
-            return False
-        except Exception as e:
-            print(f"Error al verificar estado de mesa: {e}")
-            return False
+        return self.motor.liberar_mesa_si_completada(mesa_id)
     
     def actualizar_mesas_automatico(self):
         """Actualizar vista de mesas cada 30 segundos"""
         try:
-            if hasattr(self, 'frame_mesas'):
+            if hasattr(self, 'plano_mesas'):
                 self.cargar_mesas()
             # Programar siguiente actualización
             self.root.after(30000, self.actualizar_mesas_automatico)
@@ -1842,30 +2007,15 @@ class SistemaComandas:
 
     def obtener_siguiente_numero_ticket(self):
         """Obtiene el siguiente número de ticket secuencial (01-99)"""
-        try:
-            # Buscar el último número de ticket usado hoy
-            self.cursor.execute('''
-                SELECT MAX(CAST(SUBSTR(numero_comanda, -2) AS INTEGER)) as ultimo_numero
-                FROM comandas 
-                WHERE numero_comanda LIKE '%-%__'
-                AND DATE(fecha) = DATE('now')
-            ''')
-            resultado = self.cursor.fetchone()
-            ultimo_numero = resultado[0] if resultado and resultado[0] else 0
-            
-            # Incrementar y resetear a 01 si llega a 100
-            siguiente_numero = (ultimo_numero + 1) % 100
-            if siguiente_numero == 0:
-                siguiente_numero = 1
-                
-            return f"{siguiente_numero:02d}"  # Formato 01, 02, ..., 99
-        except Exception as e:
-            print(f"Error al obtener número de ticket: {e}")
-            # Fallback: usar timestamp
-            return datetime.now().strftime("%S")
+        return self.motor.obtener_siguiente_numero_ticket()
 
-    def generar_ticket_comanda(self, comanda_id, numero_comanda, total, observaciones):
-        """Genera un ticket PDF con formato de troquel para papel de 7cm x 20cm"""
+    def generar_ticket_comanda(self, comanda_id, numero_comanda, total, observaciones,
+                               mesa_nombre=None, usuario_nombre=None):
+        """Genera un ticket PDF con formato de troquel para papel de 7cm x 20cm
+
+        Sin mesa_nombre ni usuario_nombre usa la mesa seleccionada y el usuario
+        actual (las comandas del diario local traen los suyos).
+        """
         try:
             # Crear carpeta 'tickets' en el directorio de la aplicación
             app_dir = self.get_app_directory()
@@ -1876,6 +2026,7 @@ class SistemaComandas:
                 print(f"Carpeta {carpeta_tickets} creada")
 
             # Configurar PDF para papel de 7cm x 20cm
+            FPDF = cargar_fpdf()
             pdf = FPDF(orientation='P', unit='cm', format=(7, 20))
             pdf.add_page()
             pdf.set_auto_page_break(auto=False)  # Desactivar salto automático
@@ -1891,7 +2042,8 @@ class SistemaComandas:
             pdf.ln(0.2)
             
             # Mesa
-            mesa_nombre = self.mesa_actual[1] if self.mesa_actual else "Sin Mesa"
+            if mesa_nombre is None:
+                mesa_nombre = self.mesa_actual[1] if self.mesa_actual else "Sin Mesa"
             pdf.set_font('Arial', 'B', 10)
             pdf.cell(0, 0.6, f"MESA: {mesa_nombre}", 0, 1, 'C')
             pdf.ln(0.2)
@@ -1908,7 +2060,8 @@ class SistemaComandas:
             pdf.cell(0, 0.5, f"Fecha: {fecha_actual}", 0, 1, 'C')
             
             # Usuario/Mesero
-            usuario_nombre = self.usuario_actual.get('nombre', 'Usuario') if self.usuario_actual else 'Sistema'
+            if usuario_nombre is None:
+                usuario_nombre = self.usuario_actual.get('nombre', 'Usuario') if self.usuario_actual else 'Sistema'
             pdf.cell(0, 0.5, f"Mesero: {usuario_nombre}", 0, 1, 'C')
             pdf.ln(0.4)
             
@@ -1918,12 +2071,7 @@ class SistemaComandas:
             pdf.ln(0.2)
             
             # Obtener items de la comanda
-            self.cursor.execute('''
-                SELECT producto_nombre, cantidad, precio_unitario, observaciones
-                FROM items_comanda WHERE comanda_id = ?
-                ORDER BY id
-            ''', (comanda_id,))
-            items = self.cursor.fetchall()
+            items = self.motor.obtener_items_comanda(comanda_id)
             
             # Lista de productos
             pdf.set_font('Arial', '', 8)
@@ -2029,10 +2177,60 @@ class SistemaComandas:
             import traceback
             traceback.print_exc()
     
-    def crear_pestaña_productos(self):
+    def generar_tickets_estacion(self, comanda_id, numero_comanda, observaciones, mesa_nombre=None):
+        """Genera un ticket por estación con sólo sus items (sin precios); devuelve las estaciones"""
+        try:
+            carpeta_tickets = os.path.join(self.get_app_directory(), "tickets")
+            os.makedirs(carpeta_tickets, exist_ok=True)
+            FPDF = cargar_fpdf()
+            
+            numero_ticket = numero_comanda.split('-')[-1]
+            if mesa_nombre is None:
+                mesa_nombre = self.mesa_actual[1] if self.mesa_actual else "Sin Mesa"
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            
+            grupos = self.motor.items_por_estacion(comanda_id)
+            for estacion, items in grupos.items():
+                pdf = FPDF(orientation='P', unit='cm', format=(7, 20))
+                pdf.add_page()
+                pdf.set_auto_page_break(auto=True, margin=0.5)
+                
+                pdf.set_font('Arial', 'B', 14)
+                pdf.cell(0, 0.8, estacion.upper(), 0, 1, 'C')
+                pdf.set_font('Arial', 'B', 12)
+                pdf.cell(0, 0.7, f"COMANDA N° {numero_ticket}", 0, 1, 'C')
+                pdf.set_font('Arial', '', 8)
+                pdf.cell(0, 0.5, f"Mesa: {mesa_nombre}   Hora: {datetime.now().strftime('%H:%M')}", 0, 1, 'C')
+                pdf.cell(0, 0.3, '='*45, 0, 1, 'C')
+                pdf.ln(0.2)
+                
+                pdf.set_font('Arial', 'B', 11)
+                for nombre_producto, cantidad, observaciones_item in items:
+                    pdf.multi_cell(0, 0.5, f"{cantidad}x {nombre_producto}", 0, 'L')
+                    if observaciones_item.strip():
+                        pdf.set_font('Arial', 'I', 8)
+                        pdf.multi_cell(0, 0.4, f"    * {observaciones_item}", 0, 'L')
+                        pdf.set_font('Arial', 'B', 11)
+                
+                if observaciones and observaciones.strip():
+                    pdf.ln(0.2)
+                    pdf.set_font('Arial', 'B', 8)
+                    pdf.cell(0, 0.4, "OBSERVACIONES:", 0, 1, 'L')
+                    pdf.set_font('Arial', '', 8)
+                    pdf.multi_cell(0, 0.4, observaciones.strip(), 0, 'L')
+                
+                pdf.output(os.path.join(carpeta_tickets, f'ticket_{numero_ticket}_{estacion}_{timestamp}.pdf'))
+            return list(grupos)
+        except Exception as e:
+            messagebox.showerror("Error", f"Error al generar los tickets por estación: {str(e)}")
+            print(f"Error detallado: {e}")
+            return []
+    
+    def crear_pestaña_productos(self, frame_productos=None):
         """Crea la pestaña de gestión de productos (solo admin)"""
-        frame_productos = tk.Frame(self.notebook, bg='#F8F9FA')
-        self.notebook.add(frame_productos, text='🍽️ Productos')
+        if frame_productos is None:
+            frame_productos = tk.Frame(self.notebook, bg='#F8F9FA')
+            self.notebook.add(frame_productos, text='🍽️ Productos')
         
         # Frame contenedor
         contenedor = tk.Frame(frame_productos, bg='#F8F9FA')
@@ -2071,10 +2269,34 @@ class SistemaComandas:
         )
         self.prod_categoria.pack(pady=3)
         
+        tk.Label(frame_form, text="Estación:", font=('Arial', 12), bg='#F8F9FA').pack(pady=3)
+        self.prod_estacion = ttk.Combobox(
+            frame_form,
+            font=('Arial', 12),
+            width=33,
+            values=list(OrderEngine.ESTACIONES),
+            state='readonly'
+        )
+        self.prod_estacion.set(OrderEngine.ESTACIONES[0])
+        self.prod_estacion.pack(pady=3)
+        
         tk.Label(frame_form, text="Descripción:", font=('Arial', 12), bg='#F8F9FA').pack(pady=3)
         self.prod_descripcion = tk.Text(frame_form, font=('Arial', 11), width=35, height=4)
         self.prod_descripcion.pack(pady=3)
         
+        tk.Label(frame_form, text="Imagen:", font=('Arial', 12), bg='#F8F9FA').pack(pady=3)
+        frame_imagen = tk.Frame(frame_form, bg='#F8F9FA')
+        frame_imagen.pack(pady=3)
+        self.prod_imagen = tk.Entry(frame_imagen, font=('Arial', 11), width=28)
+        self.prod_imagen.pack(side='left')
+        tk.Button(
+            frame_imagen,
+            text="📁",
+            font=('Arial', 11),
+            command=self.elegir_imagen_producto,
+            cursor='hand2'
+        ).pack(side='left', padx=(5, 0))
+        
         # Disponibilidad
         self.disponible_var = tk.BooleanVar(value=True)
         tk.Checkbutton(
@@ -2186,6 +2408,8 @@ class SistemaComandas:
         precio = self.prod_precio.get().strip()
         categoria = self.prod_categoria.get().strip()
         descripcion = self.prod_descripcion.get("1.0", tk.END).strip()
+        imagen = self.prod_imagen.get().strip() or None
+        estacion = self.prod_estacion.get() or OrderEngine.ESTACIONES[0]
         disponible = 1 if self.disponible_var.get() else 0
         
         if not nombre:
@@ -2202,19 +2426,24 @@ class SistemaComandas:
             # Actualizar
             self.cursor.execute('''
                 UPDATE productos 
-                SET nombre=?, precio=?, categoria=?, descripcion=?, disponible=?
+                SET nombre=?, precio=?, categoria=?, descripcion=?, disponible=?, imagen=?, estacion=?
                 WHERE id=?
-            ''', (nombre, precio, categoria or 'Otros', descripcion, disponible, self.producto_id))
+            ''', (nombre, precio, categoria or 'Otros', descripcion, disponible, imagen, estacion,
+                  self.producto_id))
+            producto_id = self.producto_id
             messagebox.showinfo("Éxito", "Producto actualizado correctamente")
         else:
             # Insertar
             self.cursor.execute('''
-                INSERT INTO productos (nombre, precio, categoria, descripcion, disponible)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (nombre, precio, categoria or 'Otros', descripcion, disponible))
+                INSERT INTO productos (nombre, precio, categoria, descripcion, disponible, imagen, estacion)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (nombre, precio, categoria or 'Otros', descripcion, disponible, imagen, estacion))
+            producto_id = self.cursor.lastrowid
             messagebox.showinfo("Éxito", "Producto agregado correctamente")
         
         self.conn.commit()
+        self.motor.producto_modificado(producto_id)
+        self.actualizar_mas_vendidos()
         self.limpiar_formulario_producto()
         self.actualizar_tabla_productos()
         
@@ -2223,6 +2452,25 @@ class SistemaComandas:
             self.cargar_categorias()
             self.cargar_productos()
     
+    def elegir_imagen_producto(self):
+        """Selecciona el archivo de imagen del producto"""
+        ruta = filedialog.askopenfilename(
+            title="Imagen del producto",
+            filetypes=[("Imágenes", "*.png *.jpg *.jpeg *.gif *.bmp *.webp"), ("Todos los archivos", "*.*")]
+        )
+        if not ruta:
+            return
+        # Dentro de la carpeta del programa se guarda relativa, así sobrevive a moverla
+        app_dir = os.path.abspath(self.get_app_directory())
+        try:
+            if os.path.commonpath([os.path.abspath(ruta), app_dir]) == app_dir:
+                ruta = os.path.relpath(ruta, app_dir)
+        except ValueError:
+            # Otra unidad de disco en Windows: se deja la ruta absoluta
+            pass
+        self.prod_imagen.delete(0, tk.END)
+        self.prod_imagen.insert(0, ruta)
+    
     def limpiar_formulario_producto(self):
         """Limpia el formulario de productos"""
         self.producto_id = None
@@ -2230,10 +2478,14 @@ class SistemaComandas:
         self.prod_precio.delete(0, tk.END)
         self.prod_categoria.set('')
         self.prod_descripcion.delete("1.0", tk.END)
+        self.prod_imagen.delete(0, tk.END)
+        self.prod_estacion.set(OrderEngine.ESTACIONES[0])
         self.disponible_var.set(True)
     
     def actualizar_tabla_productos(self):
         """Actualiza la tabla de productos"""
+        if not self.widget_activo('tabla_productos'):
+            return
         for item in self.tabla_productos.get_children():
             self.tabla_productos.delete(item)
         
@@ -2276,6 +2528,9 @@ class SistemaComandas:
             self.prod_categoria.set(producto[3])
             self.prod_descripcion.delete("1.0", tk.END)
             self.prod_descripcion.insert("1.0", producto[5] if producto[5] else "")
+            self.prod_imagen.delete(0, tk.END)
+            self.prod_imagen.insert(0, producto[6] or "")
+            self.prod_estacion.set(producto[7] or OrderEngine.ESTACIONES[0])
             self.disponible_var.set(bool(producto[4]))
     
     def eliminar_producto(self):
@@ -2291,14 +2546,17 @@ class SistemaComandas:
             
             self.cursor.execute('DELETE FROM productos WHERE id = ?', (producto_id,))
             self.conn.commit()
+            self.motor.producto_modificado(producto_id)
+            self.actualizar_mas_vendidos()
             
             self.actualizar_tabla_productos()
             messagebox.showinfo("Éxito", "Producto eliminado correctamente")
     
-    def crear_pestaña_mesas(self):
+    def crear_pestaña_mesas(self, frame_mesas=None):
         """Crea la pestaña de gestión de mesas"""
-        frame_mesas = tk.Frame(self.notebook, bg='#F8F9FA')
-        self.notebook.add(frame_mesas, text='🪑 Mesas')
+        if frame_mesas is None:
+            frame_mesas = tk.Frame(self.notebook, bg='#F8F9FA')
+            self.notebook.add(frame_mesas, text='🪑 Mesas')
         
         # Marco principal
         main_frame = tk.Frame(frame_mesas, bg='#F8F9FA')
@@ -2417,6 +2675,8 @@ class SistemaComandas:
     
     def actualizar_lista_mesas(self):
         """Actualiza la lista de mesas en el Treeview"""
+        if not self.widget_activo('tree_mesas'):
+            return
         # Limpiar lista actual
         for item in self.tree_mesas.get_children():
             self.tree_mesas.delete(item)
@@ -2734,23 +2994,275 @@ class SistemaComandas:
         except Exception as e:
             messagebox.showerror("Error", f"Error al eliminar la mesa: {str(e)}")
     
-    def crear_pestaña_reportes(self):
+    def crear_pestaña_reportes(self, frame_reportes=None):
         """Crea la pestaña de reportes"""
-        frame_reportes = tk.Frame(self.notebook, bg='#F8F9FA')
-        self.notebook.add(frame_reportes, text='📊 Reportes')
+        if frame_reportes is None:
+            frame_reportes = tk.Frame(self.notebook, bg='#F8F9FA')
+            self.notebook.add(frame_reportes, text='📊 Reportes')
         
-        # Implementar reportes...
-        tk.Label(
-            frame_reportes,
-            text="🚧 Reportes - En desarrollo",
-            font=('Arial', 16, 'bold'),
-            bg='#F8F9FA'
-        ).pack(pady=50)
+        contenedor = tk.Frame(frame_reportes, bg='#F8F9FA')
+        contenedor.pack(fill='both', expand=True, padx=10, pady=10)
+        
+        # Filtros de período
+        frame_filtros = tk.Frame(contenedor, bg='#F8F9FA')
+        frame_filtros.pack(fill='x', pady=(0, 10))
+        
+        hoy = datetime.now()
+        tk.Label(frame_filtros, text="Desde:", font=('Arial', 11), bg='#F8F9FA').pack(side='left')
+        self.entry_reporte_desde = tk.Entry(frame_filtros, font=('Arial', 11), width=12)
+        self.entry_reporte_desde.insert(0, hoy.strftime('%Y-%m-01'))
+        self.entry_reporte_desde.pack(side='left', padx=5)
+        
+        tk.Label(frame_filtros, text="Hasta:", font=('Arial', 11), bg='#F8F9FA').pack(side='left')
+        self.entry_reporte_hasta = tk.Entry(frame_filtros, font=('Arial', 11), width=12)
+        self.entry_reporte_hasta.insert(0, hoy.strftime('%Y-%m-%d'))
+        self.entry_reporte_hasta.pack(side='left', padx=5)
+        
+        # Atajos de período
+        for texto, dias in (('Hoy', 0), ('7 días', 6), ('30 días', 29), ('Año', 364)):
+            tk.Button(
+                frame_filtros,
+                text=texto,
+                font=('Arial', 10),
+                bg='#6C757D',
+                fg='white',
+                command=lambda d=dias: self.seleccionar_periodo_reporte(d),
+                cursor='hand2',
+                relief='flat',
+                padx=8
+            ).pack(side='left', padx=2)
+        
+        self.btn_generar_reporte = tk.Button(
+            frame_filtros,
+            text="📊 Generar Reporte",
+            font=('Arial', 11, 'bold'),
+            bg='#28A745',
+            fg='white',
+            command=self.generar_reporte,
+            cursor='hand2',
+            relief='flat',
+            padx=15
+        )
+        self.btn_generar_reporte.pack(side='left', padx=10)
+        
+        self.btn_exportar_excel = tk.Button(
+            frame_filtros,
+            text="📥 Exportar a Excel",
+            font=('Arial', 11),
+            bg='#17A2B8',
+            fg='white',
+            command=self.exportar_excel,
+            cursor='hand2',
+            relief='flat',
+            padx=15
+        )
+        self.btn_exportar_excel.pack(side='left', padx=5)
+        
+        self.progreso_exportacion = ttk.Progressbar(frame_filtros, length=150, mode='determinate')
+        
+        self.label_estado_reporte = tk.Label(
+            frame_filtros, text="", font=('Arial', 10), bg='#F8F9FA', fg='#6C757D'
+        )
+        self.label_estado_reporte.pack(side='left', padx=10)
+        
+        # Totales del período
+        self.label_totales_reporte = tk.Label(
+            contenedor,
+            text="Selecciona un período y presiona Generar Reporte",
+            font=('Arial', 12, 'bold'),
+            bg='#F8F9FA',
+            fg='#2C3E50',
+            anchor='w'
+        )
+        self.label_totales_reporte.pack(fill='x', pady=(0, 10))
+        
+        # Una tabla por dimensión
+        notebook_reportes = ttk.Notebook(contenedor)
+        notebook_reportes.pack(fill='both', expand=True)
+        
+        self.tablas_reporte = {}
+        for dimension, titulo, con_comandas in (
+            ('producto', 'Producto', False),
+            ('categoria', 'Categoría', False),
+            ('hora', 'Hora', True),
+            ('usuario', 'Mozo', True),
+            ('mesa', 'Mesa', True),
+        ):
+            frame_tabla = tk.Frame(notebook_reportes, bg='#F8F9FA')
+            notebook_reportes.add(frame_tabla, text=titulo)
+            
+            columnas = (titulo, 'Cantidad', 'Comandas', 'Importe') if con_comandas else (titulo, 'Cantidad', 'Importe')
+            tree = ttk.Treeview(frame_tabla, columns=columnas, show='headings')
+            for columna in columnas:
+                tree.heading(columna, text=columna)
+                tree.column(columna, width=250 if columna == titulo else 120,
+                            anchor='w' if columna == titulo else 'center')
+            
+            scrollbar = ttk.Scrollbar(frame_tabla, orient='vertical', command=tree.yview)
+            tree.configure(yscrollcommand=scrollbar.set)
+            tree.pack(side='left', fill='both', expand=True)
+            scrollbar.pack(side='right', fill='y')
+            self.tablas_reporte[dimension] = (tree, con_comandas)
+    
+    def seleccionar_periodo_reporte(self, dias):
+        """Completa el período del reporte con los últimos días indicados"""
+        hoy = datetime.now()
+        self.entry_reporte_desde.delete(0, tk.END)
+        self.entry_reporte_desde.insert(0, (hoy - timedelta(days=dias)).strftime('%Y-%m-%d'))
+        self.entry_reporte_hasta.delete(0, tk.END)
+        self.entry_reporte_hasta.insert(0, hoy.strftime('%Y-%m-%d'))
+    
+    def obtener_periodo_reporte(self):
+        """Devuelve (desde, hasta) del filtro de reportes o None si no son fechas válidas"""
+        desde = self.entry_reporte_desde.get().strip()
+        hasta = self.entry_reporte_hasta.get().strip()
+        try:
+            if datetime.strptime(desde, '%Y-%m-%d') > datetime.strptime(hasta, '%Y-%m-%d'):
+                raise ValueError
+        except ValueError:
+            messagebox.showwarning("Período inválido", "Ingresa fechas válidas con formato AAAA-MM-DD (desde ≤ hasta)")
+            return None
+        return desde, hasta
+    
+    def generar_reporte(self):
+        """Calcula el reporte en un hilo secundario para no congelar la interfaz"""
+        periodo = self.obtener_periodo_reporte()
+        if not periodo:
+            return
+        desde, hasta = periodo
+        
+        self.btn_generar_reporte.config(state='disabled')
+        self.label_estado_reporte.config(text="⏳ Calculando...")
+        self.trabajos_en_curso.add('reporte')
+        
+        resultado = {}
+        
+        def progreso(filas):
+            resultado['filas'] = filas
+        
+        def calcular():
+            try:
+                resultado['reporte'] = reportes.generar_reporte(self.motor.db_path, desde, hasta, progreso=progreso)
+            except Exception as e:
+                resultado['error'] = e
+        
+        hilo = threading.Thread(target=calcular, name='reporte-ventas', daemon=True)
+        hilo.start()
+        self.root.after(100, lambda: self.esperar_reporte(hilo, resultado))
+    
+    def esperar_reporte(self, hilo, resultado):
+        """Consulta periódicamente el hilo del reporte desde el hilo de Tk"""
+        pestaña_activa = self.widget_activo('label_estado_reporte')
+        if hilo.is_alive():
+            if pestaña_activa and 'filas' in resultado:
+                self.label_estado_reporte.config(text=f"⏳ Calculando... {resultado['filas']:,} items leídos")
+            self.root.after(100, lambda: self.esperar_reporte(hilo, resultado))
+            return
+        
+        self.trabajos_en_curso.discard('reporte')
+        if pestaña_activa:
+            self.btn_generar_reporte.config(state='normal')
+            self.label_estado_reporte.config(text="")
+        if 'error' in resultado:
+            messagebox.showerror("Error", f"Error al generar el reporte: {str(resultado['error'])}")
+            return
+        if not pestaña_activa:
+            # Sin la pestaña no hay tablas donde volcarlo: al menos se informan los totales
+            totales = resultado['reporte']['totales']
+            moneda = self.config.get('moneda', '$')
+            messagebox.showinfo(
+                "Reporte",
+                f"✅ Reporte terminado: {totales['comandas']} comandas, Total: {moneda}{totales['total']:,.2f}\n"
+                f"Abre la pestaña Reportes y genéralo de nuevo para ver el detalle."
+            )
+            return
+        self.mostrar_reporte(resultado['reporte'])
+    
+    def exportar_excel(self):
+        """Exporta el detalle de comandas del período a XLSX en un hilo secundario"""
+        periodo = self.obtener_periodo_reporte()
+        if not periodo:
+            return
+        desde, hasta = periodo
+        
+        ruta = filedialog.asksaveasfilename(
+            title="Exportar comandas a Excel",
+            defaultextension='.xlsx',
+            initialfile=f"comandas_{desde}_{hasta}.xlsx",
+            filetypes=[('Libro de Excel', '*.xlsx')]
+        )
+        if not ruta:
+            return
+        
+        self.btn_exportar_excel.config(state='disabled')
+        self.progreso_exportacion['value'] = 0
+        self.progreso_exportacion.pack(side='left', padx=5)
+        self.label_estado_reporte.config(text="📥 Exportando...")
+        self.trabajos_en_curso.add('exportacion')
+        
+        resultado = {}
+        
+        def progreso(escritas, total):
+            resultado['progreso'] = (escritas, total)
+        
+        def exportar():
+            try:
+                resultado['filas'] = exportacion.exportar_excel(
+                    self.motor.db_path, ruta, desde, hasta, progreso=progreso
+                )
+            except Exception as e:
+                resultado['error'] = e
+        
+        hilo = threading.Thread(target=exportar, name='exportacion-excel', daemon=True)
+        hilo.start()
+        self.root.after(200, lambda: self.esperar_exportacion(hilo, resultado, ruta))
+    
+    def esperar_exportacion(self, hilo, resultado, ruta):
+        """Actualiza la barra de progreso de la exportación desde el hilo de Tk"""
+        pestaña_activa = self.widget_activo('label_estado_reporte')
+        if pestaña_activa and 'progreso' in resultado:
+            escritas, total = resultado['progreso']
+            self.progreso_exportacion['value'] = escritas * 100 / total if total else 100
+            self.label_estado_reporte.config(text=f"📥 Exportando... {escritas:,} de {total:,} filas")
+        if hilo.is_alive():
+            self.root.after(200, lambda: self.esperar_exportacion(hilo, resultado, ruta))
+            return
+        
+        self.trabajos_en_curso.discard('exportacion')
+        if pestaña_activa:
+            self.btn_exportar_excel.config(state='normal')
+            self.progreso_exportacion.pack_forget()
+            self.label_estado_reporte.config(text="")
+        if 'error' in resultado:
+            messagebox.showerror("Error", f"Error al exportar: {str(resultado['error'])}")
+            return
+        messagebox.showinfo("Exportación", f"✅ Se exportaron {resultado['filas']:,} filas a:\n{ruta}")
+    
+    def mostrar_reporte(self, reporte):
+        """Vuelca los DataFrames del reporte en las tablas de la pestaña"""
+        moneda = self.config.get('moneda', '$')
+        totales = reporte['totales']
+        self.label_totales_reporte.config(
+            text=f"{totales['comandas']} comandas  •  {totales['unidades']} unidades  •  "
+                 f"Total: {moneda}{totales['total']:,.2f}  •  Ticket promedio: {moneda}{totales['ticket_promedio']:,.2f}"
+        )
+        
+        for dimension, (tree, con_comandas) in self.tablas_reporte.items():
+            tree.delete(*tree.get_children())
+            tabla = reporte[dimension]
+            for clave, fila in zip(tabla.index, tabla.itertuples(index=False)):
+                etiqueta = f"{clave:02d}:00" if dimension == 'hora' else clave
+                importe = f"{moneda}{fila.importe:,.2f}"
+                if con_comandas:
+                    tree.insert('', 'end', values=(etiqueta, int(fila.cantidad), fila.comandas, importe))
+                else:
+                    tree.insert('', 'end', values=(etiqueta, int(fila.cantidad), importe))
     
-    def crear_pestaña_usuarios(self):
+    def crear_pestaña_usuarios(self, frame_usuarios=None):
         """Crea la pestaña de gestión de usuarios"""
-        frame_usuarios = tk.Frame(self.notebook, bg='#F8F9FA')
-        self.notebook.add(frame_usuarios, text='👥 Usuarios')
+        if frame_usuarios is None:
+            frame_usuarios = tk.Frame(self.notebook, bg='#F8F9FA')
+            self.notebook.add(frame_usuarios, text='👥 Usuarios')
         
         # Marco principal
         main_frame = tk.Frame(frame_usuarios, bg='#F8F9FA')
@@ -2886,6 +3398,8 @@ class SistemaComandas:
     
     def actualizar_lista_usuarios(self):
         """Actualiza la lista de usuarios en el Treeview"""
+        if not self.widget_activo('tree_usuarios'):
+            return
         # Limpiar lista actual
         for item in self.tree_usuarios.get_children():
             self.tree_usuarios.delete(item)
@@ -3314,10 +3828,11 @@ class SistemaComandas:
         # Enfocar primer campo
         entry_nueva_password.focus()
     
-    def crear_pestaña_configuracion(self):
+    def crear_pestaña_configuracion(self, frame_config=None):
         """Crea la pestaña de configuración del sistema (solo admin)"""
-        frame_config = tk.Frame(self.notebook, bg='#F8F9FA')
-        self.notebook.add(frame_config, text='⚙️ Configuración')
+        if frame_config is None:
+            frame_config = tk.Frame(self.notebook, bg='#F8F9FA')
+            self.notebook.add(frame_config, text='⚙️ Configuración')
         
         # Marco principal
         main_frame = tk.Frame(frame_config, bg='#F8F9FA')
@@ -3396,6 +3911,51 @@ class SistemaComandas:
         )
         btn_aplicar.pack(side='left', padx=10)
         
+        # Botón Estadísticas de consultas SQL
+        btn_consultas = tk.Button(
+            buttons_container,
+            text="📈 Consultas SQL",
+            font=('Arial', 12),
+            bg='#6C757D',
+            fg='white',
+            command=self.mostrar_estadisticas_consultas,
+            relief='flat',
+            padx=20,
+            pady=10,
+            cursor='hand2'
+        )
+        btn_consultas.pack(side='left', padx=10)
+        
+        # Botón Bloqueos de la interfaz
+        btn_bloqueos = tk.Button(
+            buttons_container,
+            text="⏱️ Bloqueos UI",
+            font=('Arial', 12),
+            bg='#6C757D',
+            fg='white',
+            command=self.mostrar_bloqueos_ui,
+            relief='flat',
+            padx=20,
+            pady=10,
+            cursor='hand2'
+        )
+        btn_bloqueos.pack(side='left', padx=10)
+        
+        # Botón Respaldo manual
+        btn_respaldo = tk.Button(
+            buttons_container,
+            text="💾 Respaldar Ahora",
+            font=('Arial', 12),
+            bg='#6C757D',
+            fg='white',
+            command=self.respaldar_ahora,
+            relief='flat',
+            padx=20,
+            pady=10,
+            cursor='hand2'
+        )
+        btn_respaldo.pack(side='left', padx=10)
+        
         # Frame principal para las configuraciones (HORIZONTAL)
         self.frame_config_scroll = tk.Frame(main_frame, bg='#F8F9FA')
         self.frame_config_scroll.pack(fill='both', expand=True)
@@ -3405,6 +3965,8 @@ class SistemaComandas:
     
     def cargar_configuraciones_interfaz(self):
         """Carga las configuraciones en la interfaz con layout horizontal"""
+        if not self.widget_activo('frame_config_scroll'):
+            return
         # Limpiar frame
         for widget in self.frame_config_scroll.winfo_children():
             widget.destroy()
@@ -3419,16 +3981,32 @@ class SistemaComandas:
         categorias = {
             'Funcionalidades Principales': [
                 'usar_mesas', 'usar_categorias', 'usar_observaciones', 
-                'generar_tickets', 'permitir_comandas_sin_mesa', 'mostrar_control_comandas'
+                'generar_tickets', 'permitir_comandas_sin_mesa', 'mostrar_control_comandas',
+                'horas_cuenta_inactiva'
             ],
             'Sistema de Usuarios': [
-                'usar_sistema_usuarios', 'usuario_predeterminado'
+                'usar_sistema_usuarios', 'usuario_predeterminado', 'cambio_rapido_usuario'
             ],
             'Interfaz y Presentación': [
-                'mostrar_precios_menu', 'actualizacion_automatica'
+                'mostrar_precios_menu', 'actualizacion_automatica', 'mostrar_mas_vendidos',
+                'mas_vendidos_por_hora', 'minutos_actualizar_mas_vendidos', 'mostrar_imagenes_productos'
             ],
             'Información del Negocio': [
                 'nombre_negocio', 'moneda'
+            ],
+            'Rendimiento': [
+                'umbral_consulta_lenta_ms', 'monitor_bloqueos_ui', 'umbral_bloqueo_ui_ms',
+                'liberar_pestanas_inactivas', 'minutos_liberar_pestanas',
+                'dias_retencion_comandas', 'busqueda_fts5', 'milisegundos_guardar_borrador'
+            ],
+            'Respaldos': [
+                'respaldo_automatico', 'horas_entre_respaldos', 'respaldos_a_conservar'
+            ],
+            'Cocina y Estaciones': [
+                'minutos_alerta_cocina', 'minutos_demora_cocina', 'tickets_por_estacion'
+            ],
+            'API para Handhelds': [
+                'servidor_api', 'puerto_servidor_api', 'puerto_eventos_api'
             ]
         }
         
@@ -3623,6 +4201,212 @@ class SistemaComandas:
             # Volver al login sin cerrar la aplicación
             self.volver_al_login()
     
+    def mostrar_estadisticas_consultas(self):
+        """Muestra los tiempos acumulados por consulta SQL y permite volcarlos a JSON"""
+        ventana = tk.Toplevel(self.root)
+        ventana.title("Estadísticas de Consultas SQL")
+        ventana.geometry("1000x500")
+        ventana.configure(bg='#F8F9FA')
+        ventana.transient(self.root)
+        
+        tk.Label(
+            ventana,
+            text=f"📈 Consultas SQL (lentas: más de {instrumentacion.estadisticas.umbral_lento_ms} ms)",
+            font=('Arial', 14, 'bold'),
+            bg='#F8F9FA',
+            fg='#2C3E50'
+        ).pack(pady=10)
+        
+        lista_frame = tk.Frame(ventana, bg='#F8F9FA')
+        lista_frame.pack(fill='both', expand=True, padx=10)
+        
+        tree = ttk.Treeview(
+            lista_frame,
+            columns=('Origen', 'Llamadas', 'Total', 'Promedio', 'Máximo', 'Filas', 'SQL'),
+            show='headings'
+        )
+        for columna, ancho in (('Origen', 220), ('Llamadas', 70), ('Total', 80), ('Promedio', 80),
+                               ('Máximo', 80), ('Filas', 70), ('SQL', 400)):
+            tree.heading(columna, text=columna)
+            tree.column(columna, width=ancho, anchor='w' if columna in ('Origen', 'SQL') else 'center')
+        
+        scrollbar = ttk.Scrollbar(lista_frame, orient='vertical', command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        tree.pack(side='left', fill='both', expand=True)
+        scrollbar.pack(side='right', fill='y')
+        
+        def cargar():
+            for item in tree.get_children():
+                tree.delete(item)
+            for fila in instrumentacion.estadisticas.resumen():
+                tree.insert('', 'end', values=(
+                    fila['etiqueta'], fila['llamadas'], f"{fila['total_ms']:.1f} ms",
+                    f"{fila['promedio_ms']:.2f} ms", f"{fila['max_ms']:.1f} ms",
+                    fila['filas'], fila['sql']
+                ))
+        
+        def volcar():
+            ruta = filedialog.asksaveasfilename(
+                parent=ventana,
+                defaultextension='.json',
+                initialfile=f"consultas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+                filetypes=[('JSON', '*.json')]
+            )
+            if ruta:
+                instrumentacion.estadisticas.volcar(ruta)
+                messagebox.showinfo("Consultas SQL", f"Estadísticas guardadas en:\n{ruta}", parent=ventana)
+        
+        def reiniciar():
+            instrumentacion.estadisticas.reiniciar()
+            cargar()
+        
+        botones_frame = tk.Frame(ventana, bg='#F8F9FA')
+        botones_frame.pack(pady=10)
+        for texto, comando, color in (("🔄 Actualizar", cargar, '#17A2B8'),
+                                      ("💾 Volcar a JSON", volcar, '#28A745'),
+                                      ("🗑️ Reiniciar", reiniciar, '#DC3545')):
+            tk.Button(
+                botones_frame,
+                text=texto,
+                font=('Arial', 11, 'bold'),
+                bg=color,
+                fg='white',
+                command=comando,
+                relief='flat',
+                padx=15,
+                pady=6,
+                cursor='hand2'
+            ).pack(side='left', padx=5)
+        
+        cargar()
+    
+    def abrir_pantalla_cocina(self):
+        """Abre la pantalla de cocina en otra ventana, o la trae al frente si ya está abierta"""
+        if self.pantalla_cocina is not None and self.pantalla_cocina.ventana.winfo_exists():
+            self.pantalla_cocina.ventana.deiconify()
+            self.pantalla_cocina.ventana.lift()
+            return
+        ventana = tk.Toplevel(self.root)
+        ventana.geometry("1200x750")
+        self.pantalla_cocina = PantallaCocina(ventana, self.motor)
+    
+    def respaldar_ahora(self):
+        """Inicia un respaldo manual sin esperar al intervalo automático"""
+        if self.respaldo_en_curso:
+            messagebox.showinfo("Respaldo", "Ya hay un respaldo en curso")
+            return
+        directorio = os.path.join(self.get_app_directory(), respaldo.DIRECTORIO)
+        self.respaldar_en_segundo_plano(directorio)
+        messagebox.showinfo(
+            "Respaldo",
+            f"Respaldo iniciado en segundo plano.\n\nSe guardará en:\n{directorio}\n\n"
+            "El resultado queda en logs/respaldos.log"
+        )
+    
+    def mostrar_bloqueos_ui(self):
+        """Muestra los bloqueos de la interfaz agrupados por el manejador que los causó"""
+        if not self.monitor_ui:
+            messagebox.showinfo("Bloqueos UI", "El monitor de bloqueos está desactivado en la configuración")
+            return
+        
+        ventana = tk.Toplevel(self.root)
+        ventana.title("Bloqueos de la Interfaz")
+        ventana.geometry("600x400")
+        ventana.configure(bg='#F8F9FA')
+        ventana.transient(self.root)
+        
+        tk.Label(
+            ventana,
+            text=f"⏱️ Bloqueos mayores a {self.monitor_ui.umbral_ms} ms",
+            font=('Arial', 14, 'bold'),
+            bg='#F8F9FA',
+            fg='#2C3E50'
+        ).pack(pady=10)
+        
+        tree = ttk.Treeview(
+            ventana,
+            columns=('Manejador', 'Cantidad', 'Peor', 'Total'),
+            show='headings'
+        )
+        for columna, ancho in (('Manejador', 250), ('Cantidad', 80), ('Peor', 100), ('Total', 100)):
+            tree.heading(columna, text=columna)
+            tree.column(columna, width=ancho, anchor='w' if columna == 'Manejador' else 'center')
+        tree.pack(fill='both', expand=True, padx=10)
+        
+        for fila in self.monitor_ui.resumen():
+            tree.insert('', 'end', values=(
+                fila['manejador'], fila['cantidad'],
+                f"{fila['peor_ms']:.0f} ms", f"{fila['total_ms']:.0f} ms"
+            ))
+        
+        tk.Label(
+            ventana,
+            text="Detalle de cada bloqueo en logs/bloqueos_ui.log",
+            font=('Arial', 10),
+            bg='#F8F9FA',
+            fg='#6C757D'
+        ).pack(pady=10)
+    
+    def es_administrador(self):
+        """Indica si el usuario de la sesión actual tiene rol de administrador"""
+        rol_usuario = self.usuario_actual.get('rol', '').lower() if self.usuario_actual and self.usuario_actual.get('rol') else ''
+        return rol_usuario in ['admin', 'administrador']
+
+    def aplicar_permisos_pestañas(self):
+        """Muestra u oculta las pestañas de administración según el rol actual"""
+        visibles = self.es_administrador()
+        for frame in self.pestañas_admin:
+            if visibles:
+                # add sobre una pestaña oculta la restaura en su posición original
+                self.notebook.add(frame)
+            else:
+                self.notebook.hide(frame)
+        if not visibles and self.notebook.select() in [str(frame) for frame in self.pestañas_admin]:
+            self.notebook.select(0)
+
+    def interfaz_en_memoria(self):
+        """Indica si la interfaz principal está construida y puede reutilizarse"""
+        return (
+            self.config.get('cambio_rapido_usuario', True)
+            and getattr(self, 'notebook', None) is not None
+            and self.notebook.winfo_exists()
+        )
+
+    def cambiar_usuario(self):
+        """Vuelve al login conservando la interfaz construida para el próximo usuario"""
+        # La comanda sin finalizar queda en su borrador y se retoma al volver a entrar
+        if not self.config.get('cambio_rapido_usuario', True):
+            self.volver_al_login()
+            return
+
+        # Ocultar sin destruir: mesas, categorías y productos quedan cargados
+        self.header.pack_forget()
+        self.notebook.pack_forget()
+
+        # Reset del estado de la sesión
+        self.usuario_actual = None
+        self.comanda_actual = []
+        self.actualizar_comanda_display()
+        self.mesa_actual = None
+        if hasattr(self, 'label_mesa_actual'):
+            self.label_mesa_actual.config(text="No seleccionada")
+            self.plano_mesas.marcar_seleccionada(None)
+        if hasattr(self, 'text_observaciones'):
+            self.text_observaciones.delete("1.0", tk.END)
+            self.text_observaciones.insert("1.0", "Escribe observaciones especiales aquí (opcional)...")
+            self.text_observaciones.config(fg='#7F8C8D')
+
+        self.mostrar_login()
+
+    def restaurar_interfaz_principal(self):
+        """Vuelve a mostrar la interfaz existente con la identidad y permisos del nuevo usuario"""
+        self.label_usuario.config(text=f"👤 {self.usuario_actual['nombre']}")
+        self.aplicar_permisos_pestañas()
+        self.restaurar_borrador()
+        self.notebook.select(0)
+        self.header.pack(fill='x')
+        self.notebook.pack(fill='both', expand=True, padx=5, pady=5)
+
     def volver_al_login(self):
         """Vuelve a la pantalla de login sin cerrar la aplicación"""
         try:
@@ -3653,5 +4437,22 @@ class SistemaComandas:
 
 if __name__ == "__main__":
     root = tk.Tk()
-    app = SistemaComandas(root)
-    root.mainloop()
\ No newline at end of file
+    argumentos = sys.argv[1:]
+    if '--cocina' in argumentos:
+        # Terminal dedicada a la cocina: sólo la pantalla de comandas abiertas, sin login.
+        # Con --estacion NOMBRE muestra únicamente la cola de esa estación.
+        estacion = None
+        if '--estacion' in argumentos and argumentos.index('--estacion') + 1 < len(argumentos):
+            estacion = argumentos[argumentos.index('--estacion') + 1]
+        if getattr(sys, 'frozen', False):
+            app_dir = os.path.dirname(sys.executable)
+        else:
+            app_dir = os.path.dirname(os.path.abspath(__file__))
+        motor = OrderEngine(os.path.join(app_dir, 'comandas.db'))
+        app = PantallaCocina(root, motor, pantalla_completa=True, estacion=estacion)
+    else:
+        app = SistemaComandas(root)
+    root.mainloop()
+    if isinstance(app, SistemaComandas):
+        # Lo tocado en el último intervalo todavía no se escribió
+        app.borradores.cerrar()
\ No newline at end of file
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""Resúmenes diarios de ventas mantenidos en forma incremental
+
+Cada tabla acumula por día (y producto, mesa, mozo u hora) las unidades, el
+importe, las comandas no canceladas y cuántas de ellas se completaron. El motor
+las actualiza en la misma transacción que registra, completa o cancela una
+comanda; reconstruir() las recalcula desde comandas/items_comanda.
+"""
+
+# Tabla -> (columna clave, expresión SQL de la clave sobre comandas c / items_comanda i)
+TABLAS = {
+    'ventas_diarias_producto': ('producto', 'i.producto_nombre'),
+    'ventas_diarias_mesa': ('mesa_id', 'COALESCE(c.mesa_id, 0)'),
+    'ventas_diarias_usuario': ('usuario', 'c.usuario'),
+    'ventas_diarias_hora': ('hora', "CAST(SUBSTR(c.fecha, 12, 2) AS INTEGER)"),
+}
+
+# Tablas donde cada comanda aporta a una sola clave
+_CLAVE_POR_COMANDA = ('ventas_diarias_mesa', 'ventas_diarias_usuario', 'ventas_diarias_hora')
+
+
+def crear_tablas(cursor):
+    """Crea las tablas de resumen si no existen"""
+    for tabla, (columna, _) in TABLAS.items():
+        tipo = 'TEXT' if columna in ('producto', 'usuario') else 'INTEGER'
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {tabla} (
+                dia TEXT NOT NULL,
+                {columna} {tipo} NOT NULL,
+                cantidad INTEGER NOT NULL DEFAULT 0,
+                importe REAL NOT NULL DEFAULT 0,
+                comandas INTEGER NOT NULL DEFAULT 0,
+                completadas INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (dia, {columna})
+            )
+        ''')
+
+
+def _signos(estado_anterior, estado_nuevo):
+    """Variación de (venta, completada) al pasar de un estado a otro; None = comanda inexistente"""
+    def vigente(estado):
+        return 1 if estado is not None and estado != 'Cancelada' else 0
+
+    def completada(estado):
+        return 1 if estado == 'Completada' else 0
+
+    return (vigente(estado_nuevo) - vigente(estado_anterior),
+            completada(estado_nuevo) - completada(estado_anterior))
+
+
+def aplicar_transicion(cursor, comanda_id, estado_anterior, estado_nuevo):
+    """Suma o resta la comanda en los resúmenes según el cambio de estado
+
+    Debe ejecutarse dentro de la transacción que modifica la comanda.
+    """
+    venta, completada = _signos(estado_anterior, estado_nuevo)
+    if not venta and not completada:
+        return
+
+    for tabla, (columna, expresion) in TABLAS.items():
+        # En mesa/usuario/hora la comanda es una sola fila agrupada; en producto
+        # cuenta una vez por cada producto que contiene
+        cursor.execute(f'''
+            INSERT INTO {tabla} (dia, {columna}, cantidad, importe, comandas, completadas)
+            SELECT DATE(c.fecha), {expresion},
+                   ? * SUM(i.cantidad), ? * SUM(i.cantidad * i.precio_unitario), ?, ?
+            FROM comandas c
+            JOIN items_comanda i ON i.comanda_id = c.id
+            WHERE c.id = ?
+            GROUP BY 1, 2
+            ON CONFLICT (dia, {columna}) DO UPDATE SET
+                cantidad = cantidad + excluded.cantidad,
+                importe = importe + excluded.importe,
+                comandas = comandas + excluded.comandas,
+                completadas = completadas + excluded.completadas
+        ''', (venta, venta, venta, completada, comanda_id))
+
+
+def reconstruir(cursor, desde=None, hasta=None, comandas='comandas', items='items_comanda'):
+    """Recalcula los resúmenes desde los datos crudos, opcionalmente sólo entre dos fechas
+
+    comandas/items permiten leer de vistas que incluyan el archivo histórico.
+    Devuelve la cantidad de filas escritas por tabla.
+    """
+    condiciones = ["c.estado != 'Cancelada'"]
+    parametros = []
+    borrar = []
+    parametros_borrar = []
+    if desde:
+        condiciones.append("c.fecha >= ?")
+        parametros.append(desde)
+        borrar.append("dia >= ?")
+        parametros_borrar.append(desde)
+    if hasta:
+        condiciones.append("c.fecha < DATE(?, '+1 day')")
+        parametros.append(hasta)
+        borrar.append("dia <= ?")
+        parametros_borrar.append(hasta)
+    where = ' AND '.join(condiciones)
+    where_borrar = f"WHERE {' AND '.join(borrar)}" if borrar else ''
+
+    filas = {}
+    for tabla, (columna, expresion) in TABLAS.items():
+        cursor.execute(f"DELETE FROM {tabla} {where_borrar}", parametros_borrar)
+        if tabla in _CLAVE_POR_COMANDA:
+            # Totalizar cada comanda primero para contarla una sola vez
+            cursor.execute(f'''
+                INSERT INTO {tabla} (dia, {columna}, cantidad, importe, comandas, completadas)
+                SELECT dia, clave, SUM(cantidad), SUM(importe), COUNT(*), SUM(completada)
+                FROM (
+                    SELECT DATE(c.fecha) AS dia, {expresion} AS clave,
+                           SUM(i.cantidad) AS cantidad,
+                           SUM(i.cantidad * i.precio_unitario) AS importe,
+                           c.estado = 'Completada' AS completada
+                    FROM {comandas} c
+                    JOIN {items} i ON i.comanda_id = c.id
+                    WHERE {where}
+                    GROUP BY c.id
+                )
+                GROUP BY dia, clave
+            ''', parametros)
+        else:
+            cursor.execute(f'''
+                INSERT INTO {tabla} (dia, {columna}, cantidad, importe, comandas, completadas)
+                SELECT DATE(c.fecha), {expresion},
+                       SUM(i.cantidad), SUM(i.cantidad * i.precio_unitario),
+                       COUNT(DISTINCT c.id),
+                       COUNT(DISTINCT CASE WHEN c.estado = 'Completada' THEN c.id END)
+                FROM {comandas} c
+                JOIN {items} i ON i.comanda_id = c.id
+                WHERE {where}
+                GROUP BY 1, 2
+            ''', parametros)
+        filas[tabla] = cursor.rowcount
+    return filas